@@ -23,6 +23,7 @@ alltestnames = [
     'MiscUtils.Tests.TestFuncs',
     'MiscUtils.Tests.TestPickleCache',
     'MiscUtils.Tests.TestDataTable',
+    'MiscUtils.Tests.TestDBPool',
     'MiscUtils.Tests.TestDateInterval',
     'MiscUtils.Tests.TestDateParser',
     'MiscUtils.Tests.TestDictForArgs',
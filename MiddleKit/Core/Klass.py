@@ -321,6 +321,15 @@ class Klass(MiddleDict, ModelObject):
                 self._pyClass = None
         return self._pyClass
 
+    def __getstate__(self):
+        """For pickling, remove the Python class.
+
+        It will be looked up again by pyClass() when needed.
+        """
+        attrs = self.__dict__.copy()
+        attrs['_pyClass'] = False
+        return attrs
+
     def backObjRefAttrs(self):
         """Return a list of all potentially referencing attributes.
 
@@ -131,10 +131,15 @@ class Klasses(dict, ModelObject):
             klass.awakeFromRead(self)
 
     def __getstate__(self):
-        """For pickling, remove the back reference to the model that owns self."""
+        """For pickling, remove the back reference to the model that owns self.
+
+        The reference is kept if the model itself is pickled as part of
+        the compiled model cache.
+        """
         assert self._model
         attrs = self.__dict__.copy()
-        del attrs['_model']
+        if not self._model._compiling:
+            del attrs['_model']
         return attrs
 
 
@@ -1,10 +1,11 @@
 import os
 import sys
+from hashlib import sha1
 
 try:
-    from cPickle import load, dump
+    from cPickle import load, dump, Pickler, Unpickler
 except ImportError:
-    from pickle import load, dump
+    from pickle import load, dump, Pickler, Unpickler
 
 from MiscUtils.Configurable import Configurable
 from MiscUtils import NoDefault
@@ -40,6 +41,7 @@ class Model(Configurable):
     """
 
     pickleProtocol = -1  # highest protocol available
+    compiledCacheVersion = 1  # increase when the layout of the model changes
 
     def __init__(self,
             filename=None, classesFilename=None, configFilename=None,
@@ -53,6 +55,9 @@ class Model(Configurable):
         self._name = None
         self._parents = []  # e.g., parent models
         self._pyClassForName = {}
+        self._compiledCacheName = None
+        self._readFromCompiledCache = False
+        self._compiling = False
 
         # _allModelsByFilename is used to avoid loading the same parent model twice
         if rootModel:
@@ -78,13 +83,24 @@ class Model(Configurable):
     def filename(self):
         return self._filename
 
-    def read(self, filename, isClassesFile=False):
+    def read(self, filename, isClassesFile=False, cacheName=None):
+        """Read the model.
+
+        If a cacheName is passed and the UseCompiledModelCache setting is
+        true, the model is read from the compiled model cache with that name
+        if it is still valid. See readCompiledCache().
+        """
         assert self._filename is None, 'Cannot read twice.'
         # Assume the .mkmodel extension if none is given
         if os.path.splitext(filename)[1] == '':
             filename += '.mkmodel'
         self._filename = os.path.abspath(filename)
         self._name = None
+        if (cacheName and not isClassesFile
+                and self.setting('UseCompiledModelCache', False)):
+            self._compiledCacheName = cacheName
+            if self.readCompiledCache():
+                return
         if isClassesFile:
             self.dontReadParents()
         else:
@@ -135,7 +151,158 @@ class Model(Configurable):
             self._klasses._model = self
 
     def __getstate__(self):
-        raise Exception('Model instances were not designed to be pickled.')
+        if not self._compiling:
+            raise Exception('Model instances were not designed to be pickled.'
+                ' Use the UseCompiledModelCache setting instead.')
+        attrs = self.__dict__.copy()
+        attrs['_pyClassForName'] = {}
+        attrs['_compiling'] = False
+        return attrs
+
+
+    ## Compiled cache ##
+
+    def compiledCachePath(self):
+        """Return the path of the compiled model cache.
+
+        The file is put in the model directory or in the directory given
+        by the CompiledModelCacheDir setting (relative to the model).
+        Its name contains the cache name, since model users such as object
+        stores for different databases can add different data to the model.
+        """
+        dirname = self.setting('CompiledModelCacheDir', None)
+        dirname = os.path.join(self._filename, dirname or '')
+        return os.path.normpath(os.path.join(dirname,
+            '%s.%s.mkcache' % (self.name(), self._compiledCacheName)))
+
+    def compiledCacheSources(self):
+        """Return the paths of all files the model has been read from.
+
+        These are the classes files and the config files of the model
+        and of all its parent models, including files that do not exist.
+        """
+        filenames = [self._filename]
+        filenames.extend(sorted(model.filename()
+            for model in self._allModelsByFilename.values()))
+        sources = []
+        for filename in filenames:
+            for name in 'Classes.csv', 'Classes.xls', self._configFilename:
+                sources.append(os.path.join(filename, name))
+        return sources
+
+    def compiledCacheHeader(self, sources):
+        """Return the header identifying the model read from the sources.
+
+        The header contains the versions of the cache layout and of Python,
+        and a SHA-1 hash of each source file (None for missing files).
+        """
+        hashes = []
+        for path in sources:
+            try:
+                with open(path, 'rb') as f:
+                    hashes.append(sha1(f.read()).hexdigest())
+            except IOError:
+                hashes.append(None)
+        return dict(version=self.compiledCacheVersion,
+            python=sys.version_info[:2], sources=zip(sources, hashes))
+
+    def readCompiledCache(self):
+        """Read the model from the compiled model cache.
+
+        The cache contains the complete model including its parent models,
+        resolved inheritance, attributes and the data added by the model user
+        (e.g. SQL statement prefixes). It is only used if the versions and the
+        hashes of all source files match; otherwise the model is read from
+        the source files and the cache is written by writeCompiledCache().
+        Returns whether the model has been read from the cache.
+        """
+        try:
+            f = open(self.compiledCachePath(), 'rb')
+        except IOError:
+            return False
+        try:
+            unpickler = Unpickler(f)
+            unpickler.persistent_load = self._compiledCachePersistentLoad
+            header = unpickler.load()
+            sources = [path for path, hash in header.get('sources', ())]
+            if header != self.compiledCacheHeader(sources):
+                return False
+            attrs = unpickler.load()
+        except Exception:
+            # ignore corrupted caches and caches that cannot be
+            # unpickled, e.g. because classes have been renamed
+            return False
+        finally:
+            f.close()
+        config = self._config
+        self.__dict__.update(attrs)
+        self._config = config
+        self._readFromCompiledCache = True
+        self.awakeFromCompiledCache()
+        return True
+
+    def awakeFromCompiledCache(self):
+        """Perform initialization after reading from the compiled cache.
+
+        Connects the klasses with their Python classes, like awakeFromRead().
+        """
+        for model in self._searchOrder:
+            for klass in model.klasses().klassesInOrder():
+                klass.pyClass()
+
+    def readFromCompiledCache(self):
+        """Return whether the model has been read from the compiled cache."""
+        return self._readFromCompiledCache
+
+    def shouldWriteCompiledCache(self):
+        """Return whether the compiled model cache should be written."""
+        return (self._compiledCacheName is not None
+            and not self._readFromCompiledCache)
+
+    def writeCompiledCache(self):
+        """Write the compiled model cache.
+
+        The cache is written to a temporary file that is renamed afterwards,
+        so that other processes never read a partially written cache.
+        Errors are ignored, since the cache is an optimization only.
+        """
+        path = self.compiledCachePath()
+        models = [self] + self._allModelsByFilename.values()
+        attrs = self.__dict__.copy()
+        attrs['_pyClassForName'] = {}
+        attrs['_readFromCompiledCache'] = False
+        del attrs['_config']
+        tmpPath = '%s.%d.tmp' % (path, os.getpid())
+        for model in models:
+            model._compiling = True
+        try:
+            with open(tmpPath, 'wb') as f:
+                pickler = Pickler(f, self.pickleProtocol)
+                pickler.persistent_id = self._compiledCachePersistentId
+                pickler.dump(self.compiledCacheHeader(
+                    self.compiledCacheSources()))
+                pickler.dump(attrs)
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmpPath, path)
+        except Exception:
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+            return False
+        finally:
+            for model in models:
+                model._compiling = False
+        return True
+
+    def _compiledCachePersistentId(self, obj):
+        # the model itself is not pickled, only its attributes
+        return 'model' if obj is self else None
+
+    def _compiledCachePersistentLoad(self, pid):
+        assert pid == 'model'
+        return self
 
     def awakeFromRead(self):
         # create containers for all klasses, uniqued by name
@@ -369,6 +536,7 @@ class Model(Configurable):
             Threaded = True,
             ObjRefSuffixes = ('ClassId', 'ObjId'),
             UseBigIntObjRefColumns = False,
+            IndexObjRefColumns = True,
             # SQLLog = {'File': 'stdout'},
             PreSQL = '',
             PostSQL = '',
@@ -37,8 +37,30 @@ class ModelUser(object):
         if modelClass is None:
             from MiddleKit.Core.Model import Model as modelClass
         self._model = modelClass(**keywords)
-        self._model.read(filename)
+        self._model.read(filename, cacheName=self.compiledModelCacheName())
         self.modelWasSet()
+        if self._model.shouldWriteCompiledCache():
+            self.compileModel()
+            self._model.writeCompiledCache()
+
+    def compiledModelCacheName(self):
+        """Return the name of the compiled model cache used by self.
+
+        Model users that add different data to the model need different
+        caches, so the name of the class is returned by default. Return
+        None to never use the compiled model cache.
+        """
+        return self.__class__.__name__
+
+    def compileModel(self):
+        """Prepare the model for being written to the compiled model cache.
+
+        Invoked after modelWasSet() if the model has been read from the
+        source files and the UseCompiledModelCache setting is true.
+        Subclasses can override this to compute data that shall be
+        kept in the cache.
+        """
+        pass
 
     def modelWasSet(self):
         """Perform additional set up of the store after the model is set.
@@ -45,6 +45,10 @@ class CodeGenerator(ModelUser):
         """
         return self.__class__.__name__
 
+    def compiledModelCacheName(self):
+        """Return None since generators always read the source files."""
+        return None
+
     def requireDir(self, dirname):
         if not os.path.exists(dirname):
             os.mkdir(dirname)
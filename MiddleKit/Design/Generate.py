@@ -37,11 +37,14 @@ class Generate(object):
         # Generate
         if 'sql' in opt:
             print 'Generating SQL...'
-            self.generate(
+            generator = self.generate(
                 pyClass = opt['db'] + 'SQLGenerator',
                 model = opt['model'],
                 configFilename = opt.get('config'),
                 outdir = os.path.join(outdir, 'GeneratedSQL'))
+            if 'index-report' in opt:
+                print 'Index report:'
+                generator.writeIndexReport()
         if 'py' in opt:
             print 'Generating Python...'
             self.generate(
@@ -61,11 +64,14 @@ class Generate(object):
             print
         print '''\
 Usage: %s --db DBNAME --model FILENAME \\
-           [--sql] [--py] [--config FILENAME] [--outdir DIRNAME]
+           [--sql] [--py] [--index-report]
+           [--config FILENAME] [--outdir DIRNAME]
        %s -h | --help
 
     * Known databases include: %s.
     * If neither --sql nor --py are specified, both are generated.
+    * --index-report prints the indexes of all tables together with
+      advice about missing and redundant indexes. It implies --sql.
     * If --outdir is not specified,
       then the base filename (sans extension) is used.
     * --config lets you specify a different config filename inside the model.
@@ -79,7 +85,8 @@ Usage: %s --db DBNAME --model FILENAME \\
         if isinstance(args, basestring):
             args = args.split()
         optPairs, files = getopt(args[1:], 'h',
-            ['help', 'db=', 'model=', 'sql', 'py', 'config=', 'outdir='])
+            ['help', 'db=', 'model=', 'sql', 'py', 'index-report',
+                'config=', 'outdir='])
         if len(optPairs) < 1:
             self.usage('Missing options.')
         if len(files) > 0:
@@ -104,6 +111,8 @@ Usage: %s --db DBNAME --model FILENAME \\
         if 'sql' not in opt and 'py' not in opt:
             opt['sql'] = ''
             opt['py'] = ''
+        elif 'index-report' in opt:
+            opt['sql'] = ''
         if 'outdir' not in opt:
             opt['outdir'] = os.curdir
 
@@ -115,6 +124,7 @@ Usage: %s --db DBNAME --model FILENAME \\
         The pyClass may be a string, in which case a module of the same name is
         imported and the class extracted from that. The model may be a string,
         in which case it is considered a filename of a model.
+        Returns the generator.
         """
         if isinstance(pyClass, basestring):
             module = __import__(pyClass, globals())
@@ -126,6 +136,7 @@ Usage: %s --db DBNAME --model FILENAME \\
         else:
             generator.setModel(model)
         generator.generate(outdir)
+        return generator
 
 
 if __name__ == '__main__':
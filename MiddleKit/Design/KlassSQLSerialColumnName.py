@@ -11,6 +11,13 @@ class KlassMixIn(object):
             self._sqlIdColumnName = name
         return name
 
+    def sqlRowVersionColumnName(self):
+        """Return the name of the row version column.
+
+        The column exists if the UseRowVersions setting is set.
+        """
+        return 'rowVersion'
+
 
 from MiscUtils.MixIn import MixIn
 from MiddleKit.Core.Klass import Klass
@@ -121,6 +121,26 @@ name varchar(100)
             wr("(%s, '%s');\n" % (klass.id(), klass.name()))
         wr('\ngo\n\n')
 
+    def writeChangeLogSQL(self, generator, out):
+        out.write('''\
+if exists (select * from dbo.sysobjects where id = object_id(N'[dbo].[_MKChanges]') and OBJECTPROPERTY(id, N'IsUserTable') = 1)
+drop table [dbo].[_MKChanges]
+go
+
+create table _MKChanges (
+id int identity(1, 1) primary key,
+classId int not null,
+objId int not null,
+origin varchar(32) not null,
+changed bigint not null
+)
+go
+
+create index _MKChanges_changed on _MKChanges (changed)
+go
+
+''')
+
     def writeKeyValue(self, out, key, value):
         ''' Used by willWriteSQL(). '''
         key = key.ljust(12)
@@ -186,29 +206,9 @@ class Klass(object):
         """
         return '[%s]' % self.name()
 
-    def writeIndexSQLDefsAfterTable(self, wr):
-        for attr in self.allAttrs():
-            if attr.boolForKey('isIndexed') and attr.hasSQLColumn():
-                unique = ' unique' if self.boolForKey('isUnique') else ''
-                indexName = cleanConstraintName('IX__%s__%s' % (
-                    self.name(), attr.name()))
-                wr('create%s index [%s] on %s(%s);\n' % (
-                    unique, indexName, self.sqlTableName(), attr.sqlColumnName()))
-            elif (attr.boolForKey('isBackRefAttr')
-                    and not attr.boolForKey('isDerived')):
-                # this index will speed up the fetching of lists
-                if self.setting('UseBigIntObjRefColumns', False):
-                    # not bothering supporting the old obj ref approach
-                    pass
-                else:
-                    attrName = attr.name()
-                    classIdName, objIdName = attr.sqlName().split(',', 1)
-                    tableName = self.sqlTableName()
-                    indexName = 'IX__%(tableName)s__BackRef__%(attrName)s' % locals()
-                    indexName = cleanConstraintName(indexName)
-                    wr('create index [%(indexName)s] on '
-                        '%(tableName)s(%(classIdName)s, %(objIdName)s);\n' % locals())
-        wr('\n')
+    def sqlIndexName(self, index):
+        return '[%s]' % cleanConstraintName('IX__%s__%s' % (
+            self.name(), index.label))
 
 
 class Attr(object):
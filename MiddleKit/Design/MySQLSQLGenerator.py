@@ -44,12 +44,21 @@ class Klass(object):
             self.sqlSerialColumnName().ljust(self.maxNameWidth()),)
 
     def writeIndexSQLDefsInTable(self, wr):
-        for attr in self.allAttrs():
-            if attr.boolForKey('isIndexed') and attr.hasSQLColumn():
-                wr(',\n')
-                wr('    index (%s)' % attr.sqlName())
+        for index in self.sqlIndexes():
+            wr(',\n')
+            wr('    %sindex %s (%s)' % ('unique ' if index.unique else '',
+                index.label, ', '.join(index.columns)))
+            if index.where:
+                wr(' /* where %s (not supported) */' % index.where)
         wr('\n')
 
+    def writeIndexSQLDefsAfterTable(self, wr):
+        # in MySQL, the indexes are created inside the create table statement
+        pass
+
+    def sqlSupportsPartialIndexes(self):
+        return False
+
 
 class EnumAttr(object):
 
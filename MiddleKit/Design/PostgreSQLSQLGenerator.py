@@ -67,6 +67,9 @@ class Klasses(object):
     def listTablesSQL(self):
         return '\d\n\n'
 
+    def changeLogIdSQLDef(self):
+        return 'id serial primary key'
+
 
 class Klass(object):
 
@@ -76,23 +79,10 @@ class Klass(object):
         if not self.isAbstract():
             wr('create sequence %s start 1 minvalue 1;\n\n' % self.seqName())
         Klass.mixInSuperWriteCreateSQL(self, generator, out)
-        self.writePgSQLIndexDefs(wr)
 
     def seqName(self):
         return '%s_%s_seq' % (self.sqlTableName(), self.sqlSerialColumnName())
 
-    def writeIndexSQLDefs(self, wr):
-        # in PostgreSQL, indices must be created with 'create index' commands
-        pass
-
-    def writePgSQLIndexDefs(self, wr):
-        for attr in self.allAttrs():
-            if attr.get('isIndexed', 0) and attr.hasSQLColumn():
-                wr('create index %s_%s_index on %s (%s);\n'
-                    % (self.sqlTableName(), attr.sqlName(),
-                    self.sqlTableName(), attr.sqlName()))
-        wr('\n')
-
     def primaryKeySQLDef(self, generator):
         return "    %s integer not null primary key default nextval('%s'),\n" % (
             self.sqlSerialColumnName(), self.seqName())
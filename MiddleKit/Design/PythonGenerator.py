@@ -66,6 +66,9 @@ class Klass(object):
             name = self.name()
             superclassModule = 'GeneratedPy.Gen' + name
             superclassName = 'Gen' + name
+            # keep the hierarchy free of instance dictionaries if possible
+            slots = ('\n    __slots__ = ()\n'
+                if self.setting('UseSlots', False) else '')
 
             # Write file
             with open(filename, 'w') as f:
@@ -129,11 +132,25 @@ del sys.path[0]
     def writePyClassDef(self):
         wr = self._pyOut.write
         wr('\n\nclass Gen%s(%s):\n' % (self.name(), self.supername()))
+        # mark the class as generated, see MiddleObject._mk_generatedRowLoader()
+        wr('\n    _mk_generated = True\n')
+        self.writePySlots()
         self.writePyInit()
         self.writePyReadStoreData()
+        self.writePyLoadRow()
         self.writePyAccessors()
         wr('\n')
 
+    def writePySlots(self):
+        """Write __slots__ for the attributes if the UseSlots setting is set.
+
+        The attribute values are then not stored in the instance dictionary.
+        This saves memory when many objects are held in memory.
+        """
+        if self.setting('UseSlots', False):
+            names = tuple('_' + attr.name() for attr in self.attrs())
+            self._pyOut.write('\n    __slots__ = %r\n' % (names,))
+
     def maxAttrNameLen(self):
         return max([len(attr.name()) for attr in self.attrs()] or [0])
 
@@ -160,6 +177,14 @@ del sys.path[0]
                 wr(s)
             wr('        %s.readStoreData(self, store, row)\n\n' % self.supername())
 
+    def writePyLoadRow(self):
+        """Write a method for reading the attributes from a row of the store.
+
+        Subclass responsibility, since the format of the rows depends on
+        the store. The default implementation writes nothing.
+        """
+        pass
+
     def writePyAccessors(self):
         """Write Python accessors for attributes simply by asking each one to do so."""
         out = self._pyOut
@@ -195,6 +220,15 @@ class Attr(object):
     def pyReadStoreDataStatement(self):
         return None
 
+    def pyLoadRowConversion(self):
+        """Return the statements for converting a value read from the store.
+
+        The statements convert the local variable "value" in the same way
+        as the set method would do. Used for generating row loaders.
+        Returns None if no conversion is needed.
+        """
+        return None
+
     def writePyAccessors(self, out):
         self.writePyGet(out)
         self.writePySet(out)
@@ -253,7 +287,7 @@ from %(superclassModule)s import %(superclassName)s
 
 
 class %(name)s(%(superclassName)s):
-
+%(slots)s
     def __init__(self):
         %(superclassName)s.__init__(self)
 """
@@ -292,6 +326,12 @@ class IntAttr(object):
     def stringToValue(self, string):
         return int(string)
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, long):
+            value = int(value)
+'''
+
     def writePySetChecks(self, out):
         Attr.writePySetChecks.im_func(self, out)
         out.write('''\
@@ -310,6 +350,12 @@ class LongAttr(object):
     def stringToValue(self, string):
         return long(string)
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, int):
+            value = long(value)
+'''
+
     def writePySetChecks(self, out):
         Attr.writePySetChecks.im_func(self, out)
         out.write('''\
@@ -326,6 +372,12 @@ class FloatAttr(object):
     def stringToValue(self, string):
         return float(string)
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, (int, long)):
+            value = float(value)
+'''
+
     def writePySetChecks(self, out):
         Attr.writePySetChecks.im_func(self, out)
         out.write('''\
@@ -342,6 +394,14 @@ class DecimalAttr(object):
     def stringToValue(self, string):
         return float(string)
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, (int, long)):
+            value = float(value)
+        elif isinstance(value, float):
+            value = Decimal(str(value))
+'''
+
     def writePySetChecks(self, out):
         Attr.writePySetChecks.im_func(self, out)
         out.write('''\
@@ -457,6 +517,12 @@ class EnumAttr(object):
 
 class AnyDateTimeAttr(object):
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, basestring):
+            value = %s(value)
+''' % self.nativeDateTimeParser()
+
     def writePySetChecks(self, out):
         Attr.writePySetChecks.im_func(self, out)
         typeName = self.nativeDateTimeTypeName()
@@ -486,6 +552,14 @@ class DateAttr(object):
     def nativeDateTimeParser(self):
         return 'parseDate'
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, datetime):
+            value = value.date()
+        elif isinstance(value, basestring):
+            value = parseDate(value)
+'''
+
     def writePySetChecks(self, out):
         # additional check to also allow datetime instances
         out.write('''\
@@ -503,6 +577,14 @@ class TimeAttr(object):
     def nativeDateTimeParser(self):
         return 'parseTime'
 
+    def pyLoadRowConversion(self):
+        return '''\
+        if isinstance(value, datetime):
+            value = value.time()
+        elif isinstance(value, basestring):
+            value = parseTime(value)
+'''
+
     def writePySetChecks(self, out):
         # additional check to also allow datetime instances
         out.write('''\
@@ -6,6 +6,7 @@ from glob import glob
 from MiscUtils import AbstractError, CSVParser
 from MiscUtils.Funcs import asclocaltime
 
+from MiddleKit.Core.Model import ModelError
 from MiddleKit.Core.ObjRefAttr import objRefJoin
 from CodeGenerator import *
 
@@ -21,6 +22,29 @@ class SampleError(Exception):
         print '%s:%d: %s' % (filename, self._line, self._error)
 
 
+class SQLIndex(object):
+    """An index of a table.
+
+    Attrs:
+        label   - used to build the name of the index
+        columns - the list of the SQL column names
+        unique  - whether this is a unique index
+        where   - the condition of a partial index or None
+        origin  - 'isIndexed', 'objRef' or 'declared'
+    """
+
+    def __init__(self, label, columns, unique=False, where=None, origin=None):
+        self.label = label
+        self.columns = columns
+        self.unique = unique
+        self.where = where
+        self.origin = origin
+
+    def __repr__(self):
+        return '<%s %s (%s)>' % (self.__class__.__name__,
+            self.label, ', '.join(self.columns))
+
+
 class SQLGenerator(CodeGenerator):
     """The MiddleKit SQL Generator class.
 
@@ -71,6 +95,33 @@ class SQLGenerator(CodeGenerator):
         """
         raise AbstractError(self.__class__)
 
+    def writeIndexReport(self, out=None):
+        """Write a report about the indexes of all tables.
+
+        Lists the indexes created for each table, followed by advice
+        about missing and redundant indexes. Used by Generate.py.
+        """
+        if out is None:
+            out = sys.stdout
+        wr = out.write
+        numIndexes = numAdvice = 0
+        for klass in self._model.allKlassesInOrder():
+            if klass.isAbstract():
+                continue
+            indexes = klass.sqlIndexes()
+            advice = klass.sqlIndexAdvice()
+            numIndexes += len(indexes)
+            numAdvice += len(advice)
+            wr('%s:\n' % klass.name())
+            for index in indexes:
+                wr('    %s%s (%s)%s - %s\n' % ('unique ' if index.unique else '',
+                    index.label, ', '.join(index.columns),
+                    ' where %s' % index.where if index.where else '',
+                    index.origin))
+            for line in advice:
+                wr('    * %s\n' % line)
+        wr('%d indexes, %d pieces of advice.\n' % (numIndexes, numAdvice))
+
 
 class ModelObject(object):
     pass
@@ -325,7 +376,10 @@ class Klasses(object):
 
         One popular user of this method is dropTablesSQL().
         """
-        return ['_MKClassIds']
+        names = ['_MKClassIds']
+        if self._model.setting('ChangeNotification', None):
+            names.append('_MKChanges')
+        return names
 
     def writeKeyValue(self, out, key, value):
         """Used by willCreateWriteSQL()."""
@@ -416,6 +470,8 @@ class Klasses(object):
         # assign the class ids up-front, so that we can resolve forward object references
         self.assignClassIds(generator)
         self.writeClassIdsSQL(generator, out)
+        if self._model.setting('ChangeNotification', None):
+            self.writeChangeLogSQL(generator, out)
 
         if self._model.setting('DoNotSortSQLCreateStatementsByDependency', False):
             # Generates the CREATE TABLEs in the order the classes were declared
@@ -440,6 +496,31 @@ name varchar(100)
             wr("    (%s, '%s');\n" % (klass.id(), klass.name()))
         wr('\n')
 
+    def writeChangeLogSQL(self, generator, out):
+        """Write the SQL for the table logging the changes of objects.
+
+        The table is created if the ChangeNotification setting is set.
+        Object stores insert a row for every object they update or delete,
+        and one row with an objId of 0 for every class of which they insert
+        objects, so that other stores can invalidate their cached objects.
+        The origin identifies the store and changed is the Unix time.
+        """
+        out.write('''\
+create table _MKChanges (
+%s,
+classId int not null,
+objId int not null,
+origin varchar(32) not null,
+changed bigint not null
+);
+create index _MKChanges_changed on _MKChanges (changed);
+
+''' % self.changeLogIdSQLDef())
+
+    def changeLogIdSQLDef(self):
+        """Return the SQL for the auto-incremented id of the change log."""
+        return 'id int not null primary key auto_increment'
+
     def listTablesSQL(self):
         # return a SQL command to list all tables in the database
         # this is database-specific, so by default we return nothing
@@ -473,6 +554,9 @@ class Klass(object):
         if generator.model().setting('DeleteBehavior', 'delete') == 'mark':
             self.writeDeletedSQLDef(generator, out)
             wr(',\n')
+        if generator.model().setting('UseRowVersions', False):
+            self.writeRowVersionSQLDef(generator, out)
+            wr(',\n')
         first = True
         sqlAttrs = []
         nonSQLAttrs = []
@@ -528,24 +612,165 @@ class Klass(object):
         dateTimeAttr.setKlass(self)
         dateTimeAttr.writeCreateSQL(generator, out)
 
+    def writeRowVersionSQLDef(self, generator, out):
+        """Write SQL for the row version.
+
+        Writes the column definition for the version number of the row that
+        becomes part of the CREATE statement. This is used if UseRowVersions
+        is set. Rows start with version 1 and every update increments it.
+        """
+        out.write('    %s int not null default 1' % (
+            self.sqlRowVersionColumnName().ljust(self.maxNameWidth()),))
+
     def maxNameWidth(self):
         return 30  # @@ 2000-09-15 ce: Ack! Duplicated from Attr class below
 
     def writeIndexSQLDefsInTable(self, wr):
-        """Return SQL for creating indexes in table.
+        """Write SQL for creating indexes in table.
 
-        Subclasses should override this or writeIndexSQLDefsAfterTable,
-        or no indexes will be created.
+        Subclasses can override this for SQL variants that create indexes
+        inside the create table statement, in which case they must also
+        override writeIndexSQLDefsAfterTable().
         """
         pass
 
     def writeIndexSQLDefsAfterTable(self, wr):
-        """Return SQL for creating indexes after table.
+        """Write SQL for creating indexes after table.
 
-        Subclasses should override this or writeIndexSQLDefsInTable,
-        or no indexes will be created.
+        Writes a create index statement for each of the sqlIndexes().
         """
-        pass
+        for index in self.sqlIndexes():
+            wr(self.sqlCreateIndex(index))
+
+    def sqlIndexes(self):
+        """Return the indexes of the table as a list of SQLIndex objects.
+
+        Indexes are created for the attributes with isIndexed set, for obj
+        ref attributes (which are needed for list attributes and for checking
+        references when deleting objects) unless the IndexObjRefColumns
+        setting or their isIndexed is false, and for the indexes declared
+        with Indexes in the class definitions, including superclasses.
+        Duplicate indexes are left out.
+        """
+        indexes = []
+        seen = set()
+
+        def add(index):
+            key = (tuple(index.columns), index.where)
+            if key not in seen:
+                seen.add(key)
+                indexes.append(index)
+
+        for attr in self.allAttrs():
+            if attr.hasSQLColumn():
+                if attr.boolForKey('isIndexed'):
+                    add(SQLIndex(attr.name(), attr.sqlIndexColumns(),
+                        origin='isIndexed'))
+                elif attr.sqlAutoIndex():
+                    add(SQLIndex(attr.name(), attr.sqlIndexColumns(),
+                        origin='objRef'))
+        specs = []
+        klass = self
+        while klass is not None:
+            specs[:0] = klass.get('Indexes') or []
+            klass = klass.superklass()
+        for spec in specs:
+            add(self.sqlIndexForSpec(spec))
+        return indexes
+
+    def sqlIndexForSpec(self, spec):
+        """Return an SQLIndex for an index declared with Indexes.
+
+        The spec can be a string with comma separated attribute names,
+        a list of attribute names, or a dictionary with the keys Attrs
+        (one of the former), and optionally Unique, Where and Name.
+        """
+        if isinstance(spec, dict):
+            names = spec.get('Attrs')
+            unique = spec.get('Unique', False)
+            where = spec.get('Where')
+            label = spec.get('Name')
+        else:
+            names, unique, where, label = spec, False, None, None
+        if isinstance(names, basestring):
+            names = [name.strip() for name in names.split(',')]
+        if not names:
+            raise ModelError('class %s: index %r has no attributes.'
+                % (self.name(), spec))
+        columns = []
+        for name in names:
+            attr = self.lookupAttr(name, None)
+            if attr is None:
+                if name not in ('deleted', self.sqlSerialColumnName()):
+                    raise ModelError('class %s: index %r refers to'
+                        ' unknown attribute %r.' % (self.name(), spec, name))
+                columns.append(name)
+            elif not attr.hasSQLColumn():
+                raise ModelError('class %s: index %r refers to attribute'
+                    ' %r which has no SQL column.' % (self.name(), spec, name))
+            else:
+                columns.extend(attr.sqlIndexColumns())
+        return SQLIndex(label or '_'.join(names), columns,
+            bool(unique), where, 'declared')
+
+    def sqlIndexName(self, index):
+        """Return the SQL name of the given index of the table."""
+        return '%s_%s_index' % (self.name(), index.label)
+
+    def sqlSupportsPartialIndexes(self):
+        """Return whether indexes can have a where clause."""
+        return True
+
+    def sqlCreateIndex(self, index):
+        """Return the SQL statement for creating the given index."""
+        sql = 'create%s index %s on %s (%s)' % (
+            ' unique' if index.unique else '', self.sqlIndexName(index),
+            self.sqlTableName(), ', '.join(index.columns))
+        if index.where:
+            if self.sqlSupportsPartialIndexes():
+                sql += ' where %s' % index.where
+            else:
+                sql += ' /* where %s (not supported) */' % index.where
+        return sql + ';\n'
+
+    def sqlIndexAdvice(self):
+        """Return a list of advice about the indexes of the table.
+
+        Points out obj refs that are not indexed, indexes that are made
+        redundant by other indexes or unique constraints, and indexes
+        on long string columns.
+        """
+        advice = []
+        indexes = self.sqlIndexes()
+        for attr in self.allAttrs():
+            if not attr.hasSQLColumn():
+                continue
+            columns = tuple(attr.sqlIndexColumns())
+            if attr.sqlIsObjRef() and not any(
+                    tuple(index.columns[:len(columns)]) == columns
+                    for index in indexes if not index.where):
+                advice.append('obj ref %s is not indexed, so fetching'
+                    ' referencing objects and deleting %s objects will scan'
+                    ' this table' % (attr.name(), attr.targetClassName()))
+            if attr.boolForKey('isIndexed') and attr.boolForKey('isUnique'):
+                advice.append('%s is unique and therefore already indexed'
+                    % attr.name())
+        for index in indexes:
+            for other in indexes:
+                if (other is not index and not index.unique
+                        and index.where == other.where
+                        and len(other.columns) > len(index.columns)
+                        and other.columns[:len(index.columns)] == index.columns):
+                    advice.append('index %s is redundant, since its columns'
+                        ' are a prefix of index %s' % (index.label, other.label))
+                    break
+            for column in index.columns:
+                attr = self.lookupAttr(column, None)
+                if attr is not None and attr.sqlIsLongString():
+                    advice.append('index %s contains the long string column'
+                        ' %s, consider giving it a smaller Max'
+                        % (index.label, column))
+        return advice
 
     def sqlTableName(self):
         """Return table name.
@@ -674,6 +899,20 @@ class Attr(object):
         """Return SQL to use within a column definition to make it unique."""
         return ' unique' if self.boolForKey('isUnique') else ''
 
+    def sqlIndexColumns(self):
+        """Return the list of SQL columns to be indexed for this attribute."""
+        return [self.sqlName()]
+
+    def sqlAutoIndex(self):
+        """Return whether the attribute is indexed even without isIndexed."""
+        return False
+
+    def sqlIsObjRef(self):
+        return False
+
+    def sqlIsLongString(self):
+        return False
+
 
 class BoolAttr(object):
 
@@ -788,6 +1027,9 @@ class StringAttr(object):
         # print '>> value:', value
         return value
 
+    def sqlIsLongString(self):
+        return not self.get('Max') or int(self['Max']) > 255
+
 
 class AnyDateTimeAttr(object):
 
@@ -800,6 +1042,17 @@ class AnyDateTimeAttr(object):
 
 class ObjRefAttr(object):
 
+    def sqlIndexColumns(self):
+        return self.sqlName().split(',')
+
+    def sqlAutoIndex(self):
+        if self.get('isIndexed') in (None, ''):
+            return self.setting('IndexObjRefColumns', True)
+        return self.boolForKey('isIndexed')
+
+    def sqlIsObjRef(self):
+        return True
+
     def sqlName(self):
         if self.setting('UseBigIntObjRefColumns', False):
             return self.name() + 'Id'  # old way: one 64 bit column
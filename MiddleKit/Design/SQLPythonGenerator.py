@@ -14,6 +14,37 @@ class Klass(object):
         # invoking super is the only awkward aspect of mix-ins that hasn't been solved
         self._pyOut.write('from MiddleKit.Run.SQLObjectStore import ObjRefError\n\n')
 
+    def writePyLoadRow(self):
+        """Write the _mk_loadRow() method for reading a row of the store.
+
+        The method sets all attributes directly from the row, with the same
+        conversions that the set methods would do. It is used by
+        MiddleObject.readStoreData() instead of the set methods.
+        """
+        wr = self._pyOut.write
+        wr('\n    def _mk_loadRow(self, row):\n')
+        i = 1
+        for attr in self.allDataAttrs():
+            i = attr.writePyLoadRow(wr, i)
+        wr('        assert len(row) == %d\n\n' % i)
+
+
+class Attr(object):
+
+    def writePyLoadRow(self, write, i):
+        """Write the statements for reading the attribute from row[i].
+
+        Returns the index of the next column. Used for _mk_loadRow().
+        """
+        conversion = self.pyLoadRowConversion()
+        if conversion:
+            write('        value = row[%d]\n' % i)
+            write(conversion)
+            write('        self._%s = value\n' % self.name())
+        else:
+            write('        self._%s = row[%d]\n' % (self.name(), i))
+        return i + 1
+
 
 class ObjRefAttr(object):
 
@@ -21,19 +52,41 @@ class ObjRefAttr(object):
         name = self.name()
         pyGetName = self.pyGetName()
         klassName = self.klass().name()
+        if self.setting('UseSlots', False):
+            target = 'self._%s' % name
+        else:
+            target = "self.__dict__['_%s']" % name
         out.write('''
     def %(pyGetName)s(self):
         if self._%(name)s is not None and not isinstance(self._%(name)s, MiddleObject):
             try:
-                self.__dict__['_%(name)s'] = self._mk_store.fetchObjRef(self._%(name)s)
+                %(target)s = self._mk_store.fetchObjRef(self._%(name)s)
             except ObjRefError as e:
-                self.__dict__['_%(name)s'] = self.objRefErrorWasRaised(e, %(klassName)r, %(name)r)
+                %(target)s = self.objRefErrorWasRaised(e, %(klassName)r, %(name)r)
         return self._%(name)s
 ''' % locals())
 
+    def writePyLoadRow(self, write, i):
+        name = self.name()
+        if self.setting('UseBigIntObjRefColumns', False):
+            write('''\
+        value = row[%(i)d]
+        self._%(name)s = None if value is None else long(value)
+''' % locals())
+            return i + 1
+        else:
+            write('''\
+        value = row[%d]
+        self._%s = None if value is None else (long(row[%d]) << 32) | long(value)
+''' % (i + 1, name, i))
+            return i + 2
+
 
 class ListAttr(object):
 
+    def writePyLoadRow(self, write, i):
+        return i  # lists have no SQL columns
+
     def writePyGet(self, out, names):
         if self.setting('UseBigIntObjRefColumns', False):
             out.write('''
@@ -38,6 +38,9 @@ class Klasses(object):
     def listTablesSQL(self):
         return ''
 
+    def changeLogIdSQLDef(self):
+        return 'id integer primary key autoincrement'
+
 
 class Klass(object):
 
@@ -45,10 +48,6 @@ class Klass(object):
         return '    %s integer primary key autoincrement,\n' % (
             self.sqlSerialColumnName().ljust(self.maxNameWidth()),)
 
-    def writeIndexSQLDefs(self, wr):
-        # in SQLite, indices must be created with 'create index' commands
-        pass
-
 
 class EnumAttr(object):
 
@@ -0,0 +1,194 @@
+"""Asynchronous access to object stores with a pool of worker threads."""
+
+import sys
+import threading
+from Queue import Queue
+
+
+class AsyncTimeoutError(Exception):
+    """Raised by Future.result() if the result is not ready in time."""
+
+
+class Future(object):
+    """The pending result of an operation carried out by an AsyncStore.
+
+    The result() method waits until the operation is done and returns its
+    result, or raises the exception raised by the operation.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._excInfo = None
+        self._callbacks = []
+
+    def done(self):
+        """Return whether the operation is done."""
+        return self._event.isSet()
+
+    def result(self, timeout=None):
+        """Wait for and return the result of the operation.
+
+        If the operation raised an exception, it is raised again.
+        If a timeout in seconds is given and the operation is not done
+        by then, an AsyncTimeoutError is raised.
+        """
+        self.wait(timeout)
+        if self._excInfo is not None:
+            raise self._excInfo[0], self._excInfo[1], self._excInfo[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the operation and return its exception or None."""
+        self.wait(timeout)
+        return self._excInfo[1] if self._excInfo is not None else None
+
+    def wait(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise AsyncTimeoutError('The operation is not done'
+                ' after %s seconds.' % timeout)
+
+    def addDoneCallback(self, callback):
+        """Add a function to be called with the future when it is done.
+
+        The function is called by the worker thread, or right away
+        if the operation is already done.
+        """
+        with self._lock:
+            if not self._event.isSet():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def setResult(self, result, excInfo=None):
+        """Set the result or the exception info. Invoked by the worker."""
+        with self._lock:
+            self._result = result
+            self._excInfo = excInfo
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, None
+        for callback in callbacks:
+            callback(self)
+
+
+class AsyncStore(object):
+    """Asynchronous facade for an object store.
+
+    The methods of an AsyncStore carry out the operations of the store with
+    a pool of worker threads and return Futures instead of the results.
+    This way, pages can issue several independent queries that overlap
+    while waiting for the database:
+
+        asyncStore = AsyncStore(store)
+        books = asyncStore.fetchObjectsOfClass('Book', clauses='order by title')
+        count = asyncStore.countObjectsOfClass('Author')
+        books, count = books.result(), count.result()
+
+    The store must be threaded, since the workers use their own database
+    connections (or connections from the pool of the store, which should
+    be at least as large as the number of workers). Objects fetched by the
+    workers are the same objects that the store returns to other threads.
+
+    The saveChanges() method hands the current UnitOfWork of the calling
+    thread over to a worker, which saves it.
+    """
+
+    def __init__(self, store, workers=4):
+        if not store.setting('Threaded'):
+            raise ValueError('AsyncStore needs a store with Threaded set.')
+        self._store = store
+        self._queue = Queue()
+        self._workers = []
+        for i in range(max(1, workers)):
+            worker = threading.Thread(target=self.work,
+                name='AsyncStore-%d' % (i + 1))
+            worker.setDaemon(True)
+            worker.start()
+            self._workers.append(worker)
+
+    def store(self):
+        return self._store
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.shutdown()
+
+
+    ## Operations ##
+
+    def submit(self, func, *args, **kwargs):
+        """Call func with the given arguments in a worker thread.
+
+        Returns a Future for the result of the call.
+        """
+        if self._workers is None:
+            raise RuntimeError('The AsyncStore has been shut down.')
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def fetchObject(self, *args, **kwargs):
+        return self.submit(self._store.fetchObject, *args, **kwargs)
+
+    def fetchObjectsOfClass(self, *args, **kwargs):
+        return self.submit(self._store.fetchObjectsOfClass, *args, **kwargs)
+
+    def fetchObjRef(self, objRef):
+        return self.submit(self._store.fetchObjRef, objRef)
+
+    def fetchValuesOfClass(self, *args, **kwargs):
+        return self.submit(self._store.fetchValuesOfClass, *args, **kwargs)
+
+    def fetchAggregateOfClass(self, *args, **kwargs):
+        return self.submit(self._store.fetchAggregateOfClass, *args, **kwargs)
+
+    def countObjectsOfClass(self, *args, **kwargs):
+        return self.submit(self._store.countObjectsOfClass, *args, **kwargs)
+
+    def saveChanges(self, uow=None):
+        """Save the changes of the unit of work in a worker thread.
+
+        If no unit of work is given, the current unit of work of the calling
+        thread is saved. The unit of work being saved is unbound from the
+        calling thread, which gets a new one for its next changes, so that
+        ending the request does not discard the changes while they are saved.
+        Do not change the objects until the changes are saved.
+        """
+        store = self._store
+        current = store.currentUnitOfWork()
+        if uow is None:
+            uow = current
+        if uow is current:
+            store.bindUnitOfWork(None)
+        return self.submit(store.saveChanges, uow)
+
+
+    ## Workers ##
+
+    def work(self):
+        """Carry out the queued operations. Run by the worker threads."""
+        get = self._queue.get
+        while True:
+            job = get()
+            if job is None:
+                break
+            future, func, args, kwargs = job
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                future.setResult(None, sys.exc_info())
+            else:
+                future.setResult(result)
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads after the queued operations are done."""
+        workers, self._workers = self._workers, None
+        if workers:
+            for worker in workers:
+                self._queue.put(None)
+            if wait:
+                for worker in workers:
+                    worker.join()
@@ -0,0 +1,347 @@
+"""Bulk loading of sample and dump files into SQL object stores."""
+
+import sys
+from time import time
+
+from MiscUtils import CSVParser
+from MiddleKit.Core.ObjRefAttr import ObjRefAttr
+
+
+class BulkLoadError(Exception):
+    """Bulk load error.
+
+    Raised for invalid input. The message includes the file name and the
+    line number if these are known.
+    """
+
+
+class BulkLoader(object):
+    """Load sample and dump files directly into the database.
+
+    The files have the format of the Samples.csv files of MiddleKit models
+    and the output of SQLObjectStore.dumpObjectStore():
+
+        Book objects
+        title,author by name,published
+        MiddleKit in Action,Joe Schmoe,2003-04-01
+
+    Unlike the InsertSamples.sql script written by the SQL generators, the
+    rows are not converted to SQL statements. Instead, they are collected in
+    batches per class and passed to the bulkInsertRows() method of the store,
+    which uses the fastest way supported by the database (e.g. COPY with
+    PostgreSQL and executemany() otherwise). Objects are not created.
+
+    Everything is loaded with one connection in one transaction which is
+    committed by finish() and rolled back by abort(). Objects that have been
+    fetched by the store before are not refreshed.
+
+    Rows without a serial number column get the serial numbers following the
+    highest serial number of their class in the database. Plain obj refs
+    ("Class.serialNum" or "serialNum") are taken as they are. Obj refs given
+    by a column "foo by bar" are looked up by the value of the attribute bar
+    of the target class; they are resolved in a second pass by finish(), so
+    they can refer to objects that are loaded later.
+
+    The batch size defaults to the 'BulkLoadBatchSize' setting (1000).
+    If a progress file such as sys.stderr is passed, the number of rows and
+    the throughput are reported for every batch and for every class.
+    """
+
+    def __init__(self, store, batchSize=None, progress=None):
+        self._store = store
+        if batchSize is None:
+            batchSize = store.setting('BulkLoadBatchSize', 1000)
+        self._batchSize = max(1, batchSize)
+        self._progress = progress
+        self._conn = store.newConnection()
+        self._cur = self._conn.cursor()
+        self._parse = CSVParser.CSVParser().parse
+        self._batches = {}  # (klass, column names) -> list of rows
+        self._nextSerialNums = {}  # klass -> next serial num
+        self._refsBy = {}  # (klass, attr name, by name) -> (attr, by attr, refs)
+        self._rows = {}  # class name -> number of rows loaded
+        self._seconds = {}  # class name -> seconds spent loading
+        self._loadedKlasses = set()
+        self._startTime = time()
+
+    def store(self):
+        return self._store
+
+
+    ## Loading ##
+
+    def loadFile(self, filename):
+        """Load the objects in the given CSV file."""
+        with open(filename) as f:
+            self.loadLines(f, filename)
+
+    def loadLines(self, lines, filename=None):
+        """Load the objects in the given lines of CSV data."""
+        linenum = 0
+        klass = None
+        attrs = None
+        try:
+            for line in lines:
+                linenum += 1
+                try:
+                    fields = self._parse(line)
+                except CSVParser.ParseError as err:
+                    raise BulkLoadError('Syntax error: %s' % err)
+                if fields is None:
+                    continue  # parser got embedded newline
+                if not any(fields) or (fields[0] and fields[0][0] == '#'):
+                    continue
+                if fields[0].lower().endswith(' objects'):
+                    klass = self.klassForHeader(fields[0])
+                    attrs = None
+                elif klass is None:
+                    raise BulkLoadError(
+                        "Have not yet seen an 'objects' declaration.")
+                elif attrs is None:
+                    attrs = self.attrsForColumns(klass,
+                        [name.strip() for name in fields if name.strip()])
+                    colNames, batch = self.batchForAttrs(klass, attrs)
+                else:
+                    self.addRow(klass, attrs, fields, batch)
+                    if len(batch) >= self._batchSize:
+                        self.flushBatch(klass, colNames)
+        except BulkLoadError as e:
+            if filename:
+                raise BulkLoadError('%s:%d: %s' % (filename, linenum, e))
+            raise BulkLoadError('line %d: %s' % (linenum, e))
+        except Exception as e:
+            raise BulkLoadError('%s:%d: %s: %s' % (filename or 'line',
+                linenum, e.__class__.__name__, e))
+
+    def finish(self):
+        """Insert the remaining rows, resolve obj refs and commit.
+
+        Returns the statistics as given by stats().
+        """
+        store = self._store
+        try:
+            for klass, colNames in sorted(self._batches):
+                self.flushBatch(klass, colNames)
+            self.resolveRefsBy()
+            for klass in sorted(self._loadedKlasses):
+                store.didBulkLoadKlass(self._cur, klass)
+            store.didBulkLoad(self._cur, sorted(self._loadedKlasses))
+            self._conn.commit()
+        except Exception:
+            self.abort()
+            raise
+        self.close()
+        for klass in self._loadedKlasses:
+            store.invalidateQueries(klass, isDeep=False)
+        if self._progress:
+            self.writeStats(self._progress)
+        return self.stats()
+
+    def abort(self):
+        """Roll back everything that has been loaded."""
+        if self._conn is not None:
+            try:
+                self._conn.rollback()
+            finally:
+                self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._cur.close()
+            self._conn.close()
+            self._conn = self._cur = None
+
+
+    ## Statistics ##
+
+    def stats(self):
+        """Return a dictionary with statistics about the load.
+
+        The dictionary maps the names of the loaded classes to pairs of the
+        number of rows and the seconds spent inserting them. The key None
+        maps to the total number of rows and the elapsed time.
+        """
+        stats = dict((name, (rows, self._seconds.get(name, 0.0)))
+            for name, rows in self._rows.items())
+        stats[None] = (sum(self._rows.values()), time() - self._startTime)
+        return stats
+
+    def writeStats(self, out=None):
+        if out is None:
+            out = sys.stdout
+        stats = self.stats()
+        rows, seconds = stats.pop(None)
+        for name in sorted(stats):
+            out.write('%s: %s\n' % (name, self.rate(*stats[name])))
+        out.write('Total: %s\n' % self.rate(rows, seconds))
+
+    @staticmethod
+    def rate(rows, seconds):
+        if seconds > 0:
+            return '%d rows in %.2f secs (%d rows/sec)' % (
+                rows, seconds, rows / seconds)
+        return '%d rows' % rows
+
+
+    ## Self utility ##
+
+    def klassForHeader(self, header):
+        className = header.split(None, 1)[0]
+        try:
+            return self._store.model().klass(className)
+        except KeyError:
+            raise BulkLoadError("Class '%s' is not defined" % className)
+
+    def attrsForColumns(self, klass, names):
+        """Return the attrs for the given column names.
+
+        The serial number column is returned as None, and "foo by bar"
+        columns are returned as (foo, bar) pairs.
+        """
+        attrs = []
+        for name in names:
+            if name == klass.sqlSerialColumnName():
+                attrs.append(None)
+                continue
+            parts = name.split()
+            if len(parts) == 3 and parts[1].lower() == 'by':
+                name, refByAttrName = parts[0], parts[2]
+            elif len(parts) == 1:
+                refByAttrName = None
+            else:
+                raise BulkLoadError("Attribute '%s' of class '%s' is not"
+                    " in format 'foo' or 'foo by bar'" % (name, klass.name()))
+            attr = klass.lookupAttr(name, None)
+            if attr is None or not attr.hasSQLColumn():
+                raise BulkLoadError("Class '%s' has no attribute '%s'"
+                    % (klass.name(), name))
+            if refByAttrName:
+                if not isinstance(attr, ObjRefAttr):
+                    raise BulkLoadError("Cannot use 'by' feature with"
+                        " non-obj ref attribute '%s' of class '%s'"
+                        % (name, klass.name()))
+                if attr.isRequired():
+                    raise BulkLoadError("Cannot use 'by' feature with"
+                        " required attribute '%s' of class '%s'"
+                        % (name, klass.name()))
+                refByAttr = attr.targetKlass().lookupAttr(refByAttrName, None)
+                if refByAttr is None:
+                    raise BulkLoadError("Attribute '%s' of class '%s' has a"
+                        " 'by' of '%s', but no such attribute can be found"
+                        " in target class '%s'" % (name, klass.name(),
+                            refByAttrName, attr.targetKlass().name()))
+                attr = attr, refByAttr
+            attrs.append(attr)
+        return attrs
+
+    def batchForAttrs(self, klass, attrs):
+        """Return the column names and the current batch for the attrs."""
+        colNames = [klass.sqlSerialColumnName()]
+        for attr in attrs:
+            if attr is not None:
+                if isinstance(attr, tuple):
+                    attr = attr[0]
+                colNames.extend(attr.bulkColumnNames())
+        colNames = tuple(colNames)
+        batch = self._batches.get((klass, colNames))
+        if batch is None:
+            batch = self._batches[(klass, colNames)] = []
+        return colNames, batch
+
+    def addRow(self, klass, attrs, fields, batch):
+        if klass.isAbstract():
+            raise BulkLoadError("Cannot load objects of abstract class '%s'"
+                % klass.name())
+        serialNum = None
+        values = []
+        refsBy = []
+        for i, attr in enumerate(attrs):
+            # Excel sometimes doesn't include all the commas
+            value = fields[i] if i < len(fields) else ''
+            if attr is None:
+                serialNum = int(value)
+            elif isinstance(attr, tuple):
+                # set to NULL for now, resolved by finish()
+                if value.strip():
+                    refsBy.append((attr, value))
+                values.extend(attr[0].bulkValuesForNone())
+            else:
+                values.extend(attr.bulkValuesForSampleInput(value))
+        serialNum = self.serialNumForRow(klass, serialNum)
+        for (attr, refByAttr), value in refsBy:
+            self._refsBy.setdefault((klass, attr.name(), refByAttr.name()),
+                (attr, refByAttr, []))[2].append((serialNum, value))
+        values.insert(0, serialNum)
+        batch.append(values)
+
+    def serialNumForRow(self, klass, serialNum):
+        nextSerialNum = self._nextSerialNums.get(klass)
+        if nextSerialNum is None:
+            nextSerialNum = self._store.maxSerialNum(self._cur, klass) + 1
+        if serialNum is None:
+            serialNum = nextSerialNum
+        self._nextSerialNums[klass] = max(nextSerialNum, serialNum + 1)
+        return serialNum
+
+    def flushBatch(self, klass, colNames):
+        batch = self._batches.get((klass, colNames))
+        if not batch:
+            return
+        start = time()
+        self._store.bulkInsertRows(self._cur, klass, colNames, batch)
+        seconds = time() - start
+        name = klass.name()
+        self._rows[name] = self._rows.get(name, 0) + len(batch)
+        self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+        self._loadedKlasses.add(klass)
+        del batch[:]
+        if self._progress:
+            self._progress.write('%s: %s\n' % (name,
+                self.rate(self._rows[name], self._seconds[name])))
+            self._progress.flush()
+
+    def resolveRefsBy(self):
+        """Set the obj refs given by "foo by bar" columns."""
+        store = self._store
+        lookups = {}
+        for (klass, name, refByName), (attr, refByAttr, refs) in sorted(
+                self._refsBy.items()):
+            key = attr.targetKlass(), refByName
+            targets = lookups.get(key)
+            if targets is None:
+                targets = lookups[key] = self.serialNumsByValue(*key)
+            rows = []
+            for serialNum, input in refs:
+                value = refByAttr.bulkValuesForSampleInput(input)[0]
+                try:
+                    target = targets[value]
+                except KeyError:
+                    raise BulkLoadError("%s.%d: There is no %s with %s=%r"
+                        % (klass.name(), serialNum,
+                            attr.targetKlass().name(), refByAttr.name(), input))
+                values = list(attr.bulkValuesForNonNoneSampleInput(
+                    '%s.%d' % target))
+                values.append(serialNum)
+                rows.append(values)
+            store.bulkUpdateRows(self._cur, klass, attr.bulkColumnNames(), rows)
+        self._refsBy.clear()
+
+    def serialNumsByValue(self, klass, attrName):
+        """Return a dictionary mapping values of the attribute to objects.
+
+        The objects are given as (class name, serial num) pairs.
+        All concrete classes inheriting the attr are searched.
+        """
+        klasses = [klass]
+        klasses.extend(klass.descendants())
+        targets = {}
+        for klass in klasses:
+            if klass.isAbstract():
+                continue
+            sql = 'select %s,%s from %s' % (klass.sqlSerialColumnName(),
+                klass.lookupAttr(attrName).sqlColumnName(), klass.sqlTableName())
+            self._store.echoSQL(sql)
+            self._cur.execute(sql)
+            for serialNum, value in self._cur.fetchall():
+                targets[value] = klass.name(), serialNum
+        return targets
@@ -0,0 +1,185 @@
+"""Change notification for SQL object stores."""
+
+import threading
+from time import time
+from uuid import uuid4
+
+from ObjectKey import ObjectKey
+
+
+class ChangeLog(object):
+    """The change log of an SQL object store.
+
+    If the ChangeNotification setting is set, each SQL object store has
+    a change log, which logs the changes of the store in the _MKChanges table
+    and reads the changes that other stores have logged there, making the
+    changed objects hollow and removing the cached query results of the
+    changed classes from memory. The store invokes logChanges(), pollChanges() and pollIfDue().
+
+    The settings are given as a dictionary with the keys PollInterval,
+    MaxAge and CommitDelay (see the User's Guide).
+    """
+
+    def __init__(self, store, settings=None):
+        self._store = store
+        if not isinstance(settings, dict):
+            settings = {}
+        self._pollInterval = settings.get('PollInterval', 1.0)
+        self._maxAge = settings.get('MaxAge', 3600)
+        self._commitDelay = settings.get('CommitDelay', 10)
+        self._origin = uuid4().hex  # identifies the store in _MKChanges
+        self._lock = threading.Lock()
+        self._lastChangeId = 0
+        self._lastPoll = None
+        self._nextPrune = 0
+        self._seenChangeIds = {}  # change id -> time of change
+
+
+    ## Logging ##
+
+    def readLastChangeId(self):
+        """Read the id of the last change in the change log.
+
+        Only changes after this one are read by pollChanges().
+        Invoked when the store connects to the database.
+        """
+        store = self._store
+        conn, cur = store.executeSQL('select max(id) from _MKChanges;')
+        try:
+            self._lastChangeId = cur.fetchone()[0] or 0
+        finally:
+            store.doneWithConnection(conn)
+        self._lastPoll = time()
+
+    def logChanges(self, cur, changes):
+        """Insert the given changes into the change log.
+
+        changes is a list of (class id, serial number) pairs, where a serial
+        number of 0 stands for new objects of the class. Invoked by the store
+        with the cursor used for saving the changes. Changes older than MaxAge
+        seconds are removed from time to time.
+        """
+        store = self._store
+        now = int(time())
+        marker = store.sqlParamMarker()
+        sql = ('insert into _MKChanges (classId,objId,origin,changed)'
+            ' values (%s)' % ','.join([marker] * 4))
+        store.echoSQL('%s /* %d rows */' % (sql, len(changes)))
+        origin = self._origin
+        cur.executemany(sql, [(classId, serialNum, origin, now)
+            for classId, serialNum in changes])
+        if now >= self._nextPrune:
+            sql = 'delete from _MKChanges where changed<%d' % (
+                now - self._maxAge)
+            store.echoSQL(sql)
+            cur.execute(sql)
+            self._nextPrune = now + self._maxAge // 10
+
+
+    ## Polling ##
+
+    def pollChanges(self):
+        """Invalidate the objects that have been changed by other stores.
+
+        Reads the changes that other stores have logged since the last poll.
+        Objects that have been updated or deleted are made hollow unless they
+        have unsaved changes, so that they are read again when next accessed,
+        and cached query results depending on changed classes are removed.
+        If the store has not polled for more than MaxAge seconds, changes may
+        have been missed, so all objects without unsaved changes are made
+        hollow.
+
+        Returns the number of changes that have been read, or 0 if another
+        thread is polling at the same time.
+        """
+        if not self._lock.acquire(False):
+            return 0
+        try:
+            store = self._store
+            now = time()
+            lastPoll, self._lastPoll = self._lastPoll, now
+            if lastPoll is not None and now - lastPoll > self._maxAge:
+                self.invalidateUnchangedObjects()
+                store.invalidateQueries()
+            if not store.hasPendingChanges():
+                return 0
+            # changes committed late can have lower ids than the last one,
+            # so changes of the last CommitDelay seconds are read again
+            since = int(now) - self._commitDelay
+            seen = self._seenChangeIds
+            for changeId, changed in seen.items():
+                if changed < since:
+                    del seen[changeId]
+            marker = store.sqlParamMarker()
+            conn, cur = store.executeSQL('select id,classId,objId,changed'
+                ' from _MKChanges where (id>%s or changed>=%s) and origin<>%s'
+                ' order by id;' % (marker, marker, marker), clausesArgs=(
+                    self._lastChangeId, since, self._origin))
+            try:
+                rows = cur.fetchall()
+            finally:
+                store.doneWithConnection(conn)
+            klassesById = store._klassesById
+            classNames = set()
+            groups = {}
+            count = 0
+            for changeId, classId, serialNum, changed in rows:
+                if changeId in seen:
+                    continue
+                seen[changeId] = changed
+                self._lastChangeId = max(self._lastChangeId, changeId)
+                klass = klassesById.get(classId)
+                if klass is None:
+                    continue
+                count += 1
+                classNames.add(klass.name())
+                if serialNum:
+                    self.invalidateUnchangedObject(ObjectKey(
+                        ).initFromClassNameAndSerialNum(klass.name(), serialNum),
+                        groups)
+            if classNames:
+                store._queryCache.invalidateClasses(classNames)
+            return count
+        finally:
+            self._lock.release()
+
+    def pollIfDue(self):
+        """Invoke pollChanges() if PollInterval seconds have passed."""
+        if time() >= (self._lastPoll or 0) + self._pollInterval:
+            self.pollChanges()
+
+    def invalidateUnchangedObject(self, key, groups=None):
+        """Make the object with the given key hollow.
+
+        The object stays in memory, so its identity is kept, but its
+        attributes are read again when next accessed, together with the
+        other objects of its class in the given groups, which is a dictionary
+        of LazyFetchGroups by class name. Accessing an object that has been
+        deleted in the meantime raises an UnknownObjectError.
+
+        Objects with unsaved changes are kept. Their changes will be checked
+        against the row version if the UseRowVersions setting is set.
+        """
+        store = self._store
+        objects = store._objects
+        if key in objects:
+            obj = objects.get(key)
+            if obj is not None and not obj.isChanged():
+                if groups is None:
+                    groups = {}
+                klass = obj.klass()
+                group = groups.get(klass.name())
+                if group is None:
+                    group = store.lazyFetchAttrsAndGroup(klass)[1]
+                    if group is None:
+                        return  # no attributes to read again
+                    groups[klass.name()] = group
+                with store._faultLock:
+                    obj.makeHollow(group)
+                group.pending.append(obj.serialNum())
+
+    def invalidateUnchangedObjects(self):
+        """Make all objects without unsaved changes hollow."""
+        groups = {}
+        for key in self._store._objects.keys():
+            self.invalidateUnchangedObject(key, groups)
@@ -0,0 +1,474 @@
+"""Delete plans for object stores."""
+
+from MiscUtils.Funcs import safeDescription
+from MiddleKit.Core.ObjRefAttr import ObjRefAttr, objRefJoin, objRefSplit
+from MiddleKit.Core.ListAttr import ListAttr
+
+
+class DeletePlan(object):
+    """The rows affected by deleting objects.
+
+    A DeletePlan is computed by the planDelete() method of an object store.
+    It holds the serial numbers of the objects to be deleted per class and
+    the serial numbers of the objects whose obj ref attributes must be set
+    to None ("detached") per class and attribute. The classes are always the
+    concrete classes of the objects, i.e. the classes of the SQL tables.
+
+    Most of the affected objects are only known by their serial numbers.
+    Objects that are passed in or fetched while planning are kept in the
+    plan, so that the store can update them in memory.
+    """
+
+    def __init__(self):
+        self._deletes = {}  # klass -> set of serial nums
+        self._detaches = {}  # (klass, attr name) -> (attr, set of serial nums)
+        self._objects = {}  # (class name, serial num) -> object
+
+    def __repr__(self):
+        return '<%s deleting %d and detaching %d objects>' % (
+            self.__class__.__name__, self.deleteCount(), self.detachCount())
+
+    def isEmpty(self):
+        return not self._deletes and not self.detaches()
+
+    def classNames(self):
+        """Return the names of all classes affected by the plan."""
+        names = set(klass.name() for klass in self._deletes)
+        names.update(klass.name() for klass, name in self._detaches)
+        return names
+
+
+    ## Deletes ##
+
+    def addDeletes(self, klass, serialNums):
+        """Add objects of the given class to be deleted.
+
+        Returns the serial numbers that have not been in the plan before.
+        """
+        deletes = self._deletes.get(klass)
+        if deletes is None:
+            deletes = self._deletes[klass] = set()
+        new = [serialNum for serialNum in serialNums
+            if serialNum not in deletes]
+        deletes.update(new)
+        return new
+
+    def addObject(self, obj):
+        """Add an object to be deleted and keep it in the plan."""
+        self.setObject(obj)
+        return self.addDeletes(obj.klass(), (obj.serialNum(),))
+
+    def isDeleted(self, klass, serialNum):
+        deletes = self._deletes.get(klass)
+        return deletes is not None and serialNum in deletes
+
+    def discardDelete(self, klass, serialNum):
+        """Remove the object from the deletes, once it has been taken care of."""
+        deletes = self._deletes.get(klass)
+        if deletes is not None:
+            deletes.discard(serialNum)
+            if not deletes:
+                del self._deletes[klass]
+
+    def deletes(self):
+        """Return a list of (klass, serialNums) for the objects to be deleted."""
+        return [(klass, sorted(serialNums))
+            for klass, serialNums in sorted(self._deletes.items())]
+
+    def deleteCount(self):
+        return sum(len(serialNums) for serialNums in self._deletes.values())
+
+
+    ## Detaches ##
+
+    def addDetaches(self, klass, attr, serialNums):
+        """Add objects of the given class to be detached.
+
+        The obj ref attribute attr of these objects will be set to None.
+        """
+        key = klass, attr.name()
+        detaches = self._detaches.get(key)
+        if detaches is None:
+            detaches = self._detaches[key] = (attr, set())
+        detaches[1].update(serialNums)
+
+    def addDetachedObject(self, obj, attr):
+        """Add an object to be detached and keep it in the plan."""
+        self.setObject(obj)
+        self.addDetaches(obj.klass(), attr, (obj.serialNum(),))
+
+    def discardDetach(self, klass, attr, serialNum):
+        """Remove the object from the detaches, once it has been taken care of."""
+        key = klass, attr.name()
+        detaches = self._detaches.get(key)
+        if detaches is not None:
+            detaches[1].discard(serialNum)
+            if not detaches[1]:
+                del self._detaches[key]
+
+    def detaches(self):
+        """Return a list of (klass, attr, serialNums) for the detaches.
+
+        Objects that are deleted anyway are left out.
+        """
+        detaches = []
+        for (klass, name), (attr, serialNums) in sorted(
+                self._detaches.items()):
+            deletes = self._deletes.get(klass)
+            if deletes:
+                serialNums = serialNums.difference(deletes)
+            if serialNums:
+                detaches.append((klass, attr, sorted(serialNums)))
+        return detaches
+
+    def detachCount(self):
+        return sum(len(serialNums)
+            for klass, attr, serialNums in self.detaches())
+
+
+    ## Objects ##
+
+    def object(self, klass, serialNum, default=None):
+        """Return the object kept in the plan or the default."""
+        return self._objects.get((klass.name(), serialNum), default)
+
+    def setObject(self, obj):
+        self._objects[(obj.klass().name(), obj.serialNum())] = obj
+
+
+class DeletePlanner(object):
+    """Computes and commits DeletePlans for SQL object stores.
+
+    Each SQL object store has a planner, which computes the closure of a
+    cascading delete with set-based queries instead of visiting the affected
+    objects one by one, and creates the SQL statements for committing the
+    deletions in batches. The store invokes planDelete() and deleteStmts().
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._klassOrder = None
+
+
+    ## Planning ##
+
+    def planDelete(self, objs):
+        """Return a DeletePlan for deleting the given objects.
+
+        The closure of the cascade is computed level by level with set-based
+        queries: for each class with objects to be deleted, one query per
+        referencing or referenced attribute selects the affected rows for all
+        of these objects at once. Objects are not fetched, except for error
+        reports and for classes with a custom sqlDeleteStmt().
+        """
+        store = self._store
+        plan = DeletePlan()
+        pending = {}  # klass -> serial nums that have not been visited yet
+
+        def cascade(klass, serialNums):
+            serialNums = plan.addDeletes(klass, serialNums)
+            if serialNums:
+                pending.setdefault(klass, []).extend(serialNums)
+
+        for obj in objs:
+            assert store.hasObject(obj), safeDescription(obj)
+            assert obj.key() is not None
+            plan.setObject(obj)
+            cascade(obj.klass(), (obj.serialNum(),))
+
+        # denied references as (klass, serialNum, attr, klass, serialNum)
+        # of the referencing and the referenced object
+        deniedOther, deniedSelf = [], []
+        v = store._verboseDelete
+        while pending:
+            klass, serialNums = pending.popitem()
+            if v:
+                print 'checking delete of %s %s' % (klass.name(),
+                    ','.join(map(str, sorted(serialNums))))
+
+            # Objects that reference the deleted objects are cascade-deleted,
+            # detached or deny the delete, depending on onDeleteOther
+            for attr in klass.backObjRefAttrs():
+                onDeleteOther = attr.get('onDeleteOther', 'deny')
+                assert onDeleteOther in ('deny', 'detach', 'cascade')
+                for refKlass, refSerialNum, serialNum in self.referencingRows(
+                        attr, klass, serialNums):
+                    if onDeleteOther == 'cascade':
+                        cascade(refKlass, (refSerialNum,))
+                    elif onDeleteOther == 'detach':
+                        plan.addDetaches(refKlass, attr, (refSerialNum,))
+                    else:
+                        deniedOther.append((refKlass, refSerialNum,
+                            attr, klass, serialNum))
+
+            # Objects referenced by the deleted objects (by List or ObjRef)
+            # are cascade-deleted or deny the delete, depending on onDeleteSelf
+            for attr in klass.allDataAttrs():
+                if not isinstance(attr, (ObjRefAttr, ListAttr)):
+                    continue
+                onDeleteSelf = attr.get('onDeleteSelf', 'detach')
+                assert onDeleteSelf in ('deny', 'detach', 'cascade')
+                if onDeleteSelf == 'detach':
+                    continue  # nothing needs to be set to zero
+                for serialNum, refKlass, refSerialNum in self.referencedRows(
+                        klass, attr, serialNums):
+                    if onDeleteSelf == 'cascade':
+                        cascade(refKlass, (refSerialNum,))
+                    else:
+                        deniedSelf.append((klass, serialNum,
+                            attr, refKlass, refSerialNum))
+
+        self.checkDeniedReferences(plan, deniedOther, deniedSelf)
+
+        # Fetch the objects that need to create their own delete statements
+        for klass, serialNums in plan.deletes():
+            if self.hasCustomDeleteStmt(klass):
+                serialNums = [serialNum for serialNum in serialNums
+                    if store.deletePlanObject(plan, klass, serialNum) is None]
+                for obj in self.fetchObjectsWithSerialNums(klass, serialNums):
+                    plan.setObject(obj)
+        if v:
+            for klass, attr, serialNums in plan.detaches():
+                print 'will set %s.%s to None for %s' % (klass.name(),
+                    attr.name(), ','.join(map(str, serialNums)))
+        return plan
+
+    def checkDeniedReferences(self, plan, deniedOther, deniedSelf):
+        """Raise an error if the delete plan violates references.
+
+        The denied references are tuples of the class, serial number and
+        attribute of the referencing object and the class and serial number
+        of the referenced object. They are only violated if the objects on
+        the other side are not deleted by the plan as well.
+        Invoked by planDelete().
+        """
+        # imported here to avoid a circular import
+        from ObjectStore import (DeleteReferencedError,
+            DeleteObjectWithReferencesError)
+        denied = [ref for ref in deniedOther
+            if not plan.isDeleted(ref[0], ref[1])]
+        if denied:
+            klass, serialNum = denied[0][3:]
+            badObjectsAndAttrs = [
+                (self.fetchDeletePlanObject(plan, refKlass, refSerialNum), attr)
+                for refKlass, refSerialNum, attr, k, s in denied
+                if k == klass and s == serialNum]
+            raise DeleteReferencedError(
+                'You tried to delete an object (%s.%d) that is referenced'
+                ' by other objects with onDeleteOther unspecified or set to deny'
+                % (klass.name(), serialNum),
+                self.fetchDeletePlanObject(plan, klass, serialNum),
+                badObjectsAndAttrs)
+        denied = [ref for ref in deniedSelf
+            if not plan.isDeleted(ref[3], ref[4])]
+        if denied:
+            klass, serialNum = denied[0][:2]
+            badAttrs = []
+            for k, s, attr, refKlass, refSerialNum in denied:
+                if k == klass and s == serialNum and attr not in badAttrs:
+                    badAttrs.append(attr)
+            raise DeleteObjectWithReferencesError(
+                'You tried to delete an object (%s.%d) that references'
+                ' other objects with onDeleteSelf set to deny'
+                % (klass.name(), serialNum),
+                self.fetchDeletePlanObject(plan, klass, serialNum), badAttrs)
+
+    def referencingRows(self, attr, klass, serialNums, refKlass=None):
+        """Return the rows referring to the given objects with an obj ref attr.
+
+        Returns a list of (refKlass, refSerialNum, serialNum) tuples for all
+        objects of the class of the attribute (or of the given refKlass) and
+        its subclasses whose attr refers to the object of klass with serialNum,
+        where serialNum is one of the given serial numbers.
+        """
+        store = self._store
+        if refKlass is None:
+            refKlass = attr.klass()
+        bigInt = store.setting('UseBigIntObjRefColumns', False)
+        klassId = klass.id()
+        if bigInt:
+            colName = attr.sqlColumnName()
+            values = [objRefJoin(klassId, serialNum) for serialNum in serialNums]
+            where = ''
+        else:
+            classIdName, colName = attr.sqlColumnNames()
+            values = serialNums
+            where = '%s=%d and ' % (classIdName, klassId)
+        if store._markDeletes:
+            where += 'deleted is null and '
+        rows = []
+        for refKlass in [refKlass] + list(refKlass.descendants()):
+            if refKlass.isAbstract():
+                continue
+            start = 'select %s,%s from %s where %s%s in (' % (
+                refKlass.sqlSerialColumnName(), colName,
+                refKlass.sqlTableName(), where, colName)
+            for inList in self.sqlInLists(values):
+                conn, cur = store.executeSQL(start + inList + ');')
+                try:
+                    for refSerialNum, value in cur.fetchall():
+                        if bigInt:
+                            value = objRefSplit(long(value))[1]
+                        rows.append((refKlass, refSerialNum, value))
+                finally:
+                    store.doneWithConnection(conn)
+        return rows
+
+    def referencedRows(self, klass, attr, serialNums):
+        """Return the rows referred to by the given objects with an attribute.
+
+        The attribute is an obj ref or list attribute of klass. Returns a list
+        of (serialNum, refKlass, refSerialNum) tuples for all objects referred
+        to by the objects of klass with the given serial numbers.
+        """
+        store = self._store
+        if isinstance(attr, ListAttr):
+            # lists are stored as back references of the target class
+            targetKlass = store.model().klass(attr.className())
+            backRefAttr = targetKlass.lookupAttr(attr.backRefAttrName())
+            return [(serialNum, refKlass, refSerialNum)
+                for refKlass, refSerialNum, serialNum in self.referencingRows(
+                    backRefAttr, klass, serialNums, targetKlass)]
+        bigInt = store.setting('UseBigIntObjRefColumns', False)
+        serialColumnName = klass.sqlSerialColumnName()
+        start = 'select %s,%s from %s where %s in (' % (serialColumnName,
+            attr.sqlColumnName(), klass.sqlTableName(), serialColumnName)
+        klassForId = store.klassForId
+        rows = []
+        for inList in self.sqlInLists(serialNums):
+            conn, cur = store.executeSQL(start + inList + ');')
+            try:
+                for row in cur.fetchall():
+                    if bigInt:
+                        if not row[1]:
+                            continue
+                        refKlassId, refSerialNum = objRefSplit(long(row[1]))
+                    else:
+                        refKlassId, refSerialNum = row[1:]
+                        if not refKlassId or not refSerialNum:
+                            continue
+                    rows.append((row[0], klassForId(refKlassId), refSerialNum))
+            finally:
+                store.doneWithConnection(conn)
+        return rows
+
+    def fetchObjectsWithSerialNums(self, klass, serialNums):
+        """Fetch the objects of exactly klass with the given serial numbers."""
+        objs = []
+        clauses = 'where %s in (' % klass.sqlSerialColumnName()
+        for inList in self.sqlInLists(serialNums):
+            objs.extend(self._store.fetchObjectsOfClass(klass,
+                clauses=clauses + inList + ')', isDeep=False, refreshAttrs=False))
+        return objs
+
+    def fetchDeletePlanObject(self, plan, klass, serialNum):
+        """Return the object of a DeletePlan, fetching it if necessary."""
+        store = self._store
+        obj = store.deletePlanObject(plan, klass, serialNum)
+        if obj is None:
+            obj = store.fetchObject(klass, serialNum, None)
+        return obj
+
+    def hasCustomDeleteStmt(self, klass):
+        """Return whether the Python class of klass has its own sqlDeleteStmt().
+
+        The objects of such classes are deleted one statement at a time and
+        they are fetched when they are deleted by cascade. The objects of all
+        other classes are deleted in batches without fetching them.
+        """
+        # imported here to avoid a circular import
+        from MiddleObject import MiddleObject
+        return (klass.pyClass().sqlDeleteStmt.im_func
+            is not MiddleObject.sqlDeleteStmt.im_func)
+
+
+    ## Committing ##
+
+    def deleteStmts(self, deletedObjects, deletePlans):
+        """Return the SQL statements for committing the given deletions.
+
+        Returns the list of statements and the list of changes for the change
+        log as (class id, serial number) pairs. The references are detached
+        first. Then the objects are deleted class by class in batches, with
+        the classes in reverse dependency order, so that referencing rows are
+        deleted before the rows they refer to, for the sake of foreign keys.
+        Objects of classes with a custom sqlDeleteStmt() are deleted one by one.
+        """
+        stmts = []
+        changes = []
+        objsByKlass = {}
+        serialNumsByKlass = {}
+        for obj in deletedObjects:
+            klass = obj.klass()
+            if self.hasCustomDeleteStmt(klass):
+                objsByKlass.setdefault(klass, []).append(obj)
+            else:
+                serialNumsByKlass.setdefault(klass, []).append(obj.serialNum())
+        for plan in deletePlans:
+            for klass, attr, serialNums in plan.detaches():
+                stmts.extend(self.sqlDetachStmts(klass, attr, serialNums))
+                changes.extend((klass.id(), serialNum) for serialNum in serialNums)
+            for klass, serialNums in plan.deletes():
+                serialNumsByKlass.setdefault(klass, []).extend(serialNums)
+        klasses = set(objsByKlass)
+        klasses.update(serialNumsByKlass)
+        for klass in sorted(klasses, key=self.klassDeleteOrder):
+            for obj in objsByKlass.get(klass, ()):
+                stmts.append(obj.sqlDeleteStmt())
+                changes.append((klass.id(), obj.serialNum()))
+            serialNums = serialNumsByKlass.get(klass)
+            if serialNums:
+                stmts.extend(self.sqlDeleteStmts(klass, serialNums))
+                changes.extend((klass.id(), serialNum) for serialNum in serialNums)
+        return stmts, changes
+
+    def klassDeleteOrder(self, klass):
+        """Return the position of the klass in the order of deletion.
+
+        This is the reverse of the order in which the tables are created,
+        i.e. the dependency order of the model unless the setting
+        DoNotSortSQLCreateStatementsByDependency is set.
+        """
+        order = self._klassOrder
+        if order is None:
+            model = self._store.model()
+            if model.setting('DoNotSortSQLCreateStatementsByDependency', False):
+                klasses = model.allKlassesInOrder()
+            else:
+                klasses = model.allKlassesInDependencyOrder()
+            order = self._klassOrder = dict((klass.name(), i)
+                for i, klass in enumerate(reversed(klasses)))
+        return order.get(klass.name(), -1)
+
+    def sqlInLists(self, values):
+        """Return the integer values as comma separated lists.
+
+        The lists have up to DeleteBatchSize values each, to be used
+        as the "in" lists of the SQL statements for deleting objects.
+        """
+        batchSize = self._store.setting('DeleteBatchSize', 500)
+        values = ['%d' % value for value in values]
+        return [','.join(values[i:i+batchSize])
+            for i in xrange(0, len(values), batchSize)]
+
+    def sqlDeleteStmts(self, klass, serialNums):
+        """Return the SQL statements deleting the given objects of klass.
+
+        If deletion is being marked with a timestamp, update statements
+        are returned instead. See also sqlDeleteStmt() of the objects.
+        """
+        store = self._store
+        if store._markDeletes:
+            start = 'update %s set deleted=%s where %s in (' % (
+                klass.sqlTableName(), store.sqlNowCall(),
+                klass.sqlSerialColumnName())
+        else:
+            start = 'delete from %s where %s in (' % (
+                klass.sqlTableName(), klass.sqlSerialColumnName())
+        return [start + inList + ');' for inList in self.sqlInLists(serialNums)]
+
+    def sqlDetachStmts(self, klass, attr, serialNums):
+        """Return the SQL statements setting attr to NULL for the given objects."""
+        start = 'update %s set %s where %s in (' % (klass.sqlTableName(),
+            attr.sqlUpdateExpr(None), klass.sqlSerialColumnName())
+        return [start + inList + ');' for inList in self.sqlInLists(serialNums)]
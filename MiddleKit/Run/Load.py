@@ -0,0 +1,101 @@
+#!/usr/bin/env python2
+
+"""Load.py
+
+Bulk load sample or dump files into the database of a MiddleKit model.
+
+> python Load.py -h
+"""
+
+
+import os
+import sys
+from getopt import getopt
+from glob import glob
+
+from Dump import Dump
+
+
+class Load(Dump):
+
+    def main(self, args=sys.argv):
+        """Main method."""
+        opt, files = self.options(args)
+
+        # this is really only necessary if 'package' is set for the model,
+        # but it shouldn't hurt
+        middledir = os.path.dirname(os.path.dirname((os.path.abspath(opt['model']))))
+        sys.path.insert(1, middledir)
+
+        if not files:
+            files = sorted(glob(os.path.join(opt['model'], 'Sample*.csv')))
+            if not files:
+                self.usage('No files specified and no samples in model.')
+
+        # Load
+        classname = '%sObjectStore' % opt['db']
+        module = __import__('MiddleKit.Run.%s' % classname, globals(), locals(), [classname])
+        pyClass = getattr(module, classname)
+        if 'prompt-for-args' in opt:
+            sys.stderr.write('Enter %s init args: ' % classname)
+            conn = raw_input()
+            store = eval('pyClass(%s)' % conn)
+        else:
+            store = pyClass()
+        store.readModelFileNamed(opt['model'])
+        batchSize = opt.get('batch-size')
+        if batchSize:
+            batchSize = int(batchSize)
+        store.bulkLoad(files, batchSize,
+            progress=sys.stderr if 'show-progress' in opt else None)
+
+    def usage(self, errorMsg=None):
+        """Print usage information."""
+        progName = os.path.basename(sys.argv[0])
+        if errorMsg:
+            print '%s: error: %s' % (progName, errorMsg)
+        print 'Usage: %s --db DBNAME --model FILENAME [FILES]' % progName
+        print '       %s -h | --help' % progName
+        print
+        print 'Options:'
+        print '    --prompt-for-args Prompt for args to use for initializing store (i.e. password)'
+        print '    --show-progress   Print the number of loaded rows and the throughput'
+        print '                      on stderr as each batch is inserted'
+        print '    --batch-size N    Insert N rows at once (default is 1000)'
+        print
+        print '       * DBNAME can be: %s' % ', '.join(self.databases())
+        print '       * FILES are sample or dump files, default is the model samples'
+        print
+        sys.exit(1)
+
+    def options(self, args):
+        """Get command line options and files."""
+        # Command line dissection
+        if isinstance(args, basestring):
+            args = args.split()
+        optPairs, files = getopt(args[1:], 'h', ['help',
+            'show-progress', 'db=', 'model=', 'batch-size=', 'prompt-for-args'])
+        if len(optPairs) < 1:
+            self.usage('Missing options.')
+
+        # Turn the cmd line optPairs into a dictionary
+        opt = {}
+        for key, value in optPairs:
+            if key.startswith('--'):
+                key = key[2:]
+            elif key.startswith('-'):
+                key = key[1:]
+            opt[key] = value
+
+        # Check for required opt, set defaults, etc.
+        if 'h' in opt or 'help' in opt:
+            self.usage()
+        if 'db' not in opt:
+            self.usage('No database specified.')
+        if 'model' not in opt:
+            self.usage('No model specified.')
+        return opt, files
+
+
+if __name__ == '__main__':
+    Load().main(sys.argv)
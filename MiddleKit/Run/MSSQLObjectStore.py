@@ -60,6 +60,22 @@ class MSSQLObjectStore(SQLObjectStore):
                 self.doneWithConnection(newConn)
         return value
 
+    def bulkInsertRows(self, cur, klass, colNames, rows):
+        """Insert the rows with explicit values for the identity column.
+
+        Uses the fast_executemany feature of newer pyodbc versions.
+        """
+        tableName = klass.sqlTableName()
+        self.echoSQL('set identity_insert %s on' % tableName)
+        cur.execute('set identity_insert %s on' % tableName)
+        if hasattr(cur, 'fast_executemany'):
+            cur.fast_executemany = True
+        try:
+            SQLObjectStore.bulkInsertRows(self, cur, klass, colNames, rows)
+        finally:
+            self.echoSQL('set identity_insert %s off' % tableName)
+            cur.execute('set identity_insert %s off' % tableName)
+
     def filterDateTimeDelta(self, dtd):
         if isinstance(dtd, datetime.timedelta):
             dtd = datetime.datetime(1970, 1, 1) + dtd
@@ -68,6 +84,16 @@ class MSSQLObjectStore(SQLObjectStore):
     def sqlNowCall(self):
         return 'GETDATE()'
 
+    def sqlLimitClause(self, limit=None, offset=None):
+        """Return an OFFSET/FETCH clause (needs SQL Server 2012 or newer).
+
+        Note that SQL Server only accepts this after an ORDER BY clause.
+        """
+        clause = ['offset %d rows' % (offset or 0)]
+        if limit is not None:
+            clause.append('fetch next %d rows only' % limit)
+        return ' '.join(clause)
+
 
 class Klass(object):
 
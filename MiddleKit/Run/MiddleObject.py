@@ -9,6 +9,38 @@ from MiddleKit.Core.ListAttr import ListAttr
 
 import ObjectStore
 
+_numRefreshLocks = 64
+
+# Helper functions for attributes that can be missing in hollow objects,
+# working without faulting in and also with generated __slots__:
+
+_getAttribute = object.__getattribute__
+
+
+def _setDefaultAttr(obj, name):
+    try:
+        _getAttribute(obj, name)
+    except AttributeError:
+        setattr(obj, name, None)
+
+
+def _delAttr(obj, name):
+    try:
+        delattr(obj, name)
+    except AttributeError:
+        pass
+
+
+def _isGenerated(pyClass, name):
+    """Check whether the given attribute is defined by a generated class.
+
+    The classes written by the PythonGenerator are marked with _mk_generated.
+    """
+    for cls in pyClass.__mro__:
+        if name in cls.__dict__:
+            return cls.__dict__.get('_mk_generated', False)
+    return False
+
 
 class MiddleObject(object):
     """Superclass for the MiddleKit objects.
@@ -35,25 +67,61 @@ class MiddleObject(object):
     change-detection bookkeeping on '_mk_*' attributes.
     """
 
-    _mk_isDeleted = False
+    # The bookkeeping attributes are kept in slots. The generated classes
+    # add slots for the attributes of the model if UseSlots is set.
+    __slots__ = ('_mk_store', '_mk_changedAttrs', '_mk_serialNum', '_mk_key',
+        '_mk_changed', '_mk_initing', '_mk_inStore', '_mk_isDeleted',
+        '_mk_isHollow', '_mk_lazyGroup', '_mk_version', '__weakref__')
 
 
     ## Init ##
 
     def __init__(self):
-        self.__dict__['_mk_initing'] = True
+        self._mk_initing = True
         self._mk_store = None
         self._mk_changedAttrs = None
         self._mk_serialNum = 0
         self._mk_key = None
         self._mk_changed = False
+        self._mk_isDeleted = False
+        self._mk_isHollow = False  # set for objects from lazy fetches
+        self._mk_lazyGroup = None
+        self._mk_version = None  # the row version, if the store uses row versions
         self._mk_initing = False
         self._mk_inStore = False
 
-    # cache the various setFoo methods first by qualified class name
-    _mk_setCache = {}
-    # get a reentrant lock for accessing the persistent store
-    _mk_cacheLock = threading.RLock()
+    # the row loaders of the various classes, see _mk_rowLoader()
+    _mk_rowLoaders = {}
+    # locks for refreshing objects, picked by serial number
+    _mk_refreshLocks = tuple(threading.RLock() for i in range(_numRefreshLocks))
+
+
+    ## Pickling ##
+
+    def __getstate__(self):
+        """Return the state of the object for pickling.
+
+        Since the attributes can be kept in slots as well as in the
+        instance dictionary, the state is gathered from both.
+        """
+        state = {}
+        for cls in self.__class__.__mro__:
+            slots = cls.__dict__.get('__slots__', ())
+            if isinstance(slots, basestring):
+                slots = (slots,)
+            for name in slots:
+                if name[:2] != '__':
+                    try:
+                        state[name] = _getAttribute(self, name)
+                    except AttributeError:
+                        pass
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        """Restore the state of the object when unpickling."""
+        for name, value in state.iteritems():
+            setattr(self, name, value)
 
 
     ## Read Store ##
@@ -65,64 +133,191 @@ class MiddleObject(object):
         persistent store. Could be invoked multiple times for the same object
         in order to "refresh the attributes" from the persistent store.
         """
-        self._mk_cacheLock.acquire()
-        try:
-            if self._mk_store:
-                assert self._mk_store is store, \
-                    'Cannot refresh data from a different store.'
-                if self._mk_changed and not self._mk_initing:
-                    assert store.setting('AllowRefreshOfChangedObject', False), (
-                        "attempted to refresh changed object %s.%d\nchanges=%r\n"
-                        "Your app needs to call store.saveChanges() before doing"
-                        " anything which can cause objects to be refreshed from the"
-                        " database (i.e. calling store.deleteObject()), otherwise"
-                        " your changes will be lost." % (self.klass().name(),
-                            self.serialNum(), self._mk_changedAttrs))
-            else:
-                self.setStore(store)
-            assert not self._mk_isDeleted, 'Cannot refresh a deleted object.'
-            if store.setting('UseBigIntObjRefColumns', False):
-                fullClassName = self.__class__.__module__ + '.' + self.__class__.__name__
-                cache = self._mk_setCache.setdefault(fullClassName, [])
-                if not cache:
-                    allAttrs = self.klass().allDataAttrs()
-                    # @@ 2000-10-29 ce: next line is major hack: hasSQLColumn()
-                    attrs = [attr for attr in allAttrs if attr.hasSQLColumn()]
-                    attrNames = [attr.name() for attr in attrs]
-                    assert len(attrNames) + 1 == len(row)  # +1 because row has serialNumber
-                    for name in attrNames:
-                        setMethodName = 'set' + name[0].upper() + name[1:]
-                        setMethod = getattr(self.__class__, setMethodName, '_'+name)
-                        cache.append(setMethod)
-
-                assert len(cache) + 1 == len(row)
-                self._mk_initing = True
-                if self._mk_serialNum == 0:
-                    self.setSerialNum(row[0])
-                else:
-                    assert self._mk_serialNum == row[0]
-                # Set all of our attributes with setFoo() or by assigning to _foo
-                for i, setter in enumerate(cache):
-                    setter(self, row[i+1])
-            else:
-                self._mk_initing = True
-                if self._mk_serialNum == 0:
-                    self.setSerialNum(row[0])
-                else:
-                    assert self._mk_serialNum == row[0]
-                allAttrs = self.klass().allDataAttrs()
+        if self._mk_store:
+            # refreshing an object that may be shared with other threads
+            lock = self._mk_refreshLocks[self._mk_serialNum % _numRefreshLocks]
+            with lock:
+                self._mk_readStoreData(store, row)
+        else:
+            # a new object that is not yet visible to other threads
+            self._mk_readStoreData(store, row)
+        return self
+
+    def _mk_readStoreData(self, store, row):
+        if self._mk_store:
+            assert self._mk_store is store, \
+                'Cannot refresh data from a different store.'
+            if self._mk_changed and not self._mk_initing:
+                assert store.setting('AllowRefreshOfChangedObject', False), (
+                    "attempted to refresh changed object %s.%d\nchanges=%r\n"
+                    "Your app needs to call store.saveChanges() before doing"
+                    " anything which can cause objects to be refreshed from the"
+                    " database (i.e. calling store.deleteObject()), otherwise"
+                    " your changes will be lost." % (self.klass().name(),
+                        self.serialNum(), self._mk_changedAttrs))
+        else:
+            self.setStore(store)
+        assert not self._mk_isDeleted, 'Cannot refresh a deleted object.'
+        if self._mk_isHollow:
+            # we have the full row at hand, so don't fault in
+            for attr in self._mk_lazyGroup.attrs:
+                _setDefaultAttr(self, '_' + attr.name())
+            self._mk_isHollow = False
+            self._mk_lazyGroup = None
+        loadRow = self._mk_rowLoaders.get(self.__class__)
+        if loadRow is None:
+            loadRow = self._mk_rowLoader()
+        self._mk_initing = True
+        if self._mk_serialNum == 0:
+            self.setSerialNum(row[0])
+        else:
+            assert self._mk_serialNum == row[0]
+        loadRow(self, row)
+        self._mk_initing = False
+        self._mk_inStore = True
+        # setting the values above will cause _mk_changed to be set
+        self._mk_changed = False  # clear it now
+
+    def _mk_rowLoader(self):
+        """Build and return the row loader for the class of this object.
+
+        The row loader is a function taking the object and the row. If the
+        generated class has a _mk_loadRow() method and no set methods have
+        been customized, this method is used. Otherwise, the row loader
+        invokes the row reader functions returned by the rowReader() method
+        of the attributes with SQL columns, one after the other.
+
+        The row loader is built once per class and then used by readStoreData()
+        without any locking. If two threads happen to build it at the same
+        time, they will simply get equivalent loaders.
+        """
+        pyClass = self.__class__
+        loadRow = self._mk_generatedRowLoader()
+        if loadRow is None:
+            readers = []
+            for attr in self.klass().allDataAttrs():
+                readRow = attr.rowReader(pyClass)
+                if readRow is not None:
+                    readers.append(readRow)
+            readers = tuple(readers)
+            def loadRow(obj, row):
+                # set all of the attributes with setFoo()
                 i = 1
-                for attr in allAttrs:
-                    i = attr.readStoreDataRow(self, row, i)
+                for readRow in readers:
+                    i = readRow(obj, row, i)
+                assert i == len(row)
+        self._mk_rowLoaders[pyClass] = loadRow
+        return loadRow
+
+    def _mk_generatedRowLoader(self):
+        """Return the generated _mk_loadRow() function if it can be used.
+
+        Since the generated function assigns the attributes directly, it
+        can only be used if all set methods are the generated ones, i.e.
+        they are defined in classes marked with _mk_generated.
+        """
+        pyClass = self.__class__
+        if not _isGenerated(pyClass, '_mk_loadRow'):
+            return None
+        for attr in self.klass().allDataAttrs():
+            if attr.hasSQLColumn():
+                if not _isGenerated(pyClass, attr.pySetName()):
+                    return None
+        return pyClass._mk_loadRow.im_func
+
+    def readHollowStoreData(self, store, row, attrs, group=None):
+        """Read partial data from the persistent store.
+
+        Invoked by the store for lazy fetches. The row contains the serial
+        number followed by the values of the given attrs only. The other
+        attributes with SQL columns are left out, making the object "hollow".
+        They will be faulted in through the store when first accessed,
+        along with the other objects in the given LazyFetchGroup.
+        """
+        assert not self._mk_store, 'Cannot read hollow data into a stored object.'
+        self.setStore(store)
+        self._mk_initing = True
+        self.setSerialNum(row[0])
+        if group:
+            for attr in group.attrs:
+                _delAttr(self, '_' + attr.name())
+            self._mk_isHollow = True
+            self._mk_lazyGroup = group
+        for attr in self.klass().allDataAttrs():
+            if isinstance(attr, ListAttr):
+                # the list get methods will fetch the lists from the store
+                setattr(self, '_' + attr.name(), None)
+        i = 1
+        for attr in attrs:
+            i = attr.readStoreDataRow(self, row, i)
+        self._mk_initing = False
+        self._mk_changed = False
+        return self
 
-            self._mk_initing = False
-            self._mk_inStore = True
-            # setting the values above will cause _mk_changed to be set
-            self._mk_changed = False  # clear it now
+    def readFaultedStoreData(self, store, row, attrs):
+        """Read the data that was left out of a hollow object.
+
+        Invoked by the store when faulting in hollow objects. The row contains
+        the serial number followed by the values of the given attrs. Changes
+        to attributes that had already been fetched are kept.
+        """
+        assert self._mk_store is store
+        assert self._mk_serialNum == row[0]
+        for attr in attrs:
+            _setDefaultAttr(self, '_' + attr.name())
+        self._mk_isHollow = False
+        self._mk_lazyGroup = None
+        changed = self._mk_changed
+        self._mk_initing = True
+        try:
+            i = 1
+            for attr in attrs:
+                i = attr.readStoreDataRow(self, row, i)
         finally:
-            self._mk_cacheLock.release()
+            self._mk_initing = False
+        self._mk_changed = changed
         return self
 
+    def makeHollow(self, group):
+        """Discard the data read from the persistent store.
+
+        Invoked by the store for objects that have been changed by other
+        stores. The object keeps its identity, but the attributes of the given
+        LazyFetchGroup are faulted in again when first accessed, along with
+        the other objects in the group. Lists are fetched again as well.
+        """
+        assert not self._mk_changed, 'Cannot make a changed object hollow.'
+        self._mk_lazyGroup = group
+        self._mk_isHollow = True
+        for attr in group.attrs:
+            _delAttr(self, '_' + attr.name())
+        for attr in self.klass().allDataAttrs():
+            if isinstance(attr, ListAttr):
+                setattr(self, '_' + attr.name(), None)
+        return self
+
+    def __getattr__(self, name):
+        """Fault in the missing attributes of a hollow object.
+
+        Only invoked by Python if the attribute was not found otherwise.
+        """
+        try:
+            isHollow = _getAttribute(self, '_mk_isHollow')
+        except AttributeError:  # not initialized, e.g. while unpickling
+            isHollow = False
+        if (isHollow and name[:1] == '_'
+                and name[1:2] != '_' and not name.startswith('_mk_')):
+            self._mk_store.faultInObject(self)
+            return _getAttribute(self, name)
+        raise AttributeError(name)
+
+    def isHollow(self):
+        """Return whether some attributes still need to be faulted in.
+
+        Only objects from lazy fetches can be hollow.
+        """
+        return self._mk_isHollow
+
 
     ## Debug Info ##
 
@@ -183,6 +378,14 @@ class MiddleObject(object):
     def setChanged(self, flag):
         self._mk_changed = flag
 
+    def rowVersion(self):
+        """Return the version of the row the object has been read from.
+
+        Returns None if the UseRowVersions setting is not set or the version
+        is not known, as for hollow objects that have not been faulted in.
+        """
+        return self._mk_version
+
 
     ## In Store ##
 
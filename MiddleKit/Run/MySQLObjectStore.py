@@ -2,6 +2,7 @@ import new
 
 import MySQLdb
 from MySQLdb import Warning
+from MySQLdb.cursors import SSCursor
 
 from SQLObjectStore import SQLObjectStore
 
@@ -101,6 +102,23 @@ class MySQLObjectStore(SQLObjectStore):
     def sqlNowCall(self):
         return 'NOW()'
 
+    def sqlLimitClause(self, limit=None, offset=None):
+        if limit is None and offset:
+            limit = 18446744073709551615  # MySQL needs a limit for an offset
+        return SQLObjectStore.sqlLimitClause(self, limit, offset)
+
+    def newStreamingCursor(self, conn):
+        """Return an unbuffered cursor if the connection is not shared.
+
+        MySQLdb can stream the rows of a result with an SSCursor, but no
+        other query can be executed on the same connection before all of
+        these rows have been read, so we can only do so with dedicated
+        connections, as they are used in threaded mode.
+        """
+        if conn is self._connection:
+            return conn.cursor()
+        return conn.cursor(SSCursor)
+
 
 # Mixins
 
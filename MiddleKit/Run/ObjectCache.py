@@ -0,0 +1,206 @@
+"""Object cache for object stores."""
+
+from threading import Lock
+from time import time
+from weakref import WeakValueDictionary
+
+
+class ObjectCache(object):
+    """Object cache keeping recently used objects in memory.
+
+    ObjectCache maps ObjectKeys to objects like a dictionary and is used by
+    ObjectStore for keeping track of the objects in memory. All objects are
+    referenced weakly, so they stay in the cache as long as they are in use.
+    Additionally, the cache keeps strong references to the recently used
+    objects, so these stay in memory even when they are not used elsewhere.
+
+    The strong references are kept in two generations. Objects that are
+    added to the cache or found in the cache go to the young generation.
+    When the young generation is full, it becomes the old generation, and
+    the objects that were still in the old generation are evicted (i.e.
+    only weakly referenced from then on). This approximates a least
+    recently used policy with little bookkeeping: looking up an object
+    that is already in the young generation and has no time to live
+    does not take the lock and does not change the generations.
+
+    The size is the maximum number of strongly referenced objects. A size
+    of 0 means that objects are only weakly referenced, and a size of None
+    means that all objects are kept strongly referenced.
+
+    The time to live (ttl) is the number of seconds an object is kept
+    strongly referenced after it has last been used. It can also be set
+    per class name with classTTL. None means no limit, and 0 means that
+    the objects are only weakly referenced.
+
+    The implementation is not a complete dict wrapper; only the methods
+    needed by the object stores are implemented.
+    """
+
+    def __init__(self, size=0, ttl=None, classTTL=None):
+        self._weak = WeakValueDictionary()
+        self._genSize = size if size is None else (size + 1) // 2
+        self._ttl = ttl
+        self._classTTL = classTTL or {}
+        self._young = {}  # the young generation: key -> (obj, expires)
+        self._old = {}  # the old generation
+        ttls = [t for t in self._classTTL.values() + [ttl] if t]
+        # check for expired objects in intervals of the smallest ttl
+        self._purgeInterval = min(ttls) if ttls else None
+        self._nextPurge = None
+        self._lock = Lock()
+        self.resetStats()
+
+    def __repr__(self):
+        return '<%s with %d objects>' % (self.__class__.__name__, len(self))
+
+
+    ## Dictionary interface ##
+
+    def get(self, key, default=None):
+        obj = self._weak.get(key)
+        if obj is None:
+            self._misses += 1
+            return default
+        self._hits += 1
+        if self._genSize != 0:
+            young = self._young.get(key)
+            if young is None or young[1] is not None:
+                self._use(key, obj)
+        return obj
+
+    def __getitem__(self, key):
+        obj = self.get(key)
+        if obj is None:
+            raise KeyError(key)
+        return obj
+
+    def __setitem__(self, key, obj):
+        self._weak[key] = obj
+        if self._genSize != 0:
+            self._use(key, obj)
+
+    def __delitem__(self, key):
+        del self._weak[key]
+        self._forget(key)
+
+    def __contains__(self, key):
+        return key in self._weak
+
+    def __len__(self):
+        return len(self._weak)
+
+    def pop(self, key, default=None):
+        self._forget(key)
+        return self._weak.pop(key, default)
+
+    def keys(self):
+        return self._weak.keys()
+
+    def values(self):
+        return self._weak.values()
+
+    def items(self):
+        return self._weak.items()
+
+    def clear(self):
+        with self._lock:
+            self._young = {}
+            self._old = {}
+        self._weak = WeakValueDictionary()
+
+
+    ## Invalidation ##
+
+    def invalidate(self, key):
+        """Remove the object with the given key from the cache.
+
+        Returns the object or None if it was not in the cache.
+        """
+        obj = self.pop(key)
+        if obj is not None:
+            self._invalidations += 1
+        return obj
+
+    def invalidateClass(self, className):
+        """Remove all objects of the given class from the cache.
+
+        Returns the number of objects that have been removed.
+        """
+        count = 0
+        for key in self._weak.keys():
+            if (key.className() == className
+                    and self.invalidate(key) is not None):
+                count += 1
+        return count
+
+    def purge(self):
+        """Drop the strong references to all objects that have expired.
+
+        This is also done automatically from time to time when the cache
+        is used and time to live values have been set.
+        """
+        with self._lock:
+            self._purge(time())
+
+
+    ## Statistics ##
+
+    def stats(self):
+        """Return a dictionary with statistics about the cache.
+
+        The keys are: size (number of objects in the cache), resident
+        (number of strongly referenced objects), hits, misses, evictions,
+        expirations, invalidations. The counts are only approximate
+        when the cache is used by several threads.
+        """
+        return dict(size=len(self._weak),
+            resident=len(self._young) + len(self._old),
+            hits=self._hits, misses=self._misses,
+            evictions=self._evictions, expirations=self._expirations,
+            invalidations=self._invalidations)
+
+    def resetStats(self):
+        self._hits = self._misses = self._evictions = 0
+        self._expirations = self._invalidations = 0
+
+
+    ## Self utility ##
+
+    def ttl(self, key):
+        """Return the time to live for the object with the given key."""
+        return self._classTTL.get(key.className(), self._ttl)
+
+    def _use(self, key, obj):
+        """Put the object into the young generation."""
+        ttl = self.ttl(key)
+        if ttl == 0:
+            return
+        now = time()
+        with self._lock:
+            self._old.pop(key, None)
+            self._young[key] = (obj, None if ttl is None else now + ttl)
+            genSize = self._genSize
+            if genSize is not None and len(self._young) >= genSize:
+                self._evictions += len(self._old)
+                self._old = self._young
+                self._young = {}
+            if self._purgeInterval:
+                if self._nextPurge is None:
+                    self._nextPurge = now + self._purgeInterval
+                elif now >= self._nextPurge:
+                    self._purge(now)
+
+    def _purge(self, now):
+        """Drop expired objects. The lock must be held."""
+        for gen in self._young, self._old:
+            for key, (obj, expires) in gen.items():
+                if expires is not None and expires < now:
+                    del gen[key]
+                    self._expirations += 1
+        if self._purgeInterval:
+            self._nextPurge = now + self._purgeInterval
+
+    def _forget(self, key):
+        with self._lock:
+            self._young.pop(key, None)
+            self._old.pop(key, None)
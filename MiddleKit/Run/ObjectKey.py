@@ -31,6 +31,9 @@ class ObjectKey(object):
         self._serialNum = serialNum
         return self
 
+    def className(self):
+        return self._className
+
     def serialNum(self):
         return self._serialNum
 
@@ -1,12 +1,14 @@
 import sys
-import thread
+import threading
 from types import ClassType
-
-from weakref import WeakValueDictionary
+from weakref import WeakSet
 
 from MiscUtils import NoDefault
 from MiscUtils.Funcs import safeDescription
 from ObjectKey import ObjectKey
+from ObjectCache import ObjectCache
+from QueryCache import QueryCache
+from DeletePlan import DeletePlan
 from MiddleKit.Core.ModelUser import ModelUser
 from MiddleKit.Core.Klass import Klass as BaseKlass
 from MiddleKit.Core.ObjRefAttr import ObjRefAttr
@@ -14,8 +16,20 @@ from MiddleKit.Core.ListAttr import ListAttr
     # ^^^ for use in _klassForClass() below
     # Can't import as Klass or Core.ModelUser (our superclass)
     # will try to mix it in.
-from PerThreadList import PerThreadList, NonThreadedList
-from PerThreadDict import PerThreadDict, NonThreadedDict
+from UnitOfWork import UnitOfWork
+
+# the stores whose units of work are ended by endUnitsOfWork()
+_requestStores = WeakSet()
+
+
+def endUnitsOfWork():
+    """End the units of work of the current thread in all object stores.
+
+    This is invoked by the WebKit application at the end of every request
+    for the stores that have the DiscardUnsavedChanges setting turned on.
+    """
+    for store in list(_requestStores):
+        store.endUnitOfWork()
 
 
 class UnknownObjectError(LookupError):
@@ -103,23 +117,94 @@ class ObjectStore(ModelUser):
         """Perform additional set up of the store after the model is set."""
         ModelUser.modelWasSet(self)
         self._threaded = self.setting('Threaded')
-        if self._threaded:
-            self._hasChanges = set()  # keep track on a per-thread basis
-            self._newObjects = PerThreadList()
-            self._deletedObjects = PerThreadList()
-            self._changedObjects = PerThreadDict()
-        else:
-            self._hasChanges = False
-            self._newObjects = NonThreadedList()
-            self._deletedObjects = NonThreadedList()
-            self._changedObjects = NonThreadedDict()
+        self._context = threading.local()  # the current unit of work
+        # without threading, all threads share one unit of work
+        self._sharedUnitOfWork = None if self._threaded else UnitOfWork(self)
+        self._changedUnitsOfWork = set()  # units of work with unsaved changes
+        self.resetUnitOfWorkStats()
         self._objects = self.emptyObjectCache()  # dict; keyed by ObjectKeys
+        self._queryCache = self.emptyQueryCache()
+        if self.setting('DiscardUnsavedChanges', False):
+            _requestStores.add(self)
+        else:
+            _requestStores.discard(self)
 
     def emptyObjectCache(self):
+        """Return a new cache for the objects in memory.
+
+        The cache is an ObjectCache configured with the ObjectCache setting.
+        Objects are only weakly referenced by default, unless the setting
+        CacheObjectsForever is set.
+        """
+        settings = self.setting('ObjectCache', None) or {}
         if self.setting('CacheObjectsForever', False):
-            return {}
+            size = None
         else:
-            return WeakValueDictionary()
+            size = settings.get('Size', 0)
+        return ObjectCache(size, settings.get('TTL'), settings.get('ClassTTL'))
+
+    def objectCacheStats(self):
+        """Return a dictionary with statistics about the object cache.
+
+        See ObjectCache.stats() for the keys of the dictionary.
+        """
+        return self._objects.stats()
+
+    def emptyQueryCache(self):
+        """Return a new cache for query results.
+
+        The cache is a QueryCache configured with the QueryCache setting.
+        """
+        settings = self.setting('QueryCache', None) or {}
+        return QueryCache(settings.get('Size', 100), settings.get('TTL'))
+
+    def queryCacheStats(self):
+        """Return a dictionary with statistics about the query cache.
+
+        See QueryCache.stats() for the keys of the dictionary.
+        """
+        return self._queryCache.stats()
+
+    def invalidateQueries(self, aClass=None, isDeep=True):
+        """Remove cached query results depending on the given class.
+
+        Results are removed automatically when changes of objects of the
+        class are saved. You need to invoke this method only if a cached
+        query depends on other classes (e.g., via joins in its clauses),
+        or if the database has been changed by other means.
+        If no class is given, all cached query results are removed.
+        If isDeep is true, results depending on subclasses are also removed.
+        Returns the number of results that have been removed.
+        """
+        if aClass is None:
+            count = len(self._queryCache)
+            self._queryCache.clear()
+            return count
+        klass = self._klassForClass(aClass)
+        klasses = [klass]
+        if isDeep:
+            klasses.extend(klass.descendants())
+        return self._queryCache.invalidateClasses(
+            [klass.name() for klass in klasses])
+
+    def changedClassNames(self, allThreads=False):
+        """Return the names of the classes of all unsaved objects.
+
+        This includes new, changed and deleted objects of the current unit
+        of work, or of all units of work if allThreads is true.
+        """
+        if allThreads:
+            uows = list(self._changedUnitsOfWork)
+        else:
+            uows = [self.currentUnitOfWork()]
+        names = set()
+        for uow in uows:
+            for objs in (uow._newObjects, uow._deletedObjects,
+                    uow._changedObjects.values()):
+                names.update(obj.klass().name() for obj in objs)
+            for plan in uow._deletePlans:
+                names.update(plan.classNames())
+        return names
 
 
     ## Manipulating the objects in the store ##
@@ -177,6 +262,32 @@ class ObjectStore(ModelUser):
         else:
             return self._objects.get(key, default)
 
+    def invalidateObject(self, obj):
+        """Remove the object from the memory of the store.
+
+        The next fetch of the object will create a new instance with the
+        current data from the persistent store, so you should not use the
+        invalidated instance afterwards. Objects with unsaved changes should
+        not be invalidated. Returns True if the object was in memory.
+        """
+        key = obj.key()
+        return key is not None and self._objects.invalidate(key) is not None
+
+    def invalidateObjectsOfClass(self, aClass, isDeep=True):
+        """Remove all objects of the given class from the memory of the store.
+
+        If isDeep is True, then objects of all subclasses are also removed.
+        This is a cheaper alternative to clear() when you know that only the
+        data of certain classes has been changed by other processes.
+        Returns the number of objects that have been removed.
+        """
+        klass = self._klassForClass(aClass)
+        count = self._objects.invalidateClass(klass.name())
+        if isDeep:
+            for subklass in klass.subklasses():
+                count += self.invalidateObjectsOfClass(subklass)
+        return count
+
     def add(self, obj, noRecurse=False):
         return self.addObject(obj, noRecurse)
 
@@ -193,7 +304,7 @@ class ObjectStore(ModelUser):
             assert obj.key() is None
             # Make the store aware of this new object
             self.willChange()
-            self._newObjects.append(obj)
+            self.currentUnitOfWork()._newObjects.append(obj)
             obj.setStore(self)
             if not noRecurse:
                 # Recursively add referenced objects to the store
@@ -214,27 +325,78 @@ class ObjectStore(ModelUser):
         Restrictions: The object must be contained in the store and obviously
         you cannot remove it more than once.
         """
+        self.deleteObjects((obj,))
+
+    def deleteObjects(self, objs):
+        """Delete several objects at once.
+
+        The objects are deleted together with all objects that are deleted
+        by cascade, and references to them are detached as specified by the
+        onDeleteOther and onDeleteSelf settings of the attributes.
+        Returns the DeletePlan that has been carried out.
+        """
         # First check if the delete is possible.  Then do the actual delete.
         # This avoids partially deleting objects only to have an exception
         # halt the process in the middle.
+        plan = self.planDelete(objs)
+        self.willChange()
+        self.applyDeletePlan(plan)
+        return plan
 
+    def planDelete(self, objs):
+        """Return a DeletePlan for deleting the given objects.
+
+        Raises DeleteReferencedError or DeleteObjectWithReferencesError
+        if the objects cannot be deleted. This implementation visits the
+        affected objects one by one. Specific object stores may replace it
+        with something more efficient.
+        """
         objectsToDel = {}
         detaches = []
-        self._deleteObject(obj, objectsToDel, detaches)  # compute objectsToDel and detaches
-        self.willChange()
-
-        # detaches
-        for obj, attr in detaches:
+        for obj in objs:
             if id(obj) not in objectsToDel:
-                obj.setValueForAttr(attr, None)
+                # compute objectsToDel and detaches
+                self._deleteObject(obj, objectsToDel, detaches)
+        plan = DeletePlan()
+        for obj in objectsToDel.values():
+            plan.addObject(obj)
+        for obj, attr in detaches:
+            plan.addDetachedObject(obj, attr)
+        return plan
 
-        # process final list of objects
-        objectsToDel = objectsToDel.values()
-        for obj in objectsToDel:
-            obj._mk_isDeleted = True
-            self._deletedObjects.append(obj)
-            obj.updateReferencingListAttrs()
-            del self._objects[obj.key()]
+    def applyDeletePlan(self, plan):
+        """Carry out the given DeletePlan for the objects in memory.
+
+        Objects in memory are detached by setting their attributes to None,
+        and deleted by marking them as deleted and removing them from the
+        store. Their SQL is issued by saveChanges() as usual. The objects not
+        in memory are left in the plan, which is kept for commitDeletions().
+        """
+        for klass, attr, serialNums in plan.detaches():
+            for serialNum in serialNums:
+                obj = self.deletePlanObject(plan, klass, serialNum)
+                if obj is not None:
+                    obj.setValueForAttr(attr, None)
+                    plan.discardDetach(klass, attr, serialNum)
+        uow = self.currentUnitOfWork()
+        for klass, serialNums in plan.deletes():
+            for serialNum in serialNums:
+                obj = self.deletePlanObject(plan, klass, serialNum)
+                if obj is not None:
+                    obj._mk_isDeleted = True
+                    uow._deletedObjects.append(obj)
+                    obj.updateReferencingListAttrs()
+                    self._objects.pop(obj.key())
+                    plan.discardDelete(klass, serialNum)
+        if not plan.isEmpty():
+            uow._deletePlans.append(plan)
+
+    def deletePlanObject(self, plan, klass, serialNum):
+        """Return the object of a DeletePlan if it is in memory, else None."""
+        obj = plan.object(klass, serialNum)
+        if obj is None:
+            obj = self.objectForClassAndSerial(klass, serialNum, None)
+        return obj
 
     def _deleteObject(self, obj, objectsToDel, detaches, superobject=None):
         """Compile the list of objects to be deleted.
@@ -341,56 +503,170 @@ class ObjectStore(ModelUser):
         # This is actually a no-op. There is nothing that needs to be set to zero.
 
 
+    ## Units of work ##
+
+    def unitOfWork(self):
+        """Return a new unit of work for the store.
+
+        Changes made while the unit of work is entered as a context manager
+        are registered with the unit of work instead of the current thread.
+        See UnitOfWork for details.
+        """
+        return UnitOfWork(self)
+
+    def currentUnitOfWork(self):
+        """Return the unit of work of the current thread.
+
+        This is the unit of work bound to the thread, if any, or otherwise
+        the thread's own one, which is created when needed. If the Threaded
+        setting is turned off, all threads share one unit of work instead.
+        """
+        try:
+            return self._context.uow
+        except AttributeError:
+            uow = self._sharedUnitOfWork
+            if uow is None:
+                uow = self._context.uow = UnitOfWork(self)
+            return uow
+
+    def bindUnitOfWork(self, uow):
+        """Bind the unit of work to the current thread.
+
+        Passing None unbinds the current unit of work, so that the thread
+        gets a new one of its own when needed. Returns the previously bound
+        unit of work or None. Usually invoked by entering and leaving
+        a UnitOfWork.
+        """
+        context = self._context
+        previous = getattr(context, 'uow', None)
+        if uow is None:
+            if previous is not None:
+                del context.uow
+        else:
+            assert uow.store() is self
+            context.uow = uow
+        return previous
+
+    def endUnitOfWork(self):
+        """End the unit of work of the current thread.
+
+        This is invoked automatically at the end of every WebKit request
+        if the DiscardUnsavedChanges setting is turned on, so that changes
+        that a request has not saved are not saved by a later request served
+        by the same thread. These changes are discarded, and the thread gets
+        a new unit of work for its next changes. If the Threaded setting is
+        turned off, the changes of all threads are discarded. Returns the
+        numbers of new, changed and deleted objects that have not been saved.
+        Units of work of threads that end are freed automatically.
+        """
+        uow = self.bindUnitOfWork(None) or self._sharedUnitOfWork
+        if uow is None:
+            return 0, 0, 0
+        counts = uow.changeCounts()
+        self.discardChanges(uow)
+        return counts
+
+    def unitOfWorkStats(self):
+        """Return a dictionary with statistics about the saved changes.
+
+        The keys are: pending (number of units of work with unsaved changes),
+        saves (number of saved units of work with changes), inserts, updates,
+        deletes (numbers of saved objects), maxObjects (largest number of
+        objects saved at once), discards (number of units of work whose changes
+        have been discarded). The counts are only approximate when the store
+        is used by several threads.
+        """
+        stats = self._unitOfWorkStats.copy()
+        stats['pending'] = len(self._changedUnitsOfWork)
+        return stats
+
+    def resetUnitOfWorkStats(self):
+        self._unitOfWorkStats = dict(saves=0, inserts=0, updates=0,
+            deletes=0, maxObjects=0, discards=0)
+
+
     ## Changes ##
 
     def hasChangesForCurrentThread(self):
-        """Return whether the current thread has changes to be committed."""
-        if self._threaded:
-            threadid = thread.get_ident()
-            return threadid in self._hasChanges
-        else:
-            return self._hasChanges
+        """Return whether the current thread has changes to be committed.
+
+        If a unit of work is bound to the thread, its changes are checked.
+        """
+        uow = getattr(self._context, 'uow', None) or self._sharedUnitOfWork
+        return uow is not None and uow._hasChanges
 
     def hasChanges(self):
-        """Return whether any thread has changes to be committed."""
-        if self._threaded:
-            return bool(self._hasChanges)
-        return self._hasChanges
+        """Return whether any thread or unit of work has changes to be committed."""
+        return bool(self._changedUnitsOfWork)
 
     def willChange(self):
-        if self._threaded:
-            threadid = thread.get_ident()
-            self._hasChanges.add(threadid)
-        else:
-            self._hasChanges = True
+        uow = self.currentUnitOfWork()
+        if not uow._hasChanges:
+            uow._hasChanges = True
+            self._changedUnitsOfWork.add(uow)
 
     def saveAllChanges(self):
         """Commit object changes to the object store.
 
         Done by invoking commitInserts(), commitUpdates() and commitDeletions()
-        all of which must by implemented by a concrete subclass.
+        all of which must by implemented by a concrete subclass. Cached query
+        results depending on the classes of the saved objects are invalidated.
+        The changes of all threads and all units of work are saved.
         """
-        self.commitDeletions(allThreads=True)
-        self.commitInserts(allThreads=True)
-        self.commitUpdates(allThreads=True)
-        if self._threaded:
-            self._hasChanges = set()
-        else:
-            self._hasChanges = False
+        for uow in list(self._changedUnitsOfWork):
+            self.saveChanges(uow)
 
-    def saveChanges(self):
+    def saveChanges(self, uow=None):
         """Commit object changes to the object store.
 
         Done by invoking commitInserts(), commitUpdates() and commitDeletions()
-        all of which must by implemented by a concrete subclass.
+        all of which must by implemented by a concrete subclass. Cached query
+        results depending on the classes of the saved objects are invalidated.
+        The changes of the given unit of work are saved, or otherwise the
+        changes of the current unit of work (see currentUnitOfWork()).
         """
-        self.commitDeletions()
-        self.commitInserts()
-        self.commitUpdates()
-        if self._threaded:
-            self._hasChanges.discard(thread.get_ident())
-        else:
-            self._hasChanges = False
+        if uow is not None and uow is not self.currentUnitOfWork():
+            with uow:
+                return self.saveChanges()
+        uow = self.currentUnitOfWork()
+        if not uow._hasChanges:
+            return
+        counts = uow.changeCounts()
+        classNames = self.changedClassNames()
+        try:
+            self.commitDeletions()
+            self.commitInserts()
+            self.commitUpdates()
+        finally:
+            if classNames:
+                self._queryCache.invalidateClasses(classNames)
+        uow._hasChanges = False
+        self._changedUnitsOfWork.discard(uow)
+        stats = self._unitOfWorkStats
+        stats['saves'] += 1
+        stats['inserts'] += counts[0]
+        stats['updates'] += counts[1]
+        stats['deletes'] += counts[2]
+        if sum(counts) > stats['maxObjects']:
+            stats['maxObjects'] = sum(counts)
+
+    def discardChanges(self, uow=None):
+        """Forget about the changes of the given or current unit of work.
+
+        The changed objects are not flagged as changed any more and are
+        removed from memory, so that the next fetch reads them again with
+        their stored data instead of the discarded changes.
+        """
+        if uow is None:
+            uow = self.currentUnitOfWork()
+        if uow._hasChanges:
+            self._unitOfWorkStats['discards'] += 1
+        for obj in uow._changedObjects.values():
+            obj.setChanged(False)
+            obj._mk_changedAttrs = None
+            self.invalidateObject(obj)
+        uow.clear()
+        self._changedUnitsOfWork.discard(uow)
 
     def commitInserts(self):
         """Commit inserts.
@@ -458,30 +734,24 @@ class ObjectStore(ModelUser):
         to be saved.  You can check for that with hasChanges().
         """
         assert not self.hasChanges()
-        assert self._newObjects.isEmpty()
-        assert self._deletedObjects.isEmpty()
-        assert self._changedObjects.isEmpty()
 
         self._objects = self.emptyObjectCache()
+        self._queryCache.clear()
         self._newSerialNum = -1
 
     def discardEverything(self):
         """Discard all cached objects.
 
-        This includes any modification tracking.  However, objects in memory
-        will not change state as a result of this call.
+        This includes any modification tracking.  The changed objects are
+        not flagged as changed any more, but keep their changed values.
 
         This method is a severe form of clear() and is typically used only
         for debugging or production emergencies.
         """
-        if self._threaded:
-            self._hasChanges = set()
-        else:
-            self._hasChanges = False
+        for uow in list(self._changedUnitsOfWork):
+            self.discardChanges(uow)
         self._objects = self.emptyObjectCache()
-        self._newObjects.clear()
-        self._deletedObjects.clear()
-        self._changedObjects.clear()
+        self._queryCache.clear()
         self._newSerialNum = -1
 
 
@@ -497,7 +767,7 @@ class ObjectStore(ModelUser):
         If you subclass MiddleObject, then you're taken care of.
         """
         self.willChange()
-        self._changedObjects[obj] = obj
+        self.currentUnitOfWork()._changedObjects[obj] = obj
         # @@ 2000-10-06 ce: Should this be keyed by the obj.key()? Does it matter?
 
 
@@ -1,3 +1,4 @@
+from cStringIO import StringIO
 
 connectionPool = True
 try:
@@ -38,6 +39,9 @@ class PostgreSQLObjectStore(SQLObjectStore):
     You wouldn't use the 'db' argument, since that is determined by the model.
     """
 
+    _streamingCursorCount = 0
+    _listenConnection = None  # for notifications of changes
+
     def augmentDatabaseArgs(self, args, pool=False):
         if not args.get('database'):
             args['database'] = self._model.sqlDatabaseName()
@@ -65,6 +69,15 @@ class PostgreSQLObjectStore(SQLObjectStore):
     def newCursorForConnection(self, conn, dictMode=False):
         return conn.cursor()
 
+    def newStreamingCursor(self, conn):
+        """Return a named (server side) cursor if psycopg2 is used."""
+        if dbi.__name__ != 'psycopg2':
+            return conn.cursor()
+        self._streamingCursorCount += 1
+        name = 'mk_stream_%d_%d' % (id(self), self._streamingCursorCount)
+        # hold the cursor so that it survives commits on the same connection
+        return conn.cursor(name, withhold=True)
+
     def retrieveNextInsertId(self, klass):
         seqname = "%s_%s_seq" % (klass.name(), klass.sqlSerialColumnName())
         conn, curs = self.executeSQL("select nextval('%s')" % seqname)
@@ -82,7 +95,11 @@ class PostgreSQLObjectStore(SQLObjectStore):
             if not self.setting('IgnoreSQLWarnings', False):
                 raise
 
-    def saveChanges(self):
+    def saveChanges(self, uow=None):
+        if uow is not None and uow is not self.currentUnitOfWork():
+            with uow:
+                return self.saveChanges()
+        classNames = self.changedClassNames()
         conn, cur = self.connectionAndCursor()
         try:
             SQLObjectStore.saveChanges(self)
@@ -94,6 +111,77 @@ class PostgreSQLObjectStore(SQLObjectStore):
                 conn.rollback()
                 raise
         conn.commit()
+        if classNames:
+            # queries run before the commit may have cached old results
+            self._queryCache.invalidateClasses(classNames)
+
+    def bulkInsertRows(self, cur, klass, colNames, rows):
+        """Insert the rows with COPY if the cursor supports copy_from()."""
+        if not hasattr(cur, 'copy_from'):
+            return SQLObjectStore.bulkInsertRows(
+                self, cur, klass, colNames, rows)
+        data = StringIO()
+        wr = data.write
+        for row in rows:
+            wr('\t'.join(map(self.copyValue, row)))
+            wr('\n')
+        data.seek(0)
+        self.echoSQL('copy %s (%s) from stdin /* %d rows */' % (
+            klass.sqlTableName(), ','.join(colNames), len(rows)))
+        cur.copy_from(data, klass.sqlTableName(), columns=colNames)
+
+    @staticmethod
+    def copyValue(value):
+        """Return the value in the text format of COPY."""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        elif not isinstance(value, str):
+            return str(value)
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace(
+            '\n', '\\n').replace('\r', '\\r')
+
+    def didBulkLoadKlass(self, cur, klass):
+        """Set the serial number sequence to the highest serial number."""
+        serialName = klass.sqlSerialColumnName()
+        sql = "select setval('%s_%s_seq', (select max(%s) from %s))" % (
+            klass.name(), serialName, serialName, klass.sqlTableName())
+        self.echoSQL(sql)
+        cur.execute(sql)
+
+    def logChanges(self, cur, changes):
+        """Log the changes and notify the listening stores on commit."""
+        SQLObjectStore.logChanges(self, cur, changes)
+        self.echoSQL('notify mk_changes')
+        cur.execute('notify mk_changes')
+
+    def hasPendingChanges(self):
+        """Check whether other stores have sent notifications of changes.
+
+        With psycopg2, the store listens for notifications sent by logChanges()
+        on a separate connection, so the change log is only read when other
+        stores have committed changes. Otherwise this always returns True.
+        """
+        if dbi.__name__ != 'psycopg2':
+            return True
+        conn = self._listenConnection
+        if conn is None:
+            conn = self.newConnection()
+            conn.set_isolation_level(0)  # autocommit
+            cur = conn.cursor()
+            self.echoSQL('listen mk_changes')
+            cur.execute('listen mk_changes')
+            cur.close()
+            self._listenConnection = conn
+            return True  # changes may have been logged before listening
+        conn.poll()
+        if conn.notifies:
+            del conn.notifies[:]
+            return True
+        return False
 
     def sqlCaseInsensitiveLike(self, a, b):
         return "%s ilike %s" % (a, b)
@@ -0,0 +1,160 @@
+"""Query result cache for object stores."""
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+class QueryCache(object):
+    """Cache for the results of queries.
+
+    QueryCache maps query keys to query results. The results are sequences
+    of (klass, serialNum) pairs identifying the fetched objects, not the
+    objects themselves, so the cache does not keep objects in memory.
+
+    Each result is stored together with the names of the classes it depends
+    on. When objects of these classes are changed, the result can be removed
+    with invalidateClass(). Results of queries that started before an
+    invalidation are not stored (see generation() and put()), so a result
+    that has been read before a concurrent change cannot sneak into the cache.
+
+    The size is the maximum number of results in the cache; the least
+    recently used results are evicted first. A size of 0 means that nothing
+    is cached, and a size of None means that the number is not limited.
+
+    The time to live (ttl) is the number of seconds a result is kept after
+    it has been stored. None means no limit. Use it to bound the staleness
+    of results that may be changed by other processes.
+    """
+
+    def __init__(self, size=100, ttl=None):
+        self._size = size
+        self._ttl = ttl
+        self._results = OrderedDict()  # key -> (result, expires, classNames)
+        self._keysByClass = {}  # className -> set of keys
+        self._generation = 0
+        self._lock = Lock()
+        self.resetStats()
+
+    def __repr__(self):
+        return '<%s with %d results>' % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, key):
+        """Return the cached result for the key or None."""
+        with self._lock:
+            item = self._results.get(key)
+            if item is not None:
+                if item[1] is not None and item[1] < time():
+                    self._remove(key)
+                    self._expirations += 1
+                else:
+                    # move the result to the end as the most recently used
+                    del self._results[key]
+                    self._results[key] = item
+                    self._hits += 1
+                    return item[0]
+            self._misses += 1
+        return None
+
+    def generation(self):
+        """Return the current generation of the cache.
+
+        The generation changes whenever results are invalidated.
+        Get it before running a query and pass it to put() afterwards.
+        """
+        return self._generation
+
+    def put(self, key, result, classNames, generation=None):
+        """Store the result for the key.
+
+        classNames are the names of the classes the result depends on.
+        If a generation is passed, the result is only stored if nothing
+        has been invalidated since the generation has been taken.
+        Returns whether the result has been stored.
+        """
+        if self._size == 0:
+            return False
+        expires = None if self._ttl is None else time() + self._ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            if key in self._results:
+                self._remove(key)
+            self._results[key] = (tuple(result), expires, classNames)
+            keysByClass = self._keysByClass
+            for className in classNames:
+                keys = keysByClass.get(className)
+                if keys is None:
+                    keys = keysByClass[className] = set()
+                keys.add(key)
+            if self._size is not None:
+                while len(self._results) > self._size:
+                    self._remove(next(iter(self._results)))
+                    self._evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._keysByClass.clear()
+            self._generation += 1
+
+
+    ## Invalidation ##
+
+    def invalidateClass(self, className):
+        """Remove all results depending on the given class.
+
+        Returns the number of results that have been removed.
+        """
+        return self.invalidateClasses((className,))
+
+    def invalidateClasses(self, classNames):
+        """Remove all results depending on any of the given classes.
+
+        Returns the number of results that have been removed.
+        """
+        count = 0
+        with self._lock:
+            self._generation += 1
+            for className in classNames:
+                for key in list(self._keysByClass.get(className, ())):
+                    self._remove(key)
+                    count += 1
+            self._invalidations += count
+        return count
+
+
+    ## Statistics ##
+
+    def stats(self):
+        """Return a dictionary with statistics about the cache.
+
+        The keys are: size (number of results in the cache), hits, misses,
+        evictions, expirations, invalidations.
+        """
+        return dict(size=len(self._results),
+            hits=self._hits, misses=self._misses,
+            evictions=self._evictions, expirations=self._expirations,
+            invalidations=self._invalidations)
+
+    def resetStats(self):
+        self._hits = self._misses = self._evictions = 0
+        self._expirations = self._invalidations = 0
+
+
+    ## Self utility ##
+
+    def _remove(self, key):
+        """Remove the result for the key. The lock must be held."""
+        result, expires, classNames = self._results.pop(key)
+        keysByClass = self._keysByClass
+        for className in classNames:
+            keys = keysByClass.get(className)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del keysByClass[className]
@@ -1,8 +1,17 @@
 import sys
+import threading
+from collections import deque
+from decimal import Decimal
+from time import time
 
 from MiddleObject import MiddleObject
 from ObjectStore import ObjectStore, UnknownObjectError
 from ObjectKey import ObjectKey
+from DeletePlan import DeletePlanner
+from ChangeLog import ChangeLog
+from ValueQuery import ValueQuery
+from BulkLoader import BulkLoader
+from SQLProfiler import SQLProfiler
 from MiddleKit.Core.ObjRefAttr import objRefJoin, objRefSplit
 from MiscUtils import NoDefault, AbstractError, CSVJoiner
 from MiscUtils import Funcs as funcs
@@ -29,6 +38,26 @@ class ObjRefDanglesError(ObjRefError):
 aggressiveGC = False
 
 
+class StaleObjectError(SQLObjectStoreError):
+    """Stale object error.
+
+    Raised by saveChanges() if the UseRowVersions setting is set and changed
+    objects could not be saved, because their rows have been updated or
+    deleted by another store since the objects have been read. The changes
+    of the other objects have been saved. You can call objects() to get the
+    stale objects, which are still registered as changed. Pass them to the
+    store's refreshStaleObject() to discard their changes and read them again.
+    """
+
+    def __init__(self, objs):
+        SQLObjectStoreError.__init__(self, 'Stale objects: %s' % ', '.join(
+            '%s.%d' % (obj.klass().name(), obj.serialNum()) for obj in objs))
+        self._objects = objs
+
+    def objects(self):
+        return self._objects
+
+
 class UnknownSerialNumberError(SQLObjectStoreError):
     """For internal use when archiving objects.
 
@@ -74,6 +103,25 @@ class UnknownSerialNumInfo(object):
         return '<%s %s>' % (self.__class__.__name__, s)
 
 
+class LazyFetchGroup(object):
+    """For internal use when faulting in lazily fetched objects.
+
+    All objects of a class that were fetched together by a lazy fetch share
+    one group, so that accessing a missing attribute of one of them faults in
+    the others as well, in batches, rather than one query per object.
+
+    Attrs:
+        klass   - the klass of the fetched objects
+        attrs   - the attrs that were left out of the fetch
+        pending - the serial numbers of the fetched objects in fetch order
+    """
+
+    def __init__(self, klass, attrs):
+        self.klass = klass
+        self.attrs = attrs
+        self.pending = deque()
+
+
 class SQLObjectStore(ObjectStore):
     """The MiddleKit SQL Object Store.
 
@@ -99,7 +147,9 @@ class SQLObjectStore(ObjectStore):
         self._commited = False
         self._sqlEcho = None
         self._sqlCount = 0
+        self._sqlProfiler = None
         self._pool = None  # an optional DBPool
+        self._faultLock = threading.RLock()
 
     def modelWasSet(self):
         """Perform additional set up of the store after the model is set.
@@ -118,17 +168,24 @@ class SQLObjectStore(ObjectStore):
 
         # Cache some settings
         self._markDeletes = self.setting('DeleteBehavior', 'delete') == 'mark'
+        self._rowVersions = self.setting('UseRowVersions', False)
+        self._deletePlanner = DeletePlanner(self)
+        self._valueQuery = ValueQuery(self)
+        self.setUpChangeNotification()
 
-        # Set up SQL echo
+        # Set up SQL echo and profiling
         self.setUpSQLEcho()
+        self.setUpSQLProfiler()
 
         # Set up attrs for caching
+        compiled = self.model().readFromCompiledCache()
         for klass in self.model().allKlassesInOrder():
             klass._getMethods = {}
             klass._setMethods = {}
-            for attr in klass.allDataAttrs():
-                attr._sqlColumnName = None
-                attr._sqlColumnNames = None
+            if not compiled:
+                for attr in klass.allDataAttrs():
+                    attr._sqlColumnName = None
+                    attr._sqlColumnNames = None
 
         # use dbargs from settings file as defaults
         # (args passed to __init__ take precedence)
@@ -140,6 +197,19 @@ class SQLObjectStore(ObjectStore):
         # Connect
         self.connect()
 
+    def compileModel(self):
+        """Compute the SQL column names and statement prefixes.
+
+        These are kept in the compiled model cache.
+        """
+        ObjectStore.compileModel(self)
+        for klass in self.model().allKlassesInOrder():
+            klass.fetchSQLStart()
+            klass.insertSQLStart()
+            for attr in klass.allDataAttrs():
+                if attr.hasSQLColumn():
+                    attr.sqlColumnName()
+
     def setUpSQLEcho(self):
         """Set up the SQL echoing/logging for the store.
 
@@ -164,6 +234,33 @@ class SQLObjectStore(ObjectStore):
                 mode = mode[0]
                 self._sqlEcho = open(filename, mode)
 
+    def setUpSQLProfiler(self):
+        """Set up the SQL profiler for the store.
+
+        The profiler is set up according to the setting 'SQLProfiler'.
+        Invoked by modelWasSet().
+        """
+        setting = self.setting('SQLProfiler', None)
+        if setting:
+            if not isinstance(setting, dict):
+                setting = {}
+            self._sqlProfiler = SQLProfiler(self,
+                slowQueryTime=setting.get('SlowQueryTime'),
+                slowQueryLog=setting.get('SlowQueryLog'),
+                maxStatements=setting.get('MaxStatements', 1000),
+                maxSlowQueries=setting.get('MaxSlowQueries', 100))
+        else:
+            self._sqlProfiler = None
+
+    def setUpChangeNotification(self):
+        """Set up the change notification for the store.
+
+        The notification is set up according to the setting
+        'ChangeNotification'. Invoked by modelWasSet().
+        """
+        settings = self.setting('ChangeNotification', None)
+        self._changeLog = ChangeLog(self, settings) if settings else None
+
 
     ## Connecting to the db ##
 
@@ -185,19 +282,46 @@ class SQLObjectStore(ObjectStore):
             self._connection = self.newConnection()
             self._connected = True
             self.readKlassIds()
+            if self._changeLog is not None:
+                self._changeLog.readLastChangeId()
             poolSize = self.setting('SQLConnectionPoolSize', 0)
             if poolSize:
                 args = self._dbArgs.copy()
                 self.augmentDatabaseArgs(args, pool=True)
                 try:
-                    self._pool = DBPool(self.dbapiModule(), poolSize, **args)
+                    self._pool = self.newConnectionPool(poolSize, args)
                 except TypeError:
                     if 'database' in args:
                         del args['database']
-                        self._pool = DBPool(self.dbapiModule(), poolSize, **args)
+                        self._pool = self.newConnectionPool(poolSize, args)
                     else:
                         raise
 
+    def newConnectionPool(self, poolSize, args):
+        """Return a new DBPool with the given size and database arguments.
+
+        The pool is configured with the SQLConnectionPool setting.
+        One connection is opened right away in order to check the arguments.
+        """
+        settings = self.setting('SQLConnectionPool', None) or {}
+        options = {}
+        for name in ('MinIdle', 'CheckoutTimeout', 'PingInterval',
+                'PingQuery', 'MaxLifetime', 'ThreadAffinity'):
+            if name in settings:
+                options[name[0].lower() + name[1:]] = settings[name]
+        args.update(options)
+        pool = DBPool(self.dbapiModule(), poolSize, **args)
+        pool.connection().close()
+        return pool
+
+    def connectionPoolStats(self):
+        """Return a dictionary with statistics about the connection pool.
+
+        See DBPool.stats() for the keys of the dictionary.
+        Returns None if the store does not use a connection pool.
+        """
+        return self._pool.stats() if self._pool else None
+
     def augmentDatabaseArgs(self, args, pool=False):
         # give subclasses the opportunity to add or change
         # database arguments
@@ -240,19 +364,35 @@ class SQLObjectStore(ObjectStore):
 
     ## Changes ##
 
-    def commitInserts(self, allThreads=False):
+    def endUnitOfWork(self):
+        """End the unit of work of the current thread.
+
+        Also ends the transaction of the thread for the SQL profiler.
+        """
+        if self._sqlProfiler is not None:
+            self._sqlProfiler.endTransaction()
+        return ObjectStore.endUnitOfWork(self)
+
+    def commitInserts(self):
+        newObjects = self.currentUnitOfWork()._newObjects
         unknownSerialNums = []
         # @@ ... sort here for dependency order
-        for obj in self._newObjects.items(allThreads):
+        for obj in newObjects:
             self._insertObject(obj, unknownSerialNums)
         conn = None
         try:
             for unknownInfo in unknownSerialNums:
                 stmt = unknownInfo.updateStmt()
                 conn, cur = self.executeSQL(stmt, conn)
+            if self._changeLog is not None:
+                changes = set((obj.klass().id(), 0)
+                    for obj in newObjects)
+                if changes:
+                    conn, cur = self.connectionAndCursor(conn)
+                    self.logChanges(cur, sorted(changes))
         finally:
             self.doneWithConnection(conn)
-        self._newObjects.clear(allThreads)
+        del newObjects[:]
 
     def _insertObject(self, obj, unknownSerialNums):
         # New objects not in the persistent store have serial numbers less than 1
@@ -278,6 +418,8 @@ class SQLObjectStore(ObjectStore):
             obj.setSerialNum(idNum)
             obj.setKey(ObjectKey().initFromObject(obj))
             obj.setChanged(False)
+            if self._rowVersions:
+                obj._mk_version = 1
 
             # Update our object pool
             self._objects[obj.key()] = obj
@@ -301,27 +443,218 @@ class SQLObjectStore(ObjectStore):
         """
         return cur.lastrowid
 
-    def commitUpdates(self, allThreads=False):
+    def commitUpdates(self):
+        """Commit updates.
+
+        With the UseRowVersions setting, an object is only updated if its
+        row still has the version the object has been read with. Objects
+        whose rows have been updated or deleted by another store in the
+        meantime stay changed, and a StaleObjectError is raised for them
+        after the other objects have been saved.
+        """
+        changedObjects = self.currentUnitOfWork()._changedObjects
+        checkVersions = self._rowVersions
+        saved = []
+        stale = []
         conn = None
         try:
-            for obj in self._changedObjects.values(allThreads):
+            for obj in changedObjects.values():
                 sql = obj.sqlUpdateStmt()
                 conn, cur = self.executeSQL(sql, conn)
+                if (checkVersions and obj._mk_version is not None
+                        and cur.rowcount == 0):
+                    stale.append(obj)
+                    continue
                 obj.setChanged(False)
+                if obj._mk_version is not None:
+                    obj._mk_version += 1
+                saved.append(obj)
+            if saved and self._changeLog is not None:
+                self.logChanges(cur, [(obj.klass().id(), obj.serialNum())
+                    for obj in saved])
         finally:
             self.doneWithConnection(conn)
-        self._changedObjects.clear(allThreads)
-
-    def commitDeletions(self, allThreads=False):
+        changedObjects.clear()
+        if stale:
+            for obj in stale:
+                changedObjects[obj] = obj
+            raise StaleObjectError(stale)
+
+    def refreshStaleObject(self, obj):
+        """Discard the unsaved changes of an object and read it again.
+
+        Use this for the objects of a StaleObjectError, then apply your
+        changes again. Returns the object, or None if it has been deleted
+        in the meantime, in which case it is removed from memory.
+        """
+        self.currentUnitOfWork()._changedObjects.pop(obj, None)
+        obj.setChanged(False)
+        obj._mk_changedAttrs = None
+        refreshed = self.fetchObject(obj.klass(), obj.serialNum(), None)
+        if refreshed is None:
+            self.invalidateObject(obj)
+        return refreshed
+
+    def commitDeletions(self):
+        """Commit deletions.
+
+        The deleted objects are deleted in batches per class, together with
+        the rows of the delete plans that have not been in memory. The SQL
+        statements are created by the DeletePlanner of the store.
+        """
+        uow = self.currentUnitOfWork()
+        deletedObjects = uow._deletedObjects
+        deletePlans = uow._deletePlans
+        stmts, changes = self._deletePlanner.deleteStmts(
+            deletedObjects, deletePlans)
         conn = None
         try:
-            for obj in self._deletedObjects.items(allThreads):
-                sql = obj.sqlDeleteStmt()
+            for sql in stmts:
                 conn, cur = self.executeSQL(sql, conn)
                 conn.commit()
+            if changes and self._changeLog is not None:
+                conn, cur = self.connectionAndCursor(conn)
+                self.logChanges(cur, changes)
+                conn.commit()
         finally:
             self.doneWithConnection(conn)
-        self._deletedObjects.clear(allThreads)
+        del deletedObjects[:]
+        del deletePlans[:]
+
+
+    ## Change notification ##
+
+    def logChanges(self, cur, changes):
+        """Insert the given changes into the change log.
+
+        changes is a list of (class id, serial number) pairs, where a serial
+        number of 0 stands for new objects of the class. Invoked with the
+        cursor used for saving the changes if the ChangeNotification setting
+        is set. See ChangeLog for the details.
+        """
+        self._changeLog.logChanges(cur, changes)
+
+    def pollChanges(self):
+        """Invalidate the objects that have been changed by other stores.
+
+        Reads the changes that other stores have logged since the last poll,
+        removes the changed objects from memory unless they have unsaved
+        changes, and removes cached query results depending on changed
+        classes. See ChangeLog for the details.
+
+        This is invoked automatically by the fetch methods every PollInterval
+        seconds if the ChangeNotification setting is set. Applications can
+        also invoke it at the start of every request or transaction.
+        Returns the number of changes that have been read.
+        """
+        if self._changeLog is None:
+            return 0
+        return self._changeLog.pollChanges()
+
+    def pollChangesIfDue(self):
+        """Invoke pollChanges() if PollInterval seconds have passed.
+
+        Invoked by the fetch methods.
+        """
+        if self._changeLog is not None:
+            self._changeLog.pollIfDue()
+
+    def hasPendingChanges(self):
+        """Return whether other stores may have logged changes.
+
+        Invoked by pollChanges() before reading the change log. The default
+        implementation always returns True. Subclasses can override this if
+        the database can notify the store of changes.
+        """
+        return True
+
+
+    ## Deleting ##
+
+    def planDelete(self, objs):
+        """Return a DeletePlan for deleting the given objects.
+
+        The plan is computed with set-based queries by the DeletePlanner
+        of the store, see there.
+        """
+        return self._deletePlanner.planDelete(objs)
+
+
+    ## Bulk loading ##
+
+    def bulkLoad(self, filenames, batchSize=None, progress=None):
+        """Load the given sample or dump files directly into the database.
+
+        This is much faster than creating and saving objects or running
+        the InsertSamples.sql script. See BulkLoader for the details.
+        Nothing is loaded if an error occurs. Returns the statistics
+        as given by BulkLoader.stats().
+        """
+        if isinstance(filenames, basestring):
+            filenames = [filenames]
+        loader = BulkLoader(self, batchSize, progress)
+        try:
+            for filename in filenames:
+                loader.loadFile(filename)
+        except Exception:
+            loader.abort()
+            raise
+        return loader.finish()
+
+    def sqlParamMarker(self):
+        """Return the parameter marker for the paramstyle of the DB API module."""
+        return '?' if self.dbapiModule().paramstyle == 'qmark' else '%s'
+
+    def maxSerialNum(self, cur, klass):
+        """Return the highest serial number in the table of the class."""
+        sql = 'select max(%s) from %s' % (
+            klass.sqlSerialColumnName(), klass.sqlTableName())
+        self.echoSQL(sql)
+        cur.execute(sql)
+        return cur.fetchone()[0] or 0
+
+    def bulkInsertRows(self, cur, klass, colNames, rows):
+        """Insert the rows into the table of the class.
+
+        Invoked by the BulkLoader with the rows of a batch as lists of column
+        values. The first column is always the serial number column.
+        The default implementation uses executemany(). Subclasses should
+        override this if the database provides a faster way.
+        """
+        marker = self.sqlParamMarker()
+        sql = 'insert into %s (%s) values (%s)' % (klass.sqlTableName(),
+            ','.join(colNames), ','.join([marker] * len(colNames)))
+        self.echoSQL('%s /* %d rows */' % (sql, len(rows)))
+        cur.executemany(sql, rows)
+
+    def bulkUpdateRows(self, cur, klass, colNames, rows):
+        """Update columns of rows in the table of the class.
+
+        Invoked by the BulkLoader to set obj refs. The rows are lists of
+        values for the given columns followed by the serial number.
+        """
+        marker = self.sqlParamMarker()
+        sql = 'update %s set %s where %s=%s' % (klass.sqlTableName(),
+            ','.join('%s=%s' % (colName, marker) for colName in colNames),
+            klass.sqlSerialColumnName(), marker)
+        self.echoSQL('%s /* %d rows */' % (sql, len(rows)))
+        cur.executemany(sql, rows)
+
+    def didBulkLoadKlass(self, cur, klass):
+        """Invoked by the BulkLoader after rows of the class have been loaded.
+
+        Subclasses can override this to adjust sequences or statistics.
+        """
+        pass
+
+    def didBulkLoad(self, cur, klasses):
+        """Invoked by the BulkLoader before the load is committed.
+
+        Logs the loaded classes if the ChangeNotification setting is set,
+        so that other stores discard their cached query results.
+        """
+        if klasses and self._changeLog is not None:
+            self.logChanges(cur, [(klass.id(), 0) for klass in klasses])
 
 
     ## Fetching ##
@@ -348,7 +681,9 @@ class SQLObjectStore(ObjectStore):
             return objects[0]
 
     def fetchObjectsOfClass(self, aClass,
-            clauses='', isDeep=True, refreshAttrs=True, serialNum=None, clausesArgs=None):
+            clauses='', isDeep=True, refreshAttrs=True, serialNum=None,
+            clausesArgs=None, lazy=False, attrs=None, limit=None, offset=None,
+            cache=False):
         """Fetch a list of objects of a specific class.
 
         The list may be empty if no objects are found.
@@ -363,6 +698,25 @@ class SQLObjectStore(ObjectStore):
         serialNum can be a specific serial number if you are looking for
         a specific object. If serialNum is provided, it overrides the clauses.
 
+        If lazy is true, only the serial numbers of the objects are fetched.
+        The objects are "hollow" and their attributes are faulted in from the
+        database when first accessed, in batches of LazyFetchBatchSize objects.
+        You can pass a list of attribute names in attrs to have these fetched
+        right away (this implies lazy). Objects that are already in memory are
+        never refreshed by a lazy fetch.
+
+        limit and offset restrict the number of objects returned. Since each
+        class has its own SQL table, they can only be used for classes without
+        subclasses or with isDeep=False. See also fetchPageOfClass().
+
+        If cache is true, the serial numbers of the fetched objects are kept
+        in the query cache, and the same query with the same arguments returns
+        the same objects without querying the database again, until objects
+        of the class (or its subclasses, if isDeep) are saved by the store.
+        Objects that are already in memory are not refreshed in this case,
+        and the others are returned as hollow objects. See the QueryCache
+        setting for limiting the size and time to live of the results.
+
         You should label all arguments other than aClass:
             objs = store.fetchObjectsOfClass('Foo', clauses='where x<5')
         The reason for labeling is that this method is likely to undergo
@@ -372,6 +726,16 @@ class SQLObjectStore(ObjectStore):
         Raises an exception if aClass parameter is invalid.
         """
         klass = self._klassForClass(aClass)
+        if attrs is not None:
+            lazy = True
+        if isDeep and (limit is not None or offset is not None):
+            self.checkNoSubklassesForLimit(klass)
+        self.pollChangesIfDue()
+
+        if cache:
+            return self.fetchCachedObjectsOfClass(klass,
+                clauses, isDeep, refreshAttrs, serialNum,
+                clausesArgs, lazy, attrs, limit, offset)
 
         # Fetch objects of subclasses first, because the code below
         # will be  modifying clauses and serialNum
@@ -379,48 +743,404 @@ class SQLObjectStore(ObjectStore):
         if isDeep:
             for subklass in klass.subklasses():
                 deepObjs.extend(self.fetchObjectsOfClass(
-                    subklass, clauses, isDeep, refreshAttrs, serialNum, clausesArgs))
+                    subklass, clauses, isDeep, refreshAttrs, serialNum,
+                    clausesArgs, lazy, attrs))
 
         # Now get objects of this exact class
         objs = []
         if not klass.isAbstract():
-            fetchSQLStart = klass.fetchSQLStart()
-            className = klass.name()
-            if serialNum is not None:
-                serialNum = int(serialNum)  # make sure it's a valid int
-                clauses = 'where %s=%d' % (klass.sqlSerialColumnName(), serialNum)
-            if self._markDeletes:
-                clauses = self.addDeletedToClauses(clauses)
-            conn, cur = self.executeSQL(fetchSQLStart + clauses + ';', clausesArgs=clausesArgs)
+            sql, fetchAttrs, group = self.fetchSQLForKlass(klass,
+                clauses, serialNum, lazy, attrs, limit, offset)
+            conn, cur = self.executeSQL(sql, clausesArgs=clausesArgs)
             try:
+                objectForRow = self.objectForRow
                 for row in cur.fetchall():
-                    serialNum = row[0]
-                    key = ObjectKey().initFromClassNameAndSerialNum(className, serialNum)
-                    obj = self._objects.get(key)
-                    if obj is None:
-                        pyClass = klass.pyClass()
-                        obj = pyClass()
-                        assert isinstance(obj, MiddleObject), (
-                            'Not a MiddleObject. obj = %r, type = %r, MiddleObject = %r'
-                                % (obj, type(obj), MiddleObject))
-                        obj.readStoreData(self, row)
-                        obj.setKey(key)
-                        self._objects[key] = obj
-                    else:
-                        # Existing object
-                        if refreshAttrs:
-                            obj.readStoreData(self, row)
-                    objs.append(obj)
+                    objs.append(objectForRow(klass, row,
+                        refreshAttrs, fetchAttrs, group))
             finally:
                 self.doneWithConnection(conn)
         objs.extend(deepObjs)
         return objs
 
+    def fetchCachedObjectsOfClass(self, klass, clauses, isDeep, refreshAttrs,
+            serialNum, clausesArgs, lazy, attrs, limit, offset):
+        """Fetch a list of objects using the query cache.
+
+        Invoked by fetchObjectsOfClass() if cache is true.
+        """
+        key = self.queryCacheKey(klass, clauses, isDeep, serialNum,
+            clausesArgs, lazy, attrs, limit, offset)
+        queryCache = self._queryCache
+        if key is not None:
+            result = queryCache.get(key)
+            if result is not None:
+                return self.objectsForQueryResult(result)
+            generation = queryCache.generation()
+        objs = self.fetchObjectsOfClass(klass, clauses, isDeep, refreshAttrs,
+            serialNum, clausesArgs, lazy, attrs, limit, offset)
+        if key is not None:
+            classNames = set([klass.name()])
+            if isDeep:
+                classNames.update(k.name() for k in klass.descendants())
+            queryCache.put(key, [(obj.klass(), obj.serialNum())
+                for obj in objs], classNames, generation)
+        return objs
+
+    def queryCacheKey(self, klass, clauses, isDeep, serialNum,
+            clausesArgs, lazy, attrs, limit, offset):
+        """Return the key of a query for the query cache.
+
+        Returns None if the query cannot be cached because
+        the clausesArgs are not hashable.
+        """
+        if isinstance(clausesArgs, dict):
+            clausesArgs = tuple(sorted(clausesArgs.items()))
+        elif isinstance(clausesArgs, list):
+            clausesArgs = tuple(clausesArgs)
+        if attrs is not None:
+            attrs = tuple(attr if isinstance(attr, basestring) else attr.name()
+                for attr in attrs)
+        key = (klass.name(), clauses, isDeep, serialNum,
+            clausesArgs, lazy, attrs, limit, offset)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def objectsForQueryResult(self, result):
+        """Return the objects for a result from the query cache.
+
+        The result is a sequence of (klass, serialNum) pairs. Objects that
+        are not in memory any more are created as hollow objects.
+        """
+        objs = []
+        groups = {}
+        objectForRow = self.objectForRow
+        for klass, serialNum in result:
+            fetchAttrsAndGroup = groups.get(klass)
+            if fetchAttrsAndGroup is None:
+                fetchAttrsAndGroup = groups[klass] = self.lazyFetchAttrsAndGroup(klass)
+            fetchAttrs, group = fetchAttrsAndGroup
+            objs.append(objectForRow(klass, (serialNum,),
+                False, fetchAttrs, group))
+        return objs
+
+    def iterObjectsOfClass(self, aClass,
+            clauses='', isDeep=True, refreshAttrs=True, clausesArgs=None,
+            lazy=False, attrs=None, limit=None, offset=None,
+            batchSize=1000, register=True):
+        """Iterate over the objects of a specific class.
+
+        Works like fetchObjectsOfClass(), but returns an iterator that
+        creates the objects while reading the rows from the database in
+        batches of batchSize, instead of reading all of them at once.
+        If the database module supports this, a server side cursor is used.
+        See newStreamingCursor().
+
+        If register is false, objects that are not yet in memory are not added
+        to the store's object cache, so they can be garbage collected right
+        after use, even with the CacheObjectsForever setting. Don't change
+        such objects, and note that fetching them again creates new instances.
+
+        A database connection is held until the iterator is exhausted or
+        closed, so don't keep partially consumed iterators around.
+        """
+        klass = self._klassForClass(aClass)
+        if attrs is not None:
+            lazy = True
+        if isDeep and (limit is not None or offset is not None):
+            self.checkNoSubklassesForLimit(klass)
+        self.pollChangesIfDue()
+        if not klass.isAbstract():
+            sql, fetchAttrs, group = self.fetchSQLForKlass(klass,
+                clauses, None, lazy, attrs, limit, offset)
+            conn, cur = self.executeSQL(sql,
+                clausesArgs=clausesArgs, streaming=True)
+            try:
+                cur.arraysize = batchSize
+                objectForRow = self.objectForRow
+                while True:
+                    rows = cur.fetchmany(batchSize)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield objectForRow(klass, row,
+                            refreshAttrs, fetchAttrs, group, register)
+            finally:
+                cur.close()
+                self.doneWithConnection(conn)
+        if isDeep:
+            for subklass in klass.subklasses():
+                for obj in self.iterObjectsOfClass(subklass,
+                        clauses, isDeep, refreshAttrs, clausesArgs,
+                        lazy, attrs, None, None, batchSize, register):
+                    yield obj
+
+    def fetchPageOfClass(self, aClass, afterSerialNum=0, pageSize=100,
+            where=None, clausesArgs=None, orderBy=None, descending=False,
+            **kwargs):
+        """Fetch a page of objects of a specific class by keyset pagination.
+
+        Returns up to pageSize objects of exactly the given class (subclasses
+        are not included) with serial numbers greater than afterSerialNum,
+        ordered by serial number. The where argument can hold an additional
+        SQL condition (without the 'where'). To get the next page, pass the
+        serial number of the last object returned as afterSerialNum.
+
+        If orderBy is the name of an attribute with one SQL column, the objects
+        are ordered by its values, descending if descending is true, followed
+        by the objects without a value, and by serial number for equal values.
+        The page then starts after the object afterSerialNum in this order,
+        whose value is looked up by the query itself.
+
+        Unlike using an offset, this is efficient even for pages deep into
+        large tables, because the database can use the primary key index
+        (and an index on the orderBy column, if there is one).
+        Additional keyword arguments are passed to fetchObjectsOfClass().
+        """
+        klass = self._klassForClass(aClass)
+        serialName = klass.sqlSerialColumnName()
+        afterSerialNum = int(afterSerialNum)
+        if orderBy in (None, 'serialNum', serialName):
+            if descending:
+                conditions = ['%s<%d' % (serialName, afterSerialNum)
+                    ] if afterSerialNum else []
+                orderBy = '%s desc' % serialName
+            else:
+                conditions = ['%s>%d' % (serialName, afterSerialNum)]
+                orderBy = serialName
+        else:
+            colName = self.sortColumnName(klass, orderBy)
+            conditions = []
+            if afterSerialNum:
+                value = '(select %s from %s where %s=%d)' % (colName,
+                    klass.sqlTableName(), serialName, afterSerialNum)
+                conditions.append('(%(col)s%(op)s%(value)s'
+                    ' or (%(col)s=%(value)s and %(serial)s>%(after)d)'
+                    ' or (%(col)s is null and (%(value)s is not null'
+                    ' or %(serial)s>%(after)d)))' % dict(col=colName,
+                        op='<' if descending else '>', value=value,
+                        serial=serialName, after=afterSerialNum))
+            orderBy = 'case when %s is null then 1 else 0 end, %s%s, %s' % (
+                colName, colName, ' desc' if descending else '', serialName)
+        if where:
+            conditions.append('(%s)' % where)
+        clauses = ' and '.join(conditions)
+        if clauses:
+            clauses = 'where ' + clauses
+        clauses += ' order by %s' % orderBy
+        return self.fetchObjectsOfClass(klass, clauses=clauses,
+            clausesArgs=clausesArgs, isDeep=False, limit=pageSize, **kwargs)
+
+    def sortColumnName(self, klass, name):
+        """Return the SQL column for ordering by the attribute with the name.
+
+        Raises a ValueError if the attribute does not have exactly one column.
+        """
+        attr = klass.lookupAttr(name, None)
+        if attr is None or not attr.hasSQLColumn():
+            raise ValueError('Class %s has no attribute %s with an SQL column.'
+                % (klass.name(), name))
+        colName = attr.sqlColumnName()
+        if ',' in colName:
+            raise ValueError('Cannot order by attribute %s of class %s'
+                ' which has several SQL columns.' % (name, klass.name()))
+        return colName
+
+    def checkNoSubklassesForLimit(self, klass):
+        """Raise a ValueError if a limit cannot be applied to a deep fetch."""
+        if klass.subklasses():
+            raise ValueError('Cannot use limit or offset for a deep fetch'
+                ' of class %s which has subclasses.' % klass.name())
+
+    def fetchSQLForKlass(self, klass, clauses='', serialNum=None,
+            lazy=False, attrs=None, limit=None, offset=None):
+        """Return the fetch SQL for objects of exactly the given klass.
+
+        Returns a tuple of (sql, fetchAttrs, group) where fetchAttrs and
+        group are None for regular fetches and as returned by
+        lazyFetchAttrsAndGroup() for lazy fetches.
+        Invoked by fetchObjectsOfClass() and iterObjectsOfClass().
+        """
+        if lazy:
+            fetchAttrs, group = self.lazyFetchAttrsAndGroup(klass, attrs)
+            fetchSQLStart = klass.fetchSQLStartForAttrs(fetchAttrs)
+        else:
+            fetchAttrs = group = None
+            fetchSQLStart = klass.fetchSQLStart()
+        if serialNum is not None:
+            serialNum = int(serialNum)  # make sure it's a valid int
+            clauses = 'where %s=%d' % (klass.sqlSerialColumnName(), serialNum)
+        if self._markDeletes:
+            clauses = self.addDeletedToClauses(clauses)
+        if limit is not None or offset is not None:
+            clauses = '%s %s' % (clauses, self.sqlLimitClause(limit, offset))
+        return fetchSQLStart + clauses + ';', fetchAttrs, group
+
+    def objectForRow(self, klass, row, refreshAttrs=True,
+            fetchAttrs=None, group=None, register=True):
+        """Return the object for a fetched row of the given klass.
+
+        Objects already in memory are reused (and refreshed if refreshAttrs
+        is true), others are created and registered with the store unless
+        register is false. fetchAttrs and group are given for lazy fetches.
+        """
+        serialNum = row[0]
+        key = ObjectKey().initFromClassNameAndSerialNum(klass.name(), serialNum)
+        if self._rowVersions and fetchAttrs is None:
+            # the row version is the last column of regular fetches
+            version, row = row[-1], row[:-1]
+        obj = self._objects.get(key)
+        if obj is None:
+            pyClass = klass.pyClass()
+            obj = pyClass()
+            assert isinstance(obj, MiddleObject), (
+                'Not a MiddleObject. obj = %r, type = %r, MiddleObject = %r'
+                    % (obj, type(obj), MiddleObject))
+            if fetchAttrs is None:
+                obj.readStoreData(self, row)
+                if self._rowVersions:
+                    obj._mk_version = version
+            else:
+                obj.readHollowStoreData(self, row, fetchAttrs, group)
+                if group and register:
+                    group.pending.append(serialNum)
+            obj.setKey(key)
+            if register:
+                self._objects[key] = obj
+        elif refreshAttrs and fetchAttrs is None:
+            # Existing object
+            obj.readStoreData(self, row)
+            if self._rowVersions:
+                obj._mk_version = version
+        return obj
+
+    def lazyFetchAttrsAndGroup(self, klass, attrs=None):
+        """Return the attrs to fetch up front and a LazyFetchGroup for the others.
+
+        attrs is a list of attribute names (or attributes) of the klass.
+        The group is None if no attributes are left to be faulted in.
+        Invoked by fetchSQLForKlass() for lazy fetches.
+        """
+        fetchAttrs = []
+        if attrs:
+            for attr in attrs:
+                if isinstance(attr, basestring):
+                    attr = klass.lookupAttr(attr)
+                if not attr.hasSQLColumn():
+                    raise ValueError('Cannot fetch attribute %s of class %s'
+                        ' since it has no SQL column.' % (attr.name(), klass.name()))
+                fetchAttrs.append(attr)
+        fetchNames = set(attr.name() for attr in fetchAttrs)
+        faultAttrs = [attr for attr in klass.allDataAttrs()
+            if attr.hasSQLColumn() and attr.name() not in fetchNames]
+        group = LazyFetchGroup(klass, faultAttrs) if faultAttrs else None
+        return fetchAttrs, group
+
+    def faultInObject(self, obj):
+        """Fetch the attributes that were left out of a hollow object.
+
+        Invoked by MiddleObject when an attribute of a hollow object, as
+        created by a lazy fetch, is first accessed. The other hollow objects
+        of the same fetch are faulted in along with obj using the same query,
+        up to a total of LazyFetchBatchSize objects.
+        Raises UnknownObjectError if obj has vanished from the database.
+        Objects that have vanished are removed from memory.
+        """
+        with self._faultLock:
+            if not obj._mk_isHollow:
+                return  # faulted in by another thread in the meantime
+            group = obj._mk_lazyGroup
+            klass = group.klass
+            className = klass.name()
+            batch = {obj.serialNum(): obj}
+            batchSize = self.setting('LazyFetchBatchSize', 100)
+            pending = group.pending
+            while pending and len(batch) < batchSize:
+                serialNum = pending.popleft()
+                if serialNum in batch:
+                    continue
+                key = ObjectKey().initFromClassNameAndSerialNum(className, serialNum)
+                other = self._objects.get(key)
+                if (other is not None and other._mk_isHollow
+                        and other._mk_lazyGroup is group):
+                    batch[serialNum] = other
+            clauses = 'where %s in (%s)' % (klass.sqlSerialColumnName(),
+                ','.join(str(serialNum) for serialNum in sorted(batch)))
+            conn, cur = self.executeSQL(klass.fetchSQLStartForAttrs(
+                group.attrs, self._rowVersions) + clauses + ';')
+            try:
+                for row in cur.fetchall():
+                    other = batch.pop(row[0])
+                    if self._rowVersions:
+                        other._mk_version, row = row[-1], row[:-1]
+                    other.readFaultedStoreData(self, row, group.attrs)
+            finally:
+                self.doneWithConnection(conn)
+            for other in batch.itervalues():
+                self.invalidateObject(other)
+            if obj._mk_isHollow:
+                raise UnknownObjectError('Cannot fault in %s.%d since it'
+                    ' is not in the database.' % (className, obj.serialNum()))
+
     def refreshObject(self, obj):
         assert obj.store() is self
         return self.fetchObject(obj.klass(), obj.serialNum())
 
 
+    ## Projections and aggregates ##
+
+    def fetchValuesOfClass(self, aClass, attrs, clauses='', isDeep=True,
+            clausesArgs=None, distinct=False, columns=False, arrays=False):
+        """Fetch values of attributes without creating objects.
+
+        attrs is a list of attribute names. The name of the serial number
+        column (or 'serialNum') can be used for the serial numbers.
+        Returns a list of tuples with one value per attribute, in the form
+        returned by the DB API module. Obj refs are returned as 64 bit
+        obj ref values which can be passed to fetchObjRef().
+
+        aClass, clauses, isDeep and clausesArgs work as with
+        fetchObjectsOfClass(). With isDeep, the rows of each class are
+        fetched separately, so the clauses can contain an order by clause.
+        If distinct is true, duplicate rows of the same class are dropped.
+
+        If columns is true, a list with one list of values per attribute is
+        returned instead. If arrays is true, the values of numeric attributes
+        are returned as NumPy arrays (with NaN for None) in such a list.
+        """
+        return self._valueQuery.fetchValues(self._klassForClass(aClass),
+            attrs, clauses, isDeep, clausesArgs, distinct, columns, arrays)
+
+    def fetchAggregateOfClass(self, aClass, aggregates, groupBy=None,
+            clauses='', isDeep=True, clausesArgs=None,
+            columns=False, arrays=False):
+        """Compute aggregates over the objects of a class.
+
+        aggregates is a list of expressions like 'count', 'count(*)',
+        'count(attr)', 'sum(attr)', 'avg(attr)', 'min(attr)' or 'max(attr)'
+        using attribute names. Obj refs can only be counted.
+        Without groupBy, a tuple with the aggregate values is returned, or the
+        single value if aggregates is a string. groupBy is a list of attribute
+        names; then a list of tuples of the group values followed by the
+        aggregate values is returned, ordered by the group values.
+        The columns and arrays arguments work as with fetchValuesOfClass().
+
+        The clauses can only contain a where clause. If isDeep is true and
+        there are several concrete classes, the aggregates are computed over
+        the union of the rows of all their tables in one query.
+        """
+        return self._valueQuery.fetchAggregate(self._klassForClass(aClass),
+            aggregates, groupBy, clauses, isDeep, clausesArgs, columns, arrays)
+
+    def countObjectsOfClass(self, aClass, clauses='', isDeep=True,
+            clausesArgs=None):
+        """Return the number of objects of a class, without fetching them."""
+        return self.fetchAggregateOfClass(aClass, 'count',
+            clauses=clauses, isDeep=isDeep, clausesArgs=clausesArgs)
+
+
     ## Klasses ##
 
     def klassForId(self, id):
@@ -429,7 +1149,8 @@ class SQLObjectStore(ObjectStore):
 
     ## Self utility for SQL, connections, cursors, etc. ##
 
-    def executeSQL(self, sql, connection=None, commit=False, clausesArgs=None):
+    def executeSQL(self, sql, connection=None, commit=False,
+            clausesArgs=None, streaming=False):
         """Execute the given SQL.
 
         This will connect to the database for the first time if necessary.
@@ -437,6 +1158,7 @@ class SQLObjectStore(ObjectStore):
         Returns the connection and cursor used and relies on connectionAndCursor()
         to obtain these. Note that you can pass in a connection to force a
         particular one to be used and a flag to commit immediately.
+        If streaming is true, a cursor for reading large results is used.
         """
         sql = str(sql)  # Excel-based models yield Unicode strings which some db modules don't like
         sql = sql.strip()
@@ -444,16 +1166,36 @@ class SQLObjectStore(ObjectStore):
             import gc
             assert gc.isenabled()
             gc.collect()
+        stats = self.echoSQL(sql)
+        if stats is None:
+            conn, cur = self.connectionAndCursor(connection, streaming)
+            self._executeSQL(cur, sql, clausesArgs)
+        else:
+            start = time()
+            conn, cur = self.connectionAndCursor(connection, streaming)
+            connected = time()
+            self._executeSQL(cur, sql, clausesArgs)
+            cur = self._sqlProfiler.executed(stats, sql,
+                connected - start, time() - connected, cur)
+        if commit:
+            conn.commit()
+        return conn, cur
+
+    def echoSQL(self, sql):
+        """Count the given SQL and log it to self._sqlEcho, if it is not None.
+
+        Invoked by executeSQL(). Methods that execute SQL directly on
+        a cursor should invoke this as well. If the store has an SQL profiler,
+        the statement is registered with it and its StatementStats are
+        returned, otherwise None.
+        """
         self._sqlCount += 1
         if self._sqlEcho:
             timestamp = funcs.timestamp()['pretty']
             self._sqlEcho.write('SQL %04i. %s %s\n' % (self._sqlCount, timestamp, sql))
             self._sqlEcho.flush()
-        conn, cur = self.connectionAndCursor(connection)
-        self._executeSQL(cur, sql, clausesArgs)
-        if commit:
-            conn.commit()
-        return conn, cur
+        if self._sqlProfiler is not None:
+            return self._sqlProfiler.statement(sql)
 
     def _executeSQL(self, cur, sql, clausesArgs=None):
         """Invoke execute on the cursor with the given SQL.
@@ -509,12 +1251,44 @@ class SQLObjectStore(ObjectStore):
         """
         self._sqlEcho = file
 
-    def connectionAndCursor(self, connection=None):
+    def sqlCount(self):
+        """Return the number of SQL statements executed by the store.
+
+        This counts the statements of all threads. Use queryBudget() for
+        counting the statements of the current thread only.
+        """
+        return self._sqlCount
+
+    def sqlProfiler(self):
+        """Return the SQL profiler of the store or None.
+
+        See the SQLProfiler setting and the SQLProfiler class.
+        """
+        return self._sqlProfiler
+
+    def setSQLProfiler(self, profiler):
+        """Set the SQL profiler of the store. None turns profiling off."""
+        self._sqlProfiler = profiler
+
+    def queryBudget(self, maxStatements, maxPerShape=None):
+        """Return a context manager asserting a query budget for its block.
+
+        Raises QueryBudgetExceeded if the current thread executes more than
+        maxStatements SQL statements, or more than maxPerShape statements of
+        the same shape, in the block. Sets up an SQL profiler if the store
+        does not have one yet. See SQLProfiler.budget().
+        """
+        if self._sqlProfiler is None:
+            self._sqlProfiler = SQLProfiler(self)
+        return self._sqlProfiler.budget(maxStatements, maxPerShape)
+
+    def connectionAndCursor(self, connection=None, streaming=False):
         """Return the connection and cursor needed for executing SQL.
 
         Takes into account factors such as setting('Threaded') and the
         threadsafety level of the DB API module. You can pass in a connection to
         force a particular one to be used. Uses newConnection() and connect().
+        If streaming is true, the cursor is created by newStreamingCursor().
         """
         if aggressiveGC:
             import gc
@@ -536,9 +1310,21 @@ class SQLObjectStore(ObjectStore):
             if not self._connected:
                 self.connect()
             conn = self._connection
-        cursor = conn.cursor()
+        if streaming:
+            cursor = self.newStreamingCursor(conn)
+        else:
+            cursor = conn.cursor()
         return conn, cursor
 
+    def newStreamingCursor(self, conn):
+        """Return a cursor for reading large results in batches.
+
+        Used by iterObjectsOfClass(). Subclasses should override this to
+        return a server side cursor if the DB API module supports that.
+        The default implementation returns an ordinary cursor.
+        """
+        return conn.cursor()
+
     def threadSafety(self):
         """Return the threadsafety of the DB API module."""
         return self.dbapiModule().threadsafety
@@ -555,6 +1341,20 @@ class SQLObjectStore(ObjectStore):
         """
         raise AbstractError(self.__class__)
 
+    def sqlLimitClause(self, limit=None, offset=None):
+        """Return the SQL clause for limiting the number of fetched rows.
+
+        The clause is appended to the other clauses of a select statement.
+        Subclasses should override this if their database does not support
+        the standard LIMIT and OFFSET clauses in this form.
+        """
+        clause = []
+        if limit is not None:
+            clause.append('limit %d' % limit)
+        if offset:
+            clause.append('offset %d' % offset)
+        return ' '.join(clause)
+
     def addDeletedToClauses(self, clauses):
         """Modify the given set of clauses so that it filters out records with non-NULL deleted field."""
         clauses = clauses.strip()
@@ -591,6 +1391,7 @@ class SQLObjectStore(ObjectStore):
                 return self.objRefZeroSerialNum(objRef)
 
             klass = self.klassForId(klassId)
+            self.pollChangesIfDue()
 
             # Check if we already have this in memory first
             key = ObjectKey()
@@ -729,8 +1530,7 @@ class SQLObjectStore(ObjectStore):
             out.write(CSVJoiner.joinCSVFields(colNames) + "\n")
 
             # write out a line for each object in this class
-            objlist = self.fetchObjectsOfClass(klass.name(), isDeep=False)
-            for obj in objlist:
+            for obj in self.iterObjectsOfClass(klass.name(), isDeep=False):
                 fields = []
                 fields.append(str(obj.serialNum()))
                 for attr in attrs:
@@ -825,9 +1625,19 @@ class MiddleObjectMixIn(object):
         res = []
         for attr in self._mk_changedAttrs.values():
             res.append(attr.sqlUpdateExpr(self.valueForAttr(attr)))
+        where = [klass.sqlSerialColumnName(), '=', str(self.serialNum())]
+        if self.store().setting('UseRowVersions', False):
+            # increment the row version and check it, if known
+            colName = klass.sqlRowVersionColumnName()
+            version = self._mk_version
+            if version is None:
+                res.append('%s=%s+1' % (colName, colName))
+            else:
+                res.append('%s=%d' % (colName, version + 1))
+                where.extend((' and ', colName, '=', str(version)))
         res = ','.join(res)
-        res = ('update ', klass.sqlTableName(), ' set ', res, ' where ',
-            klass.sqlSerialColumnName(), '=', str(self.serialNum()))
+        res = ['update ', klass.sqlTableName(), ' set ', res, ' where ']
+        res.extend(where)
         return ''.join(res)
 
     def sqlDeleteStmt(self):
@@ -887,9 +1697,24 @@ class Klass(object):
             attrs = [attr for attr in attrs if attr.hasSQLColumn()]
             colNames = [self.sqlSerialColumnName()]
             colNames.extend([attr.sqlColumnName() for attr in attrs])
+            if self.klasses().model().setting('UseRowVersions', False):
+                colNames.append(self.sqlRowVersionColumnName())
             self._fetchSQLStart = 'select %s from %s ' % (','.join(colNames), self.sqlTableName())
         return self._fetchSQLStart
 
+    def fetchSQLStartForAttrs(self, attrs, rowVersion=False):
+        """Return the start of a select statement for the given attrs only.
+
+        The first column selected is always the serial number. If rowVersion
+        is true, the row version is selected as the last column.
+        Used for lazy fetches and for faulting in hollow objects.
+        """
+        colNames = [self.sqlSerialColumnName()]
+        colNames.extend([attr.sqlColumnName() for attr in attrs])
+        if rowVersion:
+            colNames.append(self.sqlRowVersionColumnName())
+        return 'select %s from %s ' % (','.join(colNames), self.sqlTableName())
+
     def insertSQLStart(self, includeSerialColumn=False):
         """Return a tuple of insertSQLStart (a string) and sqlAttrs (a list)."""
         if self._insertSQLStart is None:
@@ -971,6 +1796,48 @@ class Attr(object):
         obj.setValueForAttr(self, value)
         return i + 1
 
+    def rowReader(self, pyClass):
+        """Return a function for reading the attr out of a row.
+
+        The function works like readStoreDataRow(), but the set method of
+        the given Python class is looked up only once. Row readers are used
+        for the row loaders of MiddleObject.readStoreData().
+        """
+        setter = getattr(pyClass, self.pySetName())
+        def readRow(obj, row, i):
+            setter(obj, row[i])
+            return i + 1
+        return readRow
+
+    def bulkColumnNames(self):
+        """Return the list of SQL column names used by the BulkLoader."""
+        return self.sqlColumnName().split(',')
+
+    def bulkValuesForSampleInput(self, input):
+        """Return the column values for sample input as a tuple.
+
+        Used by the BulkLoader, which reads sample input like the SQL
+        generators do for the InsertSamples.sql script. Users of Attr should
+        invoke this method, but subclasses and mixins should implement
+        bulkValueForNonNoneSampleInput() instead.
+        """
+        if isinstance(input, basestring):
+            input = input.strip()
+        input = input or self.get('Default')
+        if input in (None, '', 'None', 'none'):
+            return self.bulkValuesForNone()
+        else:
+            return self.bulkValuesForNonNoneSampleInput(input)
+
+    def bulkValuesForNone(self):
+        return (None,)
+
+    def bulkValuesForNonNoneSampleInput(self, input):
+        return (self.bulkValueForNonNoneSampleInput(input),)
+
+    def bulkValueForNonNoneSampleInput(self, input):
+        return input
+
 
 class BasicTypeAttr(object):
     pass
@@ -983,24 +1850,77 @@ class IntAttr(object):
         # it's important to use str() since an int might point
         # to a long (whose repr() would be suffixed with an 'L')
 
+    def bulkValueForNonNoneSampleInput(self, input):
+        if isinstance(input, basestring) and input.endswith('.0'):
+            # numeric values from Excel-based models are always float
+            input = input[:-2]
+        return int(input)
+
 
 class LongAttr(object):
 
     def sqlForNonNone(self, value):
         return str(value)
 
+    def bulkValueForNonNoneSampleInput(self, input):
+        return long(input)
+
+
+class FloatAttr(object):
+
+    def bulkValueForNonNoneSampleInput(self, input):
+        return float(input)
+
 
 class DecimalAttr(object):
 
     def sqlForNonNone(self, value):
         return str(value)  # repr() will give Decimal("3.4")
 
+    def bulkValueForNonNoneSampleInput(self, input):
+        input = str(input)
+        Decimal(input)  # raises exception if value is invalid
+        return input
+
 
 class BoolAttr(object):
 
     def sqlForNonNone(self, value):
         return '1' if value else '0'  # MySQL and MS SQL will take 1 and 0 for bools
 
+    def bulkValueForNonNoneSampleInput(self, input):
+        if isinstance(input, basestring):
+            input = input.upper()
+        if input in (False, 'FALSE', 'NO', '0', '0.0'):
+            return False
+        elif input in (True, 'TRUE', 'YES', '1', '1.0'):
+            return True
+        else:
+            raise ValueError('invalid bool input: %r' % input)
+
+
+class StringAttr(object):
+
+    def bulkValueForNonNoneSampleInput(self, input):
+        if input == "''":
+            return ''
+        if '\\' in input:
+            # add spaces before and after, to prevent
+            # syntax error if value begins or ends with "
+            input = eval('""" ' + input + ' """')[1:-1]
+        return input
+
+
+class EnumAttr(object):
+
+    def bulkValueForNonNoneSampleInput(self, input):
+        if self.model().usesExternalSQLEnums():
+            return self.intValueForString(input)
+        if not self.hasEnum(input):
+            raise ValueError('invalid enum input: %r (enums are %r)'
+                % (input, self.enums()))
+        return input
+
 
 class ObjRefAttr(object):
 
@@ -1063,6 +1983,30 @@ class ObjRefAttr(object):
                 objId = value.serialNum()
             return '%s=%s,%s=%s' % (classIdName, classId, objIdName, objId)
 
+    def bulkValuesForNone(self):
+        if self.setting('UseBigIntObjRefColumns', False):
+            return (None,)
+        else:
+            return None, None
+
+    def bulkValuesForNonNoneSampleInput(self, input):
+        """Return the column values for "Class.serialNum" or "serialNum".
+
+        A comment can follow the value after a space, like "User.3 Joe".
+        """
+        input = input.split(None, 1)[0]
+        parts = input.split('.', 1)
+        if len(parts) == 2:
+            className, serialNum = parts
+        else:
+            className, serialNum = self.targetClassName(), input
+        classId = self.klass().klasses()._model.klass(className).id()
+        serialNum = int(serialNum)
+        if self.setting('UseBigIntObjRefColumns', False):
+            return (objRefJoin(classId, serialNum),)
+        else:
+            return classId, serialNum
+
     def readStoreDataRow(self, obj, row, i):
         # This does *not* get called under the old approach of single obj ref columns.
         # See MiddleObject.readStoreData.
@@ -1076,6 +2020,16 @@ class ObjRefAttr(object):
         obj.setValueForAttr(self, value)
         return i + 2
 
+    def rowReader(self, pyClass):
+        if self.setting('UseBigIntObjRefColumns', False):
+            return Attr.rowReader.im_func(self, pyClass)
+        setter = getattr(pyClass, self.pySetName())
+        def readRow(obj, row, i):
+            objId = row[i+1]
+            setter(obj, None if objId is None else objRefJoin(row[i], objId))
+            return i + 2
+        return readRow
+
 
 class ListAttr(object):
 
@@ -1085,6 +2039,9 @@ class ListAttr(object):
     def readStoreDataRow(self, obj, row, i):
         return i
 
+    def rowReader(self, pyClass):
+        return None
+
 
 class AnyDateTimeAttr(object):
 
@@ -0,0 +1,422 @@
+"""Profiling of the SQL statements executed by object stores."""
+
+import re
+import sys
+import threading
+import weakref
+from time import time
+
+from MiscUtils.Funcs import timestamp
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block executes more SQL statements than its budget.
+
+    The statements() method returns the SQL of the statements executed
+    by the block.
+    """
+
+    def __init__(self, message, statements):
+        AssertionError.__init__(self, message)
+        self._statements = statements
+
+    def statements(self):
+        return self._statements
+
+
+_literals = re.compile(r"'(?:[^']|'')*'|(?<![\w.$])-?\d+(?:\.\d+)?(?![\w.])")
+_lists = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_spaces = re.compile(r'\s+')
+
+
+def normalizeSQL(sql):
+    """Return the shape of an SQL statement.
+
+    String and number literals are replaced with ?, lists of them with
+    (...), and whitespace is collapsed, so that statements which differ
+    only by their values have the same shape:
+
+        >>> normalizeSQL("select * from Book where id in (1, 2) and x='a'")
+        'select * from Book where id in (...) and x=?'
+    """
+    sql = _literals.sub('?', sql)
+    sql = _lists.sub('(...)', sql)
+    return _spaces.sub(' ', sql).strip().rstrip(';')
+
+
+class StatementStats(object):
+    """Statistics for all SQL statements of the same shape.
+
+    The statistics are updated by the SQLProfiler while holding its lock.
+    """
+
+    def __init__(self, sql):
+        self._sql = sql
+        self._calls = 0
+        self._timedCalls = 0
+        self._seconds = 0.0
+        self._maxSeconds = 0.0
+        self._waitSeconds = 0.0
+        self._rows = 0
+        self._sources = {}  # source -> number of calls
+
+    def sql(self):
+        return self._sql
+
+    def calls(self):
+        return self._calls
+
+    def seconds(self):
+        return self._seconds
+
+    def meanSeconds(self):
+        return self._seconds / self._timedCalls if self._timedCalls else 0.0
+
+    def maxSeconds(self):
+        return self._maxSeconds
+
+    def waitSeconds(self):
+        return self._waitSeconds
+
+    def rows(self):
+        return self._rows
+
+    def addCall(self, source):
+        self._calls += 1
+        self._sources[source] = self._sources.get(source, 0) + 1
+
+    def addTiming(self, seconds, waitSeconds):
+        self._timedCalls += 1
+        self._seconds += seconds
+        self._waitSeconds += waitSeconds
+        if seconds > self._maxSeconds:
+            self._maxSeconds = seconds
+
+    def addRows(self, rows):
+        self._rows += rows
+
+    def asDict(self):
+        return dict(sql=self._sql, calls=self._calls, seconds=self._seconds,
+            meanSeconds=self.meanSeconds(), maxSeconds=self._maxSeconds,
+            waitSeconds=self._waitSeconds, rows=self._rows,
+            sources=dict(self._sources))
+
+
+class CountingCursor(object):
+    """Cursor wrapper counting the fetched rows for the profiler."""
+
+    def __init__(self, cursor, stats, lock):
+        self._cursor = cursor
+        self._stats = stats
+        self._lock = lock
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count(1)
+            yield row
+
+    def _count(self, rows):
+        with self._lock:
+            self._stats.addRows(rows)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+
+class SQLProfiler(object):
+    """Profiler for the SQL statements executed by an object store.
+
+    The profiler aggregates the statements by their shape (see normalizeSQL),
+    recording the number of calls, the time spent executing them, the time
+    spent waiting for a connection, the number of rows fetched and where
+    they were issued from. The source of a statement is the first function
+    outside of MiddleKit.Run and MiddleKit.Core on the call stack, unless
+    a source has been set for the thread with source() or setSource(),
+    e.g. the name of the servlet serving the request.
+
+    The statements of a thread up to the next endTransaction() make up a
+    transaction. The store ends the transaction in endUnitOfWork(), so in
+    applications that invoke this at the end of every request, the
+    transaction statistics show the number of statements per request.
+
+    Statements taking slowQueryTime seconds or longer are kept in a list of
+    the last maxSlowQueries slow queries and written to the slowQueryLog,
+    a file (or 'stdout' or 'stderr'), if it is given.
+
+    All profilers of the process are returned by SQLProfiler.profilers(),
+    which is used by the SQLProfile page of the WebKit Admin context.
+    """
+
+    _profilers = weakref.WeakKeyDictionary()
+
+    def __init__(self, store=None, slowQueryTime=None, slowQueryLog=None,
+            maxStatements=1000, maxSlowQueries=100):
+        self._store = weakref.ref(store) if store is not None else None
+        self._slowQueryTime = slowQueryTime
+        if slowQueryLog in ('stdout', 'stderr'):
+            slowQueryLog = getattr(sys, slowQueryLog)
+        elif isinstance(slowQueryLog, basestring):
+            slowQueryLog = open(slowQueryLog, 'a')
+        self._slowQueryLog = slowQueryLog
+        self._maxStatements = maxStatements
+        self._maxSlowQueries = maxSlowQueries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._budgets = {}  # thread id -> list of statement lists
+        self.reset()
+        self._profilers[self] = True
+
+    @classmethod
+    def profilers(cls):
+        """Return the profilers of all stores of the process."""
+        return list(cls._profilers)
+
+    def name(self):
+        store = self._store and self._store()
+        if store is None:
+            return 'SQLProfiler %x' % id(self)
+        model = store.model()
+        return '%s %s' % (store.__class__.__name__,
+            model.name() if model else '')
+
+    def reset(self):
+        """Discard all statistics."""
+        with self._lock:
+            self._statements = {}  # shape -> StatementStats
+            self._counts = threading.local()  # statements per transaction
+            self._slowQueries = []
+            self._transactions = 0
+            self._transactionStatements = 0
+            self._maxTransactionStatements = 0
+            self._since = time()
+
+
+    ## Recording ##
+
+    def statement(self, sql):
+        """Register a statement that is about to be executed.
+
+        Returns the StatementStats for the statement, which are passed
+        to executed() if the statement is timed.
+        """
+        shape = normalizeSQL(sql)
+        source = self.currentSource()
+        counts = self._counts
+        counts.statements = getattr(counts, 'statements', 0) + 1
+        budgets = self._budgets.get(threading.current_thread().ident)
+        if budgets:
+            for statements in budgets:
+                statements.append(sql)
+        with self._lock:
+            stats = self._statements.get(shape)
+            if stats is None:
+                if len(self._statements) >= self._maxStatements:
+                    shape = '(other statements)'
+                    stats = self._statements.get(shape)
+                if stats is None:
+                    stats = self._statements[shape] = StatementStats(shape)
+            stats.addCall(source)
+        return stats
+
+    def executed(self, stats, sql, waitSeconds, seconds, cursor):
+        """Record the execution time of a statement.
+
+        Returns a cursor counting the rows fetched through it.
+        """
+        with self._lock:
+            stats.addTiming(seconds, waitSeconds)
+        if self._slowQueryTime is not None and seconds >= self._slowQueryTime:
+            self.slowQuery(sql, seconds)
+        return CountingCursor(cursor, stats, self._lock)
+
+    def slowQuery(self, sql, seconds):
+        source = self.currentSource()
+        when = timestamp()['pretty']
+        with self._lock:
+            self._slowQueries.append(dict(sql=sql, seconds=seconds,
+                source=source, time=when))
+            del self._slowQueries[:-self._maxSlowQueries or None]
+        log = self._slowQueryLog
+        if log is not None:
+            log.write('SLOW %s %.3f secs %s: %s\n' % (when, seconds, source,
+                _spaces.sub(' ', sql)))
+            log.flush()
+
+    def endTransaction(self):
+        """End the transaction of the current thread.
+
+        Returns the number of statements of the transaction.
+        """
+        counts = self._counts
+        statements = getattr(counts, 'statements', 0)
+        counts.statements = 0
+        with self._lock:
+            self._transactions += 1
+            self._transactionStatements += statements
+            if statements > self._maxTransactionStatements:
+                self._maxTransactionStatements = statements
+        return statements
+
+
+    ## Sources ##
+
+    def currentSource(self):
+        """Return the source of the statements of the current thread."""
+        source = getattr(self._local, 'source', None)
+        if source:
+            return source
+        frame = sys._getframe(1)
+        while frame is not None:
+            module = frame.f_globals.get('__name__') or ''
+            if not module.startswith(('MiddleKit.Run.', 'MiddleKit.Core.')):
+                return '%s.%s' % (module, frame.f_code.co_name)
+            frame = frame.f_back
+        return None
+
+    def setSource(self, source):
+        """Set the source of the statements of the current thread.
+
+        None makes the profiler determine the source from the call stack.
+        """
+        self._local.source = source
+
+    def source(self, source):
+        """Return a context manager setting the source for its block."""
+        return _Source(self, source)
+
+
+    ## Budgets ##
+
+    def budget(self, maxStatements, maxPerShape=None):
+        """Return a context manager enforcing a query budget.
+
+        Raises QueryBudgetExceeded at the end of the block if the current
+        thread executed more than maxStatements statements within the block,
+        or, if maxPerShape is given, more than maxPerShape statements of the
+        same shape (a typical sign of N+1 queries):
+
+            with store.queryBudget(3, maxPerShape=1):
+                showAuthorsWithBooks()
+        """
+        return _Budget(self, maxStatements, maxPerShape)
+
+
+    ## Statistics ##
+
+    def statements(self):
+        """Return the statistics of the statements as list of dictionaries.
+
+        The statements are sorted by the total time spent executing them,
+        then by the number of calls. The keys are: sql (the shape of the
+        statement), calls, seconds, meanSeconds, maxSeconds, waitSeconds
+        (the time spent waiting for connections), rows (the number of rows
+        fetched) and sources (mapping sources to numbers of calls).
+        """
+        with self._lock:
+            stats = [s.asDict() for s in self._statements.values()]
+        stats.sort(key=lambda s: (-s['seconds'], -s['calls'], s['sql']))
+        return stats
+
+    def slowQueries(self):
+        """Return the last slow queries as list of dictionaries.
+
+        The keys are: sql, seconds, source and time.
+        """
+        with self._lock:
+            return list(self._slowQueries)
+
+    def stats(self):
+        """Return a dictionary with summary statistics.
+
+        The keys are: statements (number of executed statements), shapes
+        (number of different shapes), seconds, waitSeconds, rows,
+        transactions, statementsPerTransaction (the mean),
+        maxStatementsPerTransaction, slowQueries and since (the time
+        when the statistics have been reset).
+        """
+        with self._lock:
+            statements = self._statements.values()
+            transactions = self._transactions
+            return dict(statements=sum(s.calls() for s in statements),
+                shapes=len(statements),
+                seconds=sum(s.seconds() for s in statements),
+                waitSeconds=sum(s.waitSeconds() for s in statements),
+                rows=sum(s.rows() for s in statements),
+                transactions=transactions,
+                statementsPerTransaction=(float(self._transactionStatements)
+                    / transactions if transactions else 0.0),
+                maxStatementsPerTransaction=self._maxTransactionStatements,
+                slowQueries=len(self._slowQueries), since=self._since)
+
+
+class _Source(object):
+
+    def __init__(self, profiler, source):
+        self._profiler = profiler
+        self._source = source
+
+    def __enter__(self):
+        self._previous = getattr(self._profiler._local, 'source', None)
+        self._profiler.setSource(self._source)
+
+    def __exit__(self, type, value, traceback):
+        self._profiler.setSource(self._previous)
+
+
+class _Budget(object):
+
+    def __init__(self, profiler, maxStatements, maxPerShape):
+        self._profiler = profiler
+        self._maxStatements = maxStatements
+        self._maxPerShape = maxPerShape
+
+    def __enter__(self):
+        self._statements = []
+        threadid = threading.current_thread().ident
+        self._profiler._budgets.setdefault(threadid, []).append(
+            self._statements)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        threadid = threading.current_thread().ident
+        budgets = self._profiler._budgets
+        budgets[threadid].remove(self._statements)
+        if not budgets[threadid]:
+            del budgets[threadid]
+        if type is not None:
+            return
+        statements = self._statements
+        if len(statements) > self._maxStatements:
+            raise QueryBudgetExceeded('%d SQL statements executed,'
+                ' but the budget is %d:\n%s' % (len(statements),
+                    self._maxStatements, '\n'.join(statements)), statements)
+        if self._maxPerShape is not None:
+            shapes = {}
+            for sql in statements:
+                shape = normalizeSQL(sql)
+                shapes[shape] = shapes.get(shape, 0) + 1
+            for shape, count in sorted(shapes.items()):
+                if count > self._maxPerShape:
+                    raise QueryBudgetExceeded('%d SQL statements of the'
+                        ' same shape executed, but the budget is %d: %s'
+                        % (count, self._maxPerShape, shape), statements)
+
+    def statements(self):
+        """Return the statements executed so far in the block."""
+        return list(self._statements)
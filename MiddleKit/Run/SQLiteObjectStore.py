@@ -44,6 +44,11 @@ class SQLiteObjectStore(SQLObjectStore):
     def sqlNowCall(self):
         return "datetime('now')"
 
+    def sqlLimitClause(self, limit=None, offset=None):
+        if limit is None and offset:
+            limit = -1  # SQLite needs a limit when using an offset
+        return SQLObjectStore.sqlLimitClause(self, limit, offset)
+
 
 class StringAttr(object):
 
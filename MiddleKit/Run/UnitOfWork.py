@@ -0,0 +1,108 @@
+"""Unit of work."""
+
+import thread
+
+
+class UnitOfWork(object):
+    """Unit of work.
+
+    A unit of work keeps track of the new, changed and deleted objects of
+    an object store that have not been saved yet.
+
+    Every thread has its own unit of work, which the store creates when the
+    thread makes its first change, and which goes away with the thread.
+    The store's currentUnitOfWork() method returns it. Other units of work
+    are created with the unitOfWork() method of the store. While such a unit
+    of work is used as a context manager, it is bound to the current thread,
+    and all changes made by this thread are registered with the unit of work
+    instead of the thread's own one:
+
+        uow = store.unitOfWork()
+        with uow:
+            invoice.setPaid(True)
+            store.addObject(receipt)
+        uow.saveChanges()
+
+    A unit of work can be saved and entered again by other threads later,
+    e.g. by the worker threads of an AsyncStore. The objects themselves are
+    shared by all units of work and threads of the store, so a unit of work
+    should only be used by one thread at a time.
+    """
+
+
+    ## Init ##
+
+    def __init__(self, store):
+        self._store = store
+        self._hasChanges = False
+        self._newObjects = []
+        self._deletedObjects = []
+        self._deletePlans = []
+        self._changedObjects = {}
+        self._previous = {}  # thread id -> units of work bound before
+
+    def store(self):
+        return self._store
+
+
+    ## Binding ##
+
+    def __enter__(self):
+        previous = self._store.bindUnitOfWork(self)
+        self._previous.setdefault(thread.get_ident(), []).append(previous)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        threadid = thread.get_ident()
+        previous = self._previous[threadid]
+        self._store.bindUnitOfWork(previous.pop())
+        if not previous:
+            del self._previous[threadid]
+
+
+    ## Changes ##
+
+    def hasChanges(self):
+        """Return whether the unit of work has changes to be saved."""
+        return self._hasChanges
+
+    def changeCounts(self):
+        """Return the numbers of new, changed and deleted objects."""
+        deletes = len(self._deletedObjects)
+        for plan in self._deletePlans:
+            deletes += plan.deleteCount()
+        return len(self._newObjects), len(self._changedObjects), deletes
+
+    def changedClassNames(self):
+        """Return the names of the classes of all unsaved objects."""
+        with self:
+            return self._store.changedClassNames()
+
+    def addObject(self, obj):
+        """Add the object to the store as part of this unit of work."""
+        with self:
+            self._store.addObject(obj)
+
+    def deleteObject(self, obj):
+        """Delete the object from the store as part of this unit of work."""
+        with self:
+            self._store.deleteObject(obj)
+
+    def saveChanges(self):
+        """Save the changes of this unit of work."""
+        self._store.saveChanges(self)
+
+    def discardChanges(self):
+        """Forget about the changes of this unit of work.
+
+        See the discardChanges() method of the store.
+        """
+        self._store.discardChanges(self)
+
+    def clear(self):
+        """Remove all objects. Invoked by the store."""
+        self._hasChanges = False
+        del self._newObjects[:]
+        del self._deletedObjects[:]
+        del self._deletePlans[:]
+        self._changedObjects.clear()
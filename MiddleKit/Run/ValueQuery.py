@@ -0,0 +1,287 @@
+"""Projection and aggregate queries for SQL object stores."""
+
+import re
+
+from MiddleKit.Core.ObjRefAttr import ObjRefAttr, objRefJoin
+
+try:
+    import numpy
+except ImportError:  # NumPy not available
+    numpy = None
+
+
+class QueryColumn(object):
+    """A column of a projection or aggregate query.
+
+    Holds the attr whose values are selected (None for the serial number)
+    and the aggregate function applied to them, if any. A count of all rows
+    has no attr and is a star column. Used by ValueQuery.
+    """
+
+    numericTypes = ('int', 'long', 'float', 'decimal', 'bool')
+
+    def __init__(self, attr, function=None, star=False):
+        self._attr = attr
+        self._function = function
+        self._star = star
+        self._isObjRef = isinstance(attr, ObjRefAttr)
+        if function in ('count', 'sum', 'avg') or attr is None:
+            self._isNumeric = True
+        else:
+            self._isNumeric = (not self._isObjRef
+                and attr['Type'].lower() in self.numericTypes)
+        # an obj ref with two columns yields one joined value:
+        self._isObjRefPair = (self._isObjRef and function is None
+            and not attr.setting('UseBigIntObjRefColumns', False))
+
+    def attr(self):
+        return self._attr
+
+    def function(self):
+        return self._function
+
+    def isStar(self):
+        return self._star
+
+    def isNumeric(self):
+        return self._isNumeric
+
+    def isObjRef(self):
+        return self._isObjRef
+
+    def isObjRefPair(self):
+        return self._isObjRefPair
+
+    def colNames(self, klass):
+        """Return the SQL column names of the values in the table of klass."""
+        if self._star:
+            return []
+        if self._attr is None:
+            return [klass.sqlSerialColumnName()]
+        return self._attr.sqlColumnName().split(',')
+
+    def sqlExprs(self, colNames):
+        """Return the SQL expressions for selecting from the given columns."""
+        if self._star:
+            return ['count(*)']
+        if self._function is None:
+            return colNames
+        # the last column of an obj ref is the one with the serial number
+        return ['%s(%s)' % (self._function, colNames[-1])]
+
+    def value(self, row, i):
+        """Return the value of the column in the row and the next index."""
+        if self._isObjRefPair:
+            classId, objId = row[i], row[i+1]
+            return (None if objId is None
+                else objRefJoin(classId, objId)), i + 2
+        return row[i], i + 1
+
+
+class ValueQuery(object):
+    """Builds and runs projection and aggregate queries.
+
+    Each SQL object store has a ValueQuery, which selects values of
+    attributes and computes aggregates without creating objects. The store
+    invokes fetchValues() and fetchAggregate() for its fetchValuesOfClass()
+    and fetchAggregateOfClass() methods.
+    """
+
+    _aggregateRE = re.compile(r'^(\w+)\s*(?:\(\s*(\*|\w+)\s*\))?$')
+
+    def __init__(self, store):
+        self._store = store
+
+
+    ## Queries ##
+
+    def fetchValues(self, klass, attrs, clauses='', isDeep=True,
+            clausesArgs=None, distinct=False, columns=False, arrays=False):
+        """Fetch values, see SQLObjectStore.fetchValuesOfClass()."""
+        queryColumns = [self.queryColumn(klass, name) for name in attrs]
+        rows = []
+        for klass in self.queryKlasses(klass, isDeep):
+            colNames = []
+            for column in queryColumns:
+                colNames.extend(column.colNames(klass))
+            sql = 'select %s%s from %s %s' % ('distinct ' if distinct else '',
+                ','.join(colNames), klass.sqlTableName(),
+                self.queryClauses(clauses))
+            rows.extend(self.queryRows(sql, clausesArgs, queryColumns))
+        if columns or arrays:
+            return self.queryColumnsForRows(rows, queryColumns, arrays)
+        return rows
+
+    def fetchAggregate(self, klass, aggregates, groupBy=None,
+            clauses='', isDeep=True, clausesArgs=None,
+            columns=False, arrays=False):
+        """Compute aggregates, see SQLObjectStore.fetchAggregateOfClass()."""
+        single = isinstance(aggregates, basestring)
+        if single:
+            aggregates = [aggregates]
+        if groupBy is None:
+            groupBy = []
+        elif isinstance(groupBy, basestring):
+            groupBy = [groupBy]
+        groupColumns = [self.queryColumn(klass, name) for name in groupBy]
+        aggColumns = [self.queryAggregate(klass, aggregate)
+            for aggregate in aggregates]
+        queryColumns = groupColumns + aggColumns
+        klasses = self.queryKlasses(klass, isDeep)
+        if not klasses:
+            rows = []
+        else:
+            if len(klasses) == 1:
+                klass = klasses[0]
+                colNames = [column.colNames(klass) for column in queryColumns]
+                source = '%s %s' % (klass.sqlTableName(),
+                    self.queryClauses(clauses))
+            else:
+                colNames, source = self.queryUnion(
+                    klasses, queryColumns, clauses)
+                if clausesArgs:
+                    clausesArgs = self.repeatClausesArgs(
+                        clausesArgs, len(klasses))
+            groupSQL = ','.join(name for names in colNames[:len(groupBy)]
+                for name in names)
+            exprs = [groupSQL] if groupSQL else []
+            for column, names in zip(aggColumns, colNames[len(groupBy):]):
+                exprs.extend(column.sqlExprs(names))
+            sql = 'select %s from %s' % (','.join(exprs), source)
+            if groupSQL:
+                sql += ' group by %s order by %s' % (groupSQL, groupSQL)
+            rows = self.queryRows(sql, clausesArgs, queryColumns)
+        if columns or arrays:
+            return self.queryColumnsForRows(rows, queryColumns, arrays)
+        if groupBy:
+            return rows
+        if rows:
+            row = rows[0]
+        else:
+            row = tuple(0 if column.function() == 'count' else None
+                for column in aggColumns)
+        return row[0] if single else row
+
+
+    ## Building queries ##
+
+    def queryColumn(self, klass, name):
+        """Return a QueryColumn for the attribute with the given name."""
+        if name in ('serialNum', klass.sqlSerialColumnName()):
+            return QueryColumn(None)
+        attr = klass.lookupAttr(name, None)
+        if attr is None or not attr.hasSQLColumn():
+            raise ValueError("Class '%s' has no attribute '%s' with a column"
+                % (klass.name(), name))
+        return QueryColumn(attr)
+
+    def queryAggregate(self, klass, aggregate):
+        """Return a QueryColumn for an aggregate such as 'sum(attr)'."""
+        match = self._aggregateRE.match(aggregate.strip())
+        function, name = match.groups() if match else (None, None)
+        if function:
+            function = function.lower()
+        if function not in ('count', 'sum', 'avg', 'min', 'max'):
+            raise ValueError('Invalid aggregate: %r' % aggregate)
+        if name in (None, '*'):
+            if function != 'count':
+                raise ValueError('Invalid aggregate: %r' % aggregate)
+            return QueryColumn(None, function, star=True)
+        column = self.queryColumn(klass, name)
+        if column.isObjRef() and function != 'count':
+            raise ValueError('Obj ref attribute %r can only be counted'
+                % column.attr().name())
+        return QueryColumn(column.attr(), function)
+
+    def queryKlasses(self, klass, isDeep):
+        """Return the concrete klasses whose tables must be queried.
+
+        The klasses are in the same order as the objects returned by
+        fetchObjectsOfClass().
+        """
+        klasses = [] if klass.isAbstract() else [klass]
+        if isDeep:
+            for subklass in klass.subklasses():
+                klasses.extend(self.queryKlasses(subklass, isDeep))
+        return klasses
+
+    def queryClauses(self, clauses):
+        clauses = clauses or ''
+        store = self._store
+        if store._markDeletes:
+            clauses = store.addDeletedToClauses(clauses)
+        return clauses
+
+    def queryUnion(self, klasses, queryColumns, clauses):
+        """Return the column names and the source for querying several tables.
+
+        The source is a derived table selecting the columns of all tables
+        with "union all". Since the names of the serial number columns can
+        differ between tables, the columns are renamed to mk0, mk1 etc.
+        """
+        colNames = []
+        count = 0
+        for column in queryColumns:
+            width = len(column.colNames(klasses[0]))
+            colNames.append(['mk%d' % i for i in range(count, count + width)])
+            count += width
+        parts = []
+        for klass in klasses:
+            exprs = []
+            for column in queryColumns:
+                exprs.extend(column.colNames(klass))
+            exprs = ['%s as mk%d' % (expr, i) for i, expr in enumerate(exprs)]
+            parts.append('select %s from %s %s' % (','.join(exprs or ['1 as mk0']),
+                klass.sqlTableName(), self.queryClauses(clauses)))
+        return colNames, '(%s) mk_union' % ' union all '.join(parts)
+
+    def repeatClausesArgs(self, clausesArgs, count):
+        """Return the clause arguments for the clauses repeated count times."""
+        if isinstance(clausesArgs, dict):
+            return clausesArgs
+        return tuple(clausesArgs) * count
+
+    def queryRows(self, sql, clausesArgs, queryColumns):
+        """Execute a projection or aggregate query and return the rows."""
+        store = self._store
+        conn, cur = store.executeSQL(sql + ';', clausesArgs=clausesArgs)
+        try:
+            rows = cur.fetchall()
+        finally:
+            store.doneWithConnection(conn)
+        if not any(column.isObjRefPair() for column in queryColumns):
+            return [tuple(row) for row in rows]
+        result = []
+        for row in rows:
+            values = []
+            i = 0
+            for column in queryColumns:
+                value, i = column.value(row, i)
+                values.append(value)
+            result.append(tuple(values))
+        return result
+
+    def queryColumnsForRows(self, rows, queryColumns, arrays=False):
+        """Return the values in the rows as a list of columns.
+
+        If arrays is true, numeric columns are converted to NumPy arrays.
+        Columns with None values or with floats or decimals are converted
+        to arrays of floats, using NaN for None.
+        """
+        if arrays and numpy is None:
+            # imported here to avoid a circular import
+            from SQLObjectStore import SQLObjectStoreError
+            raise SQLObjectStoreError('NumPy is needed for returning arrays.')
+        columns = [list(values) for values in zip(*rows)] or [
+            [] for column in queryColumns]
+        if arrays:
+            for i, column in enumerate(queryColumns):
+                if column.isNumeric():
+                    values = columns[i]
+                    if all(isinstance(value, (int, long)) for value in values):
+                        columns[i] = numpy.array(values, dtype=numpy.int64)
+                    else:
+                        columns[i] = numpy.array([numpy.nan if value is None
+                            else float(value) for value in values],
+                            dtype=numpy.float64)
+        return columns
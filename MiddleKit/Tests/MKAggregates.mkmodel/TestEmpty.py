@@ -0,0 +1,137 @@
+def test(store):
+    addObjects(store)
+    testValues(store)
+    testAggregates(store)
+    testArrays(store)
+
+
+def addObjects(store):
+    from Author import Author
+    from Book import Book
+    from Anthology import Anthology
+    jane, john = Author(), Author()
+    jane.setName('Jane')
+    john.setName('John')
+    for title, author, price, pages, inPrint, pyClass in [
+            ('Python', jane, 10.0, 100, True, Book),
+            ('Webware', john, 20.0, 200, True, Book),
+            ('Old', jane, None, 50, False, Book),
+            ('Best of', john, 30.0, 300, True, Anthology)]:
+        publication = pyClass()
+        publication.setTitle(title)
+        publication.setAuthor(author)
+        publication.setPrice(price)
+        publication.setPages(pages)
+        publication.setInPrint(inPrint)
+        if pyClass is Anthology:
+            publication.setEditor(jane)
+        store.addObject(publication)
+    store.saveChanges()
+
+
+def testValues(store):
+    sqlCount = store.sqlCount()
+    rows = store.fetchValuesOfClass('Book', ['title', 'pages'],
+        clauses='order by title')
+    assert rows == [('Old', 50), ('Python', 100), ('Webware', 200),
+        ('Best of', 300)], rows
+    # one query per concrete class
+    assert store.sqlCount() - sqlCount == 2
+    rows = store.fetchValuesOfClass('Book', ['title'], isDeep=False,
+        clauses='where pages>?', clausesArgs=(60,))
+    assert sorted(rows) == [('Python',), ('Webware',)], rows
+    # the abstract class has no table
+    rows = store.fetchValuesOfClass('Publication', ['serialNum', 'title'],
+        clauses='order by serialNum')
+    assert rows == [(1, 'Python'), (2, 'Webware'), (3, 'Old'),
+        (1, 'Best of')], rows
+    rows = store.fetchValuesOfClass('Book', ['author'], distinct=True)
+    assert len(rows) == 3, rows
+    # obj refs are returned as obj ref values
+    title, author = store.fetchValuesOfClass('Anthology', ['title', 'editor'])[0]
+    assert store.fetchObjRef(author).name() == 'Jane'
+    columns = store.fetchValuesOfClass('Book', ['title', 'price'],
+        clauses='order by title', columns=True)
+    assert columns == [['Old', 'Python', 'Webware', 'Best of'],
+        [None, 10.0, 20.0, 30.0]], columns
+    for attrs in (['foo'], ['title', 'bar']):
+        try:
+            store.fetchValuesOfClass('Book', attrs)
+        except ValueError as e:
+            assert "has no attribute" in str(e)
+        else:
+            raise AssertionError('no error for %r' % attrs)
+    print '*** passed testValues'
+
+
+def testAggregates(store):
+    assert store.countObjectsOfClass('Book') == 4
+    assert store.countObjectsOfClass('Book', isDeep=False) == 3
+    assert store.countObjectsOfClass('Publication',
+        clauses='where inPrint=?', clausesArgs=(1,)) == 3
+    assert store.countObjectsOfClass('Anthology', 'where pages>1000') == 0
+    assert store.countObjectsOfClass('Publication', isDeep=False) == 0
+
+    sqlCount = store.sqlCount()
+    count, total, average, smallest, biggest = store.fetchAggregateOfClass(
+        'Book', ['count(*)', 'sum(pages)', 'avg(price)',
+            'min(pages)', 'max(title)'])
+    # one query for the union of both tables
+    assert store.sqlCount() - sqlCount == 1
+    assert (count, total, smallest, biggest) == (4, 650, 50, 'Webware'), (
+        count, total, smallest, biggest)
+    assert average == 20.0, average
+    assert store.fetchAggregateOfClass('Book', 'count(price)') == 3
+    assert store.fetchAggregateOfClass('Book', 'sum(pages)',
+        isDeep=False, clauses='where inPrint=1') == 300
+    assert store.fetchAggregateOfClass('Publication', 'max(pages)',
+        isDeep=False) is None
+
+    rows = store.fetchAggregateOfClass('Book', ['count', 'sum(pages)'],
+        groupBy='inPrint')
+    assert [tuple(map(int, row)) for row in rows] == [
+        (0, 1, 50), (1, 3, 600)], rows
+    rows = store.fetchAggregateOfClass('Book', ['count(author)', 'max(pages)'],
+        groupBy=['author'])
+    assert [(store.fetchObjRef(author).name(), count, pages)
+        for author, count, pages in rows] == [
+            ('Jane', 2, 100), ('John', 2, 300)], rows
+    columns = store.fetchAggregateOfClass('Book', 'count',
+        groupBy='inPrint', columns=True)
+    assert len(columns) == 2 and columns[1] == [1, 3], columns
+
+    for aggregate in ('median(pages)', 'sum(*)', 'sum(author)', 'max(foo)',
+            'count(pages'):
+        try:
+            store.fetchAggregateOfClass('Book', aggregate)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('no error for %r' % aggregate)
+    print '*** passed testAggregates'
+
+
+def testArrays(store):
+    try:
+        import numpy
+    except ImportError:
+        from MiddleKit.Run.SQLObjectStore import SQLObjectStoreError
+        try:
+            store.fetchValuesOfClass('Book', ['pages'], arrays=True)
+        except SQLObjectStoreError:
+            pass
+        else:
+            raise AssertionError('no error for arrays without NumPy')
+        print 'skipped testArrays (NumPy is not installed)'
+        return
+    titles, pages, prices, inPrint = store.fetchValuesOfClass('Book',
+        ['title', 'pages', 'price', 'inPrint'],
+        clauses='order by title', arrays=True)
+    assert titles == ['Old', 'Python', 'Webware', 'Best of']
+    assert isinstance(pages, numpy.ndarray) and pages.sum() == 650
+    assert numpy.isnan(prices[0]) and numpy.nansum(prices) == 60.0
+    assert inPrint.sum() == 3
+    inPrint, counts = store.fetchAggregateOfClass('Book', 'count',
+        groupBy='inPrint', arrays=True)
+    assert list(counts) == [1, 3]
+    print '*** passed testArrays'
@@ -0,0 +1,129 @@
+from StringIO import StringIO
+
+from MiddleKit.Run.BulkLoader import BulkLoader, BulkLoadError
+
+
+samples = '''\
+Book objects
+title,author by name,price,pages,inPrint,format
+Python in Action,Jane Doe,12.50,250,yes,paperback
+Webware for Beginners,John Roe,,120,,hardcover
+No Author,,0.99,,no,
+
+Anthology objects
+title,editor by name,author,format
+Best of Webware,Jane Doe,Author.2 John Roe,paperback
+
+Author objects
+name,born,mentor by name
+# the mentor is defined after its mentee
+Jane Doe,1950-01-02,John Roe
+John Roe,,
+'''
+
+
+def test(store):
+    testLoad(store)
+    testRoundTrip(store)
+    testErrors(store)
+
+
+def testLoad(store):
+    progress = StringIO()
+    loader = BulkLoader(store, batchSize=2, progress=progress)
+    sqlCount = store.sqlCount()
+    loader.loadLines(samples.splitlines())
+    stats = loader.finish()
+    assert stats['Book'][0] == 3, stats
+    assert stats['Anthology'][0] == 1, stats
+    assert stats['Author'][0] == 2, stats
+    assert stats[None][0] == 6, stats
+    # two batches for books, one each for anthologies and authors,
+    # max serial num queries, lookups and updates for the refs by name
+    assert store.sqlCount() - sqlCount <= 11, store.sqlCount() - sqlCount
+    progress = progress.getvalue()
+    assert 'Book: 2 rows' in progress, progress
+    assert 'Book: 3 rows' in progress, progress
+    assert 'Total: 6 rows' in progress, progress
+
+    jane, john = store.fetchObjectsOfClass('Author', clauses='order by name')
+    assert jane.serialNum() == 1 and john.serialNum() == 2
+    assert str(jane.born()) == '1950-01-02', jane.born()
+    assert john.born() is None
+    assert jane.mentor() is john
+    assert john.mentor() is None
+
+    books = store.fetchObjectsOfClass('Book',
+        clauses='order by serialNum', isDeep=False)
+    assert [book.serialNum() for book in books] == [1, 2, 3]
+    python, webware, noAuthor = books
+    assert python.title() == 'Python in Action'
+    assert python.author() is jane
+    assert float(python.price()) == 12.5
+    assert python.pages() == 250
+    assert python.inPrint()
+    assert python.format() == 'paperback'
+    assert webware.author() is john
+    assert webware.price() is None
+    assert webware.inPrint()  # the default
+    assert webware.format() == 'hardcover'
+    assert noAuthor.author() is None
+    assert not noAuthor.inPrint()
+    assert noAuthor.format() is None
+
+    anthology, = store.fetchObjectsOfClass('Anthology')
+    assert anthology.serialNum() == 1
+    assert anthology.editor() is jane
+    assert anthology.author() is john
+
+    # the next load continues the serial numbers
+    loader = BulkLoader(store)
+    loader.loadLines(['Author objects', 'name', 'Jim Poe'])
+    loader.finish()
+    jim, = store.fetchObjectsOfClass('Author', clauses="where name='Jim Poe'")
+    assert jim.serialNum() == 3
+    print '*** passed testLoad'
+
+
+def testRoundTrip(store):
+    dump = StringIO()
+    store.dumpObjectStore(dump)
+    dump = dump.getvalue()
+    store.clear()
+    for className in 'Anthology', 'Book', 'Author':
+        store.executeSQLTransaction('delete from %s;' % className)
+    assert not store.fetchObjectsOfClass('Book')
+    with open('BulkLoadDump.csv', 'w') as f:
+        f.write(dump)
+    store.bulkLoad('BulkLoadDump.csv')
+    store.clear()
+    again = StringIO()
+    store.dumpObjectStore(again)
+    assert again.getvalue() == dump, again.getvalue()
+    print '*** passed testRoundTrip'
+
+
+def testErrors(store):
+    count = len(store.fetchObjectsOfClass('Author'))
+    for lines, error in [
+            (['Foo objects'], "Class 'Foo' is not defined"),
+            (['name', 'Joe'], "Have not yet seen an 'objects' declaration"),
+            (['Author objects', 'nickname', 'Joe'],
+                "Class 'Author' has no attribute 'nickname'"),
+            (['Book objects', 'pages by title', '1'],
+                "Cannot use 'by' feature with non-obj ref"),
+            (['Book objects', 'title,pages', 'Thin,many'], 'ValueError'),
+            (['Author objects', 'name,mentor by name', 'Joe,Nobody'],
+                "There is no Author with name='Nobody'")]:
+        loader = BulkLoader(store)
+        try:
+            loader.loadLines(lines, 'Test.csv')
+            loader.finish()
+        except BulkLoadError as e:
+            assert error in str(e), str(e)
+            loader.abort()
+        else:
+            raise AssertionError('no error for %r' % lines)
+    # nothing has been loaded
+    assert len(store.fetchObjectsOfClass('Author')) == count
+    print '*** passed testErrors'
@@ -32,6 +32,10 @@ def test(store):
 
     testCascadeWithRequiredBackRef(store)
 
+    testSetBasedDelete(store)
+
+    testConnectionPool(store)
+
 # These are possible values for expectedResult
 DELETE_FOO = 1
 DELETE_OBJECT = 2
@@ -211,3 +215,91 @@ def testCascadeWithRequiredBackRef(store):
     store._verboseDelete = 1
     store.deleteObject(e)
     store.saveChanges()
+
+
+def testSetBasedDelete(store):
+    """Test cascades and detaches of objects that are not in memory.
+
+    The delete plan is computed with one query per class and attribute,
+    so the number of SQL statements must not grow with the number of
+    objects, and the objects need not be fetched.
+    """
+    from Engine import Engine
+    from EnginePart import EnginePart
+    from C import C
+    store._verboseDelete = 0
+    engines = []
+    for i in range(2):
+        e = Engine()
+        store.addObject(e)
+        store.saveChanges()
+        for j in range(50):
+            e.addToParts(EnginePart())
+        engines.append(e)
+    foo = Foo()
+    store.addObject(foo)
+    store.saveChanges()
+    for i in range(30):
+        c = C()
+        c.setFoo(foo)
+        store.addObject(c)
+    store.saveChanges()
+    e, foo = engines[0].serialNum(), foo.serialNum()
+    engines = c = None
+    store.clear()
+
+    e = store.fetchObject(Engine, e)
+    foo = store.fetchObject(Foo, foo)
+    sqlCount = store.sqlCount()
+    plan = store.deleteObjects([e, foo])
+    assert plan.deleteCount() == 50, plan
+    assert plan.detachCount() == 30, plan
+    assert e.isDeleted() and foo.isDeleted()
+    assert not store.hasObject(e)
+    # one query per referencing or referenced attribute of Foo and Engine
+    planCount = store.sqlCount() - sqlCount
+    assert planCount <= 20, planCount
+    sqlCount = store.sqlCount()
+    # the parts referencing the engine are deleted before the engine
+    uow = store.currentUnitOfWork()
+    stmts = store._deletePlanner.deleteStmts(
+        uow._deletedObjects, uow._deletePlans)[0]
+    tables = [sql.split()[1 if sql.startswith('update') else 2]
+        for sql in stmts]
+    assert tables.index('EnginePart') < tables.index('Engine'), tables
+    store.saveChanges()
+    sqlCount = store.sqlCount() - sqlCount
+    assert sqlCount <= 5, sqlCount
+    store.clear()
+    assert len(store.fetchObjectsOfClass(Engine)) == 1
+    assert len(store.fetchObjectsOfClass(EnginePart)) == 50
+    assert len(store.fetchObjectsOfClass(Foo)) == 0
+    cs = store.fetchObjectsOfClass(C)
+    assert len(cs) == 30
+    assert all(c.foo() is None for c in cs)
+
+    # objects in memory are updated as well
+    e = store.fetchObjectsOfClass(Engine)[0]
+    part = e.parts()[0]
+    store.deleteObject(e)
+    assert part.isDeleted()
+    assert not store.hasObject(part)
+    store.saveChanges()
+    assert not store.fetchObjectsOfClass(EnginePart)
+
+    store.clear()
+    store.executeSQLTransaction('delete from C;')
+    print '*** passed testSetBasedDelete'
+
+
+def testConnectionPool(store):
+    stats = store.connectionPoolStats()
+    if stats is None:  # the store does not use a pool
+        return
+    assert stats['maxConnections'] == 10
+    assert stats['used'] == 0, stats
+    assert 0 < stats['size'] <= 10, stats
+    assert stats['checkouts'] > stats['created'], stats
+    if store.setting('SQLConnectionPool', None):
+        assert stats['idle'] >= 1, stats
+    print '*** passed testConnectionPool'
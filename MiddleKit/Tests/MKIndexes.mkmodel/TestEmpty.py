@@ -0,0 +1,78 @@
+def test(store):
+    if store.__class__.__name__ != 'SQLiteObjectStore':
+        return  # the tests query the SQLite catalog
+    testIndexes(store)
+    testQueryPlans(store)
+    testPartialUniqueIndex(store)
+
+
+def indexes(store):
+    conn, cur = store.executeSQL("select tbl_name, name, sql from sqlite_master"
+        " where type='index' and sql is not null order by 1, 2")
+    try:
+        return cur.fetchall()
+    finally:
+        store.doneWithConnection(conn)
+
+
+def testIndexes(store):
+    names = {}
+    for table, name, sql in indexes(store):
+        names.setdefault(table, []).append(name)
+    assert 'Team' not in names, names
+    assert names['Person'] == ['Person_email_index', 'Person_lastName_firstName_index',
+        'Person_lastName_index', 'Person_team_index'], names['Person']
+    assert names['Employee'] == ['Employee_email_index',
+        'Employee_lastName_firstName_index', 'Employee_lastName_index',
+        'Employee_team_index', 'Employee_team_lastName_index'], names['Employee']
+    for table, name, sql in indexes(store):
+        if name.endswith('_team_index'):
+            assert '(teamClassId, teamObjId)' in sql, sql
+        elif name.endswith('_email_index'):
+            assert sql.lower().startswith('create unique index'), sql
+            assert sql.endswith('where email is not null'), sql
+
+
+def queryPlan(store, sql):
+    conn, cur = store.executeSQL('explain query plan ' + sql)
+    try:
+        return ' '.join(str(row[-1]) for row in cur.fetchall())
+    finally:
+        store.doneWithConnection(conn)
+
+
+def testQueryPlans(store):
+    # the queries for list attributes and for deleting objects use the index
+    plan = queryPlan(store, 'select serialNum from Person'
+        ' where teamClassId=1 and teamObjId=1')
+    assert 'Person_team_index' in plan, plan
+    plan = queryPlan(store, 'select serialNum from Employee'
+        ' where teamClassId=1 and teamObjId=1')
+    assert 'Employee_team' in plan, plan
+    plan = queryPlan(store, "select serialNum from Person"
+        " where lastName='Doe' and firstName='John'")
+    assert 'Person_lastName' in plan, plan
+    # the obj ref with isIndexed=False has no index
+    plan = queryPlan(store, 'select serialNum from Person'
+        ' where mentorClassId=1 and mentorObjId=1')
+    assert 'INDEX' not in plan.upper(), plan
+
+
+def testPartialUniqueIndex(store):
+    from Person import Person
+    for i in range(2):
+        person = Person()
+        person.setLastName('Doe')
+        store.addObject(person)
+    store.saveChanges()  # several persons without email are fine
+    for i in range(2):
+        person = Person()
+        person.setLastName('Roe')
+        person.setEmail('roe@example.com')
+        store.addObject(person)
+    try:
+        store.saveChanges()
+    except Exception as e:
+        assert 'unique' in str(e).lower(), e
+    else:
+        raise AssertionError('email should be unique')
@@ -0,0 +1,108 @@
+def test(store):
+    from Item import Item
+    from SpecialItem import SpecialItem
+
+    testIter(store)
+    testUnregistered(store)
+    testLimit(store)
+    testPages(store)
+
+
+def testIter(store):
+    store.clear()
+    items = store.iterObjectsOfClass('Item', clauses='order by x', batchSize=3)
+    assert iter(items) is items
+    item = items.next()
+    assert item.name() == 'a'
+    assert store.fetchObject('Item', item.serialNum()) is item
+    names = [item.name() for item in items]
+    # objects of subclasses follow the objects of the class itself
+    assert names == list('bcdefgst')
+    assert isinstance(store.fetchObject('SpecialItem', 1).y(), int)
+
+    items = store.iterObjectsOfClass('Item', isDeep=False, clauses='where x>3')
+    assert sorted(item.x() for item in items) == [4, 5, 6, 7]
+
+    store.clear()
+    items = list(store.iterObjectsOfClass('Item', attrs=['name']))
+    assert len(items) == 9
+    assert items[-1].isHollow()
+    assert items[-1].y() == 2
+
+
+def testUnregistered(store):
+    store.clear()
+    items = list(store.iterObjectsOfClass('Item', register=False))
+    assert len(items) == 9
+    item = store.fetchObjectsOfClass('Item', clauses='where x=1')[0]
+    assert item.name() == 'a'
+    assert item not in items
+    # objects already in memory are returned as usual
+    items = list(store.iterObjectsOfClass('Item', register=False))
+    assert item in items
+
+
+def testLimit(store):
+    store.clear()
+    items = store.fetchObjectsOfClass('Item', isDeep=False,
+        clauses='order by x', limit=3)
+    assert [item.name() for item in items] == list('abc')
+    items = store.fetchObjectsOfClass('Item', isDeep=False,
+        clauses='order by x', limit=2, offset=3)
+    assert [item.name() for item in items] == list('de')
+    items = store.fetchObjectsOfClass('Item', isDeep=False,
+        clauses='order by x', offset=5)
+    assert [item.name() for item in items] == list('fg')
+    items = store.iterObjectsOfClass('SpecialItem',
+        clauses='order by x', limit=1, offset=1)
+    assert [item.name() for item in items] == ['t']
+    try:
+        store.fetchObjectsOfClass('Item', limit=3)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expecting ValueError for deep fetch with limit')
+
+
+def testPages(store):
+    store.clear()
+    pages = []
+    serialNum = 0
+    while True:
+        page = store.fetchPageOfClass('Item', serialNum, pageSize=3)
+        if not page:
+            break
+        pages.append([item.name() for item in page])
+        serialNum = page[-1].serialNum()
+    assert pages == [list('abc'), list('def'), ['g']]
+    page = store.fetchPageOfClass('Item', 2, pageSize=10, where='x<>5')
+    assert [item.name() for item in page] == list('cdfg')
+
+    # ordered by an attribute, with equal and missing values
+    store.executeSQLTransaction(["update Item set x=3 where name='e'",
+        "update Item set x=null where name in ('b', 'f')"])
+    store.clear()
+
+    def allPages(**kwargs):
+        pages = []
+        serialNum = 0
+        while True:
+            page = store.fetchPageOfClass('Item', serialNum,
+                pageSize=2, **kwargs)
+            if not page:
+                break
+            pages.append(''.join(item.name() for item in page))
+            serialNum = page[-1].serialNum()
+        return pages
+    assert allPages(orderBy='x') == ['ac', 'ed', 'gb', 'f']
+    assert allPages(orderBy='x', descending=True) == ['gd', 'ce', 'ab', 'f']
+    assert allPages(orderBy='x', where="name<>'c'") == ['ae', 'dg', 'bf']
+    assert allPages(orderBy='name', descending=True) == ['gf', 'ed', 'cb', 'a']
+    assert allPages(orderBy='serialNum', descending=True) == [
+        'gf', 'ed', 'cb', 'a']
+    try:
+        store.fetchPageOfClass('Item', orderBy='nothing')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expecting ValueError for unknown attribute')
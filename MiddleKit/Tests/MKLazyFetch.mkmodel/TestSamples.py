@@ -0,0 +1,124 @@
+def test(store):
+    from Foo import Foo
+    from Bar import Bar
+
+    testLazyFetch(store)
+    testProjection(store)
+    testChangedHollowObject(store)
+    testRefresh(store)
+    testRowLoader(store)
+    testPickle(store)
+
+
+def testLazyFetch(store):
+    store.clear()
+    count = store.sqlCount()
+    foos = store.fetchObjectsOfClass('Foo', lazy=True, clauses='order by x')
+    assert store.sqlCount() == count + 1
+    assert [foo.serialNum() for foo in foos] == [1, 2, 3, 4, 5]
+    for foo in foos:
+        assert foo.isHollow()
+
+    # faulting in happens in batches of LazyFetchBatchSize = 2
+    assert foos[0].name() == 'a'
+    assert store.sqlCount() == count + 2
+    assert not foos[0].isHollow() and not foos[1].isHollow()
+    assert foos[2].isHollow()
+    assert foos[1].x() == 2
+    assert store.sqlCount() == count + 2
+    assert [foo.x() for foo in foos] == [1, 2, 3, 4, 5]
+    assert store.sqlCount() == count + 4
+
+    # obj refs and lists work as usual
+    assert foos[0].bar().serialNum() == 1
+    assert foos[0].bar() is foos[1].bar()
+    bars = store.fetchObjectsOfClass('Bar', lazy=True, clauses='order by y')
+    assert len(bars[1].foos()) == 3
+    assert bars[1].y() == 2
+
+    # objects already in memory are not hollowed by a lazy fetch
+    foos = store.fetchObjectsOfClass('Foo', lazy=True)
+    for foo in foos:
+        assert not foo.isHollow()
+
+
+def testProjection(store):
+    store.clear()
+    foos = store.fetchObjectsOfClass('Foo', attrs=['name'], clauses='order by x')
+    count = store.sqlCount()
+    assert [foo.name() for foo in foos] == list('abcde')
+    assert store.sqlCount() == count
+    for foo in foos:
+        assert foo.isHollow()
+    assert foos[4].x() == 5
+    assert store.sqlCount() == count + 1
+    assert not foos[4].isHollow()
+    assert foos[4].name() == 'e'
+
+    try:
+        store.fetchObjectsOfClass('Bar', attrs=['foos'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expecting ValueError for list attribute')
+
+
+def testChangedHollowObject(store):
+    store.clear()
+    foo = store.fetchObjectsOfClass('Foo', attrs=['name'],
+        clauses='where name=%r' % 'c')[0]
+    foo.setName('cc')
+    assert foo.isHollow() and foo.isChanged()
+    # faulting in keeps the changes
+    assert foo.x() == 3
+    assert foo.name() == 'cc'
+    assert foo.isChanged()
+    foo.setX(33)
+    store.saveChanges()
+    store.clear()
+    foo = store.fetchObjectsOfClass('Foo', clauses='where x=33')[0]
+    assert foo.name() == 'cc'
+    foo.setName('c')
+    foo.setX(3)
+    store.saveChanges()
+
+
+def testRefresh(store):
+    store.clear()
+    foo = store.fetchObjectsOfClass('Foo', lazy=True, clauses='where x=4')[0]
+    assert foo.isHollow()
+    count = store.sqlCount()
+    foo.refetch()
+    assert store.sqlCount() == count + 1
+    assert not foo.isHollow()
+    assert foo.name() == 'd'
+
+
+def testRowLoader(store):
+    from Foo import Foo
+    store.clear()
+    foo = store.fetchObjectsOfClass('Foo', clauses='where x=2')[0]
+    assert foo._mk_rowLoaders[Foo] == Foo._mk_loadRow.im_func
+    assert foo.name() == 'b' and foo.bar().serialNum() == 1
+    if store.setting('UseSlots', False):
+        assert not hasattr(foo, '__dict__')
+    else:
+        assert '_name' in foo.__dict__
+
+
+def testPickle(store):
+    import pickle
+    from Foo import Foo
+    foo = Foo()
+    foo.setName('p')
+    foo.setX(7)
+    for protocol in range(3):
+        copy = pickle.loads(pickle.dumps(foo, protocol))
+        assert copy.name() == 'p' and copy.x() == 7
+        assert copy.serialNum() == 0 and not copy.isHollow()
+    try:
+        Foo.__new__(Foo)._name
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('uninitialized object has a name')
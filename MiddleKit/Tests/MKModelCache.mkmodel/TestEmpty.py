@@ -0,0 +1,121 @@
+import os
+from time import time
+
+from MiddleKit.Core.Model import Model
+
+
+def newStore(store):
+    newStore = store.__class__(**store._dbArgs)
+    start = time()
+    newStore.readModelFileNamed(store.model().filename())
+    return newStore, time() - start
+
+
+class ChangedModel(Model):
+    """A model pretending that the classes of a parent model have changed."""
+
+    def compiledCacheHeader(self, sources):
+        header = Model.compiledCacheHeader(self, sources)
+        parentClasses = os.path.join('MKModelInh1.mkmodel', 'Classes.csv')
+        header['sources'] = [(path, 'changed'
+            if path.endswith(parentClasses) else hash)
+            for path, hash in header['sources']]
+        return header
+
+
+def test(store):
+    testReadFromCache(store)
+    testInvalidCache(store)
+    testObjects(store)
+
+
+def testReadFromCache(store):
+    model = store.model()
+    assert not model.readFromCompiledCache()
+    path = model.compiledCachePath()
+    assert os.path.basename(path) == 'MKModelCache.%s.mkcache' % (
+        store.__class__.__name__), path
+    assert os.path.basename(os.path.dirname(path)) == 'WorkDir', path
+    assert os.path.exists(path)
+
+    cached, seconds = newStore(store)
+    cachedModel = cached.model()
+    assert cachedModel.readFromCompiledCache()
+    print 'read model from cache in %.1f ms' % (seconds * 1000)
+
+    # klasses and inherited klasses
+    names = [klass.name() for klass in model.allKlassesInOrder()]
+    assert [klass.name() for klass in cachedModel.allKlassesInOrder()] == names
+    assert 'Dummy' in names and 'Person' in names  # from the parent models
+    book = cachedModel.klass('Book')
+    assert book.superklass() is cachedModel.klass('Thing')
+    assert book.klasses().model() is cachedModel
+    assert book.lookupAttr('title').klass() is book
+    assert book.lookupAttr('author').targetKlass() is cachedModel.klass('Author')
+    assert [attr.name() for attr in book.allAttrs()] == [
+        attr.name() for attr in model.klass('Book').allAttrs()]
+    assert cachedModel.setting('Inherit') == ['MKModelInh1']
+
+    # data added by the store
+    for klass in model.allKlassesInOrder():
+        cachedKlass = cachedModel.klass(klass.name())
+        assert cachedKlass.__dict__.get('_fetchSQLStart') == klass.fetchSQLStart()
+        for attr in klass.allDataAttrs():
+            if attr.hasSQLColumn():
+                assert cachedKlass.lookupAttr(attr.name()).__dict__[
+                    '_sqlColumnName'] == attr.sqlColumnName()
+
+    # the Python classes have been connected to the cached klasses
+    assert book.pyClass()._mk_klass is book
+    assert cachedModel.klass('Dummy').pyClass()._mk_klass is cachedModel.klass('Dummy')
+    print '*** passed testReadFromCache'
+
+
+def testInvalidCache(store):
+    path = store.model().compiledCachePath()
+    # a different version of the cache layout
+    Model.compiledCacheVersion += 1
+    try:
+        cached, seconds = newStore(store)
+        assert not cached.model().readFromCompiledCache()
+        cached, seconds = newStore(store)
+        assert cached.model().readFromCompiledCache()
+    finally:
+        Model.compiledCacheVersion -= 1
+    cached, seconds = newStore(store)
+    assert not cached.model().readFromCompiledCache()
+    # a corrupted cache
+    with open(path, 'wb') as f:
+        f.write('garbage')
+    cached, seconds = newStore(store)
+    assert not cached.model().readFromCompiledCache()
+    cached, seconds = newStore(store)
+    assert cached.model().readFromCompiledCache()
+    # a changed source file of a parent model
+    changed = store.__class__(**store._dbArgs)
+    changed.readModelFileNamed(store.model().filename(), modelClass=ChangedModel)
+    assert not changed.model().readFromCompiledCache()
+    print '*** passed testInvalidCache'
+
+
+def testObjects(store):
+    cached, seconds = newStore(store)
+    assert cached.model().readFromCompiledCache()
+    from Author import Author
+    from Book import Book
+    author = Author()
+    author.setName('Joe')
+    book = Book()
+    book.setTitle('MiddleKit')
+    book.setAuthor(author)
+    book.setI(3)
+    cached.addObject(author)
+    cached.addObject(book)
+    cached.saveChanges()
+    cached.clear()
+    book, = cached.fetchObjectsOfClass('Book')
+    assert book.title() == 'MiddleKit'
+    assert book.i() == 3
+    assert book.author().name() == 'Joe'
+    assert book.klass() is cached.model().klass('Book')
+    print '*** passed testObjects'
@@ -0,0 +1,43 @@
+from threading import Thread
+from Person import Person
+import time
+
+
+def test(store, numObjects=200, numFetches=20, numThreads=(1, 2, 4, 8)):
+    """Benchmark concurrent fetches.
+
+    Each thread fetches all objects a number of times, refreshing their
+    attributes. Reading the rows into objects does not need a global lock,
+    so the throughput should not drop when threads are added.
+    """
+    for i in range(numObjects):
+        p = Person()
+        p.setId(str(i))
+        p.setFirstName('Robert')
+        p.setMiddleName('Allen')
+        p.setLastName('Zimmerman')
+        store.addObject(p)
+    store.saveChanges()
+    people = store.fetchObjectsOfClass(Person)  # keep them in memory
+
+    class Fetcher(Thread):
+
+        def run(self):
+            for i in range(numFetches):
+                objs = store.fetchObjectsOfClass(Person)
+                assert len(objs) == numObjects
+                assert objs[-1].lastName() == 'Zimmerman'
+
+    print 'threads  fetches/s  objects/s'
+    for num in numThreads:
+        fetchers = [Fetcher() for i in range(num)]
+        start = time.time()
+        for fetcher in fetchers:
+            fetcher.start()
+        for fetcher in fetchers:
+            fetcher.join()
+        duration = max(time.time() - start, 1e-6)
+        fetches = num * numFetches
+        print '%7d  %9.1f  %9.0f' % (num,
+            fetches / duration, fetches * numObjects / duration)
+    assert len(people) == numObjects
@@ -0,0 +1,108 @@
+import gc
+
+
+def test(store):
+    from Country import Country
+    from Person import Person
+
+    testGenerations(store)
+    testInvalidation(store)
+    testObjectCache()
+
+
+def testGenerations(store):
+    store.clear()
+    stats = store.objectCacheStats()
+    assert stats['size'] == stats['resident'] == stats['hits'] == 0
+    countries = store.fetchObjectsOfClass('Country')
+    assert len(countries) == 2
+    del countries
+    gc.collect()
+    # recently used objects stay in memory
+    stats = store.objectCacheStats()
+    assert stats['size'] == stats['resident'] == 2
+    count = store.sqlCount()
+    canada = store.fetchObject('Country', 1, None)
+    assert canada.name() == 'Canada'
+    # the size limits the number of objects kept in memory
+    people = store.fetchObjectsOfClass('Person')
+    assert len(people) == 6
+    del people
+    gc.collect()
+    stats = store.objectCacheStats()
+    assert stats['resident'] <= 4
+    assert stats['evictions'] > 0
+    assert stats['size'] == stats['resident'] + 1  # canada is still in use
+    assert stats['hits'] > 0
+
+
+def testInvalidation(store):
+    store.clear()
+    people = store.fetchObjectsOfClass('Person')
+    person = people[0]
+    assert store.hasObject(person)
+    assert store.invalidateObject(person)
+    assert not store.hasObject(person)
+    assert not store.invalidateObject(person)
+    fetched = store.fetchObject('Person', person.serialNum())
+    assert fetched is not person and fetched.name() == person.name()
+    assert store.invalidateObjectsOfClass('Person') == 6
+    assert store.objectCacheStats()['invalidations'] == 7
+    assert store.fetchObject('Country', 1) is person.country()
+    assert store.invalidateObjectsOfClass('Country') == 1
+
+
+def testObjectCache():
+    from MiddleKit.Run.ObjectCache import ObjectCache
+    from MiddleKit.Run.ObjectKey import ObjectKey
+
+    class Thing(object):
+        pass
+
+    def key(className, serialNum):
+        return ObjectKey().initFromClassNameAndSerialNum(className, serialNum)
+
+    # weak only
+    cache = ObjectCache()
+    thing = Thing()
+    cache[key('Thing', 1)] = thing
+    assert cache[key('Thing', 1)] is thing
+    assert key('Thing', 1) in cache
+    del thing
+    gc.collect()
+    assert key('Thing', 1) not in cache
+    assert cache.get(key('Thing', 1)) is None
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1
+
+    # two generations of size 2
+    cache = ObjectCache(4)
+    for n in range(1, 6):
+        cache[key('Thing', n)] = Thing()
+    gc.collect()
+    assert len(cache) == 3 and cache.stats()['evictions'] == 2
+    # using an object of the young generation does not change anything
+    young = cache._young
+    assert cache.get(key('Thing', 5)) is not None
+    assert cache._young is young and len(young) == 1
+    # using an object moves it to the young generation again
+    assert cache.get(key('Thing', 3)) is not None
+    cache[key('Thing', 6)] = Thing()
+    gc.collect()
+    assert sorted(k.serialNum() for k in cache.keys()) == [3, 5, 6]
+
+    # unlimited size, per class ttl
+    cache = ObjectCache(None, ttl=None, classTTL={'Temp': 0, 'Short': 0.001})
+    cache[key('Thing', 1)] = Thing()
+    cache[key('Temp', 1)] = Thing()
+    cache[key('Short', 1)] = Thing()
+    gc.collect()
+    assert len(cache) == 2
+    import time
+    time.sleep(0.01)
+    cache.purge()
+    gc.collect()
+    assert len(cache) == 1
+    assert cache.stats()['expirations'] == 1
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,164 @@
+import gc
+import time
+
+from MiddleKit.Run.QueryCache import QueryCache
+
+
+def test(store):
+    testHits(store)
+    testArgs(store)
+    testInvalidation(store)
+    testSubclasses(store)
+    testHollowObjects(store)
+    testSize(store)
+    testQueryCache()
+
+
+def fetchCountries(store):
+    return store.fetchObjectsOfClass('Country',
+        clauses='order by name', cache=True)
+
+
+def testHits(store):
+    store.clear()
+    store._queryCache.resetStats()
+    count = store.sqlCount()
+    countries = fetchCountries(store)
+    assert [c.name() for c in countries] == ['Canada', 'Germany']
+    assert store.sqlCount() == count + 1
+    assert fetchCountries(store) == countries
+    assert store.sqlCount() == count + 1  # no query
+    stats = store.queryCacheStats()
+    assert stats['size'] == 1
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    # queries without cache=True are not cached
+    assert store.fetchObjectsOfClass('Country', clauses='order by name') == countries
+    assert store.sqlCount() == count + 2
+
+
+def testArgs(store):
+    store.clear()
+    canada, germany = fetchCountries(store)
+    clauses = 'where countryObjId=? order by name'
+    count = store.sqlCount()
+    results = []
+    for country in canada, germany, canada, germany:
+        cities = store.fetchObjectsOfClass('City', clauses=clauses,
+            clausesArgs=[country.serialNum()], isDeep=False, cache=True)
+        assert all(city.country() is country for city in cities)
+        results.append(cities)
+    assert store.sqlCount() == count + 2
+    assert results[2] == results[0] and results[3] == results[1]
+    # the same query with isDeep is a different query
+    cities = store.fetchObjectsOfClass('City', clauses=clauses,
+        clausesArgs=[germany.serialNum()], cache=True)
+    assert [c.name() for c in cities] == ['Hamburg', 'Munich', 'Berlin']
+    assert store.sqlCount() == count + 4  # City and Capital
+
+
+def testInvalidation(store):
+    from Country import Country
+    store.clear()
+    countries = fetchCountries(store)
+    cities = store.fetchObjectsOfClass('City', cache=True)
+    country = Country()
+    country.setName('Austria')
+    store.addObject(country)
+    store.saveChanges()
+    count = store.sqlCount()
+    countries = fetchCountries(store)
+    assert [c.name() for c in countries] == ['Austria', 'Canada', 'Germany']
+    assert store.sqlCount() == count + 1
+    # results of other classes are not invalidated
+    assert store.fetchObjectsOfClass('City', cache=True) == cities
+    assert store.sqlCount() == count + 1
+    country.setName('Austria-Hungary')
+    store.saveChanges()
+    count = store.sqlCount()
+    assert fetchCountries(store)[0].name() == 'Austria-Hungary'
+    assert store.sqlCount() == count + 1
+    store.deleteObject(country)
+    store.saveChanges()
+    count = store.sqlCount()
+    assert len(fetchCountries(store)) == 2
+    assert store.sqlCount() == count + 1
+    assert store.queryCacheStats()['invalidations'] >= 3
+    # explicit invalidation
+    assert store.invalidateQueries('Country') == 1
+    fetchCountries(store)
+    assert store.sqlCount() == count + 2
+    assert store.invalidateQueries() == 2
+    assert store.queryCacheStats()['size'] == 0
+
+
+def testSubclasses(store):
+    store.clear()
+    cities = store.fetchObjectsOfClass('City', clauses='order by name', cache=True)
+    assert len(cities) == 5
+    exact = store.fetchObjectsOfClass('City', isDeep=False, cache=True)
+    assert len(exact) == 3
+    capitals = [city for city in cities if city.klass().name() == 'Capital']
+    assert len(capitals) == 2
+    capitals[0].setSince(capitals[0].since() + 1)
+    store.saveChanges()
+    count = store.sqlCount()
+    # the deep query depends on the subclass, but the other does not
+    assert store.fetchObjectsOfClass('City', isDeep=False, cache=True) == exact
+    assert store.sqlCount() == count
+    assert len(store.fetchObjectsOfClass(
+        'City', clauses='order by name', cache=True)) == 5
+    assert store.sqlCount() == count + 2
+
+
+def testHollowObjects(store):
+    store.clear()
+    names = list(c.name() for c in fetchCountries(store))
+    gc.collect()
+    assert store.objectCacheStats()['size'] == 0
+    count = store.sqlCount()
+    countries = fetchCountries(store)
+    assert store.sqlCount() == count
+    assert all(c.isHollow() for c in countries)
+    assert [c.name() for c in countries] == names
+    assert store.sqlCount() == count + 1  # faulted in with one query
+
+
+def testSize(store):
+    store.clear()
+    for name in 'Ottawa', 'Berlin', 'Toronto', 'Munich', 'Hamburg':
+        cities = store.fetchObjectsOfClass('City', clauses='where name=?',
+            clausesArgs=(name,), cache=True)
+        assert [c.name() for c in cities] == [name]
+    stats = store.queryCacheStats()
+    assert stats['size'] == 4
+    assert stats['evictions'] == 1
+
+
+def testQueryCache():
+    cache = QueryCache(size=2, ttl=0.05)
+    assert cache.put('a', [1], ['A'])
+    assert cache.get('a') == (1,)
+    # results of queries that started before an invalidation are not stored
+    generation = cache.generation()
+    assert cache.invalidateClass('A') == 1
+    assert not cache.put('a', [2], ['A'], generation)
+    assert cache.get('a') is None
+    assert cache.put('a', [3], ['A', 'B'], cache.generation())
+    assert cache.put('b', [4], ['B'])
+    # the least recently used result is evicted
+    assert cache.get('a') == (3,)
+    assert cache.put('c', [5], ['C'])
+    assert cache.get('b') is None
+    assert cache.get('a') == (3,)
+    assert cache.invalidateClasses(['B', 'C']) == 2
+    assert len(cache) == 0
+    cache.put('a', [6], ['A'])
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['evictions'] == 1
+    assert stats['invalidations'] == 3
+    cache = QueryCache(size=0)
+    assert not cache.put('a', [1], ['A'])
+    assert len(cache) == 0
@@ -0,0 +1,158 @@
+from MiddleKit.Run.SQLObjectStore import StaleObjectError, UnknownObjectError
+
+
+def otherStore(store):
+    """Return a store standing in for another process."""
+    other = store.__class__(**store._dbArgs)
+    other.setModel(store.model())
+    return other
+
+
+def test(store):
+    testRowVersions(store)
+    testStaleObjects(store)
+    testChangeNotification(store)
+
+
+def testRowVersions(store):
+    from Thing import Thing
+    thing = Thing()
+    thing.setName('one')
+    assert thing.rowVersion() is None
+    store.addObject(thing)
+    store.saveChanges()
+    assert thing.rowVersion() == 1
+    thing.setCount(1)
+    store.saveChanges()
+    assert thing.rowVersion() == 2
+    store.clear()
+    thing, = store.fetchObjectsOfClass('Thing')
+    assert thing.rowVersion() == 2
+    # lazy fetches get the version when faulting in
+    store.clear()
+    thing, = store.fetchObjectsOfClass('Thing', lazy=True)
+    assert thing.rowVersion() is None
+    assert thing.count() == 1
+    assert thing.rowVersion() == 2
+    print '*** passed testRowVersions'
+
+
+def testStaleObjects(store):
+    other = otherStore(store)
+    thing = store.fetchObjectsOfClass('Thing')[0]
+    otherThing = other.fetchObjectsOfClass('Thing')[0]
+    assert otherThing is not thing
+    assert thing.rowVersion() == otherThing.rowVersion() == 2
+
+    otherThing.setName('two')
+    other.saveChanges()
+    assert otherThing.rowVersion() == 3
+
+    from Thing import Thing
+    newThing = Thing()
+    newThing.setName('three')
+    store.addObject(newThing)
+    thing.setCount(2)
+    try:
+        store.saveChanges()
+    except StaleObjectError as e:
+        assert e.objects() == [thing], e.objects()
+        assert 'Thing.1' in str(e), str(e)
+    else:
+        raise AssertionError('no stale object error')
+    # the other changes have been saved, the stale object is still changed
+    assert newThing.serialNum() > 0
+    assert thing.isChanged() and store.hasChanges()
+    assert store.refreshStaleObject(thing) is thing
+    assert not thing.isChanged()
+    assert thing.name() == 'two' and thing.count() == 1
+    assert thing.rowVersion() == 3
+    thing.setCount(2)
+    store.saveChanges()
+    assert thing.rowVersion() == 4
+
+    # an object deleted by another store is stale as well
+    otherNew = other.fetchObject('Thing', newThing.serialNum())
+    other.deleteObject(otherNew)
+    other.saveChanges()
+    newThing.setCount(3)
+    try:
+        store.saveChanges()
+    except StaleObjectError as e:
+        assert e.objects() == [newThing]
+    else:
+        raise AssertionError('no stale object error')
+    assert store.refreshStaleObject(newThing) is None
+    assert not store.hasObject(newThing)
+    store.saveChanges()
+    print '*** passed testStaleObjects'
+
+
+def testChangeNotification(store):
+    # the changes of the other store of the previous test
+    assert store.pollChanges() == 2
+    other = otherStore(store)
+    thing = store.fetchObjectsOfClass('Thing')[0]
+    # own changes are not read
+    thing.setCount(4)
+    store.saveChanges()
+    assert store.pollChanges() == 0
+    otherThing = other.fetchObjectsOfClass('Thing')[0]
+
+    # updates
+    otherThing.setName('four')
+    other.saveChanges()
+    assert thing.name() == 'two'
+    assert store.pollChanges() == 1
+    assert store.pollChanges() == 0
+    # the object keeps its identity and is read again
+    assert store.hasObject(thing)
+    assert thing.isHollow()
+    assert thing.name() == 'four'
+    assert not thing.isHollow()
+    fetched = store.fetchObject('Thing', thing.serialNum())
+    assert fetched is thing
+
+    # inserts invalidate cached query results
+    things = store.fetchObjectsOfClass('Thing', cache=True)
+    from Thing import Thing
+    newThing = Thing()
+    newThing.setName('five')
+    other.addObject(newThing)
+    other.saveChanges()
+    assert len(store.fetchObjectsOfClass('Thing', cache=True)) == len(things)
+    assert store.pollChanges() == 1
+    assert len(store.fetchObjectsOfClass('Thing', cache=True)) == len(things) + 1
+
+    # objects with unsaved changes are kept
+    thing = fetched
+    thing.setCount(5)
+    otherThing.setCount(6)
+    other.saveChanges()
+    assert store.pollChanges() == 1
+    assert store.hasObject(thing)
+    try:
+        store.saveChanges()
+    except StaleObjectError:
+        store.refreshStaleObject(thing)
+    else:
+        raise AssertionError('no stale object error')
+    assert thing.count() == 6
+
+    # deletes, polled automatically by the fetch methods
+    store._changeLog._pollInterval = 0
+    newThing = store.fetchObject('Thing', newThing.serialNum())
+    other.deleteObject(other.fetchObject('Thing', newThing.serialNum()))
+    other.saveChanges()
+    store.fetchObjectsOfClass('Thing')
+    assert newThing.isHollow()
+    try:
+        newThing.name()
+    except UnknownObjectError:
+        pass
+    else:
+        raise AssertionError('no unknown object error')
+    assert not store.hasObject(newThing)
+    assert store.fetchObject('Thing', newThing.serialNum(), None) is None
+
+    print '*** passed testChangeNotification'
@@ -0,0 +1,88 @@
+from MiddleKit.Run.SQLProfiler import (
+    SQLProfiler, QueryBudgetExceeded, normalizeSQL)
+
+
+def test(store):
+    testNormalize()
+    testStatements(store)
+    testBudget(store)
+    testTransactions(store)
+
+
+def testNormalize():
+    assert normalizeSQL("select * from Book where id in (1, 2, 3)"
+        " and title='It''s'\n  and x>-1.5;") == (
+        'select * from Book where id in (...) and title=? and x>?')
+    assert normalizeSQL('select title2 from T1 where a.b=1') == (
+        'select title2 from T1 where a.b=?')
+
+
+def testStatements(store):
+    profiler = store.sqlProfiler()
+    assert isinstance(profiler, SQLProfiler)
+    assert profiler in SQLProfiler.profilers()
+    store.clear()
+    profiler.reset()
+    with profiler.source('ListBooks'):
+        books = store.fetchObjectsOfClass('Book')
+    assert len(books) == 6
+    for book in books:
+        book.author().name()
+    stats = profiler.statements()
+    assert len(stats) == 2, stats
+    byCalls = dict((s['calls'], s) for s in stats)
+    assert byCalls[1]['rows'] == 6
+    assert byCalls[1]['sources'] == {'ListBooks': 1}
+    assert byCalls[3]['rows'] == 3
+    assert 'where' in byCalls[3]['sql'] and '?' in byCalls[3]['sql']
+    for s in stats:
+        assert s['seconds'] >= s['maxSeconds'] >= s['meanSeconds'] >= 0
+        assert s['waitSeconds'] >= 0
+    summary = profiler.stats()
+    assert summary['statements'] == 4 and summary['shapes'] == 2
+    assert summary['rows'] == 9
+    # every statement is slow with a SlowQueryTime of 0
+    slow = profiler.slowQueries()
+    assert len(slow) == 3
+    assert slow[-1]['source'] != 'ListBooks'
+    assert summary['slowQueries'] == 3
+
+
+def testBudget(store):
+    store.clear()
+    with store.queryBudget(1) as budget:
+        books = store.fetchObjectsOfClass('Book')
+    assert len(budget.statements()) == 1
+    try:
+        with store.queryBudget(10, maxPerShape=1):
+            for book in books:
+                book.author().name()
+    except QueryBudgetExceeded as e:
+        assert len(e.statements()) == 3
+        assert 'same shape' in str(e)
+    else:
+        raise AssertionError('N+1 queries were not detected')
+    try:
+        with store.queryBudget(0):
+            store.fetchObjectsOfClass('Author')
+    except QueryBudgetExceeded as e:
+        assert len(e.statements()) == 1
+    else:
+        raise AssertionError('budget was not enforced')
+    with store.queryBudget(0):
+        # objects in memory need no queries
+        for book in books:
+            book.author().name()
+
+
+def testTransactions(store):
+    profiler = store.sqlProfiler()
+    profiler.reset()
+    store.endUnitOfWork()
+    store.fetchObjectsOfClass('Author')
+    store.fetchObjectsOfClass('Book')
+    store.endUnitOfWork()
+    stats = profiler.stats()
+    assert stats['transactions'] == 2
+    assert stats['maxStatementsPerTransaction'] == 2
+    assert stats['statementsPerTransaction'] == 1.0
@@ -0,0 +1,258 @@
+from threading import Thread
+import time
+import weakref
+
+from MiddleKit.Run.AsyncStore import AsyncStore, AsyncTimeoutError, Future
+from MiddleKit.Run.ObjectStore import endUnitsOfWork
+
+
+def newThing(name, count=None):
+    from Thing import Thing
+    thing = Thing()
+    thing.setName(name)
+    thing.setCount(count)
+    return thing
+
+
+def test(store):
+    testUnitOfWork(store)
+    testOtherThread(store)
+    testDiscardChanges(store)
+    testEndUnitOfWork(store)
+    testAsyncStore(store)
+    testNotThreaded(store)
+
+
+def testUnitOfWork(store):
+    uow = store.unitOfWork()
+    own = store.currentUnitOfWork()
+    assert own is not uow
+    assert store.currentUnitOfWork() is own
+    with uow:
+        assert store.currentUnitOfWork() is uow
+        one = newThing('one', 1)
+        store.addObject(one)
+        assert store.hasChangesForCurrentThread()
+    assert store.currentUnitOfWork() is own
+    assert uow.hasChanges()
+    assert not store.hasChangesForCurrentThread()
+    assert store.hasChanges()
+
+    # the changes of the thread do not include those of the unit of work
+    two = newThing('two', 2)
+    store.addObject(two)
+    assert store.hasChangesForCurrentThread()
+    store.saveChanges()
+    assert two.serialNum() > 0
+    assert one.serialNum() < 1
+    assert uow.hasChanges()
+
+    uow.saveChanges()
+    assert one.serialNum() > 0
+    assert not uow.hasChanges()
+    assert not store.hasChanges()
+
+    # changes and deletes
+    with uow:
+        one.setCount(11)
+        store.deleteObject(two)
+        assert uow.changedClassNames() == set(['Thing'])
+    assert not store.changedClassNames()
+    store.saveChanges()  # nothing for the thread
+    assert one.isChanged()
+    uow.saveChanges()
+    assert not one.isChanged()
+    store.clear()
+    things = store.fetchObjectsOfClass('Thing')
+    assert [(t.name(), t.count()) for t in things] == [('one', 11)]
+
+    # nested units of work
+    inner = store.unitOfWork()
+    with uow:
+        with inner:
+            inner.addObject(newThing('inner'))
+            assert store.currentUnitOfWork() is inner
+        assert store.currentUnitOfWork() is uow
+    assert inner.hasChanges() and not uow.hasChanges()
+    store.saveAllChanges()
+    assert not inner.hasChanges()
+    assert store.countObjectsOfClass('Thing') == 2
+    print '*** passed testUnitOfWork'
+
+
+def testOtherThread(store):
+    """Check that changes made in one thread can be saved by another."""
+    uow = store.unitOfWork()
+    thing = newThing('three', 3)
+    uow.addObject(thing)
+    errors = []
+
+    def save():
+        try:
+            assert not store.hasChangesForCurrentThread()
+            store.saveChanges(uow)
+        except Exception as e:
+            errors.append(e)
+    thread = Thread(target=save)
+    thread.start()
+    thread.join()
+    assert not errors, errors
+    assert thing.serialNum() > 0
+    assert not uow.hasChanges()
+    print '*** passed testOtherThread'
+
+
+def testDiscardChanges(store):
+    uow = store.unitOfWork()
+    with uow:
+        store.addObject(newThing('four', 4))
+    assert store.hasChanges()
+    assert store.unitOfWorkStats()['pending'] == 1
+    uow.discardChanges()
+    assert not store.hasChanges()
+    assert store.unitOfWorkStats()['pending'] == 0
+    store.saveAllChanges()
+    assert store.countObjectsOfClass('Thing') == 3
+    print '*** passed testDiscardChanges'
+
+
+def testEndUnitOfWork(store):
+    store.resetUnitOfWorkStats()
+    # a request that does not save its changes
+    thing = store.fetchObjectsOfClass('Thing', clauses="where name='one'")[0]
+    thing.setCount(12)
+    store.addObject(newThing('five', 5))
+    assert store.endUnitOfWork() == (1, 1, 0)
+    assert not store.hasChanges()
+    # the discarded changes are not kept in memory
+    assert not thing.isChanged()
+    fetched = store.fetchObjectsOfClass('Thing', clauses="where name='one'")[0]
+    assert fetched is not thing and fetched.count() == 11
+    thing = fetched
+    # WebKit ends the units of work of all stores after each request
+    store.addObject(newThing('discarded'))
+    endUnitsOfWork()
+    assert not store.hasChanges()
+    # the next request
+    store.addObject(newThing('six', 6))
+    store.saveChanges()
+    assert store.countObjectsOfClass('Thing') == 4
+    stats = store.unitOfWorkStats()
+    assert stats == dict(pending=0, saves=1, inserts=1, updates=0,
+        deletes=0, maxObjects=1, discards=2), stats
+    thing.setCount(10)
+    store.saveChanges()
+
+    # the units of work of threads are freed when the threads end
+    def change():
+        thing.setCount(13)
+        uows.append(store.currentUnitOfWork())
+    uows = []
+    thread = Thread(target=change)
+    thread.start()
+    thread.join()
+    # unsaved changes are kept for saveAllChanges()
+    assert store.hasChanges()
+    store.saveAllChanges()
+    assert not store.hasChanges()
+    ref = weakref.ref(uows.pop())
+    assert ref() is None
+    stats = store.unitOfWorkStats()
+    assert stats['saves'] == 3 and stats['updates'] == 2, stats
+    print '*** passed testEndUnitOfWork'
+
+
+def testAsyncStore(store):
+    with AsyncStore(store, workers=3) as asyncStore:
+        things = asyncStore.fetchObjectsOfClass('Thing', clauses='order by name')
+        count = asyncStore.countObjectsOfClass('Thing')
+        total = asyncStore.fetchAggregateOfClass('Thing', 'sum(count)')
+        assert [t.name() for t in things.result()] == [
+            'inner', 'one', 'six', 'three']
+        assert things.done()
+        assert count.result() == 4
+        assert total.result() == 22
+        first = things.result()[0]
+        assert asyncStore.fetchObject('Thing', first.serialNum()).result() is first
+
+        # exceptions are raised by result()
+        future = asyncStore.fetchObjectsOfClass('Nothing')
+        try:
+            future.result()
+        except KeyError:
+            pass
+        else:
+            raise AssertionError('no error for unknown class')
+        assert isinstance(future.exception(), KeyError)
+
+        # the changes of the thread can be saved by a worker
+        first.setCount(99)
+        own = store.currentUnitOfWork()
+        saved = asyncStore.saveChanges()
+        # ending the request does not interfere with the save
+        assert store.currentUnitOfWork() is not own
+        assert store.endUnitOfWork() == (0, 0, 0)
+        saved.result()
+        assert not first.isChanged()
+        assert not store.hasChangesForCurrentThread()
+        uow = store.unitOfWork()
+        with uow:
+            first.setCount(100)
+            store.addObject(newThing('seven', 7))
+            saved = asyncStore.saveChanges()
+        done = []
+        saved.addDoneCallback(done.append)
+        assert saved.result(10) is None
+        assert done == [saved]
+        assert not uow.hasChanges()
+        assert not first.isChanged()
+        assert asyncStore.countObjectsOfClass('Thing').result() == 5
+
+        # results that are not ready in time
+        slow = asyncStore.submit(time.sleep, 0.2)
+        try:
+            slow.result(0.01)
+        except AsyncTimeoutError:
+            pass
+        else:
+            raise AssertionError('no timeout')
+        assert slow.result() is None
+    try:
+        asyncStore.fetchObjectsOfClass('Thing')
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('no error after shutdown')
+    assert isinstance(slow, Future)
+    print '*** passed testAsyncStore'
+
+
+def testNotThreaded(store):
+    from MiscUtils import NoDefault
+
+    class Store(store.__class__):
+        def setting(self, name, default=NoDefault):
+            if name == 'Threaded':
+                return False
+            return store.__class__.setting(self, name, default)
+
+    other = Store(**store._dbArgs)
+    other.setModel(store.model())
+    # all threads share one unit of work
+    uow = other.currentUnitOfWork()
+    uows = []
+
+    def change():
+        uows.append(other.currentUnitOfWork())
+        other.addObject(newThing('shared', 1))
+
+    thread = Thread(target=change)
+    thread.start()
+    thread.join()
+    assert uows == [uow]
+    # the changes of the other thread are seen by this thread
+    assert other.hasChangesForCurrentThread()
+    assert other.endUnitOfWork() == (1, 0, 0)
+    assert not other.hasChanges()
+    assert other.currentUnitOfWork() is uow and not uow.hasChanges()
+    print '*** passed testNotThreaded'
@@ -80,7 +80,9 @@ class Test(object):
                 MKList MKObjRef MKObjRefReuse MKDelete MKDeleteMark
                 MKMultipleStores MKMultipleThreads
                 MKModelInh1 MKModelInh2 MKModelInh3
-                MKExcel
+                MKExcel MKLazyFetch MKIterFetch MKObjectCache MKQueryCache
+                MKIndexes MKBulkLoad MKModelCache MKAggregates MKRowVersions
+                MKUnitOfWork MKSQLProfiler
             '''.split()
 
     def canRun(self):
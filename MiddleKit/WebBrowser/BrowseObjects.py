@@ -1,8 +1,164 @@
+import sys
+from time import time
+
 from StorePage import StorePage
 
 
 class BrowseObjects(StorePage):
+    """Browse the objects of a class page by page.
+
+    The objects are fetched with keyset pagination, so that only one page
+    of objects is read from the database, however large the table is.
+    They can be sorted by any attribute with one SQL column and filtered
+    by the values of the attributes. Both is done by the database.
+
+    The fields of the page are:
+        class   - the name of the class
+        sort    - the name of the attribute to sort by (default serialNum)
+        desc    - sort in descending order if set
+        after   - the serial number of the last object of the previous page
+        size    - the page size (default 'PageSize' of Properties.config)
+        f_attr  - filter for the attribute named attr
+    """
 
     def writeContent(self):
-        className = self.request().field('class')
-        self.writeln(self.store().htObjectsOfClassNamed(className))
+        req = self.request()
+        className = req.field('class')
+        store = self.store()
+        klass = store.model().klass(className)
+        if klass.isAbstract():
+            self.writeSubklasses(klass)
+            return
+        self._klass = klass
+        self._sort = req.field('sort', None) or 'serialNum'
+        self._desc = bool(req.field('desc', None))
+        self._pageSize = min(max(1, self.intField('size',
+            self.setting('PageSize', 50))), self.setting('MaxPageSize', 1000))
+        self._filters = {}
+        for attr in klass.allAttrs():
+            if attr.isBrowserFilterable():
+                value = req.field('f_' + attr.name(), '').strip()
+                if value:
+                    self._filters[attr.name()] = value
+        self.writeFilterForm()
+        try:
+            where, args = self.filterConditions()
+        except (KeyError, ValueError) as e:
+            self.writeln('<p class="Error">Invalid filter: %s</p>'
+                % self.htmlEncode(str(e)))
+            return
+        after = self.intField('after', 0)
+        start = time()
+        # the budget only serves for counting the statements of this thread
+        with store.queryBudget(sys.maxint) as budget:
+            try:
+                objs = store.fetchPageOfClass(klass, after,
+                    self._pageSize + 1, where=where, clausesArgs=args,
+                    orderBy=self._sort, descending=self._desc)
+            except ValueError as e:
+                self.writeln('<p class="Error">%s</p>'
+                    % self.htmlEncode(str(e)))
+                return
+            total = store.countObjectsOfClass(klass,
+                clauses='where ' + where if where else '',
+                isDeep=False, clausesArgs=args)
+        duration = time() - start
+        sqlCount = len(budget.statements())
+        hasNext = len(objs) > self._pageSize
+        del objs[self._pageSize:]
+        self.writeln('<p class="TablePrefix">%d of %d %s objects'
+            ' in %.1f ms with %d SQL statement%s</p>' % (len(objs), total,
+                className, duration * 1000, sqlCount, 's'[:sqlCount != 1]))
+        self.writeObjects(objs)
+        self.writePageLinks(after, objs, hasNext)
+
+    def writeSubklasses(self, klass):
+        self.writeln('<p>%s is an abstract class. Its subclasses are:</p>'
+            % klass.name())
+        for subklass in klass.descendants():
+            name = subklass.name()
+            self.writeln('<p><a href="BrowseObjects?class=%s"'
+                ' class="ClassLink">%s</a></p>' % (self.urlEncode(name), name))
+
+    def writeFilterForm(self):
+        wr = self.writeln
+        wr('<form action="BrowseObjects" method="get" class="FilterForm">')
+        wr('<input type="hidden" name="class" value="%s">'
+            % self.htmlEncode(self._klass.name()))
+        wr('<input type="hidden" name="sort" value="%s">'
+            % self.htmlEncode(self._sort))
+        if self._desc:
+            wr('<input type="hidden" name="desc" value="1">')
+        wr('<input type="hidden" name="size" value="%d">' % self._pageSize)
+        wr('<table class="FilterTable">')
+        for attr in self._klass.allAttrs():
+            if attr.isBrowserFilterable():
+                name = attr.name()
+                wr('<tr><td>%s</td><td><input type="text" name="f_%s"'
+                    ' value="%s"></td></tr>' % (name, name,
+                        self.htmlEncode(self._filters.get(name, ''))))
+        wr('<tr><td></td><td><input type="submit" value="Filter"></td></tr>')
+        wr('</table></form>')
+
+    def writeObjects(self, objs):
+        wr = self.writeln
+        wr('<table class="ObjectsTable">')
+        wr(self._klass.htHeadingsRow(self.sortLink))
+        if objs:
+            for obj in objs:
+                wr(obj.htAttrsRow())
+        else:
+            wr('<tr><td class="NoObjectsCell">No %s objects.</td></tr>'
+                % self._klass.name())
+        wr('</table>')
+
+    def writePageLinks(self, after, objs, hasNext):
+        links = []
+        if after:
+            links.append('<a href="%s">First</a>'
+                % self.htmlEncode(self.pageURL()))
+        if hasNext:
+            links.append('<a href="%s">Next</a>' % self.htmlEncode(
+                self.pageURL(after=objs[-1].serialNum())))
+        if links:
+            self.writeln('<p class="PageLinks">%s</p>' % ' | '.join(links))
+
+
+    ## Self utility ##
+
+    def intField(self, name, default):
+        try:
+            return int(self.request().field(name, default))
+        except ValueError:
+            return default
+
+    def filterConditions(self):
+        """Return the SQL condition and the arguments for the filters."""
+        marker = self.store().sqlParamMarker()
+        conditions, args = [], []
+        for name in sorted(self._filters):
+            condition, values = self._klass.lookupAttr(name).browserFilter(
+                self._filters[name], marker)
+            conditions.append(condition)
+            args.extend(values)
+        return ' and '.join(conditions), args
+
+    def pageURL(self, **fields):
+        """Return the URL of the page with the current fields."""
+        params = dict(('f_' + name, value)
+            for name, value in self._filters.items())
+        params.update({'class': self._klass.name(), 'sort': self._sort,
+            'size': self._pageSize})
+        if self._desc:
+            params['desc'] = 1
+        params.update(fields)
+        return 'BrowseObjects?' + '&'.join('%s=%s' % (name,
+            self.urlEncode(str(value))) for name, value in sorted(params.items()))
+
+    def sortLink(self, name):
+        """Return the URL for sorting by the attribute with the given name.
+
+        Sorting by the current attribute again reverses the order.
+        """
+        desc = '1' if name == self._sort and not self._desc else ''
+        return self.pageURL(sort=name, desc=desc)
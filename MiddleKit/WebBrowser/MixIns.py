@@ -12,7 +12,9 @@ If you add another mix-in then update the list of names found
 in InstallMixIns().
 """
 
-from WebUtils.Funcs import htmlEncode
+from WebUtils.Funcs import htmlEncode, urlEncode
+from MiddleKit.Core.ObjRefAttr import objRefSplit
+from MiddleKit.Run.MiddleObject import MiddleObject as MKObject
 
 
 def splitWords(s):
@@ -66,16 +68,31 @@ class ObjectStore(object):
 
 class Klass(object):
 
-    def htHeadingsRow(self):
+    def htHeadingsRow(self, sortLink=None):
+        """Get HTML for the headings of the attributes.
+
+        If a sortLink function is given, the headings of the attributes
+        the objects can be sorted by are links. The function is called
+        with the attribute name and returns the URL of the link.
+        """
         ht = ['<tr>',
               '<th class="TableHeading">class</th>',
-              '<th class="TableHeading">serial</th>']
+              '<th class="TableHeading">%s</th>'
+                % self.htHeading('serial', 'serialNum', sortLink)]
         for attr in self.allAttrs():
             heading = splitWords(attr.name())
+            if attr.isBrowserSortable():
+                heading = self.htHeading(heading, attr.name(), sortLink)
             ht.append('<th class="TableHeading">%s</th>' % heading)
         ht.append('</tr>\n')
         return ''.join(ht)
 
+    def htHeading(self, heading, name, sortLink):
+        if sortLink is None:
+            return heading
+        return '<a href="%s" class="SortLink">%s</a>' % (
+            htmlEncode(sortLink(name)), heading)
+
 
 class MiddleObject(object):
 
@@ -112,19 +129,65 @@ class Attr(object):
     def htValue(self, value, obj):
         return htmlEncode(str(value))
 
+    def isBrowserSortable(self):
+        """Return whether objects can be sorted by the attribute.
+
+        This is the case for attributes with exactly one SQL column.
+        """
+        return self.hasSQLColumn() and ',' not in self.sqlColumnName()
+
+    def isBrowserFilterable(self):
+        return self.hasSQLColumn()
+
+    def browserFilter(self, input, marker):
+        """Return the SQL condition and the arguments for filtering.
+
+        The input is converted like sample input, so that e.g. obj refs
+        can be given as "Class.serialNum". The condition uses the given
+        parameter marker for the arguments. Raises a ValueError for
+        invalid input.
+        """
+        values = self.bulkValuesForSampleInput(input)
+        colNames = self.bulkColumnNames()
+        if values == self.bulkValuesForNone():
+            return ' and '.join('%s is null' % colName
+                for colName in colNames), []
+        return ' and '.join('%s=%s' % (colName, marker)
+            for colName in colNames), list(values)
+
+
+class StringAttr(object):
+
+    def browserFilter(self, input, marker):
+        """Return a condition matching the values containing the input.
+
+        The input may contain the SQL wildcards % and _.
+        """
+        input = input.strip()
+        if input in ('None', 'none'):
+            return '%s is null' % self.sqlColumnName(), []
+        return '%s like %s' % (self.sqlColumnName(), marker), [
+            '%%%s%%' % input]
+
 
 class ObjRefAttr(object):
 
     def htValue(self, value, obj):
+        """Get HTML for a link to the referenced object.
+
+        The link is made from the obj ref alone, so the referenced
+        object is neither fetched nor faulted in.
+        """
         if isinstance(value, long):
-            classSerialNum = (value & 0xFFFFFFFF00000000L) >> 32
-            objSerialNum = value & 0xFFFFFFFFL
-            klass = obj.store().klassForId(classSerialNum)
-            klassName = klass.name()
-            return ('<a href="BrowseObject?class=%s&serialNum=%i">%s.%i</a>'
-                % (klassName, objSerialNum, klassName, objSerialNum))
+            klassId, serialNum = objRefSplit(value)
+            klass = obj.store().klassForId(klassId)
+        elif isinstance(value, MKObject):
+            klass, serialNum = value.klass(), value.serialNum()
         else:
             return htmlEncode(str(value))
+        klassName = klass.name()
+        return ('<a href="BrowseObject?class=%s&amp;serialNum=%i">%s.%i</a>'
+            % (urlEncode(klassName), serialNum, klassName, serialNum))
 
 
 class ListAttr(object):
@@ -139,7 +202,8 @@ def InstallMixIns():
     from MiscUtils.MixIn import MixIn
 
     theGlobals = globals()
-    names = 'ObjectStore Klass MiddleObject Attr ObjRefAttr ListAttr'.split()
+    names = ('ObjectStore Klass MiddleObject Attr StringAttr'
+        ' ObjRefAttr ListAttr').split()
     places = 'Core Run'.split()
     for name in names:
         mixed = False
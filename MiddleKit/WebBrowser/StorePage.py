@@ -75,8 +75,8 @@ class StorePage(SitePage):
         for name in names:
             urlName = self.urlEncode(name)
             style = 'CurClassLink' if name == curClassName else 'ClassLink'
-            self.writeln('<p><a href="BrowseObjects?class=%s" class"=%s">'
-                '%s</a></p>' % (name, style, urlName))
+            self.writeln('<p><a href="BrowseObjects?class=%s" class="%s">'
+                '%s</a></p>' % (urlName, style, name))
 
     def writeContent(self):
         self.writeln('<p>Woops. Forgot to override writeContent().</p>')
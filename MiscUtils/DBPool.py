@@ -23,11 +23,41 @@ just a proxy class.
 db.close() will return the connection to the pool, not actually
 close it. This is so your existing code works nicely.
 
-DBPool is actually intended to be a demonstration of concept not to be
-used in a productive environment. It is really a very simple solution with
-several drawbacks. For instance, pooled database connections which have
-become invalid are not automatically recovered. For a more sophisticated
-solution, please have a look at the DBUtils package:
+The connections are opened on demand, up to maxconnections. If all
+connections are in use, connection() behaves depending on the threadsafety
+of the DB-API 2 module: With a threadsafety of 2 or more, connections can be
+shared between threads, so the connection that is used by the fewest threads
+is shared. Note that this may lead to problems if you use transactions.
+With a threadsafety of 1, a connection is used by only one thread at a time,
+and connection() waits until one is returned to the pool. The pool can be
+tuned with the following keyword arguments, which are not passed to connect():
+
+    minIdle: the number of connections opened at once and kept open
+        in the pool even if they are not used (default 0)
+    checkoutTimeout: the number of seconds connection() waits for a free
+        connection before raising CheckoutTimeoutError (default 30,
+        None means wait forever)
+    pingInterval: connections that have been idle in the pool for at least
+        this number of seconds are checked before they are handed out,
+        and replaced with new connections if they are broken (default 60;
+        0 means always check, None means never check)
+    pingQuery: the query used for checking connections that do not have
+        a ping() method (default 'select 1')
+    maxLifetime: the number of seconds after which connections are closed
+        and replaced with new connections (default None, meaning no limit)
+    threadAffinity: if set, connection() prefers the connection that was
+        last used by the same thread (default False)
+
+For example:
+
+    dbpool = DBPool(pgdb, 20, minIdle=2, checkoutTimeout=10,
+        maxLifetime=3600, database=...)
+
+The stats() method returns a dictionary with the number of open, idle and
+used connections and counters of what has happened in the pool.
+
+DBPool is still a rather simple solution. For a more sophisticated one,
+please have a look at the DBUtils package:
     https://webwareforpython.github.io/dbutils/
 
 
@@ -43,6 +73,10 @@ CREDIT
 """
 
 
+from threading import Condition, local
+from time import time
+
+
 class DBPoolError(Exception):
     """General database pooling error."""
 
@@ -51,6 +85,19 @@ class NotSupportedError(DBPoolError):
     """Missing support from database module error."""
 
 
+class CheckoutTimeoutError(DBPoolError):
+    """No connection could be obtained from the pool in time."""
+
+
+class PoolEntry(object):
+    """A database connection with the bookkeeping data of the pool."""
+
+    def __init__(self, con):
+        self.con = con
+        self.created = self.lastUsed = time()
+        self.users = 0  # the number of threads using the connection
+
+
 class PooledConnection(object):
     """A wrapper for database connections to help with DBPool.
 
@@ -58,8 +105,9 @@ class PooledConnection(object):
     but use DBPool to get new connections.
     """
 
-    def __init__(self, pool, con):
-        self._con = con
+    def __init__(self, pool, entry):
+        self._con = entry.con
+        self._entry = entry
         self._pool = pool
 
     def close(self):
@@ -67,8 +115,8 @@ class PooledConnection(object):
         # Instead of actually closing the connection,
         # return it to the pool so it can be reused.
         if self._con is not None:
-            self._pool.returnConnection(self._con)
-            self._con = None
+            self._pool.returnConnection(self._entry)
+            self._con = self._entry = None
 
     def __getattr__(self, name):
         # All other members are the same.
@@ -84,9 +132,10 @@ class DBPool(object):
         """Set up the database connection pool.
 
         dbapi: the DB-API 2 compliant module you want to use
-        maxconnections: the number of connections cached in the pool
+        maxconnections: the maximum number of connections in the pool
         args, kwargs: the parameters that shall be used to establish
-                      the database connections using connect()
+                      the database connections using connect(),
+                      except for the pool options described above
         """
         try:
             threadsafety = dbapi.threadsafety
@@ -95,82 +144,237 @@ class DBPool(object):
         if threadsafety == 0:
             raise NotSupportedError(
                 "Database module does not support any level of threading.")
-        elif dbapi.threadsafety == 1:
-            # If there is no connection level safety, build
-            # the pool using the synchronized queue class
-            # that implements all the required locking semantics.
-            from Queue import Queue
-            self._queue = Queue(maxconnections)  # create the queue
-            self.connection = self._unthreadsafe_get_connection
-            self.addConnection = self._unthreadsafe_add_connection
-            self.returnConnection = self._unthreadsafe_return_connection
-        elif dbapi.threadsafety in (2, 3):
-            # If there is connection level safety, implement the
-            # pool with an ordinary list used as a circular buffer.
-            # We only need a minimum of locking in this case.
-            from threading import Lock
-            self._lock = Lock()  # create a lock object to be used later
-            self._nextCon = 0  # the index of the next connection to be used
-            self._connections = []  # the list of connections
-            self.connection = self._threadsafe_get_connection
-            self.addConnection = self._threadsafe_add_connection
-            self.returnConnection = self._threadsafe_return_connection
-        else:
+        elif threadsafety not in (1, 2, 3):
             raise NotSupportedError(
                 'Database module threading support cannot be determined.')
-        # Establish all database connections (it would be better to
-        # only establish a part of them now, and the rest on demand).
-        for i in range(maxconnections):
-            self.addConnection(dbapi.connect(*args, **kwargs))
-
-    # The following functions are used with DB-API 2 modules
-    # that do not have connection level threadsafety, like PyGreSQL.
-    # However, the module must be threadsafe at the module level.
-    # Note: threadsafe/unthreadsafe refers to the DB-API 2 module,
-    # not to this class which should be threadsafe in any case.
-
-    def _unthreadsafe_get_connection(self):
-        """Get a connection from the pool."""
-        return PooledConnection(self, self._queue.get())
-
-    def _unthreadsafe_add_connection(self, con):
-        """Add a connection to the pool."""
-        self._queue.put(con)
-
-    def _unthreadsafe_return_connection(self, con):
+        # connections can be shared between threads with threadsafety 2 or 3
+        self._shareable = threadsafety > 1
+        self._minIdle = min(kwargs.pop('minIdle', 0), maxconnections)
+        self._checkoutTimeout = kwargs.pop('checkoutTimeout', 30)
+        self._pingInterval = kwargs.pop('pingInterval', 60)
+        self._pingQuery = kwargs.pop('pingQuery', 'select 1')
+        self._maxLifetime = kwargs.pop('maxLifetime', None)
+        self._threadAffinity = kwargs.pop('threadAffinity', False)
+        self._dbapi = dbapi
+        self._args, self._kwargs = args, kwargs
+        self._maxConnections = maxconnections
+        self._condition = Condition()
+        self._idle = []  # the idle connections, most recently used last
+        self._used = []  # the connections that are in use
+        self._size = 0  # the number of open connections, idle or used
+        self._local = local()  # the entry last used by the thread
+        self.resetStats()
+        for i in range(self._minIdle):
+            self.addConnection(self._connect())
+
+    def connection(self):
+        """Get a connection from the pool.
+
+        Returns a PooledConnection that can be used like the connection
+        itself and is returned to the pool when it is closed.
+        """
+        entry = None
+        with self._condition:
+            self._checkouts += 1
+            deadline = None
+            while not self._idle and self._size >= self._maxConnections:
+                if self._shareable and self._used:
+                    return PooledConnection(self, self._shareUsed())
+                now = time()
+                if deadline is None:
+                    self._waits += 1
+                    if self._checkoutTimeout is not None:
+                        deadline = now + self._checkoutTimeout
+                if deadline is not None and now >= deadline:
+                    self._timeouts += 1
+                    raise CheckoutTimeoutError('No database connection'
+                        ' available after %g seconds.' % self._checkoutTimeout)
+                self._condition.wait(
+                    None if deadline is None else deadline - now)
+            if self._idle:
+                entry = self._takeIdle()
+            else:
+                self._size += 1  # reserve a place for a new connection
+        if entry is None:
+            entry = self._newEntry()
+        else:
+            entry = self._checkedEntry(entry)
+        entry.lastUsed = time()
+        with self._condition:
+            entry.users = 1
+            self._used.append(entry)
+        if self._threadAffinity:
+            self._local.entry = entry
+        return PooledConnection(self, entry)
+
+    def addConnection(self, con):
+        """Add an open connection to the pool."""
+        with self._condition:
+            self._size += 1
+            self._idle.append(PoolEntry(con))
+            self._condition.notify()
+
+    def returnConnection(self, entry):
         """Return a connection to the pool.
 
-        In this case, the connections need to be put
-        back into the queue after they have been used.
         This is done automatically when the connection is closed
         and should never be called explicitly outside of this module.
+        Shared connections are returned when the last thread closes them.
         """
-        self._unthreadsafe_add_connection(con)
-
-    # The following functions are used with DB-API 2 modules
-    # that are threadsafe at the connection level, like psycopg.
-    # Note: In this case, connections are shared between threads.
-    # This may lead to problems if you use transactions.
-
-    def _threadsafe_get_connection(self):
-        """Get a connection from the pool."""
-        with self._lock:
-            next = self._nextCon
-            con = PooledConnection(self, self._connections[next])
-            next += 1
-            if next >= len(self._connections):
-                next = 0
-            self._nextCon = next
-            return con
-
-    def _threadsafe_add_connection(self, con):
-        """"Add a connection to the pool."""
-        self._connections.append(con)
-
-    def _threadsafe_return_connection(self, con):
-        """Return a connection to the pool.
+        with self._condition:
+            entry.users -= 1
+            if entry.users:
+                return  # still used by other threads
+            self._used.remove(entry)
+        now = time()
+        if self._expired(entry, now):
+            with self._condition:
+                self._recycled += 1
+            self._discard(entry)
+        else:
+            entry.lastUsed = now
+            with self._condition:
+                self._idle.append(entry)
+                self._condition.notify()
+        self._fillIdle()
+
+    def close(self):
+        """Close all idle connections in the pool.
+
+        Connections that are still in use are closed when they are returned.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry)
+
+
+    ## Statistics ##
+
+    def stats(self):
+        """Return a dictionary with statistics about the pool.
 
-        In this case, the connections always stay in the pool,
-        so there is no need to do anything here.
+        The keys are: size (number of open connections), idle, used,
+        maxConnections, checkouts, waits (checkouts that had to wait),
+        shares (checkouts that got a connection used by other threads),
+        timeouts, affinityHits, created, closed, pingFailures and recycled
+        (connections that have been replaced due to their lifetime).
         """
-        pass
+        with self._condition:
+            return dict(size=self._size, idle=len(self._idle),
+                used=self._size - len(self._idle),
+                maxConnections=self._maxConnections,
+                checkouts=self._checkouts, waits=self._waits,
+                shares=self._shares, timeouts=self._timeouts, affinityHits=self._affinityHits,
+                created=self._created, closed=self._closed,
+                pingFailures=self._pingFailures, recycled=self._recycled)
+
+    def resetStats(self):
+        self._checkouts = self._waits = self._shares = self._timeouts = 0
+        self._affinityHits = self._created = self._closed = 0
+        self._pingFailures = self._recycled = 0
+
+
+    ## Self utility ##
+
+    def _connect(self):
+        """Open a new database connection."""
+        con = self._dbapi.connect(*self._args, **self._kwargs)
+        with self._condition:
+            self._created += 1
+        return con
+
+    def _newEntry(self):
+        """Open a connection for a place that has already been reserved."""
+        try:
+            return PoolEntry(self._connect())
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _takeIdle(self):
+        """Take an entry from the idle connections. The lock must be held."""
+        idle = self._idle
+        if self._threadAffinity:
+            entry = getattr(self._local, 'entry', None)
+            if entry is not None:
+                for i in range(len(idle) - 1, -1, -1):
+                    if idle[i] is entry:
+                        self._affinityHits += 1
+                        return idle.pop(i)
+        return idle.pop()
+
+    def _shareUsed(self):
+        """Share the least used connection. The lock must be held."""
+        entry = min(self._used, key=lambda entry: entry.users)
+        entry.users += 1
+        self._shares += 1
+        return entry
+
+    def _checkedEntry(self, entry):
+        """Check a connection taken from the pool and replace it if needed."""
+        now = time()
+        if self._expired(entry, now):
+            with self._condition:
+                self._recycled += 1
+        elif (self._pingInterval is None
+                or now - entry.lastUsed < self._pingInterval
+                or self._ping(entry.con)):
+            return entry
+        else:
+            with self._condition:
+                self._pingFailures += 1
+        self._closeConnection(entry.con)
+        return self._newEntry()  # the place of the old connection is reused
+
+    def _expired(self, entry, now):
+        return (self._maxLifetime is not None
+            and now - entry.created >= self._maxLifetime)
+
+    def _ping(self, con):
+        """Check whether the connection is still usable."""
+        try:
+            ping = getattr(con, 'ping', None)
+            if callable(ping):
+                ping()
+            else:
+                cursor = con.cursor()
+                try:
+                    cursor.execute(self._pingQuery)
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+                con.rollback()  # do not leave a transaction open
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, entry):
+        """Close a connection that has been taken out of the pool."""
+        self._closeConnection(entry.con)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _closeConnection(self, con):
+        try:
+            con.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._closed += 1
+
+    def _fillIdle(self):
+        """Open connections until there are minIdle idle connections."""
+        while True:
+            with self._condition:
+                if (len(self._idle) >= self._minIdle
+                        or self._size >= self._maxConnections):
+                    return
+                self._size += 1
+            entry = self._newEntry()
+            with self._condition:
+                self._idle.insert(0, entry)
+                self._condition.notify()
@@ -18,7 +18,7 @@ from hashlib import md5, sha1
 __all__ = [
     'commas', 'charWrap', 'wordWrap', 'excstr', 'hostName', 'localIP',
     'positiveId', 'safeDescription', 'asclocaltime', 'timestamp',
-    'localTimeDelta', 'uniqueId', 'valueForString']
+    'localTimeDelta', 'monotonic', 'uniqueId', 'valueForString']
 
 
 def commas(number):
@@ -278,6 +278,53 @@ def localTimeDelta(t=None):
     return dt.fromtimestamp(t) - dt.utcfromtimestamp(t)
 
 
+def _monotonicClock():
+    """Get a function returning the time of a monotonic clock."""
+    try:
+        return time.monotonic
+    except AttributeError:  # Python < 3.3
+        pass
+    try:
+        import ctypes
+        import ctypes.util
+
+        class TimeSpec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt')
+            or ctypes.util.find_library('c'), use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(TimeSpec)]
+        clockMonotonic = 4 if os.uname()[0] == 'FreeBSD' else 1
+        byref = ctypes.byref
+        if clock_gettime(clockMonotonic, byref(TimeSpec())):
+            raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+    except Exception:  # no monotonic clock available
+        return time.time
+
+    def monotonic():
+        # use a new struct for every call, since ctypes releases the GIL
+        # and another thread could overwrite a shared struct meanwhile
+        t = TimeSpec()
+        clock_gettime(clockMonotonic, byref(t))
+        return t.tv_sec + t.tv_nsec * 1e-9
+
+    return monotonic
+
+_monotonic = _monotonicClock()
+
+
+def monotonic():
+    """Return the value of a monotonic clock in (fractional) seconds.
+
+    The clock cannot go backwards and is not affected by changes of the
+    system time, so it is the right one for measuring durations; its
+    reference point is undefined. Where no monotonic clock is available,
+    the value of time.time() is returned instead.
+    """
+    return _monotonic()
+
+
 def uniqueId(forObject=None, sha=False):
     """Generate an opaque identifier string.
 
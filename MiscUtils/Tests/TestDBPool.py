@@ -1,39 +1,257 @@
 """Test for DBPool.
 
-FUTURE
+Most tests use the sqlite3 module with in-memory databases.
+TestPgdb additionally uses the pgdb module and the template1 database
+of a local PostgreSQL server; it is skipped if these are not available.
 
-  * Parametrize the database and everything else.
-    Currently hard coded to pgdb template1 database.
+FUTURE
 
   * We don't really test performance here.
     E.g., we don't do benchmarks to see if DBPool actually helps or not.
 """
 
-
-import sys
+import sqlite3
+import threading
+import time
+import unittest
 
 import FixPath
-from MiscUtils.DBPool import DBPool
+from MiscUtils.DBPool import (DBPool, NotSupportedError,
+    CheckoutTimeoutError)
 
 
-def Test(iterations=15):
-    try:
-        dbapi_name = 'pgdb'
-        dbapi = __import__(dbapi_name)
-        pool = DBPool(dbapi, 10, database='template1')
-        for i in range(iterations):
+def newPool(maxconnections=2, **kwargs):
+    return DBPool(sqlite3, maxconnections,
+        ':memory:', check_same_thread=False, **kwargs)
+
+
+class TestDBPool(unittest.TestCase):
+
+    def testNotSupported(self):
+
+        class DBAPI(object):
+            threadsafety = 0
+
+        self.assertRaises(NotSupportedError, DBPool, DBAPI, 1)
+        DBAPI.threadsafety = None
+        self.assertRaises(NotSupportedError, DBPool, DBAPI, 1)
+
+    def testQuery(self):
+        pool = newPool()
+        db = pool.connection()
+        cursor = db.cursor()
+        cursor.execute('select 1 + 1')
+        self.assertEqual(cursor.fetchone(), (2,))
+        cursor.close()
+        db.close()
+
+    def testLazyGrowth(self):
+        pool = newPool(3)
+        self.assertEqual(pool.stats()['size'], 0)
+        db1 = pool.connection()
+        db2 = pool.connection()
+        con1, con2 = db1._con, db2._con
+        self.assertTrue(con1 is not con2)
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['used'], 2)
+        self.assertEqual(stats['created'], 2)
+        db1.close()
+        db2.close()
+        stats = pool.stats()
+        self.assertEqual(stats['idle'], 2)
+        self.assertEqual(stats['used'], 0)
+        db = pool.connection()
+        self.assertTrue(db._con is con2)
+        self.assertEqual(pool.stats()['created'], 2)
+        self.assertEqual(pool.stats()['checkouts'], 3)
+
+    def testReuse(self):
+        pool = newPool()
+        db = pool.connection()
+        con = db._con
+        db.close()
+        self.assertTrue(db._con is None)
+        db.close()  # closing twice does not hurt
+        db = pool.connection()
+        self.assertTrue(db._con is con)
+        del db  # returns the connection to the pool
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def testMinIdle(self):
+        pool = newPool(3, minIdle=2)
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['idle'], 2)
+        dbs = [pool.connection() for i in range(3)]
+        self.assertEqual(pool.stats()['idle'], 0)
+        dbs[0].close()
+        self.assertEqual(pool.stats()['idle'], 1)
+        pool.close()
+        self.assertEqual(pool.stats()['size'], 2)
+        dbs[1].close()
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def testCheckoutTimeout(self):
+        pool = newPool(1, checkoutTimeout=0.1)
+        db = pool.connection()
+        start = time.time()
+        self.assertRaises(CheckoutTimeoutError, pool.connection)
+        self.assertTrue(time.time() - start >= 0.09)
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        db.close()
+        pool.connection().close()
+
+    def testDefaultCheckoutTimeout(self):
+        self.assertEqual(newPool()._checkoutTimeout, 30)
+
+    def testSharedConnections(self):
+
+        class DBAPI(object):
+            threadsafety = 2
+            connect = staticmethod(sqlite3.connect)
+
+        pool = DBPool(DBAPI, 2, ':memory:', check_same_thread=False)
+        dbs = [pool.connection() for i in range(5)]
+        self.assertEqual(len(set(db._con for db in dbs)), 2)
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['used'], 2)
+        self.assertEqual(stats['shares'], 3)
+        self.assertEqual(stats['waits'], 0)
+        for db in dbs[:-1]:
+            db.close()
+        self.assertEqual(pool.stats()['idle'], 1)
+        dbs[-1].close()
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def testWaitForConnection(self):
+        pool = newPool(1, checkoutTimeout=5)
+        db = pool.connection()
+        con = db._con
+        timer = threading.Timer(0.1, db.close)
+        timer.start()
+        db = pool.connection()
+        timer.join()
+        self.assertTrue(db._con is con)
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 0)
+
+    def testPing(self):
+        pool = newPool(pingInterval=0)
+        db = pool.connection()
+        db.cursor().execute('create table t (n integer)')
+        db.close()
+        db = pool.connection()
+        db.cursor().execute('select * from t')  # still the same connection
+        db._con.close()  # break the connection
+        db.close()
+        db = pool.connection()
+        cursor = db.cursor()
+        cursor.execute('select 1')
+        self.assertEqual(cursor.fetchone(), (1,))
+        stats = pool.stats()
+        self.assertEqual(stats['pingFailures'], 1)
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['closed'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def testNoPing(self):
+        pool = newPool(pingInterval=None)
+        db = pool.connection()
+        db._con.close()
+        db.close()
+        db = pool.connection()
+        self.assertRaises(sqlite3.ProgrammingError, db.cursor)
+        self.assertEqual(pool.stats()['pingFailures'], 0)
+
+    def testMaxLifetime(self):
+        pool = newPool(maxLifetime=0)
+        db = pool.connection()
+        con = db._con
+        db.close()
+        self.assertRaises(sqlite3.ProgrammingError, con.cursor)
+        stats = pool.stats()
+        self.assertEqual(stats['recycled'], 1)
+        self.assertEqual(stats['size'], 0)
+        pool = newPool(maxLifetime=0.1)
+        db = pool.connection()
+        con = db._con
+        db.close()
+        time.sleep(0.1)
+        db = pool.connection()
+        self.assertTrue(db._con is not con)
+        self.assertEqual(pool.stats()['recycled'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def testThreadAffinity(self):
+        for affinity in False, True:
+            pool = newPool(threadAffinity=affinity)
+            db = pool.connection()
+            con = db._con
+            dbs = []
+            thread = threading.Thread(
+                target=lambda: dbs.append(pool.connection()))
+            thread.start()
+            thread.join()
+            db.close()
+            dbs[0].close()  # now the most recently returned connection
             db = pool.connection()
+            self.assertEqual(db._con is con, affinity)
+            self.assertEqual(pool.stats()['affinityHits'], int(affinity))
+            db.close()
+
+    def testManyThreads(self):
+        pool = newPool(3, checkoutTimeout=10)
+        errors = []
+
+        def run():
+            try:
+                for i in range(20):
+                    db = pool.connection()
+                    cursor = db.cursor()
+                    cursor.execute('select 1')
+                    cursor.fetchall()
+                    cursor.close()
+                    db.close()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        stats = pool.stats()
+        self.assertEqual(stats['checkouts'], 160)
+        self.assertTrue(stats['size'] <= 3)
+        self.assertEqual(stats['used'], 0)
+
+
+class TestPgdb(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            import pgdb
+            self.pool = DBPool(pgdb, 10, database='template1')
+        except Exception:
+            self.skipTest('You need the pgdb adapter'
+                ' and a test database for this test.')
+
+    def test(self, iterations=15):
+        for i in range(iterations):
+            db = self.pool.connection()
             cursor = db.cursor()
             cursor.execute("select datname from pg_database order by 1")
             r = cursor.fetchmany(5)
-            r = ', '.join(map(lambda s: s[0], r))
-            print i, r
+            self.assertTrue(r)
             db.close()
-    except Exception:
-        import traceback
-        traceback.print_exc()
-        print 'You need the pgdb adapter and a test database for this example.'
+        self.assertEqual(self.pool.stats()['size'], 1)
 
 
 if __name__ == '__main__':
-    Test()
+    unittest.main()
@@ -1,3 +1,4 @@
+import threading
 import time
 import unittest
 
@@ -166,6 +167,31 @@ ceremony!\""""
         self.assertEqual(d.seconds % 3600, 0)
         self.assertTrue(-1 <= d.days < 1)
 
+    def testMonotonic(self):
+        t = monotonic()
+        self.assertTrue(isinstance(t, float))
+        time.sleep(0.01)
+        d = monotonic() - t
+        self.assertTrue(0.005 < d < 1, d)
+
+    def testMonotonicThreads(self):
+        errors = []
+
+        def check():
+            last = monotonic()
+            for n in range(10000):
+                t = monotonic()
+                if t < last:
+                    errors.append((last, t))
+                last = t
+
+        threads = [threading.Thread(target=check) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
     def testUniqueId(self):
 
         def checkId(i, sha, past):
@@ -1,7 +1,13 @@
 """This module defines a class for handling writing responses."""
 
+import zlib
+from hashlib import sha1
+
 debug = False
 
+# window bits of zlib for the supported content encodings
+compressionWindowBits = dict(gzip=16 + zlib.MAX_WBITS, deflate=zlib.MAX_WBITS)
+
 
 class InvalidCommandSequence(Exception):
     """Invalid command sequence error"""
@@ -28,6 +34,12 @@ class ASStreamOut(object):
     `flush()`:
         Send the accumulated response data now. Will ask the `Response`
         to commit if it hasn't already done so.
+    `startCompression()`:
+        Compress all response data from now on with gzip or deflate.
+        This is done by the `HTTPResponse` if the client accepts it.
+    `mark()`, `dataSince()`:
+        Get the data written after a certain point, as long as it has
+        not been flushed yet. This is used by the output cache.
     """
 
     def __init__(self, autoCommit=False, bufferSize=8192):
@@ -39,6 +51,9 @@ class ASStreamOut(object):
         self._chunks = []
         self._chunkLen = 0
         self._closed = False
+        self._compressor = None
+        self._compressPending = False
+        self._resets = 0  # incremented when the chunks are rearranged
 
     def autoCommit(self):
         """Get the auto commit mode."""
@@ -79,6 +94,7 @@ class ASStreamOut(object):
         finally:
             self._chunks = []
             self._chunkLen = 0
+            self._resets += 1
         return True
 
     def buffer(self):
@@ -93,6 +109,49 @@ class ASStreamOut(object):
         else:  # otherwise return the buffered chunks
             return ''.join(self._chunks)
 
+    def startCompression(self, encoding='gzip', level=6):
+        """Compress the response data with the given content encoding.
+
+        The data accumulated so far and all data written from now on
+        is compressed. The headers must be prepended afterwards, so this
+        is invalid if we are already committed.
+        """
+        if self._committed or self._closed:
+            raise InvalidCommandSequence
+        compressor = zlib.compressobj(level, zlib.DEFLATED,
+            compressionWindowBits[encoding])
+        data = ''.join(self._chunks)
+        self._chunks = []
+        self._chunkLen = 0
+        self._resets += 1
+        self._compressor = compressor
+        if data:
+            self.write(data)
+
+    def flushCompression(self):
+        """Make all data written so far decompressible by the client."""
+        if self._compressor is not None and self._compressPending:
+            data = self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._chunks.append(data)
+            self._chunkLen += len(data)
+            self._compressPending = False
+
+    def finishCompression(self):
+        """Write the end of the compressed data.
+
+        Called when the response is complete; no data may be written after.
+        """
+        if self._compressor is not None:
+            data = self._compressor.flush()
+            self._chunks.append(data)
+            self._chunkLen += len(data)
+            self._compressor = None
+            self._compressPending = False
+
+    def compressing(self):
+        """Check whether the response data is being compressed."""
+        return self._compressor is not None
+
     def clear(self):
         """Try to clear any accumulated response data.
 
@@ -105,6 +164,7 @@ class ASStreamOut(object):
         self._buffer = ''
         self._chunks = []
         self._chunkLen = 0
+        self._resets += 1
 
     def close(self):
         """Close this buffer. No more data may be sent."""
@@ -135,6 +195,7 @@ class ASStreamOut(object):
         else:
             self._chunks.insert(0, charstr)
             self._chunkLen += len(charstr)
+            self._resets += 1
 
     def pop(self, count):
         """Remove count bytes from the front of the buffer."""
@@ -142,6 +203,34 @@ class ASStreamOut(object):
             print ">>> ASStreamOut popping", count
         self._buffer = self._buffer[count:]
 
+    def mark(self):
+        """Return a mark for the end of the data written so far."""
+        return self._resets, len(self._chunks)
+
+    def dataSince(self, mark):
+        """Return the data written since the mark has been taken.
+
+        Returns None if the data is not available any more, because it
+        has been flushed, cleared or compressed in the meantime.
+        """
+        resets, pos = mark
+        if resets != self._resets or self._compressor is not None:
+            return None
+        return ''.join(self._chunks[pos:])
+
+    def etag(self):
+        """Return a weak entity tag computed from the data written so far.
+
+        Returns None if the data is not complete any more, because it
+        has already been flushed or compressed.
+        """
+        if self._committed or self._buffer or self._compressor is not None:
+            return None
+        digest = sha1()
+        for chunk in self._chunks:
+            digest.update(chunk)
+        return 'W/"%s"' % digest.hexdigest()[:32]
+
     def committed(self):
         """Are we committed?"""
         return self._committed
@@ -172,6 +261,11 @@ class ASStreamOut(object):
             print ">>> ASStreamOut writing %s characters" % len(charstr)
         if self._closed:
             raise ConnectionAbortedError
+        if self._compressor is not None:
+            charstr = self._compressor.compress(charstr)
+            self._compressPending = True
+            if not charstr:
+                return
         self._chunks.append(charstr)
         self._chunkLen += len(charstr)
         if self._autoCommit and self._chunkLen > self._bufferSize:
@@ -29,6 +29,9 @@ class AdminPage(SidebarPage):
         self.menuItem('Config', 'Config')
         self.menuItem('Plug-ins', 'PlugIns')
         self.menuItem('Servlet Cache', 'ServletCache')
+        self.menuItem('SQL Profile', 'SQLProfile')
+        self.menuItem('Request Stages', 'RequestStages')
+        self.menuItem('Sampling Profile', 'SamplingProfile')
         self.menuItem('Application Control', 'AppControl')
         self.menuItem('Thread Control', 'ThreadControl')
         self.menuItem('Logout', 'Main?logout=yes')
@@ -0,0 +1,21 @@
+from WebKit.Page import Page
+from WebKit.HTTPExceptions import HTTPForbidden
+from WebKit.RequestMetrics import requestMetrics
+
+
+class Metrics(Page):
+    """Expose the request metrics in the Prometheus text format.
+
+    This servlet does not require a login, so that it can be scraped
+    by a Prometheus server. Access is restricted to the client addresses
+    listed in the MetricsAllowedHosts setting instead (None allows all).
+    """
+
+    def writeHTML(self):
+        allowed = self.application().setting('MetricsAllowedHosts', None)
+        if allowed is not None:
+            if self.request().remoteAddress() not in allowed:
+                raise HTTPForbidden
+        self.response().setHeader('Content-Type',
+            'text/plain; version=0.0.4; charset=utf-8')
+        self.write(requestMetrics.prometheusText())
@@ -0,0 +1,54 @@
+from time import localtime, strftime
+
+from WebKit.RequestMetrics import requestMetrics
+from WebUtils.Funcs import htmlEncode
+from AdminSecurity import AdminSecurity
+
+
+class RequestStages(AdminSecurity):
+    """Display the time spent in the stages of the requests.
+
+    This servlet shows the statistics of the request metrics (see
+    WebKit.RequestMetrics), i.e. for every stage of the requests the
+    number of requests, the total and mean time and the estimated
+    percentiles since the last reset. The same metrics are exposed
+    for Prometheus by the Metrics servlet.
+    """
+
+    def title(self):
+        return 'Request Stages'
+
+    def writeContent(self):
+        wr = self.writeln
+        if self.request().hasField('reset'):
+            requestMetrics.reset()
+            wr('<p style="color:green">The metrics have been reset.</p>')
+        if not requestMetrics.enabled():
+            wr('<h4>Request metrics are disabled.</h4>')
+            wr('<p>They can be enabled with the setting'
+                ' <code>RequestMetrics = True</code>.</p>')
+        wr('<form action="RequestStages" method="post">')
+        wr('<p>Since %s &nbsp; <input type="submit" name="reset"'
+            ' value="Reset"></p>' % strftime('%Y-%m-%d %H:%M:%S',
+                localtime(requestMetrics.since())))
+        wr('</form>')
+        stats = requestMetrics.stats()
+        if not stats:
+            wr('<h4>No requests have been recorded yet.</h4>')
+            return
+        wr('<table class="NiceTable">')
+        wr('<tr><th>Stage</th><th>Count</th><th>Total s</th><th>Mean ms</th>'
+            '<th>p50 ms</th><th>p95 ms</th><th>p99 ms</th></tr>')
+        for s in stats:
+            numbers = ('%d' % s['count'], '%.3f' % s['seconds'],
+                '%.3f' % (s['mean'] * 1000), '%.3f' % (s['p50'] * 1000),
+                '%.3f' % (s['p95'] * 1000), '%.3f' % (s['p99'] * 1000))
+            wr('<tr><td>%s</td>%s</tr>' % (htmlEncode(s['stage']), ''.join(
+                '<td style="text-align:right">%s</td>' % number
+                for number in numbers)))
+        wr('</table>')
+        wr('<p>The percentiles are estimated from histograms.'
+            ' The resolve stage includes the factory stage, and the'
+            ' awake stage usually includes the sessionLoad stage.'
+            ' The metrics are available for Prometheus'
+            ' at <a href="Metrics">Metrics</a>.</p>')
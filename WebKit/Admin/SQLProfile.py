@@ -0,0 +1,106 @@
+from time import localtime, strftime
+
+from WebUtils.Funcs import htmlEncode
+from AdminSecurity import AdminSecurity
+
+try:
+    from MiddleKit.Run.SQLProfiler import SQLProfiler
+except ImportError:
+    SQLProfiler = None
+
+
+class SQLProfile(AdminSecurity):
+    """Display the SQL profiles of the MiddleKit object stores.
+
+    This servlet shows the statistics collected by the SQL profilers of
+    the object stores in the application server process, i.e. the SQL
+    statements aggregated by their shape, sorted by the total time spent
+    executing them, and the last slow queries.
+
+    Profiling is enabled with the SQLProfiler setting of the MiddleKit
+    model or with the setSQLProfiler() method of the object store.
+    """
+
+    def title(self):
+        return 'SQL Profile'
+
+    def writeContent(self):
+        wr = self.writeln
+        if SQLProfiler is None:
+            wr('<h4>MiddleKit is not available.</h4>')
+            return
+        profilers = sorted(SQLProfiler.profilers(), key=lambda p: p.name())
+        if not profilers:
+            wr('<h4>No SQL profilers found.</h4>')
+            wr("<p>Profiling can be activated with the MiddleKit setting"
+                " <code>'SQLProfiler': {'SlowQueryTime': 1.0}</code>.</p>")
+            return
+        req = self.request()
+        try:
+            limit = int(req.field('limit', 50))
+        except ValueError:
+            limit = 50
+        wr('<form action="SQLProfile" method="post">')
+        wr('<input type="hidden" name="limit" value="%d">' % limit)
+        for i, profiler in enumerate(profilers):
+            wr('<h4>%s</h4>' % htmlEncode(profiler.name()))
+            if req.hasField('reset_%d' % i):
+                profiler.reset()
+                wr('<p style="color:green">The profile has been reset.</p>')
+            wr(htSummary(profiler.stats(), i))
+            wr(htStatements(profiler.statements(), limit))
+            slowQueries = profiler.slowQueries()
+            if slowQueries:
+                wr('<h5>Slow queries:</h5>')
+                wr(htSlowQueries(slowQueries))
+        wr('</form>')
+
+
+def htSummary(stats, i):
+    """Get HTML for the summary statistics of a profiler."""
+    return ('<p>Since %s: <strong>%d</strong> statements of %d shapes,'
+        ' %.1f ms executing, %.1f ms waiting for connections, %d rows;'
+        ' %.1f statements per transaction (maximum %d in %d transactions)'
+        ' &nbsp; <input type="submit" name="reset_%d" value="Reset"></p>'
+        % (strftime('%Y-%m-%d %H:%M:%S', localtime(stats['since'])),
+            stats['statements'], stats['shapes'], stats['seconds'] * 1000,
+            stats['waitSeconds'] * 1000, stats['rows'],
+            stats['statementsPerTransaction'],
+            stats['maxStatementsPerTransaction'], stats['transactions'], i))
+
+
+def htStatements(statements, limit):
+    """Get HTML for the statistics of the statements."""
+    html = ['<table class="NiceTable">', '<tr><th>Statement</th>'
+        '<th>Calls</th><th>Total ms</th><th>Mean ms</th><th>Max ms</th>'
+        '<th>Wait ms</th><th>Rows</th><th>Rows/Call</th><th>Sources</th></tr>']
+    for s in statements[:limit]:
+        sources = sorted(s['sources'].items(), key=lambda item: -item[1])
+        numbers = ('%d' % s['calls'], '%.1f' % (s['seconds'] * 1000),
+            '%.2f' % (s['meanSeconds'] * 1000),
+            '%.2f' % (s['maxSeconds'] * 1000),
+            '%.1f' % (s['waitSeconds'] * 1000), '%d' % s['rows'],
+            '%.1f' % (float(s['rows']) / s['calls']))
+        html.append('<tr><td>%s</td>%s<td>%s</td></tr>' % (
+            htmlEncode(s['sql']), ''.join('<td style="text-align:right">%s</td>'
+                % number for number in numbers), '<br>'.join(
+                '%s (%d)' % (htmlEncode(str(source)), calls)
+                for source, calls in sources[:5])))
+    html.append('</table>')
+    if len(statements) > limit:
+        html.append('<p>%d more statements not shown.</p>'
+            % (len(statements) - limit))
+    return '\n'.join(html)
+
+
+def htSlowQueries(slowQueries):
+    """Get HTML for the list of slow queries, the most recent first."""
+    html = ['<table class="NiceTable">',
+        '<tr><th>Time</th><th>ms</th><th>Source</th><th>Statement</th></tr>']
+    for q in reversed(slowQueries):
+        html.append('<tr><td>%s</td><td style="text-align:right">%.1f</td>'
+            '<td>%s</td><td>%s</td></tr>' % (q['time'],
+                q['seconds'] * 1000, htmlEncode(str(q['source'])),
+                htmlEncode(q['sql'])))
+    html.append('</table>')
+    return '\n'.join(html)
@@ -0,0 +1,108 @@
+from time import localtime, strftime
+
+from WebKit.SamplingProfiler import samplingProfiler
+from WebUtils.Funcs import htmlEncode, urlEncode
+from AdminSecurity import AdminSecurity
+
+
+class SamplingProfile(AdminSecurity):
+    """Control the sampling profiler and display its results.
+
+    The sampling profiler (see WebKit.SamplingProfiler) can be started
+    and stopped here while the app server is running. This page shows the
+    number of samples per servlet path and the functions in which most
+    samples have been taken, and exports the samples in the collapsed
+    stack format for creating flame graphs.
+    """
+
+    def title(self):
+        return 'Sampling Profile'
+
+    def defaultAction(self):
+        self._collapsed = None
+        self.writeHTML()  # checks the login
+        if self._collapsed is not None:
+            response = self.response()
+            response.reset()
+            response.setHeader('Content-Type', 'text/plain')
+            response.setHeader('Content-Disposition',
+                'attachment; filename="stacks.txt"')
+            self.write(self._collapsed)
+
+    def writeContent(self):
+        wr = self.writeln
+        req = self.request()
+        if req.hasField('collapsed'):
+            self._collapsed = samplingProfiler.collapsed(
+                req.field('path', None))
+            return
+        if req.hasField('start'):
+            try:
+                samplingProfiler.configure(
+                    frequency=float(req.field('frequency', 0)))
+            except ValueError:
+                pass
+            samplingProfiler.start()
+        elif req.hasField('stop'):
+            samplingProfiler.stop()
+        elif req.hasField('reset'):
+            samplingProfiler.reset()
+        stats = samplingProfiler.stats()
+        wr('<form action="SamplingProfile" method="post">')
+        if stats['running']:
+            wr('<p style="color:green">The profiler is running with'
+                ' %g samples per second. &nbsp;'
+                ' <input type="submit" name="stop" value="Stop"></p>'
+                % stats['frequency'])
+        else:
+            wr('<p>The profiler is not running. &nbsp;'
+                ' <input type="text" name="frequency" value="%g" size="5"'
+                ' style="text-align:right"> samples per second &nbsp;'
+                ' <input type="submit" name="start" value="Start"></p>'
+                % stats['frequency'])
+        wr('<p>Since %s: <strong>%d</strong> samples of %d stacks,'
+            ' %d dropped, %.2f%% of the time spent sampling &nbsp;'
+            ' <input type="submit" name="reset" value="Reset"></p>'
+            % (strftime('%Y-%m-%d %H:%M:%S', localtime(stats['since'])),
+                stats['samples'], stats['stacks'], stats['dropped'],
+                stats['overhead'] * 100))
+        wr('</form>')
+        if not stats['samples']:
+            return
+        path = req.field('path', None)
+        if path:
+            wr('<h4>%s</h4>' % htmlEncode(path))
+            wr('<p><a href="SamplingProfile">All servlets</a> |'
+                ' <a href="SamplingProfile?collapsed=1&amp;path=%s">'
+                'Collapsed stacks</a></p>' % urlEncode(path))
+        else:
+            wr('<p><a href="SamplingProfile?collapsed=1">Collapsed stacks'
+                '</a> (for flamegraph.pl)</p>')
+            wr(self.htPaths(samplingProfiler.paths(), stats['samples']))
+        wr(self.htFunctions(samplingProfiler.functions(path)))
+
+    @staticmethod
+    def htPaths(paths, samples):
+        """Get HTML for the number of samples per servlet path."""
+        html = ['<table class="NiceTable">',
+            '<tr><th>Servlet Path</th><th>Samples</th><th>%</th></tr>']
+        for path, count in paths[:50]:
+            html.append('<tr><td><a href="SamplingProfile?path=%s">%s</a></td>'
+                '<td style="text-align:right">%d</td>'
+                '<td style="text-align:right">%.1f</td></tr>' % (
+                    urlEncode(path), htmlEncode(path),
+                    count, 100.0 * count / samples))
+        html.append('</table>')
+        return '\n'.join(html)
+
+    @staticmethod
+    def htFunctions(functions):
+        """Get HTML for the functions with the most samples."""
+        html = ['<table class="NiceTable">', '<tr><th>Function</th>'
+            '<th>Own Samples</th><th>Total Samples</th></tr>']
+        for function, own, total in functions[:50]:
+            html.append('<tr><td>%s</td><td style="text-align:right">%d</td>'
+                '<td style="text-align:right">%d</td></tr>'
+                % (htmlEncode(function), own, total))
+        html.append('</table>')
+        return '\n'.join(html)
@@ -30,6 +30,9 @@ from HTTPRequest import HTTPRequest
 from HTTPExceptions import HTTPException, HTTPSessionExpired
 from Transaction import Transaction
 from ASStreamOut import ConnectionAbortedError
+from RequestMetrics import requestMetrics, monotonic
+from SamplingProfiler import samplingProfiler
+from OutputCache import outputCache
 import URLParser
 
 debug = False
@@ -37,6 +40,14 @@ debug = False
 defaultConfig = dict(
     PrintConfigAtStartUp = True,
     LogActivity = True,
+    RequestMetrics = True,
+    MetricsAllowedHosts = ['127.0.0.1', '::1'],
+    SamplingProfiler = dict(
+        AutoStart = False,
+        Frequency = 100,
+        MaxDepth = 100,
+        MaxStacks = 10000,
+        ),
     ActivityLogFilename = 'Logs/Activity.csv',
     ActivityLogColumns = [
         'request.remoteAddress', 'request.method',
@@ -109,6 +120,26 @@ defaultConfig = dict(
         '*.pyc', '*.pyo', '__init__.*', '*.config'
         ]),
     FilesToServe = [],
+    AutoETags = False,
+    Compression = dict(
+        Enabled = False,
+        Encodings = ['gzip', 'deflate'],
+        Level = 6,
+        MinSize = 1024,
+        MimeTypes = [
+            'text/*', 'application/javascript', 'application/json',
+            'application/xml', 'application/xhtml+xml', 'image/svg+xml'
+            ],
+        ),
+    OutputCache = dict(
+        Enabled = True,
+        Store = 'Memory',  # or Memcached
+        MaxSize = 32*1024*1024,
+        MaxEntries = 10000,
+        MemcachedServers = ['localhost:11211'],
+        MemcachedNamespace = 'WebwareOutput:',
+        WaitTimeout = 10,
+        ),
     UnknownFileTypes = dict(
         ReuseServlets = True,
         Technique = 'serveContent',  # or redirectSansAdapter
@@ -157,8 +188,12 @@ class Application(ConfigurableForServerSidePath):
 
         self.initVersions()
         self.initErrorPage()
+        requestMetrics.setEnabled(self.setting('RequestMetrics'))
+        self.initSamplingProfiler()
+        outputCache.configure(self.setting('OutputCache'))
 
         self._shutDownHandlers = []
+        self._endRequestHandlers = [self.endUnitsOfWork]
 
         # Initialize task manager:
         if self._server.isPersistent():
@@ -208,6 +243,15 @@ class Application(ConfigurableForServerSidePath):
                     urls[err] = '/' + urls[err]
         self._errorPage = urls
 
+    def initSamplingProfiler(self):
+        """Configure the sampling profiler and start it if requested."""
+        settings = self.setting('SamplingProfiler')
+        samplingProfiler.configure(frequency=settings.get('Frequency'),
+            maxDepth=settings.get('MaxDepth'),
+            maxStacks=settings.get('MaxStacks'))
+        if settings.get('AutoStart') and self._server.isPersistent():
+            samplingProfiler.start()
+
     def initSessions(self):
         """Initialize all session related attributes."""
         self._sessionPrefix = self.setting('SessionPrefix') or ''
@@ -307,6 +351,7 @@ class Application(ConfigurableForServerSidePath):
         of Application won't be called due to circular references.
         """
         print "Application is shutting down..."
+        samplingProfiler.stop()
         self._sessions.storeAllSessions()
         if self._server.isPersistent():
             self.taskManager().stop()
@@ -329,6 +374,28 @@ class Application(ConfigurableForServerSidePath):
         """
         self._shutDownHandlers.append(func)
 
+    def addEndRequestHandler(self, func):
+        """Add an end-of-request handler.
+
+        Functions added through `addEndRequestHandler` will be called
+        without arguments at the end of every request, by the thread that
+        served it, after the response has been delivered and the servlets
+        have been returned, even if an error occurred. You can use this hook
+        to clean up resources that are kept per thread.
+        """
+        self._endRequestHandlers.append(func)
+
+    @staticmethod
+    def endUnitsOfWork():
+        """Discard MiddleKit changes that the request has not saved.
+
+        This is the default end-of-request handler. It does nothing
+        if MiddleKit has not been imported.
+        """
+        objectStore = sys.modules.get('MiddleKit.Run.ObjectStore')
+        if objectStore is not None:
+            objectStore.endUnitsOfWork()
+
 
     ## Config ##
 
@@ -390,6 +457,7 @@ class Application(ConfigurableForServerSidePath):
 
         Finding the session ID is done in `Transaction.sessionId`.
         """
+        start = monotonic()
         debug = self.setting('Debug').get('Sessions')
         if debug:
             prefix = '>> [session] createSessionForTransaction:'
@@ -412,6 +480,7 @@ class Application(ConfigurableForServerSidePath):
             if debug:
                 print prefix, 'created session =', session
         trans.setSession(session)
+        requestMetrics.record('sessionLoad', start)
         return session
 
     def createSessionWithID(self, trans, sessionID):
@@ -538,7 +607,10 @@ class Application(ConfigurableForServerSidePath):
         then runs (via `runTransaction`) the transaction. It also catches any
         exceptions, which are then passed on to `handleExceptionInTransaction`.
         """
+        start = monotonic()
         request = self.createRequestForDict(requestDict)
+        requestMetrics.record('parse', start)
+        samplingProfiler.startRequest(request)
         if request:
             trans = Transaction(application=self, request=request)
             if trans:
@@ -546,26 +618,36 @@ class Application(ConfigurableForServerSidePath):
                 response = request.responseClass()(trans, strmOut)
                 if response:
                     trans.setResponse(response)
-                    self.runTransaction(trans)
                     try:
-                        trans.response().deliver()
-                    except ConnectionAbortedError as err:
-                        trans.setError(err)
-                    response.clearTransaction()
-                    # release possible servlets on the stack
-                    while 1:
-                        servlet = request.pop()
-                        if not servlet:
-                            break
-                        self.returnServlet(servlet)
-                    # get current servlet (this may have changed)
-                    servlet = trans.servlet()
-                    if servlet:
-                        # return the current servlet to its pool
-                        self.returnServlet(servlet)
+                        self.runTransaction(trans)
+                        sendStart = monotonic()
+                        try:
+                            trans.response().deliver()
+                        except ConnectionAbortedError as err:
+                            trans.setError(err)
+                        requestMetrics.record('send', sendStart)
+                        response.clearTransaction()
+                    finally:
+                        # release possible servlets on the stack
+                        # (also if delivering the response failed, since
+                        # hot reloads wait until the servlets are released)
+                        while 1:
+                            servlet = request.pop()
+                            if not servlet:
+                                break
+                            self.returnServlet(servlet)
+                        # get current servlet (this may have changed)
+                        servlet = trans.servlet()
+                        if servlet:
+                            # return the current servlet to its pool
+                            self.returnServlet(servlet)
+                        for endRequestHandler in self._endRequestHandlers:
+                            endRequestHandler()
                 if self.setting('LogActivity'):
                     self.writeActivityLog(trans)
             request.clearTransaction()
+        samplingProfiler.endRequest()
+        requestMetrics.record('total', start)
         return trans
 
     @staticmethod
@@ -605,7 +687,9 @@ class Application(ConfigurableForServerSidePath):
             # remove the session identifier from the path
             self.removePathSession(trans)
             # determine the context and the servlet for the transaction
+            start = monotonic()
             servlet = findServlet(trans)
+            requestMetrics.record('resolve', start)
             # handle session field only now, because the name of the
             # session id field can depend on the context
             self.handlePathSession(trans)
@@ -808,6 +892,48 @@ class Application(ConfigurableForServerSidePath):
         """Return the servlet to its pool."""
         servlet.close()
 
+    def reloadServletFile(self, path, timeout=10):
+        """Reload a changed servlet file without restarting the app server.
+
+        This is possible if the class of the servlet has been cached by a
+        servlet factory and no other module uses the servlet module. New
+        requests for the servlet are held back while the requests using
+        the old class are drained, then the module is unloaded and the
+        factory forgets the cached class and servlets, so that the next
+        request imports the module anew.
+
+        Returns whether the servlet has been reloaded. If not, because
+        the file is not a servlet or a library module, or the requests
+        could not be drained within timeout seconds, the app server
+        needs to be restarted to pick up the change.
+        """
+        imp = self._imp
+        modnames = imp.modulesForFile(path)
+        if not modnames:
+            return False
+        factories = [factory
+            for factory in URLParser.ServletFactoryManager.factories()
+            if factory.hasServlet(path)]
+        if not factories:
+            # the servlet may have been reloaded, but not used since then
+            return not any(modname in sys.modules for modname in modnames)
+        for modname in modnames:
+            if imp.dependentModules(modname):
+                return False
+        drained, reloaded = [], False
+        try:
+            for factory in factories:
+                drained.append(factory)
+                if not factory.drainServlet(path, timeout):
+                    return False
+            for modname in modnames:
+                imp.unloadModule(modname)
+            reloaded = True
+        finally:
+            for factory in drained:
+                factory.finishReload(path, reloaded)
+        return reloaded
+
     def errorPage(self, errorClass):
         """Get the error page url corresponding to an error class."""
         if errorClass.__name__ in self._errorPage:
@@ -10,6 +10,10 @@ that adds a file-monitoring and restarting to the AppServer. Used mostly like:
 If `UseImportSpy` is set to False in AppServer.config, or FAM support is
 not available, this requires regular polling. The interval for the polling
 in seconds can be set with `AutoReloadPollInterval` in AppServer.config.
+On Linux, the native inotify API is used by default (see `Inotify`).
+
+If `HotReloadServlets` is set, changed servlet modules which are not used
+by other modules are reloaded without restarting the whole process.
 """
 
 import os
@@ -20,19 +24,23 @@ from time import sleep
 from threading import Thread
 
 from AppServer import AppServer
+import Inotify
 
 
 defaultConfig = dict(
     AutoReload = False,
     AutoReloadPollInterval = 1,  # in seconds
     UseImportSpy = True,
-    UseFAMModules = 'pyinotify gamin _fam')
+    UseFAMModules = 'inotify pyinotify gamin _fam',
+    HotReloadServlets = False,
+    HotReloadDrainTime = 10)  # in seconds
 
 
 def getFAM(modules):
     """Get FAM object based on the modules specified.
 
     Currently supported are
+    inotify: built-in support for the Linux inotify API (via ctypes)
     pyinotify: http://github.com/seb-m/pyinotify
     python-gamin (gamin): http://www.gnome.org/~veillard/gamin/
     python-fam (_fam): http://python-fam.sourceforge.net
@@ -41,6 +49,14 @@ def getFAM(modules):
 
     for module in modules:
 
+        if module == 'inotify':
+            if Inotify.available():
+                try:
+                    return Inotify.InotifyMonitor()
+                except Exception as e:
+                    print "Error starting inotify: %s" % str(e)
+            continue
+
         try:
             fam = __import__(module)
         except ImportError:
@@ -234,6 +250,10 @@ class AutoReloadingAppServer(AppServer):
     to import is modified. This is so that changes to a file containing
     a syntax error (which would have prevented it from being imported)
     will also cause the server to restart.
+
+    With the `HotReloadServlets` setting, changed servlet modules are
+    reloaded by the application instead, keeping sessions, caches and
+    connections. Only changes of library modules cause a restart then.
     """
 
 
@@ -334,6 +354,7 @@ class AutoReloadingAppServer(AppServer):
                 if self._pipe:
                     os.close(self._pipe[0])
                     self._pipe = None
+                self._imp.setFileMonitor(None)
                 self._fam.close()
                 self._fam = None
 
@@ -383,6 +404,20 @@ class AutoReloadingAppServer(AppServer):
         self._shouldRestart = True
         self._runFileMonitor = False
 
+    def hotReload(self, filepath):
+        """Try to reload a changed servlet file without restart."""
+        if not self.setting('HotReloadServlets'):
+            return False
+        try:
+            reloaded = self._app.reloadServletFile(filepath,
+                self.setting('HotReloadDrainTime'))
+        except Exception as e:
+            print 'Error reloading %s: %s' % (filepath, e)
+            return False
+        if reloaded:
+            print '*** The servlet file %s has been reloaded.' % filepath
+        return reloaded
+
     def fileMonitorThreadLoop(self):
         """This the the main loop for the monitoring thread.
 
@@ -394,7 +429,7 @@ class AutoReloadingAppServer(AppServer):
         while self._runFileMonitor:
             sleep(self._pollInterval)
             f = self._imp.updatedFile()
-            if f:
+            if f and not self.hotReload(f):
                 print '*** The file', f, 'has changed.'
                 print 'Restarting AppServer...'
                 self.shouldRestart()
@@ -415,6 +450,8 @@ class AutoReloadingAppServer(AppServer):
         # Monitor all modules which have already been loaded
         for f in files:  # note that files cannot change during this loop
             self.monitorNewModule(f)
+        # Let the servlet factories rely on the monitor for changed files
+        self._imp.setFileMonitor(self._fam)
         # Create a pipe so that this thread can be notified when the
         # server is shutdown. We use a pipe because it needs to be an object
         # which will wake up the call to 'select':
@@ -433,10 +470,17 @@ class AutoReloadingAppServer(AppServer):
                 else:
                     print "Error:", e[1]
                     sys.exit(1)
+            # Editors and version control tools often change files several
+            # times in quick succession, so let these events accumulate:
+            sleep(0.05)
             while self._runFileMonitor and self._fam.pending():
                 c, f = self._fam.nextFile()
-                if c and self._imp.fileUpdated(f):
+                if not c or self.hotReload(f):
+                    continue
+                if self._imp.fileUpdated(f):
                     print '*** The file %s has been %s.' % (f, c)
                     print 'Restarting AppServer...'
                     self.shouldRestart()
+                else:
+                    self._imp.fileChanged(f)
         self._imp.notifyOfNewFiles(None)
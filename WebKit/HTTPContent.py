@@ -3,6 +3,7 @@
 from HTTPServlet import HTTPServlet
 from WebUtils import Funcs
 from Application import EndResponse
+from OutputCache import outputCache, uncachedHeaders
 
 
 class HTTPContentError(Exception):
@@ -29,6 +30,9 @@ class HTTPContent(HTTPServlet):
     For the purposes of output, the `write` and `writeln`
     convenience methods are provided.
 
+    The output of GET requests can be cached by setting the class
+    attribute `outputCache`, see the OutputCache module for details.
+
     If you plan to produce HTML content, you should start by looking
     at Page instead of this lower-level class.
     """
@@ -57,9 +61,12 @@ class HTTPContent(HTTPServlet):
         """Respond to GET.
 
         Invoked in response to a GET request method. All methods
-        are passed to `_respond`.
+        are passed to `_respond`, unless the output is cached.
         """
-        self._respond(transaction)
+        if self.outputCache and outputCache.enabled():
+            self.respondWithOutputCache(transaction)
+        else:
+            self._respond(transaction)
 
     def respondToPost(self, transaction):
         """Respond to POST.
@@ -176,6 +183,99 @@ class HTTPContent(HTTPServlet):
         self._response.write('\n')
 
 
+    ## Output Cache ##
+
+    # the policy for caching the output of GET requests
+    # as a dictionary with the keys ttl, fields, cookies and headers
+    outputCache = None
+
+    def respondWithOutputCache(self, transaction):
+        """Respond with cached output.
+
+        If the output for the request is cached, it is written to the
+        response, otherwise we respond as usual and cache the output if
+        canCacheOutput() allows it. Invoked by `respondToGet`.
+        """
+        policy = self.outputCache
+        key = outputCache.key(self, transaction, policy)
+        entry, leader = outputCache.fetch(key)
+        try:
+            if entry is not None:
+                self.writeCacheEntry(transaction, entry)
+                return
+            response = transaction.response()
+            streamOut = response.streamOut()
+            mark = streamOut.mark()
+            self._respond(transaction)
+            if not self.canCacheOutput(transaction):
+                return
+            body = streamOut.dataSince(mark)
+            if body is None:
+                return
+            headers = [(name, value) for name, value
+                in response.headers().items() if name not in uncachedHeaders]
+            entry = outputCache.set(key, body, headers, policy.get('ttl', 60))
+            response.setHeader('ETag', entry['etag'])
+            if response.notModified(entry['etag']):
+                streamOut.clear()
+                response.setStatus(304, 'Not Modified')
+        finally:
+            if leader:
+                outputCache.release(key)
+
+    def canCacheOutput(self, transaction):
+        """Check whether the output of the current request can be cached.
+
+        This is the case for successful GET requests which did not set
+        cookies or use the session, since the output is probably specific
+        for the user otherwise. Subclasses may override this.
+        """
+        response = transaction.response()
+        return (transaction.request().method() == 'GET'
+            and not transaction.errorOccurred()
+            and not response.isCommitted()
+            and response.header('Status', '200')[:3] == '200'
+            and not response.cookies() and not transaction.hasSession())
+
+    def writeCacheEntry(self, transaction, entry):
+        """Write an entry of the output cache to the response."""
+        response = transaction.response()
+        for name, value in entry['headers']:
+            response.setHeader(name, value)
+        response.setHeader('ETag', entry['etag'])
+        if response.notModified(entry['etag']):
+            response.setStatus(304, 'Not Modified')
+        else:
+            response.write(entry['body'])
+
+    def writeCachedOutput(self, name, write, policy):
+        """Write the output of a part of the page using the output cache.
+
+        Calls write() to write the output, unless the output has already
+        been cached under the given name for the request values named in
+        the policy (see OutputCache). In this case, it is written instead.
+        """
+        if not outputCache.enabled():
+            write()
+            return
+        key = outputCache.key(self, self._transaction, policy, name)
+        entry, leader = outputCache.fetch(key)
+        try:
+            if entry is not None:
+                self._response.write(entry['body'])
+                return
+            streamOut = self._response.streamOut()
+            mark = streamOut.mark()
+            write()
+            if self._request.method() != 'HEAD':  # output is suppressed
+                body = streamOut.dataSince(mark)
+                if body is not None:
+                    outputCache.set(key, body, ttl=policy.get('ttl', 60))
+        finally:
+            if leader:
+                outputCache.release(key)
+
+
     ## Threading ##
 
     def canBeThreaded(self):
@@ -1,6 +1,8 @@
 """HTTP responses"""
 
 from datetime import datetime, timedelta
+from email.utils import parsedate_tz, mktime_tz
+from fnmatch import fnmatch
 from time import time, gmtime, strftime, struct_time
 
 from MiscUtils import NoDefault
@@ -277,6 +279,7 @@ class HTTPResponse(Response):
         """
         if not self._committed:
             self.commit()
+        self._strmOut.flushCompression()
         self._strmOut.flush()
         self._strmOut.setAutoCommit(autoFlush)
 
@@ -298,14 +301,17 @@ class HTTPResponse(Response):
         if debug:
             print "HTTPResponse deliver called"
         self.recordEndTime()
-        if not self._committed:
-            self.commit()
+        if self._committed:
+            self._strmOut.finishCompression()
+        else:
+            self.commit(final=True)
 
-    def commit(self):
+    def commit(self, final=False):
         """Commit response.
 
         Write out all headers to the response stream, and tell the underlying
-        response stream it can start sending data.
+        response stream it can start sending data. Set final if the response
+        is complete, i.e. no more data will be written.
         """
         if debug:
             print "HTTPResponse commit"
@@ -316,6 +322,9 @@ class HTTPResponse(Response):
                 err = HTTPServerError()
                 self._transaction.setError(err)
             self.setErrorHeaders(err)
+        if final:
+            self.setUpETag()
+        self.setUpCompression(final)
         self.writeHeaders()
         self._committed = True
         self._strmOut.commit()
@@ -342,6 +351,104 @@ class HTTPResponse(Response):
         head = '\r\n'.join(head)
         self._strmOut.prepend(head)
 
+    ## Conditional Requests ##
+
+    def notModified(self, etag=None, lastModified=None):
+        """Check whether the client already has the current content.
+
+        Checks the conditional headers of the request against the given
+        entity tag and time of last modification (in seconds).
+        """
+        return notModified(self._transaction.request().environ(),
+            etag, lastModified)
+
+    def setUpETag(self):
+        """Set a weak ETag computed from the content if appropriate.
+
+        Invoked by commit() for complete responses if the AutoETags setting
+        is on. If the client already has the content, the response is turned
+        into a "304 Not Modified" response without body.
+        """
+        trans = self._transaction
+        if not trans.application().setting('AutoETags', False):
+            return
+        if trans.errorOccurred() or self.hasHeader('ETag'):
+            return
+        if self.header('Status', '200')[:3] != '200':
+            return
+        if trans.request().method() != 'GET':  # HEAD has no content
+            return
+        etag = self._strmOut.etag()
+        if etag:
+            self.setHeader('ETag', etag)
+            if self.notModified(etag):
+                self._strmOut.clear()
+                self.setStatus(304, 'Not Modified')
+
+
+    ## Compression ##
+
+    def negotiateCompression(self, mimeType=None, size=None):
+        """Get the content encoding for compressing the response.
+
+        Returns 'gzip' or 'deflate' if content of the given MIME type
+        (by default that of the Content-Type header) and size (None if not
+        known) shall be compressed according to the Compression setting,
+        and the client accepts the encoding. If the content is compressible,
+        'Accept-Encoding' is added to the Vary header even if the client
+        does not accept any encoding, so that caches keep both variants.
+        """
+        settings = self._transaction.application().setting('Compression', None)
+        if not settings or not settings.get('Enabled'):
+            return None
+        if size is not None and size < settings.get('MinSize', 0):
+            return None
+        if mimeType is None:
+            mimeType = self.header('Content-Type', '')
+        mimeType = mimeType.split(';', 1)[0].strip().lower()
+        if not mimeType or not any(fnmatch(mimeType, pattern)
+                for pattern in settings.get('MimeTypes', ())):
+            return None
+        vary = self.header('Vary', None)
+        if not vary:
+            self.setHeader('Vary', 'Accept-Encoding')
+        elif 'accept-encoding' not in vary.lower() and vary != '*':
+            self.setHeader('Vary', vary + ', Accept-Encoding')
+        request = self._transaction.request()
+        return acceptedEncoding(
+            request.environ().get('HTTP_ACCEPT_ENCODING'),
+            settings.get('Encodings', ('gzip', 'deflate')))
+
+    def setUpCompression(self, final=False):
+        """Start compressing the response if appropriate.
+
+        Invoked by commit() before the headers are written. If the response
+        is final, its size is known and the minimum size can be checked.
+        Responses which already have a Content-Encoding are not compressed.
+        """
+        strmOut = self._strmOut
+        if strmOut.compressing() or self.hasHeader('Content-Encoding'):
+            return
+        if self.header('Status', '200')[:3] in ('204', '304'):
+            return
+        if self._transaction.request().method() == 'HEAD':
+            return
+        if final:
+            size = strmOut.size()
+        else:
+            try:
+                size = int(self.header('Content-Length'))
+            except (KeyError, ValueError):
+                size = None
+        encoding = self.negotiateCompression(size=size)
+        if encoding:
+            self._headers.pop('Content-length', None)
+            self.setHeader('Content-Encoding', encoding)
+            strmOut.startCompression(encoding, self._transaction.application(
+                ).setting('Compression').get('Level', 6))
+            if final:
+                strmOut.finishCompression()
+
     def recordSession(self):
         """Record session ID.
 
@@ -462,3 +569,74 @@ class HTTPResponse(Response):
         uri = self._transaction.request().uri()
         print 'HTTPResponse: %s: %s' % (uri, err.codeMessage())
         self.commit()
+
+
+def acceptedEncoding(acceptEncoding, encodings=('gzip', 'deflate')):
+    """Get the first of the given encodings accepted by the client.
+
+    The acceptEncoding is the value of the Accept-Encoding header
+    of the request. Encodings with a quality value of zero are not
+    accepted; * stands for all encodings which are not listed.
+    Returns None if none of the encodings is accepted.
+    """
+    if not acceptEncoding:
+        return None
+    qualities = {}
+    for item in acceptEncoding.lower().split(','):
+        item = item.split(';')
+        encoding = item[0].strip()
+        quality = 1.0
+        for param in item[1:]:
+            param = param.split('=', 1)
+            if len(param) == 2 and param[0].strip() == 'q':
+                try:
+                    quality = float(param[1])
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding] = quality
+    default = qualities.get('*', 0.0)
+    for encoding in encodings:
+        if qualities.get(encoding, default) > 0:
+            return encoding
+    return None
+
+
+def matchesETag(ifNoneMatch, etag):
+    """Check whether an If-None-Match header matches the given ETag.
+
+    Uses the weak comparison, as required for If-None-Match.
+    """
+    if not ifNoneMatch or not etag:
+        return False
+    if ifNoneMatch.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for tag in ifNoneMatch.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def notModified(environ, etag=None, lastModified=None):
+    """Check the conditional headers of a request.
+
+    Returns True if the content with the given entity tag and time of
+    last modification (in seconds) has not been modified according to
+    the If-None-Match or If-Modified-Since header in the environment.
+    If-Modified-Since is ignored if the request has an If-None-Match.
+    """
+    ifNoneMatch = environ.get('HTTP_IF_NONE_MATCH')
+    if ifNoneMatch:
+        return matchesETag(ifNoneMatch, etag)
+    if lastModified:
+        ims = environ.get('HTTP_IF_MODIFIED_SINCE') or environ.get(
+            'IF_MODIFIED_SINCE')
+        if ims:
+            ims = parsedate_tz(ims.split(';', 1)[0])
+            if ims:
+                return int(lastModified) <= mktime_tz(ims)
+    return False
@@ -3,6 +3,7 @@
 from time import gmtime, strftime
 
 from Servlet import Servlet
+from HTTPResponse import notModified
 
 
 class HTTPServlet(Servlet):
@@ -41,19 +42,23 @@ class HTTPServlet(Servlet):
         """
         request = trans.request()
         httpMethodName = request.method()
-        # For GET and HEAD, handle the HTTP If-Modified-Since header:
-        # if the object's last modified time is the same
-        # as the IMS header, we're done.
+        # For GET and HEAD, handle the HTTP If-None-Match and
+        # If-Modified-Since headers: if the client already has the
+        # current content, we're done without generating it again.
         if httpMethodName in ('GET', 'HEAD'):
+            response = trans.response()
             lm = self.lastModified(trans)
             if lm:
-                lm = strftime('%a, %d %b %Y %H:%M:%S GMT', gmtime(lm))
-                trans.response().setHeader('Last-Modified', lm)
-                ims = request.environ(
-                    ).get('HTTP_IF_MODIFIED_SINCE') or request.environ(
-                    ).get('IF_MODIFIED_SINCE')
-                if ims and ims.split(';', 1)[0] == lm:
-                    trans.response().setStatus(304, 'Not Modified')
+                response.setHeader('Last-Modified',
+                    strftime('%a, %d %b %Y %H:%M:%S GMT', gmtime(lm)))
+            etag = self.etag(trans)
+            if etag:
+                if not etag.endswith('"'):
+                    etag = '"%s"' % etag
+                response.setHeader('ETag', etag)
+            if lm or etag:
+                if notModified(request.environ(), etag, lm):
+                    response.setStatus(304, 'Not Modified')
                     return
         method = self._methodForRequestType.get(httpMethodName)
         if not method:
@@ -75,6 +80,19 @@ class HTTPServlet(Servlet):
         """
         return None
 
+    def etag(self, trans):
+        """Get the entity tag of the current content.
+
+        Return a string identifying the current version of this object's
+        content, such as a version number or a hash of the data it is made
+        from, or None (meaning don't know or not applicable). The tag will
+        be quoted if necessary. If the request has an If-None-Match header
+        with this tag, a "304 Not Modified" response is sent without calling
+        respondToGet(). Set the AutoETags setting for computing weak entity
+        tags from the generated content automatically instead.
+        """
+        return None
+
     def respondToHead(self, trans):
         """Respond to a HEAD request.
 
@@ -31,6 +31,8 @@ class ImportManager(object):
         self._fileList = {}
         self._moduleFiles = {}
         self._notifyHook = None
+        self._changeHooks = []
+        self._fileMonitor = None
 
     def load_module(self, name, file, filename, info):
         """Replaces imp.load_module."""
@@ -83,6 +85,44 @@ class ImportManager(object):
         """
         self._notifyHook = hook
 
+    def addChangeHook(self, hook):
+        """Register a hook to be called with the path of changed files.
+
+        The hook is called from the monitor thread of the AutoReloading
+        AppServer for changes which do not require a restart, such as
+        changes of servlet modules when ReloadServletClasses is set.
+        """
+        if hook not in self._changeHooks:
+            self._changeHooks.append(hook)
+
+    def removeChangeHook(self, hook):
+        """Unregister a hook registered with addChangeHook()."""
+        if hook in self._changeHooks:
+            self._changeHooks.remove(hook)
+
+    def fileChanged(self, filename):
+        """Notify the registered hooks that the given file has changed."""
+        for hook in self._changeHooks[:]:
+            hook(filename)
+
+    def setFileMonitor(self, monitor):
+        """Set the file alteration monitor reporting changed files.
+
+        This is set by the AutoReloadingAppServer while it is monitoring
+        the files with a FAM backend supporting this (such as inotify).
+        """
+        self._fileMonitor = monitor
+
+    def isMonitored(self, filename):
+        """Check whether changes of the file are reported to the hooks.
+
+        If this is true, there is no need to check the modification time
+        of the file, since fileChanged() will be called when it changes.
+        """
+        monitor = self._fileMonitor
+        return bool(monitor and hasattr(monitor, 'monitors')
+            and monitor.monitors(filename))
+
     def watchFile(self, path, modname=None, getmtime=os.path.getmtime):
         """Add more files to watch without importing them."""
         modtime = getmtime(path)
@@ -177,6 +217,54 @@ class ImportManager(object):
             else:
                 return filename  # it's not a module, we must reload
 
+    def modulesForFile(self, filename):
+        """Get the names of the modules recorded for the given file."""
+        return [modname for modname, modfile in self._moduleFiles.items()
+            if modfile == filename]
+
+    @staticmethod
+    def dependentModules(modname):
+        """Get the names of other modules using the given module.
+
+        These are the modules that have imported the module itself or
+        objects defined in the module, which would continue to use the
+        old objects if the module were reloaded.
+        """
+        mod = sys.modules.get(modname)
+        parent, _, name = modname.rpartition('.')
+        dependents = []
+        for othername, other in sys.modules.items():
+            if other is None or othername == modname:
+                continue
+            for attr, value in vars(other).items():
+                if value is mod:
+                    # the parent package always references its submodules
+                    if othername == parent and attr == name:
+                        continue
+                else:
+                    try:
+                        if getattr(value, '__module__', None) != modname:
+                            continue
+                    except Exception:  # broken proxy objects
+                        continue
+                dependents.append(othername)
+                break
+        return dependents
+
+    def unloadModule(self, modname):
+        """Unload a module, so that it will be imported anew.
+
+        The module remains recorded for its file, with the current
+        modification time, so that the file is still being monitored.
+        """
+        sys.modules.pop(modname, None)
+        filename = self._moduleFiles.get(modname)
+        if filename in self._fileList:
+            try:
+                self._fileList[filename] = os.path.getmtime(filename)
+            except OSError:
+                pass
+
     def delModules(self, includePythonModules=False, excludePrefixes=None):
         """Delete imported modules.
 
@@ -0,0 +1,201 @@
+"""Inotify
+
+A file alteration monitor based on the inotify API of the Linux kernel.
+
+This is used by the AutoReloadingAppServer if "inotify" is listed in the
+UseFAMModules setting. It accesses the C library directly via ctypes,
+so no external module needs to be installed.
+
+Instead of watching every file separately, the monitor watches the
+directories containing the files, so that thousands of modules need only
+as many watches as there are package directories. This also catches files
+that are replaced by editors saving to a temporary file and renaming it.
+Events for the same file are coalesced until they are fetched.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import threading
+from collections import OrderedDict
+from struct import calcsize, unpack_from
+
+# inotify event masks and flags (from <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# the events we watch in the directories of the monitored files
+watchMask = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+eventFormat = 'iIII'
+eventSize = calcsize(eventFormat)
+
+
+def _loadLibC():
+    """Get the inotify functions of the C library (or None)."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+            use_errno=True)
+        functions = (libc.inotify_init1,
+            libc.inotify_add_watch, libc.inotify_rm_watch)
+    except (OSError, AttributeError):
+        return None
+    init, addWatch, rmWatch = functions
+    init.argtypes = [ctypes.c_int]
+    addWatch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    rmWatch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return functions
+
+_functions = _loadLibC()
+
+
+def available():
+    """Check whether inotify is available on this platform."""
+    return _functions is not None
+
+
+def _error(message):
+    """Create an OSError for the errno of the last C library call."""
+    code = ctypes.get_errno()
+    return OSError(code, '%s: %s' % (message, os.strerror(code)))
+
+
+class InotifyMonitor(object):
+    """Simple File Alteration Monitor based on inotify.
+
+    Provides the same interface as the FAM classes created by getFAM()
+    in AutoReloadingAppServer.
+    """
+
+    @staticmethod
+    def name():
+        return 'inotify'
+
+    def __init__(self):
+        if not available():
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        fd = _functions[0](IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise _error('Cannot initialize inotify')
+        self._fd = fd
+        self._lock = threading.Lock()
+        self._dirs = {}  # directory -> watch descriptor
+        self._watches = {}  # watch descriptor -> directory
+        self._files = {}  # directory -> set of monitored file names
+        self._changes = OrderedDict()  # file path -> kind of last change
+
+    def close(self):
+        """Stop monitoring and release the inotify instance."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def fd(self):
+        """Return the file descriptor that becomes readable on changes."""
+        return self._fd
+
+    def monitorFile(self, filepath):
+        """Start monitoring the given file."""
+        directory, name = os.path.split(os.path.abspath(filepath))
+        with self._lock:
+            if directory not in self._dirs:
+                wd = _functions[1](self._fd, directory, watchMask)
+                if wd < 0:
+                    print 'Cannot monitor %s: %s' % (
+                        filepath, os.strerror(ctypes.get_errno()))
+                    return
+                self._dirs[directory] = wd
+                self._watches[wd] = directory
+            self._files.setdefault(directory, set()).add(name)
+
+    def monitors(self, filepath):
+        """Check whether changes of the given file are reported."""
+        directory, name = os.path.split(os.path.abspath(filepath))
+        return name in self._files.get(directory, ())
+
+    def pending(self):
+        """Check whether there are changes of monitored files.
+
+        This reads all available events without blocking.
+        """
+        self.readEvents()
+        return bool(self._changes)
+
+    def nextFile(self):
+        """Return the kind of change and the path of the next changed file.
+
+        The kind of change is 'changed', 'created', 'deleted' or 'moved'.
+        """
+        with self._lock:
+            filepath, change = self._changes.popitem(last=False)
+        return change, filepath
+
+    def readEvents(self):
+        """Read all available events and record the changed files."""
+        while self._fd is not None:
+            try:
+                data = os.read(self._fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            if not data:
+                break
+            with self._lock:
+                self.parseEvents(data)
+
+    def parseEvents(self, data):
+        """Record the changes from the given raw events."""
+        changes = self._changes
+        pos, end = 0, len(data)
+        while pos + eventSize <= end:
+            wd, mask, cookie, length = unpack_from(eventFormat, data, pos)
+            pos += eventSize
+            name = data[pos:pos + length].rstrip('\0')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                # events have been lost, so everything may have changed
+                for directory, names in self._files.iteritems():
+                    for name in names:
+                        changes[os.path.join(directory, name)] = 'changed'
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # the directory itself is gone, and so are its files
+                change = 'moved' if mask & IN_MOVE_SELF else 'deleted'
+                for name in self._files.get(directory, ()):
+                    changes[os.path.join(directory, name)] = change
+                if mask & IN_IGNORED:  # the watch has been removed
+                    del self._watches[wd]
+                    del self._dirs[directory]
+                    self._files.pop(directory, None)
+                continue
+            if name not in self._files.get(directory, ()):
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                change = 'created'
+            elif mask & IN_DELETE:
+                change = 'deleted'
+            elif mask & IN_MOVED_FROM:
+                change = 'moved'
+            else:
+                change = 'changed'
+            changes[os.path.join(directory, name)] = change
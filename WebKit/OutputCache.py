@@ -0,0 +1,347 @@
+"""OutputCache.py
+
+A cache for the output of servlets.
+
+Servlets inheriting from HTTPContent can declare that the complete output
+of GET requests shall be cached by setting the class attribute outputCache,
+and Pages can declare that only the output of writeContent() shall be
+cached by setting the class attribute contentCache. Both are dictionaries
+with the following keys, all of which are optional:
+
+    ttl      - the time to live of the cached output in seconds (60)
+    fields   - the names of the request fields the output depends on
+               (None, the default, means all fields)
+    cookies  - the names of the cookies the output depends on
+    headers  - the names of the request headers the output depends on
+
+For example:
+
+    class Report(Page):
+
+        outputCache = dict(ttl=300, fields=['year'], headers=['Accept-Language'])
+
+The output is cached under a key made from the servlet class, the URL path
+and the values of the given fields, cookies and headers. Full pages are
+only cached if the response has the status 200, does not set cookies and
+the servlet has not used the session, since then the output is probably
+specific for the user. Fragments are always cached, so be sure to declare
+everything they depend on.
+
+When a cached page is served, it gets an ETag header derived from the
+content, so that clients revalidating their cached copy with If-None-Match
+get a "304 Not Modified" response without a body.
+
+If the output for a key is missing, only one thread generates it, while
+other threads requesting the same key wait for the result instead of
+generating the same output at the same time (single flight).
+
+The cache is configured with the OutputCache setting in Application.config.
+The output is stored in memory by default, with a least recently used
+policy and bounded size. It can also be stored in Memcached, so that it
+is shared by several app servers, or any other store implementing the
+interface of OutputCacheStore, which can be set with outputCache.setStore().
+"""
+
+import threading
+from collections import OrderedDict
+from hashlib import sha1
+from time import time
+
+from MiscUtils import AbstractError
+
+try:
+    from cPickle import HIGHEST_PROTOCOL as maxPickleProtocol
+except ImportError:
+    from pickle import HIGHEST_PROTOCOL as maxPickleProtocol
+
+# headers of the response which are not stored with the cached output
+uncachedHeaders = frozenset(('Status', 'Date', 'Content-length',
+    'Content-encoding', 'Etag', 'Set-cookie', 'Vary'))
+
+
+class OutputCacheStore(object):
+    """Abstract store for the output cache.
+
+    Entries are dictionaries with strings and numbers only,
+    so they can be pickled by stores which need it.
+    """
+
+    def get(self, key):
+        """Return the entry for the key or None if not available."""
+        raise AbstractError(self.__class__)
+
+    def set(self, key, entry, ttl):
+        """Store the entry for the key for ttl seconds."""
+        raise AbstractError(self.__class__)
+
+    def delete(self, key):
+        """Remove the entry for the key."""
+        raise AbstractError(self.__class__)
+
+    def clear(self):
+        """Remove all entries (if supported by the store)."""
+        raise AbstractError(self.__class__)
+
+    def stats(self):
+        """Return a dictionary with statistics of the store."""
+        return {}
+
+
+class MemoryOutputCacheStore(OutputCacheStore):
+    """Output cache store in memory.
+
+    The store holds at most maxEntries entries with at most maxSize bytes
+    of output. If these limits are exceeded, the entries which have been
+    used least recently are discarded.
+    """
+
+    def __init__(self, maxSize=32*1024*1024, maxEntries=10000):
+        self._maxSize = maxSize
+        self._maxEntries = maxEntries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if entry['expires'] > time():
+                    self._entries[key] = entry  # most recently used
+                else:
+                    self._size -= len(entry['body'])
+                    entry = None
+        return entry
+
+    def set(self, key, entry, ttl):
+        size = len(entry['body'])
+        if size > self._maxSize:
+            return
+        entry = dict(entry, expires=time() + ttl)
+        with self._lock:
+            entries = self._entries
+            old = entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old['body'])
+            entries[key] = entry
+            self._size += size
+            while self._size > self._maxSize or len(entries) > self._maxEntries:
+                self._size -= len(entries.popitem(last=False)[1]['body'])
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry['body'])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(entries=len(self._entries), size=self._size,
+                maxEntries=self._maxEntries, maxSize=self._maxSize)
+
+
+class MemcachedOutputCacheStore(OutputCacheStore):
+    """Output cache store using Memcached.
+
+    The cached output can be shared by several app servers this way.
+    Clearing the store is not supported, but since the keys contain
+    a generation number, outputCache.invalidate() still works within
+    one app server. You need to install python-memcached for this store.
+    """
+
+    def __init__(self, servers=None, namespace='WebwareOutput:'):
+        try:
+            import memcache
+        except Exception:
+            raise ImportError("For using the Memcached output cache,"
+                " python-memcached must be installed.")
+        self._namespace = namespace or ''
+        self._client = memcache.Client(servers or ['localhost:11211'],
+            pickleProtocol=maxPickleProtocol)
+
+    def get(self, key):
+        return self._client.get(self._namespace + key)
+
+    def set(self, key, entry, ttl):
+        self._client.set(self._namespace + key, entry, time=int(ttl) or 1)
+
+    def delete(self, key):
+        self._client.delete(self._namespace + key)
+
+    def clear(self):
+        pass
+
+
+class OutputCache(object):
+    """The output cache for servlets.
+
+    This manages the store, computes the cache keys and makes sure
+    that only one thread at a time generates the output for a key.
+    """
+
+    def __init__(self, store=None, enabled=True, waitTimeout=10):
+        self._store = store or MemoryOutputCacheStore()
+        self._enabled = enabled
+        self._waitTimeout = waitTimeout
+        self._lock = threading.Lock()
+        self._inFlight = {}  # key -> event set when the output is ready
+        self._generations = {}  # class name -> generation
+        self._generation = 0
+        self.resetStats()
+
+    def configure(self, settings):
+        """Configure the cache with the OutputCache setting."""
+        self._enabled = settings.get('Enabled', True)
+        self._waitTimeout = settings.get('WaitTimeout', 10)
+        store = settings.get('Store', 'Memory')
+        if store == 'Memory':
+            store = MemoryOutputCacheStore(
+                settings.get('MaxSize', 32*1024*1024),
+                settings.get('MaxEntries', 10000))
+        elif store == 'Memcached':
+            store = MemcachedOutputCacheStore(
+                settings.get('MemcachedServers'),
+                settings.get('MemcachedNamespace', 'WebwareOutput:'))
+        else:
+            raise ValueError('Invalid output cache store: %r' % store)
+        self.setStore(store)
+
+    def enabled(self):
+        return self._enabled
+
+    def setEnabled(self, enabled):
+        self._enabled = bool(enabled)
+
+    def store(self):
+        return self._store
+
+    def setStore(self, store):
+        """Set the store, an instance of an OutputCacheStore subclass."""
+        self._store = store
+
+
+    ## Keys ##
+
+    def key(self, servlet, trans, policy, name=None):
+        """Get the cache key for the output of a servlet.
+
+        The key is made from the class of the servlet, the name of the
+        fragment (if given), the URL path and the values of the fields,
+        cookies and headers of the request named in the policy.
+        """
+        cls = servlet.__class__
+        className = '%s.%s' % (cls.__module__, cls.__name__)
+        request = trans.request()
+        fields = policy.get('fields')
+        if fields is None:
+            fields = sorted(request.fields())
+        cookies, headers = policy.get('cookies', ()), policy.get('headers', ())
+        env = request.environ()
+        with self._lock:
+            generations = self._generation, self._generations.get(className, 0)
+        parts = (className, generations, name,
+            request.urlPath(), request.extraURLPath(),
+            [(field, request.field(field, None)) for field in fields],
+            [(cookie, request.cookie(cookie, None)) for cookie in cookies],
+            [(header, env.get('HTTP_' + header.upper().replace('-', '_')))
+                for header in headers])
+        return sha1(repr(parts)).hexdigest()
+
+    def invalidate(self, servletClass=None):
+        """Invalidate the cached output.
+
+        If a servlet class is given, only its output is invalidated.
+        """
+        if servletClass is None:
+            with self._lock:
+                self._generation += 1
+            self._store.clear()
+        else:
+            className = '%s.%s' % (
+                servletClass.__module__, servletClass.__name__)
+            with self._lock:
+                self._generations[className] = self._generations.get(
+                    className, 0) + 1
+
+
+    ## Entries ##
+
+    def get(self, key):
+        """Get the entry for the key or None if it is not available."""
+        entry = self._store.get(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entry
+
+    def set(self, key, body, headers=None, ttl=60):
+        """Store the output for the key and return the entry."""
+        entry = dict(body=body, headers=headers or [], time=time(),
+            etag='"%s"' % sha1(body).hexdigest()[:32])
+        self._store.set(key, entry, ttl)
+        return entry
+
+    def fetch(self, key):
+        """Get the entry for the key, waiting while it is being generated.
+
+        Returns the entry (None if it is not available) and a flag telling
+        whether the current thread has become the leader for generating
+        the output, in which case it must call release() afterwards.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry, False
+        if self.lead(key):
+            # the output may have been stored just before we took the lead
+            entry = self._store.get(key)
+            if entry is None:
+                return None, True
+            self.release(key)
+            return entry, False
+        return self.get(key), False
+
+    def lead(self, key):
+        """Become the leader for generating the output for the key.
+
+        Returns True if the current thread shall generate the output
+        and call release() afterwards. If another thread is already
+        generating it, waits until it is done (or the wait timeout has
+        passed) and returns False.
+        """
+        with self._lock:
+            event = self._inFlight.get(key)
+            if event is None:
+                self._inFlight[key] = threading.Event()
+                return True
+            self._waits += 1
+        event.wait(self._waitTimeout)
+        return False
+
+    def release(self, key):
+        """Release the leadership for generating the output for the key."""
+        with self._lock:
+            event = self._inFlight.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+    ## Statistics ##
+
+    def resetStats(self):
+        self._hits = self._misses = self._waits = 0
+
+    def stats(self):
+        """Return a dictionary with statistics of the cache and the store."""
+        stats = dict(hits=self._hits, misses=self._misses, waits=self._waits)
+        stats.update(self._store.stats())
+        return stats
+
+
+outputCache = OutputCache()
@@ -199,9 +199,10 @@ class Page(HTTPContent):
     def writeBodyParts(self):
         """Write the parts included in the <body> element.
 
-        Invokes `writeContent`. Subclasses should only override this method
-        to provide additional page parts such as a header, sidebar and footer,
-        that a subclass doesn't normally have to worry about writing.
+        Invokes `writeContent` (through `writeCachedContent`). Subclasses
+        should only override this method to provide additional page parts
+        such as a header, sidebar and footer, that a subclass doesn't
+        normally have to worry about writing.
 
         For writing page-specific content, subclasses should override
         `writeContent`() instead. This method is intended to be overridden
@@ -211,7 +212,25 @@ class Page(HTTPContent):
 
         Invoked by `writeBody`.
         """
-        self.writeContent()
+        self.writeCachedContent()
+
+    # the policy for caching the output of writeContent()
+    # as a dictionary with the keys ttl, fields, cookies and headers
+    contentCache = None
+
+    def writeCachedContent(self):
+        """Write the content of the page using the output cache.
+
+        Invokes `writeContent`, unless its output has been cached because
+        the class attribute `contentCache` has been set (see OutputCache).
+        Subclasses overriding `writeBodyParts` should invoke this method
+        instead of `writeContent` to support caching of the content.
+        """
+        if self.contentCache:
+            self.writeCachedOutput('writeContent',
+                self.writeContent, self.contentCache)
+        else:
+            self.writeContent()
 
     def writeContent(self):
         """Write the unique, central content for the page.
@@ -12,6 +12,11 @@ the Launch.py script which can be quickly examined from the command line:
     $ cd Webware
     $ bin/printprof.py WebKit/profile.pstats
 
+Note that this slows down every request considerably. For profiling
+a running app server, particularly with production traffic, use the
+sampling profiler in WebKit.SamplingProfiler instead, which can be
+started and stopped on the Sampling Profile page of the Admin context.
+
 Using the RunSnakeRun (http://www.vrplumber.com/programming/runsnakerun/)
 GUI utility you can even visualize the data in the profile.pstats file.
 
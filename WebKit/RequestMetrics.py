@@ -0,0 +1,261 @@
+"""RequestMetrics.py
+
+Lightweight timing of the stages of the requests served by WebKit.
+
+The application server and the application record how long each request
+spends in the following stages, using a monotonic clock:
+
+    queue         waiting in the request queue for a worker thread
+    parse         creating the request object from the raw request
+    resolve       finding the servlet with the URL parser
+    factory       getting the servlet from the servlet factory
+                  (this is part of the resolve stage)
+    awake         servlet awake()
+    respond       servlet respond()
+    sleep         servlet sleep()
+    sessionLoad   retrieving or creating the session
+                  (usually part of the awake stage)
+    sessionStore  storing the session after sleep()
+    send          delivering the response to the adapter or the client
+    total         dispatching the request, from parse to send
+
+The durations are aggregated into histograms, one set for each worker
+thread, so that recording does not need any locks. The histograms of
+all threads are only summed up when the metrics are read, e.g. by the
+Metrics servlet of the Admin context, which exposes them in the text
+format of Prometheus, or by the Request Metrics page of the Admin context.
+
+Recording can be switched off with the RequestMetrics setting in
+Application.config. Servlets can record stages of their own as well:
+
+    from WebKit.RequestMetrics import requestMetrics, monotonic
+
+    start = monotonic()
+    ...
+    requestMetrics.record('myStage', start)
+"""
+
+import threading
+import weakref
+from bisect import bisect_left
+from time import time
+
+from MiscUtils.Funcs import monotonic
+
+# the predefined stages in the order of processing
+stages = ('queue', 'parse', 'resolve', 'factory', 'awake', 'respond',
+    'sleep', 'sessionLoad', 'sessionStore', 'send', 'total')
+
+# the upper bounds of the histogram buckets in seconds
+# (the last bucket has no upper bound)
+buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """Histogram of the durations of one stage."""
+
+    __slots__ = ('_count', '_sum', '_counts')
+
+    def __init__(self):
+        self._count = 0
+        self._sum = 0.0
+        self._counts = [0] * (len(buckets) + 1)
+
+    def count(self):
+        """Return the number of durations."""
+        return self._count
+
+    def sum(self):
+        """Return the sum of the durations in seconds."""
+        return self._sum
+
+    def counts(self):
+        """Return the counts of the buckets."""
+        return list(self._counts)
+
+    def observe(self, seconds):
+        """Add a duration."""
+        self._count += 1
+        self._sum += seconds
+        self._counts[bisect_left(buckets, seconds)] += 1
+
+    def add(self, other, factor=1):
+        """Add the values of another histogram (factor -1 subtracts)."""
+        self._count += factor * other._count
+        self._sum += factor * other._sum
+        self._counts = [n + factor * m
+            for n, m in zip(self._counts, other._counts)]
+
+    def mean(self):
+        return self._sum / self._count if self._count else 0.0
+
+    def percentile(self, p):
+        """Estimate the p-th percentile of the durations.
+
+        The value is interpolated linearly within the bucket containing
+        the percentile, so it is only as exact as the buckets are narrow.
+        Durations in the last bucket are estimated as the largest bound.
+        """
+        if not self._count:
+            return 0.0
+        rank = p * self._count / 100.0
+        seen = 0
+        lower = 0.0
+        for upper, n in zip(buckets, self._counts):
+            if n and seen + n >= rank:
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = upper
+        return buckets[-1]
+
+    def cumulativeCounts(self):
+        """Return the cumulative counts of the buckets."""
+        counts, total = [], 0
+        for n in self._counts:
+            total += n
+            counts.append(total)
+        return counts
+
+
+class RequestMetrics(object):
+    """Histograms of the durations of the request stages.
+
+    Each thread records into its own dictionary of histograms, which is
+    never changed by other threads. Reading the metrics sums up the
+    histograms of all threads; the histograms of threads which have
+    ended are merged and released at that occasion.
+    """
+
+    def __init__(self, enabled=True):
+        self._enabled = enabled
+        self._local = threading.local()
+        self._threads = []  # list of (thread reference, histograms) pairs
+        self._retired = {}  # histograms of the threads which have ended
+        self._baseline = {}
+        self._lock = threading.Lock()  # only used when reading
+        self._since = time()
+
+    def enabled(self):
+        return self._enabled
+
+    def setEnabled(self, enabled):
+        """Switch recording on or off."""
+        self._enabled = bool(enabled)
+
+
+    ## Recording ##
+
+    def record(self, stage, start):
+        """Record a stage of the current thread that started at start.
+
+        The start time must have been taken from monotonic(). Returns the
+        current time, so that it can be used as start of the next stage.
+        """
+        now = monotonic()
+        if self._enabled:
+            try:
+                histograms = self._local.histograms
+            except AttributeError:
+                histograms = self._local.histograms = {}
+                self._threads.append(
+                    (weakref.ref(threading.current_thread()), histograms))
+            try:
+                histogram = histograms[stage]
+            except KeyError:
+                histogram = histograms[stage] = Histogram()
+            histogram.observe(now - start)
+        return now
+
+
+    ## Reading ##
+
+    def histograms(self, sinceReset=True):
+        """Return a dictionary with the histograms of all stages.
+
+        Unless sinceReset is false, the histograms only contain the
+        durations recorded since the last reset(). Note that the totals
+        may be slightly inconsistent since other threads may be recording.
+        """
+        with self._lock:
+            histograms = self._collect()
+            if sinceReset:
+                for stage, baseline in self._baseline.items():
+                    histograms[stage].add(baseline, -1)
+        return histograms
+
+    def _collect(self):
+        """Sum up the histograms of all threads (with the lock held)."""
+        retired = self._retired
+        total = {}
+        # other threads may append to the list meanwhile, so we iterate
+        # over a copy and remove the threads which have ended one by one
+        for entry in list(self._threads):
+            thread = entry[0]()
+            if thread is None or not thread.is_alive():
+                _addHistograms(retired, entry[1])
+                self._threads.remove(entry)
+            else:
+                _addHistograms(total, entry[1])
+        _addHistograms(total, retired)
+        return total
+
+    def reset(self):
+        """Start collecting the metrics shown by histograms() anew.
+
+        The cumulative histograms exported for Prometheus are not reset.
+        """
+        with self._lock:
+            self._baseline = self._collect()
+            self._since = time()
+
+    def since(self):
+        """Return the time of the last reset."""
+        return self._since
+
+    def stats(self):
+        """Return the statistics of all stages as a list of dictionaries.
+
+        The keys are: stage, count, seconds (total), mean, p50, p95 and
+        p99 (the estimated percentiles in seconds).
+        """
+        histograms = self.histograms()
+        order = dict((stage, i) for i, stage in enumerate(stages))
+        stats = []
+        for stage in sorted(histograms,
+                key=lambda stage: (order.get(stage, len(stages)), stage)):
+            h = histograms[stage]
+            stats.append(dict(stage=stage, count=h.count(), seconds=h.sum(),
+                mean=h.mean(), p50=h.percentile(50), p95=h.percentile(95),
+                p99=h.percentile(99)))
+        return stats
+
+    def prometheusText(self, prefix='webkit'):
+        """Return the histograms in the Prometheus text exposition format."""
+        name = prefix + '_request_stage_seconds'
+        lines = ['# HELP %s Time spent in the stages of the requests.' % name,
+            '# TYPE %s histogram' % name]
+        histograms = self.histograms(sinceReset=False)
+        for stage in sorted(histograms):
+            h = histograms[stage]
+            label = 'stage="%s"' % stage.replace('\\', '\\\\').replace(
+                '"', '\\"').replace('\n', '\\n')
+            for bound, n in zip(buckets + ('+Inf',), h.cumulativeCounts()):
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, label,
+                    bound if isinstance(bound, str) else repr(bound), n))
+            lines.append('%s_sum{%s} %r' % (name, label, h.sum()))
+            lines.append('%s_count{%s} %d' % (name, label, h.count()))
+        return '\n'.join(lines) + '\n'
+
+
+def _addHistograms(total, histograms):
+    """Add a dictionary of histograms to another one."""
+    for stage, histogram in histograms.items():
+        try:
+            total[stage].add(histogram)
+        except KeyError:
+            total[stage] = h = Histogram()
+            h.add(histogram)
+
+
+requestMetrics = RequestMetrics()
@@ -0,0 +1,250 @@
+"""SamplingProfiler.py
+
+A statistical profiler for the requests served by WebKit.
+
+Unlike the deterministic profiler that can be activated in Launch.py,
+which slows down every request considerably and writes its report only
+when the app server shuts down, the sampling profiler can be started
+and stopped at any time while the app server is running, and its
+overhead is small enough to use it with production traffic.
+
+While it is running, a background thread takes a snapshot of the call
+stacks of all threads that are processing requests, by default 100 times
+per second. The stacks are attributed to the servlet path of the request
+and counted, so that the number of samples of a stack is proportional
+to the time spent in it. (Sampling with signals is not an option, since
+Python only delivers signals to the main thread.)
+
+The stacks can be exported in the collapsed format used by the
+FlameGraph tools (https://github.com/brendangregg/FlameGraph):
+
+    servletPath;module:function;module:function... count
+
+The profiler is controlled by the SamplingProfile page of the Admin
+context and configured with the SamplingProfiler setting in
+Application.config. It can also be used programmatically:
+
+    from WebKit.SamplingProfiler import samplingProfiler
+    samplingProfiler.start()
+    ...
+    samplingProfiler.stop()
+    samplingProfiler.writeCollapsed('stacks.txt')
+"""
+
+import sys
+import threading
+from thread import get_ident
+from time import sleep, time
+
+
+class SamplingProfiler(object):
+    """Profiler sampling the stacks of the threads serving requests."""
+
+    def __init__(self, frequency=100, maxDepth=100, maxStacks=10000):
+        self._frequency = frequency
+        self._maxDepth = maxDepth
+        self._maxStacks = maxStacks
+        self._requests = {}  # thread id -> request
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def configure(self, frequency=None, maxDepth=None, maxStacks=None):
+        """Change the parameters of the profiler."""
+        if frequency:
+            self._frequency = max(1, min(1000, float(frequency)))
+        if maxDepth:
+            self._maxDepth = int(maxDepth)
+        if maxStacks:
+            self._maxStacks = int(maxStacks)
+
+    def frequency(self):
+        """Return the number of samples taken per second."""
+        return self._frequency
+
+    def reset(self):
+        """Discard all samples."""
+        with self._lock:
+            self._stacks = {}  # (path, frames) -> number of samples
+            self._samples = self._dropped = 0
+            self._since = time()
+            self._seconds = 0.0
+
+
+    ## Control ##
+
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Start sampling in a background thread."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._sample, name='SamplingProfiler')
+            self._thread.setDaemon(True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._running = False
+        if thread and thread is not threading.current_thread():
+            thread.join()
+        self._requests.clear()
+
+
+    ## Requests ##
+
+    def startRequest(self, request):
+        """Register the request processed by the current thread."""
+        if self._running:
+            self._requests[get_ident()] = request
+
+    def endRequest(self):
+        """Unregister the request processed by the current thread."""
+        if self._requests:
+            self._requests.pop(get_ident(), None)
+
+
+    ## Sampling ##
+
+    def _sample(self):
+        """Take samples until the profiler is stopped."""
+        ownId = get_ident()
+        while self._running:
+            interval = 1.0 / self._frequency
+            start = time()
+            requests = self._requests.items()
+            if requests:
+                frames = sys._current_frames()
+                stacks = []
+                for threadId, request in requests:
+                    if threadId == ownId:
+                        continue
+                    frame = frames.get(threadId)
+                    if frame is not None:
+                        stacks.append((self.requestPath(request),
+                            self.stack(frame)))
+                del frames
+                if stacks:
+                    self.addStacks(stacks)
+            duration = time() - start
+            with self._lock:
+                self._seconds += duration
+            sleep(max(0.0, interval - duration))
+
+    @staticmethod
+    def requestPath(request):
+        """Get the servlet path of a request for the samples."""
+        try:
+            return request.servletURI() or '/'
+        except Exception:  # request not set up yet or already finished
+            return '-'
+
+    def stack(self, frame):
+        """Get the stack of a frame as tuple, the outermost frame first."""
+        stack = []
+        maxDepth = self._maxDepth
+        while frame is not None and len(stack) < maxDepth:
+            code = frame.f_code
+            stack.append('%s:%s' % (
+                frame.f_globals.get('__name__') or code.co_filename,
+                code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def addStacks(self, stacks):
+        """Count the given list of sampled (path, stack) pairs."""
+        with self._lock:
+            counts = self._stacks
+            for key in stacks:
+                if key in counts:
+                    counts[key] += 1
+                elif len(counts) < self._maxStacks:
+                    counts[key] = 1
+                else:
+                    self._dropped += 1
+                    continue
+                self._samples += 1
+
+
+    ## Results ##
+
+    def stats(self):
+        """Return a dictionary with summary statistics.
+
+        The keys are: running, frequency, samples, stacks (the number of
+        different stacks), dropped (samples of new stacks dropped because
+        there were already maxStacks stacks), overhead (the fraction of the
+        time spent sampling) and since (the time of the last reset).
+        """
+        with self._lock:
+            elapsed = time() - self._since
+            return dict(running=self._running, frequency=self._frequency,
+                samples=self._samples, stacks=len(self._stacks),
+                dropped=self._dropped, since=self._since,
+                overhead=self._seconds / elapsed if elapsed > 0 else 0.0)
+
+    def paths(self):
+        """Return (path, samples) pairs sorted by the number of samples."""
+        paths = {}
+        with self._lock:
+            for key, count in self._stacks.iteritems():
+                path = key[0]
+                paths[path] = paths.get(path, 0) + count
+        return sorted(paths.items(), key=lambda item: (-item[1], item[0]))
+
+    def functions(self, path=None):
+        """Return the functions by number of samples.
+
+        Returns (function, own samples, total samples) triples, where own
+        samples are those in which the function was executing itself and
+        total samples include the functions called by it. If path is given,
+        only the samples for that servlet path are considered.
+        """
+        own, total = {}, {}
+        with self._lock:
+            for key, count in self._stacks.iteritems():
+                p, stack = key
+                if path is not None and p != path or not stack:
+                    continue
+                own[stack[-1]] = own.get(stack[-1], 0) + count
+                for function in set(stack):
+                    total[function] = total.get(function, 0) + count
+        return sorted(((function, own.get(function, 0), count)
+            for function, count in total.iteritems()),
+            key=lambda item: (-item[1], -item[2], item[0]))
+
+    def collapsed(self, path=None):
+        """Return the samples in the collapsed stack format.
+
+        If path is given, only the samples for that servlet path are
+        returned, otherwise the servlet path is the root frame.
+        """
+        lines = []
+        with self._lock:
+            for key, count in self._stacks.iteritems():
+                p, stack = key
+                if path is None:
+                    stack = (p,) + stack
+                elif p != path:
+                    continue
+                lines.append('%s %d' % (';'.join(
+                    frame.replace(';', ':').replace(' ', '_')
+                    for frame in stack), count))
+        lines.sort()
+        return ''.join(line + '\n' for line in lines)
+
+    def writeCollapsed(self, filename, path=None):
+        """Write the samples in the collapsed stack format to a file."""
+        with open(filename, 'w') as f:
+            f.write(self.collapsed(path))
+
+
+samplingProfiler = SamplingProfiler()
@@ -159,9 +159,11 @@ class Servlet(object):
         self._busy = True
 
     def close(self):
-        if self._busy and self._factory:
-            self._busy = False
-            self._factory.returnServlet(self)
+        if self._factory:
+            self._factory.releaseServlet(self)
+            if self._busy:
+                self._busy = False
+                self._factory.returnServlet(self)
 
     def setFactory(self, factory):
         self._factory = factory
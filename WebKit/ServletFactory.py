@@ -3,6 +3,7 @@
 import os
 import sys
 import threading
+from time import time
 
 from keyword import iskeyword
 
@@ -55,6 +56,12 @@ class ServletFactory(object):
         # (which are not pooled, so only one is kept at a time)
         self._threadsafeServletCache = {}
         self._importLock = threading.RLock()
+        # _activeServlets counts the servlets in use per class,
+        # _reloading has the paths of servlets being hot reloaded
+        self._activeServlets = {}
+        self._reloading = set()
+        self._reloadCondition = threading.Condition(threading.Lock())
+        self._imp.addChangeHook(self.fileChanged)
 
 
     ## Info ##
@@ -212,26 +219,43 @@ class ServletFactory(object):
         if no cache is found. Caching is generally controlled by servlets
         with the canBeReused() and canBeThreaded() methods.
         """
-        request = transaction.request()
-        path = request.serverSidePath()
-        # Do we need to import/reimport the class
-        # because the file changed on disk or isn't in cache?
-        mtime = os.path.getmtime(path)
-        if (path not in self._classCache
-                or mtime != self._classCache[path]['mtime']):
-            # Use a lock to prevent multiple simultaneous
-            # imports of the same module:
-            with self._importLock:
-                if (path not in self._classCache
-                        or mtime != self._classCache[path]['mtime']):
-                    theClass = self.loadClass(transaction, path)
-                    if self._cacheClasses:
-                        self._classCache[path] = {
-                            'mtime': mtime, 'class': theClass}
-                else:
-                    theClass = self._classCache[path]['class']
+        path = transaction.request().serverSidePath()
+        if self._reloading:
+            # wait while the servlet is being hot reloaded
+            with self._reloadCondition:
+                while path in self._reloading:
+                    self._reloadCondition.wait()
+        servlet = self.servletForPath(transaction, path)
+        cls = servlet.__class__
+        with self._reloadCondition:
+            self._activeServlets[cls] = self._activeServlets.get(cls, 0) + 1
+        return servlet
+
+    def servletForPath(self, transaction, path):
+        """Return a cached or new servlet for the given path."""
+        cached = self._classCache.get(path)
+        if cached and self._imp.isMonitored(path):
+            # Changes of the file will be reported to fileChanged(),
+            # so we don't need to check the modification time:
+            theClass = cached['class']
         else:
-            theClass = self._classCache[path]['class']
+            # Do we need to import/reimport the class
+            # because the file changed on disk or isn't in cache?
+            mtime = os.path.getmtime(path)
+            if not cached or mtime != cached['mtime']:
+                # Use a lock to prevent multiple simultaneous
+                # imports of the same module:
+                with self._importLock:
+                    if (path not in self._classCache
+                            or mtime != self._classCache[path]['mtime']):
+                        theClass = self.loadClass(transaction, path)
+                        if self._cacheClasses:
+                            self._classCache[path] = {
+                                'mtime': mtime, 'class': theClass}
+                    else:
+                        theClass = self._classCache[path]['class']
+            else:
+                theClass = cached['class']
 
         # Try to find a cached servlet of the correct class.
         # (Outdated servlets may have been returned to the pool after a new
@@ -289,6 +313,75 @@ class ServletFactory(object):
             path = servlet.serverSidePath()
             self._servletPool[path].append(servlet)
 
+    def releaseServlet(self, servlet):
+        """Note that a servlet is not used by a request any more.
+
+        Called by Servlet.close() for every servlet that has been handed
+        out by servletForTransaction(), so that hot reloads can wait until
+        the servlets of the old class are not used any more.
+        """
+        cls = servlet.__class__
+        with self._reloadCondition:
+            count = self._activeServlets.get(cls, 0) - 1
+            if count > 0:
+                self._activeServlets[cls] = count
+            else:
+                self._activeServlets.pop(cls, None)
+                if self._reloading:
+                    self._reloadCondition.notifyAll()
+
+    def hasServlet(self, path):
+        """Check whether the class of the servlet file is cached."""
+        return path in self._classCache
+
+    def drainServlet(self, path, timeout=10):
+        """Wait until the servlet file is not used by requests any more.
+
+        New requests for the servlet are held back until finishReload()
+        is called, which must always happen afterwards. Returns False if
+        the old servlets were still in use after timeout seconds.
+        """
+        cached = self._classCache.get(path)
+        cls = cached and cached['class']
+        condition = self._reloadCondition
+        with condition:
+            self._reloading.add(path)
+            deadline = time() + timeout
+            while self._activeServlets.get(cls):
+                remaining = deadline - time()
+                if remaining <= 0:
+                    return False
+                condition.wait(remaining)
+        return True
+
+    def finishReload(self, path, reloaded=True):
+        """Let requests for a drained servlet file continue.
+
+        If the servlet has been reloaded, the cached class and servlets
+        are discarded, so that the next request uses the new module.
+        """
+        try:
+            if reloaded:
+                with self._importLock:
+                    self._classCache.pop(path, None)
+                    if path in self._servletPool:
+                        self._servletPool[path] = []
+                    self._threadsafeServletCache.pop(path, None)
+        finally:
+            with self._reloadCondition:
+                self._reloading.discard(path)
+                self._reloadCondition.notifyAll()
+
+    def fileChanged(self, path):
+        """Forget the cached class of a servlet file that has changed.
+
+        Invoked by the import manager when the file monitor of the
+        AutoReloadingAppServer reports a change of the file.
+        """
+        if path in self._classCache:
+            with self._importLock:
+                self._classCache.pop(path, None)
+
     def flushCache(self):
         """Flush the servlet cache and start fresh.
 
@@ -131,7 +131,7 @@ table.NiceTable th a:link, table.NiceTable th a:visited {
         self.writeSidebar()
         wr('</td>')
         wr('<td id="Content">')
-        self.writeContent()
+        self.writeCachedContent()
         wr('</td>')
         wr('</tr></table>')
 
@@ -0,0 +1,192 @@
+import os
+import sys
+import unittest
+import zlib
+from gzip import GzipFile
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from MiscUtils import StringIO
+from WebKit.ASStreamOut import ASStreamOut
+from WebKit.HTTPResponse import HTTPResponse, acceptedEncoding
+
+
+class Application(object):
+    """Mock application."""
+
+    def __init__(self, enabled=True):
+        self._settings = dict(Compression=dict(Enabled=enabled,
+            Encodings=['gzip', 'deflate'], Level=6, MinSize=100,
+            MimeTypes=['text/*', 'application/json']))
+
+    def setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+
+class Request(object):
+    """Mock request."""
+
+    def __init__(self, acceptEncoding=None, method='GET'):
+        self._environ = {}
+        if acceptEncoding:
+            self._environ['HTTP_ACCEPT_ENCODING'] = acceptEncoding
+        self._method = method
+
+    def environ(self):
+        return self._environ
+
+    def method(self):
+        return self._method
+
+    def sessionId(self):
+        return None
+
+
+class Transaction(object):
+    """Mock transaction."""
+
+    def __init__(self, application, request):
+        self._application = application
+        self._request = request
+
+    def application(self):
+        return self._application
+
+    def request(self):
+        return self._request
+
+    def errorOccurred(self):
+        return False
+
+    def hasSession(self):
+        return False
+
+
+def gunzip(data):
+    return GzipFile(fileobj=StringIO(data)).read()
+
+
+def splitResponse(data):
+    head, body = data.split('\r\n\r\n', 1)
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n'))
+    return headers, body
+
+
+class AcceptedEncodingTest(unittest.TestCase):
+
+    def testAcceptedEncoding(self):
+        self.assertEqual(acceptedEncoding(None), None)
+        self.assertEqual(acceptedEncoding(''), None)
+        self.assertEqual(acceptedEncoding('gzip'), 'gzip')
+        self.assertEqual(acceptedEncoding('deflate, gzip'), 'gzip')
+        self.assertEqual(acceptedEncoding('deflate'), 'deflate')
+        self.assertEqual(acceptedEncoding('GZip;q=0.5'), 'gzip')
+        self.assertEqual(acceptedEncoding('gzip;q=0, deflate'), 'deflate')
+        self.assertEqual(acceptedEncoding('gzip; q=0.0'), None)
+        self.assertEqual(acceptedEncoding('*'), 'gzip')
+        self.assertEqual(acceptedEncoding('*, gzip;q=0'), 'deflate')
+        self.assertEqual(acceptedEncoding('identity, br'), None)
+        self.assertEqual(acceptedEncoding('gzip', ['deflate']), None)
+
+
+class StreamCompressionTest(unittest.TestCase):
+
+    def testCompression(self):
+        out = ASStreamOut()
+        out.write('Hello, ')
+        self.assertFalse(out.compressing())
+        out.startCompression('gzip')
+        self.assertTrue(out.compressing())
+        out.write('World!')
+        out.prepend('head\r\n\r\n')
+        out.commit()
+        out.finishCompression()
+        out.close()
+        self.assertFalse(out.compressing())
+        head, body = out.buffer().split('\r\n\r\n', 1)
+        self.assertEqual(head, 'head')
+        self.assertEqual(gunzip(body), 'Hello, World!')
+
+    def testFlushCompression(self):
+        out = ASStreamOut()
+        out.startCompression('deflate')
+        out.commit()
+        out.write('first ' * 100)
+        out.flushCompression()
+        out.flush()
+        decompressor = zlib.decompressobj()
+        self.assertEqual(decompressor.decompress(out.buffer()), 'first ' * 100)
+        out.pop(len(out.buffer()))
+        out.write('second ' * 100)
+        out.finishCompression()
+        out.close()
+        self.assertEqual(decompressor.decompress(out.buffer()), 'second ' * 100)
+
+
+class ResponseCompressionTest(unittest.TestCase):
+
+    def response(self, acceptEncoding='gzip, deflate', method='GET',
+            enabled=True):
+        trans = Transaction(Application(enabled),
+            Request(acceptEncoding, method))
+        return HTTPResponse(trans, ASStreamOut())
+
+    def deliver(self, response):
+        response.deliver()
+        response.streamOut().close()
+        return splitResponse(response.streamOut().buffer())
+
+    def testCompressed(self):
+        response = self.response()
+        response.write('<p>Hello, World!</p>' * 10)
+        headers, body = self.deliver(response)
+        self.assertEqual(headers['Content-encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gunzip(body), '<p>Hello, World!</p>' * 10)
+
+    def testDeflate(self):
+        response = self.response('deflate')
+        response.setHeader('Content-Type', 'application/json; charset=utf-8')
+        response.setHeader('Vary', 'Cookie')
+        response.write('[1, 2, 3]' * 20)
+        headers, body = self.deliver(response)
+        self.assertEqual(headers['Content-encoding'], 'deflate')
+        self.assertEqual(headers['Vary'], 'Cookie, Accept-Encoding')
+        self.assertEqual(zlib.decompress(body), '[1, 2, 3]' * 20)
+
+    def testNotCompressed(self):
+        # the Vary header is set if the content could have been compressed
+        for args, contentType, size, vary in (
+                (dict(enabled=False), 'text/html', 200, False),
+                (dict(acceptEncoding=None), 'text/html', 200, True),
+                (dict(acceptEncoding='br'), 'text/html', 200, True),
+                (dict(method='HEAD'), 'text/html', 200, False),
+                ({}, 'image/png', 200, False),
+                ({}, 'text/html', 50, False)):
+            response = self.response(**args)
+            response.setHeader('Content-Type', contentType)
+            response.write('x' * size)
+            headers, body = self.deliver(response)
+            self.assertFalse('Content-encoding' in headers, args)
+            self.assertEqual(body, 'x' * size)
+            self.assertEqual('Vary' in headers, vary, args)
+
+    def testContentLength(self):
+        response = self.response()
+        response.setHeader('Content-Length', '200')
+        response.streamOut().setAutoCommit()
+        response.write('y' * 200)
+        response.flush()
+        response.write('y' * 200)
+        headers, body = self.deliver(response)
+        self.assertEqual(headers['Content-encoding'], 'gzip')
+        self.assertFalse('Content-length' in headers)
+        self.assertEqual(gunzip(body), 'y' * 400)
+
+    def testAlreadyEncoded(self):
+        response = self.response()
+        response.setHeader('Content-Encoding', 'gzip')
+        response.write('z' * 200)
+        headers, body = self.deliver(response)
+        self.assertEqual(headers['Content-encoding'], 'gzip')
+        self.assertEqual(body, 'z' * 200)
@@ -0,0 +1,194 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from WebKit.ASStreamOut import ASStreamOut
+from WebKit.HTTPResponse import HTTPResponse, matchesETag, notModified
+from WebKit.HTTPServlet import HTTPServlet
+
+
+class Application(object):
+    """Mock application."""
+
+    def __init__(self, autoETags=True):
+        self._settings = dict(AutoETags=autoETags)
+
+    def setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+
+class Request(object):
+    """Mock request."""
+
+    def __init__(self, environ=None, method='GET'):
+        self._environ = environ or {}
+        self._method = method
+
+    def environ(self):
+        return self._environ
+
+    def method(self):
+        return self._method
+
+
+class Transaction(object):
+    """Mock transaction."""
+
+    def __init__(self, request, application=None):
+        self._application = application or Application()
+        self._request = request
+        self._response = HTTPResponse(self, ASStreamOut())
+        self._session = None
+
+    def application(self):
+        return self._application
+
+    def request(self):
+        return self._request
+
+    def response(self):
+        return self._response
+
+    def errorOccurred(self):
+        return False
+
+
+class VersionedServlet(HTTPServlet):
+
+    def __init__(self, version='v1', modified=None):
+        HTTPServlet.__init__(self)
+        self._version = version
+        self._modified = modified
+        self.calls = 0
+
+    def etag(self, trans):
+        return self._version
+
+    def lastModified(self, trans):
+        return self._modified
+
+    def respondToGet(self, trans):
+        self.calls += 1
+        trans.response().write('content')
+
+
+def splitResponse(data):
+    head, body = data.split('\r\n\r\n', 1)
+    headers = dict(line.split(': ', 1) for line in head.split('\r\n'))
+    return headers, body
+
+
+class NotModifiedTest(unittest.TestCase):
+
+    def testMatchesETag(self):
+        self.assertFalse(matchesETag(None, '"a"'))
+        self.assertFalse(matchesETag('"a"', None))
+        self.assertFalse(matchesETag('"b"', '"a"'))
+        self.assertTrue(matchesETag('"a"', '"a"'))
+        self.assertTrue(matchesETag('"b", W/"a"', '"a"'))
+        self.assertTrue(matchesETag('"a"', 'W/"a"'))
+        self.assertTrue(matchesETag('*', '"a"'))
+
+    def testIfModifiedSince(self):
+        ims = dict(HTTP_IF_MODIFIED_SINCE='Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertTrue(notModified(ims, lastModified=784111777))
+        self.assertTrue(notModified(ims, lastModified=784111777.5))
+        self.assertTrue(notModified(ims, lastModified=784111700))
+        self.assertFalse(notModified(ims, lastModified=784111778))
+        self.assertFalse(notModified(ims))
+        self.assertFalse(notModified({}, lastModified=784111777))
+        self.assertTrue(notModified(dict(HTTP_IF_MODIFIED_SINCE=
+            'Sun, 06 Nov 1994 08:49:37 GMT; length=123'),
+            lastModified=784111777))
+        self.assertFalse(notModified(dict(HTTP_IF_MODIFIED_SINCE='garbage'),
+            lastModified=784111777))
+
+    def testIfNoneMatchTakesPrecedence(self):
+        environ = dict(HTTP_IF_NONE_MATCH='"b"',
+            HTTP_IF_MODIFIED_SINCE='Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertFalse(notModified(environ, '"a"', 784111777))
+        self.assertTrue(notModified(environ, '"b"', 784111778))
+
+
+class ServletTest(unittest.TestCase):
+
+    def respond(self, servlet, environ=None, method='GET'):
+        trans = Transaction(Request(environ, method))
+        servlet.respond(trans)
+        return trans.response()
+
+    def testETag(self):
+        servlet = VersionedServlet()
+        response = self.respond(servlet)
+        self.assertEqual(response.header('ETag'), '"v1"')
+        self.assertFalse(response.hasHeader('Status'))
+        self.assertEqual(servlet.calls, 1)
+        response = self.respond(servlet, dict(HTTP_IF_NONE_MATCH='"v1"'))
+        self.assertEqual(response.header('Status'), '304 Not Modified')
+        self.assertEqual(response.header('ETag'), '"v1"')
+        self.assertEqual(response.streamOut().buffer(), '')
+        self.assertEqual(servlet.calls, 1)
+        response = self.respond(servlet, dict(HTTP_IF_NONE_MATCH='"v0"'))
+        self.assertFalse(response.hasHeader('Status'))
+        self.assertEqual(servlet.calls, 2)
+        response = self.respond(servlet, dict(HTTP_IF_NONE_MATCH='"v1"'),
+            method='POST')
+        self.assertFalse(response.hasHeader('ETag'))
+
+    def testWeakETag(self):
+        servlet = VersionedServlet('W/"v1"')
+        response = self.respond(servlet, dict(HTTP_IF_NONE_MATCH='"v1"'))
+        self.assertEqual(response.header('ETag'), 'W/"v1"')
+        self.assertEqual(response.header('Status'), '304 Not Modified')
+
+    def testLastModified(self):
+        servlet = VersionedServlet(None, 784111777)
+        response = self.respond(servlet, dict(
+            HTTP_IF_MODIFIED_SINCE='Sun, 06 Nov 1994 08:49:37 GMT'))
+        self.assertEqual(response.header('Last-Modified'),
+            'Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertEqual(response.header('Status'), '304 Not Modified')
+        self.assertEqual(servlet.calls, 0)
+        response = self.respond(servlet, dict(
+            HTTP_IF_MODIFIED_SINCE='Sat, 05 Nov 1994 08:49:37 GMT'))
+        self.assertFalse(response.hasHeader('Status'))
+        self.assertEqual(servlet.calls, 1)
+
+
+class AutoETagTest(unittest.TestCase):
+
+    def deliver(self, environ=None, method='GET', autoETags=True,
+            data='Hello, World!'):
+        trans = Transaction(Request(environ, method), Application(autoETags))
+        response = trans.response()
+        response.write(data)
+        response.deliver()
+        return splitResponse(response.streamOut().buffer())
+
+    def testAutoETag(self):
+        headers, body = self.deliver()
+        self.assertEqual(body, 'Hello, World!')
+        etag = headers['Etag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(self.deliver()[0]['Etag'], etag)
+        self.assertNotEqual(self.deliver(data='Hello!')[0]['Etag'], etag)
+        headers, body = self.deliver(dict(HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(headers['Status'], '304 Not Modified')
+        self.assertEqual(headers['Etag'], etag)
+        self.assertEqual(body, '')
+
+    def testNoAutoETag(self):
+        self.assertFalse('Etag' in self.deliver(autoETags=False)[0])
+        self.assertFalse('Etag' in self.deliver(method='POST')[0])
+        self.assertFalse('Etag' in self.deliver(method='HEAD')[0])
+
+    def testStreamETag(self):
+        s = ASStreamOut()
+        s.write('abc')
+        etag = s.etag()
+        s.write('def')
+        self.assertNotEqual(s.etag(), etag)
+        s.commit()
+        self.assertEqual(s.etag(), None)
@@ -0,0 +1,173 @@
+import os
+import shutil
+import sys
+import threading
+import types
+import unittest
+from tempfile import mkdtemp
+from time import sleep
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from WebKit.Application import Application as WebKitApplication
+from WebKit.ImportManager import ImportManager
+from WebKit.ServletFactory import ServletFactory
+from WebKit.URLParser import ServletFactoryManager
+
+
+servletSource = '''
+from WebKit.Servlet import Servlet
+
+class HotServlet(Servlet):
+
+    version = %d
+
+    def canBeThreaded(self):
+        return True
+'''
+
+
+class Application(object):
+    """Mock application."""
+
+    def __init__(self):
+        self._imp = ImportManager()
+
+    @staticmethod
+    def setting(name, default=None):
+        return default
+
+    reloadServletFile = WebKitApplication.reloadServletFile.im_func
+
+
+class Request(object):
+    """Mock request."""
+
+    def __init__(self, path):
+        self._path = path
+
+    def serverSidePath(self):
+        return self._path
+
+
+class Transaction(object):
+    """Mock transaction."""
+
+    def __init__(self, path):
+        self._request = Request(path)
+
+    def request(self):
+        return self._request
+
+
+class Factory(ServletFactory):
+    """Factory importing the servlet modules as top-level modules."""
+
+    def uniqueness(self):
+        return 'file'
+
+    def extensions(self):
+        return ['.hotreload']
+
+    def loadClass(self, transaction, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        module = sys.modules.get(name)
+        if module is None:
+            fp, pathname, stuff = self._imp.find_module(
+                name, [os.path.dirname(path)])
+            module = self._imp.load_module(name, fp, pathname, stuff)
+        return getattr(module, name)
+
+
+class HotReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.path = os.path.join(self.dir, 'HotServlet.py')
+        self.writeServlet(1)
+        self.app = Application()
+        self.factory = Factory(self.app)
+        ServletFactoryManager.addServletFactory(self.factory)
+
+    def tearDown(self):
+        ServletFactoryManager._factories.remove(self.factory)
+        del ServletFactoryManager._factoryExtensions['.hotreload']
+        sys.modules.pop('HotServlet', None)
+        sys.modules.pop('HotServletUser', None)
+        shutil.rmtree(self.dir)
+
+    def writeServlet(self, version):
+        with open(self.path, 'w') as f:
+            f.write(servletSource % version)
+
+    def servlet(self):
+        return self.factory.servletForTransaction(Transaction(self.path))
+
+    def testDrain(self):
+        factory = self.factory
+        servlet = self.servlet()
+        self.assertTrue(factory.hasServlet(self.path))
+        self.assertFalse(factory.drainServlet(self.path, 0.1))
+        factory.finishReload(self.path, False)
+        self.assertTrue(factory.hasServlet(self.path))
+        closer = threading.Timer(0.1, servlet.close)
+        closer.start()
+        self.assertTrue(factory.drainServlet(self.path, 5))
+        closer.join()
+        factory.finishReload(self.path)
+        self.assertFalse(factory.hasServlet(self.path))
+
+    def testHeldBack(self):
+        factory = self.factory
+        self.servlet().close()
+        self.assertTrue(factory.drainServlet(self.path, 0.1))
+        servlets = []
+        thread = threading.Thread(target=lambda: servlets.append(self.servlet()))
+        thread.start()
+        sleep(0.1)
+        self.assertTrue(thread.isAlive())
+        self.assertFalse(servlets)
+        factory.finishReload(self.path)
+        thread.join(5)
+        self.assertEqual(len(servlets), 1)
+
+    def testReloadServletFile(self):
+        servlet = self.servlet()
+        self.assertEqual(servlet.version, 1)
+        servlet.close()
+        self.assertEqual(self.app._imp.modulesForFile(self.path),
+            ['HotServlet'])
+        self.writeServlet(2)
+        self.assertTrue(self.app.reloadServletFile(self.path))
+        self.assertFalse('HotServlet' in sys.modules)
+        self.assertFalse(self.factory.hasServlet(self.path))
+        # changed again before the servlet has been requested
+        self.assertTrue(self.app.reloadServletFile(self.path))
+        servlet = self.servlet()
+        self.assertEqual(servlet.version, 2)
+        self.assertFalse(self.app._imp.fileUpdated(self.path))
+
+    def testDrainTimeout(self):
+        servlet = self.servlet()
+        self.assertFalse(self.app.reloadServletFile(self.path, 0.1))
+        self.assertTrue('HotServlet' in sys.modules)
+        self.assertTrue(self.factory.hasServlet(self.path))
+        self.assertFalse(self.factory._reloading)
+        servlet.close()
+
+    def testLibraryModule(self):
+        servlet = self.servlet()
+        servlet.close()
+        user = types.ModuleType('HotServletUser')
+        user.HotServlet = servlet.__class__
+        sys.modules['HotServletUser'] = user
+        imp = self.app._imp
+        self.assertEqual(imp.dependentModules('HotServlet'), ['HotServletUser'])
+        self.assertFalse(self.app.reloadServletFile(self.path))
+        self.assertTrue('HotServlet' in sys.modules)
+        del sys.modules['HotServletUser']
+        self.assertEqual(imp.dependentModules('HotServlet'), [])
+
+    def testNoServlet(self):
+        self.assertFalse(self.app.reloadServletFile(
+            os.path.join(self.dir, 'Other.py')))
@@ -0,0 +1,123 @@
+import os
+import select
+import shutil
+import sys
+import unittest
+from tempfile import mkdtemp
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from WebKit import Inotify
+from WebKit.ImportManager import ImportManager
+
+
+class InotifyTest(unittest.TestCase):
+
+    def setUp(self):
+        if not Inotify.available():
+            self.skipTest('inotify is not available')
+        self.dir = mkdtemp()
+        self.monitor = Inotify.InotifyMonitor()
+
+    def tearDown(self):
+        self.monitor.close()
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write(self, name, data='#'):
+        with open(self.path(name), 'w') as f:
+            f.write(data)
+
+    def changes(self):
+        select.select([self.monitor.fd()], [], [], 1)
+        changes = []
+        while self.monitor.pending():
+            changes.append(self.monitor.nextFile())
+        return changes
+
+    def testName(self):
+        self.assertEqual(self.monitor.name(), 'inotify')
+
+    def testMonitorFile(self):
+        self.write('a.py')
+        self.write('b.py')
+        self.monitor.monitorFile(self.path('a.py'))
+        self.assertTrue(self.monitor.monitors(self.path('a.py')))
+        self.assertFalse(self.monitor.monitors(self.path('b.py')))
+        self.assertFalse(self.monitor.pending())
+        self.write('b.py', 'b')
+        self.write('a.py', 'a')
+        self.assertEqual(self.changes(), [('changed', self.path('a.py'))])
+
+    def testCoalescing(self):
+        self.write('a.py')
+        self.write('b.py')
+        self.monitor.monitorFile(self.path('a.py'))
+        self.monitor.monitorFile(self.path('b.py'))
+        for i in range(10):
+            self.write('a.py', str(i))
+        self.write('b.py', 'b')
+        self.assertEqual(self.changes(), [('changed', self.path('a.py')),
+            ('changed', self.path('b.py'))])
+
+    def testReplaceAndDelete(self):
+        self.write('a.py')
+        self.monitor.monitorFile(self.path('a.py'))
+        self.write('a.tmp', 'new')
+        os.rename(self.path('a.tmp'), self.path('a.py'))
+        self.assertEqual(self.changes(), [('created', self.path('a.py'))])
+        os.remove(self.path('a.py'))
+        self.assertEqual(self.changes(), [('deleted', self.path('a.py'))])
+
+    def testRelativePath(self):
+        self.write('a.py')
+        cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            self.monitor.monitorFile('a.py')
+            self.assertTrue(self.monitor.monitors('a.py'))
+        finally:
+            os.chdir(cwd)
+        self.assertTrue(self.monitor.monitors(self.path('a.py')))
+
+    def testDeleteDirectory(self):
+        os.mkdir(self.path('pkg'))
+        self.write('pkg/a.py')
+        self.monitor.monitorFile(self.path('pkg/a.py'))
+        shutil.rmtree(self.path('pkg'))
+        self.assertEqual(self.changes(), [('deleted', self.path('pkg/a.py'))])
+        self.assertFalse(self.monitor.monitors(self.path('pkg/a.py')))
+
+
+class ChangeHookTest(unittest.TestCase):
+
+    def testChangeHooks(self):
+        imp = ImportManager()
+        changed = []
+        imp.addChangeHook(changed.append)
+        imp.addChangeHook(changed.append)
+        imp.fileChanged('a.py')
+        self.assertEqual(changed, ['a.py'])
+        imp.removeChangeHook(changed.append)
+        imp.fileChanged('b.py')
+        self.assertEqual(changed, ['a.py'])
+
+    def testIsMonitored(self):
+
+        class Monitor(object):
+
+            @staticmethod
+            def monitors(filename):
+                return filename == 'a.py'
+
+        imp = ImportManager()
+        self.assertFalse(imp.isMonitored('a.py'))
+        imp.setFileMonitor(Monitor())
+        self.assertTrue(imp.isMonitored('a.py'))
+        self.assertFalse(imp.isMonitored('b.py'))
+        imp.setFileMonitor(object())
+        self.assertFalse(imp.isMonitored('a.py'))
+        imp.setFileMonitor(None)
+        self.assertFalse(imp.isMonitored('a.py'))
@@ -0,0 +1,335 @@
+import os
+import sys
+import threading
+import unittest
+from hashlib import sha1
+from time import sleep
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import memcache
+
+from MiscUtils import AbstractError
+from WebKit.ASStreamOut import ASStreamOut
+from WebKit.HTTPResponse import HTTPResponse
+from WebKit.HTTPContent import HTTPContent
+from WebKit.Page import Page
+from WebKit.OutputCache import (OutputCache, OutputCacheStore,
+    MemoryOutputCacheStore, MemcachedOutputCacheStore, outputCache)
+
+
+class Request(object):
+    """Mock request."""
+
+    def __init__(self, fields=None, cookies=None, environ=None,
+            method='GET', urlPath='/Test', sessionId=None):
+        self._fields = fields or {}
+        self._cookies = cookies or {}
+        self._environ = environ or {}
+        self._method = method
+        self._urlPath = urlPath
+        self._sessionId = sessionId
+
+    def method(self):
+        return self._method
+
+    def environ(self):
+        return self._environ
+
+    def fields(self):
+        return self._fields
+
+    def field(self, name, default=None):
+        return self._fields.get(name, default)
+
+    def hasField(self, name):
+        return name in self._fields
+
+    def cookie(self, name, default=None):
+        return self._cookies.get(name, default)
+
+    def urlPath(self):
+        return self._urlPath
+
+    def extraURLPath(self):
+        return ''
+
+    def sessionId(self):
+        return self._sessionId
+
+
+class Transaction(object):
+    """Mock transaction."""
+
+    def __init__(self, request):
+        self._request = request
+        self._response = HTTPResponse(self, ASStreamOut())
+
+    def request(self):
+        return self._request
+
+    def response(self):
+        return self._response
+
+    def hasSession(self):
+        return self._request.sessionId() is not None
+
+    def errorOccurred(self):
+        return False
+
+
+class CachedServlet(HTTPContent):
+
+    outputCache = dict(ttl=60, fields=['id'], headers=['Accept-Language'])
+
+    calls = 0
+
+    def defaultAction(self):
+        CachedServlet.calls += 1
+        self.response().setHeader('Content-Type', 'text/plain')
+        self.write('id=%s call=%d' % (
+            self.request().field('id'), CachedServlet.calls))
+
+
+class CookieServlet(CachedServlet):
+
+    def defaultAction(self):
+        CachedServlet.defaultAction(self)
+        self.response().setCookie('visited', 'yes')
+
+
+class CachedPage(Page):
+
+    contentCache = dict(ttl=60, fields=[])
+
+    calls = 0
+
+    def title(self):
+        return 'Cached Page'
+
+    def writeContent(self):
+        CachedPage.calls += 1
+        self.write('<p>call %d</p>' % CachedPage.calls)
+
+
+def serve(servlet, request):
+    """Let the servlet respond to the request and return the response."""
+    trans = Transaction(request)
+    servlet.awake(trans)
+    servlet.respond(trans)
+    servlet.sleep(trans)
+    return trans.response()
+
+
+class StoreTest(unittest.TestCase):
+
+    def testAbstractStore(self):
+        store = OutputCacheStore()
+        self.assertRaises(AbstractError, store.get, 'a')
+        self.assertRaises(AbstractError, store.set, 'a', {}, 60)
+        self.assertRaises(AbstractError, store.delete, 'a')
+        self.assertRaises(AbstractError, store.clear)
+        self.assertEqual(store.stats(), {})
+
+
+class MemoryStoreTest(unittest.TestCase):
+
+    def testGetSet(self):
+        store = MemoryOutputCacheStore()
+        self.assertEqual(store.get('a'), None)
+        store.set('a', dict(body='abc'), 60)
+        self.assertEqual(store.get('a')['body'], 'abc')
+        store.set('a', dict(body='abcd'), 60)
+        self.assertEqual(store.stats()['size'], 4)
+        store.delete('a')
+        self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.stats()['size'], 0)
+
+    def testExpiry(self):
+        store = MemoryOutputCacheStore()
+        store.set('a', dict(body='abc'), -1)
+        self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.stats()['entries'], 0)
+
+    def testLeastRecentlyUsed(self):
+        store = MemoryOutputCacheStore(maxSize=10, maxEntries=3)
+        for key in 'abc':
+            store.set(key, dict(body=key), 60)
+        store.get('a')
+        store.set('d', dict(body='d'), 60)
+        self.assertEqual(store.get('b'), None)
+        self.assertEqual(store.get('a')['body'], 'a')
+        store.set('e', dict(body='eeeeeeee'), 60)
+        self.assertEqual(store.stats()['size'], 10)
+        self.assertEqual(store.get('c'), None)
+        self.assertEqual(store.get('d')['body'], 'd')
+        store.set('g', dict(body='g'), 60)
+        self.assertEqual(store.get('a'), None)
+        store.set('f', dict(body='f' * 11), 60)
+        self.assertEqual(store.get('f'), None)
+        store.clear()
+        self.assertEqual(store.stats()['entries'], 0)
+
+
+class MemcachedStoreTest(unittest.TestCase):
+
+    def testGetSet(self):
+        store = MemcachedOutputCacheStore(namespace='Test:')
+        store.set('a', dict(body='abc'), 60)
+        self.assertEqual(memcache.data['Test:a']['body'], 'abc')
+        self.assertEqual(store.get('a')['body'], 'abc')
+        store.delete('a')
+        self.assertEqual(store.get('a'), None)
+
+
+class OutputCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = OutputCache()
+
+    def testKey(self):
+        key = self.cache.key
+        policy = dict(fields=['id'], cookies=['lang'], headers=['Accept'])
+        servlet = CachedServlet()
+        trans = Transaction(Request(dict(id='1', other='x')))
+        k = key(servlet, trans, policy)
+        self.assertEqual(k, key(servlet, Transaction(Request(dict(id='1'))),
+            policy))
+        self.assertNotEqual(k, key(servlet,
+            Transaction(Request(dict(id='2'))), policy))
+        self.assertNotEqual(k, key(servlet, Transaction(Request(
+            dict(id='1'), cookies=dict(lang='de'))), policy))
+        self.assertNotEqual(k, key(servlet, Transaction(Request(
+            dict(id='1'), environ=dict(HTTP_ACCEPT='text/plain'))), policy))
+        self.assertNotEqual(k, key(servlet, Transaction(Request(
+            dict(id='1'), urlPath='/Other')), policy))
+        self.assertNotEqual(k, key(servlet, trans, policy, 'fragment'))
+        self.assertNotEqual(k, key(servlet, trans, {}))
+        self.cache.invalidate(CachedServlet)
+        self.assertNotEqual(k, key(servlet, trans, policy))
+
+    def testFetch(self):
+        cache = self.cache
+        self.assertEqual(cache.fetch('a'), (None, True))
+        cache.set('a', 'abc')
+        cache.release('a')
+        entry, leader = cache.fetch('a')
+        self.assertEqual(entry['body'], 'abc')
+        self.assertFalse(leader)
+        self.assertEqual(entry['etag'], cache.get('a')['etag'])
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def testSingleFlight(self):
+        cache = self.cache
+        results = []
+
+        def fetch():
+            entry, leader = cache.fetch('a')
+            if leader:
+                sleep(0.1)
+                entry = cache.set('a', 'abc')
+                cache.release('a')
+            results.append((entry['body'], leader))
+
+        threads = [threading.Thread(target=fetch) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), [('abc', False)] * 4 + [('abc', True)])
+        self.assertEqual(cache.stats()['waits'], 4)
+
+
+class StreamMarkTest(unittest.TestCase):
+
+    def testDataSince(self):
+        s = ASStreamOut()
+        s.write('abc')
+        mark = s.mark()
+        self.assertEqual(s.dataSince(mark), '')
+        s.write('def')
+        s.write('ghi')
+        self.assertEqual(s.dataSince(mark), 'defghi')
+        s.clear()
+        self.assertEqual(s.dataSince(mark), None)
+
+    def testFlushed(self):
+        s = ASStreamOut()
+        mark = s.mark()
+        s.write('abc')
+        s.commit()
+        self.assertEqual(s.dataSince(mark), None)
+
+
+class ServletOutputCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        outputCache.invalidate()
+        CachedServlet.calls = CachedPage.calls = 0
+
+    def testCachedPage(self):
+        servlet = CachedServlet()
+        response = serve(servlet, Request(dict(id='1')))
+        self.assertEqual(response.streamOut().buffer(), 'id=1 call=1')
+        etag = response.header('ETag')
+        self.assertTrue(etag)
+        response = serve(servlet, Request(dict(id='1', other='x')))
+        self.assertEqual(response.streamOut().buffer(), 'id=1 call=1')
+        self.assertEqual(response.header('Content-Type'), 'text/plain')
+        self.assertEqual(response.header('ETag'), etag)
+        response = serve(servlet, Request(dict(id='2')))
+        self.assertEqual(response.streamOut().buffer(), 'id=2 call=2')
+        response = serve(servlet, Request(dict(id='1'),
+            environ=dict(HTTP_ACCEPT_LANGUAGE='de')))
+        self.assertEqual(response.streamOut().buffer(), 'id=1 call=3')
+
+    def testNotModified(self):
+        servlet = CachedServlet()
+        etag = serve(servlet, Request(dict(id='1'))).header('ETag')
+        response = serve(servlet, Request(dict(id='1'),
+            environ=dict(HTTP_IF_NONE_MATCH=etag)))
+        self.assertEqual(response.header('Status'), '304 Not Modified')
+        self.assertEqual(response.streamOut().buffer(), '')
+        outputCache.invalidate()
+        etag = '"%s"' % sha1('id=1 call=2').hexdigest()[:32]
+        response = serve(servlet, Request(dict(id='1'),
+            environ=dict(HTTP_IF_NONE_MATCH=etag)))
+        self.assertEqual(response.header('Status'), '304 Not Modified')
+        self.assertEqual(response.header('ETag'), etag)
+        self.assertEqual(response.streamOut().buffer(), '')
+        self.assertEqual(CachedServlet.calls, 2)
+
+    def testNotCached(self):
+        servlet = CookieServlet()
+        serve(servlet, Request(dict(id='1')))
+        response = serve(servlet, Request(dict(id='1')))
+        self.assertEqual(response.streamOut().buffer(), 'id=1 call=2')
+        self.assertFalse(response.hasHeader('ETag'))
+        servlet = CachedServlet()
+        serve(servlet, Request(dict(id='1'), method='POST'))
+        serve(servlet, Request(dict(id='1'), method='HEAD'))
+        serve(servlet, Request(dict(id='1'), sessionId='abc'))
+        response = serve(servlet, Request(dict(id='1')))
+        self.assertEqual(response.streamOut().buffer(), 'id=1 call=6')
+
+    def testDisabled(self):
+        servlet = CachedServlet()
+        outputCache.setEnabled(False)
+        try:
+            serve(servlet, Request(dict(id='1')))
+            serve(servlet, Request(dict(id='1')))
+        finally:
+            outputCache.setEnabled(True)
+        self.assertEqual(CachedServlet.calls, 2)
+
+    def testCachedContent(self):
+        page = CachedPage()
+        output = serve(page, Request()).streamOut().buffer()
+        self.assertTrue('<title>Cached Page</title>' in output)
+        self.assertTrue('<p>call 1</p>' in output)
+        self.assertEqual(serve(page, Request()).streamOut().buffer(), output)
+        self.assertEqual(CachedPage.calls, 1)
+        serve(page, Request(method='HEAD'))
+        output = serve(page, Request(urlPath='/Other')).streamOut().buffer()
+        self.assertTrue('<p>call 2</p>' in output)
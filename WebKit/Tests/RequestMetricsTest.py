@@ -0,0 +1,112 @@
+import os
+import sys
+import unittest
+from threading import Thread
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from WebKit.RequestMetrics import (
+    Histogram, RequestMetrics, buckets, monotonic)
+
+
+class HistogramTest(unittest.TestCase):
+
+    def testEmpty(self):
+        h = Histogram()
+        self.assertEqual(h.count(), 0)
+        self.assertEqual(h.mean(), 0)
+        self.assertEqual(h.percentile(50), 0)
+        self.assertEqual(h.cumulativeCounts(), [0] * (len(buckets) + 1))
+
+    def testPercentile(self):
+        h = Histogram()
+        for i in range(90):
+            h.observe(0.001)
+        for i in range(10):
+            h.observe(0.005)
+        self.assertEqual(h.counts()[buckets.index(0.001)], 90)
+        self.assertEqual(h.counts()[buckets.index(0.005)], 10)
+        self.assertAlmostEqual(h.mean(), 0.0014)
+        self.assertAlmostEqual(h.percentile(45), 0.00075)
+        self.assertAlmostEqual(h.percentile(90), 0.001)
+        self.assertAlmostEqual(h.percentile(95), 0.00375)
+        self.assertEqual(h.cumulativeCounts()[-1], 100)
+        other = Histogram()
+        other.add(h)
+        other.add(h, -1)
+        self.assertEqual(other.count(), 0)
+        self.assertEqual(other.counts(), [0] * (len(buckets) + 1))
+
+
+class RequestMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._metrics = RequestMetrics()
+
+    def testRecord(self):
+        metrics = self._metrics
+        start = monotonic()
+        now = metrics.record('parse', start - 0.002)
+        self.assertTrue(now >= start)
+        metrics.record('parse', now)
+        metrics.record('custom', now)
+        histograms = metrics.histograms()
+        self.assertEqual(sorted(histograms), ['custom', 'parse'])
+        h = histograms['parse']
+        self.assertEqual(h.count(), 2)
+        self.assertTrue(0.002 <= h.sum() < 1)
+        self.assertEqual(sum(h.counts()), 2)
+        self.assertEqual([s['stage'] for s in metrics.stats()],
+            ['parse', 'custom'])
+
+    def testDisabled(self):
+        metrics = self._metrics
+        metrics.setEnabled(False)
+        self.assertFalse(metrics.enabled())
+        self.assertTrue(metrics.record('parse', monotonic()))
+        self.assertEqual(metrics.histograms(), {})
+
+    def testThreads(self):
+        metrics = self._metrics
+
+        def work():
+            for i in range(100):
+                metrics.record('respond', monotonic())
+        threads = [Thread(target=work) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        metrics.record('respond', monotonic())
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.histograms()['respond'].count(), 401)
+        # the histograms of the ended threads have been merged
+        self.assertEqual(len(metrics._threads), 1)
+        self.assertEqual(metrics.histograms()['respond'].count(), 401)
+
+    def testReset(self):
+        metrics = self._metrics
+        metrics.record('sleep', monotonic())
+        metrics.reset()
+        self.assertEqual(metrics.histograms()['sleep'].count(), 0)
+        metrics.record('sleep', monotonic())
+        self.assertEqual(metrics.histograms()['sleep'].count(), 1)
+        self.assertEqual(metrics.histograms(False)['sleep'].count(), 2)
+
+    def testPrometheusText(self):
+        metrics = self._metrics
+        metrics.record('send', monotonic())
+        metrics.reset()
+        lines = metrics.prometheusText().splitlines()
+        self.assertEqual(lines[:2], [
+            '# HELP webkit_request_stage_seconds'
+            ' Time spent in the stages of the requests.',
+            '# TYPE webkit_request_stage_seconds histogram'])
+        self.assertEqual(lines[2],
+            'webkit_request_stage_seconds_bucket{stage="send",le="0.0001"} 1')
+        self.assertEqual(lines[-3], 'webkit_request_stage_seconds_bucket'
+            '{stage="send",le="+Inf"} 1')
+        self.assertTrue(lines[-2].startswith(
+            'webkit_request_stage_seconds_sum{stage="send"} '))
+        self.assertEqual(lines[-1],
+            'webkit_request_stage_seconds_count{stage="send"} 1')
+        self.assertEqual(len(lines), 2 + len(buckets) + 3)
@@ -0,0 +1,95 @@
+import os
+import sys
+import unittest
+from threading import Thread
+from time import sleep, time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from WebKit.SamplingProfiler import SamplingProfiler
+
+
+class Request(object):
+    """Mock request."""
+
+    def __init__(self, path):
+        self._path = path
+
+    def servletURI(self):
+        return self._path
+
+
+def busy(seconds):
+    end = time() + seconds
+    while time() < end:
+        pass
+
+
+class SamplingProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._profiler = SamplingProfiler(frequency=500)
+
+    def tearDown(self):
+        self._profiler.stop()
+
+    def serve(self, path, seconds):
+        profiler = self._profiler
+        profiler.startRequest(Request(path))
+        busy(seconds)
+        profiler.endRequest()
+
+    def testNotRunning(self):
+        profiler = self._profiler
+        self.assertFalse(profiler.running())
+        profiler.startRequest(Request('/Test'))
+        self.assertEqual(profiler._requests, {})
+        profiler.endRequest()
+        self.assertEqual(profiler.stats()['samples'], 0)
+        self.assertEqual(profiler.collapsed(), '')
+
+    def testSampling(self):
+        profiler = self._profiler
+        profiler.start()
+        self.assertTrue(profiler.running())
+        threads = [Thread(target=self.serve, args=(path, 0.3))
+            for path in ('/One', '/Two')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sleep(0.05)
+        self.assertEqual(profiler._requests, {})
+        samples = profiler.stats()['samples']
+        profiler.stop()
+        self.assertFalse(profiler.running())
+        self.assertTrue(samples > 10, samples)
+        paths = dict(profiler.paths())
+        self.assertEqual(sorted(paths), ['/One', '/Two'])
+        self.assertEqual(sum(paths.values()), samples)
+        functions = profiler.functions('/One')
+        self.assertEqual(functions[0][0], '%s:busy' % __name__)
+        self.assertEqual(functions[0][1], paths['/One'])
+        lines = profiler.collapsed().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith(('/One;', '/Two;')))
+            self.assertTrue(stack.endswith(';%s:busy' % __name__), stack)
+            self.assertTrue(int(count) > 0)
+        lines = profiler.collapsed('/Two').splitlines()
+        self.assertTrue(lines)
+        self.assertFalse([line for line in lines if line.startswith('/')])
+        profiler.reset()
+        self.assertEqual(profiler.stats()['samples'], 0)
+        self.assertEqual(profiler.paths(), [])
+
+    def testMaxStacks(self):
+        profiler = SamplingProfiler(maxStacks=2)
+        profiler.addStacks([('/A', ('a',)), ('/B', ('b',)), ('/A', ('a',))])
+        profiler.addStacks([('/C', ('c',))])
+        stats = profiler.stats()
+        self.assertEqual(stats['samples'], 3)
+        self.assertEqual(stats['stacks'], 2)
+        self.assertEqual(stats['dropped'], 1)
+        self.assertEqual(profiler.collapsed(), '/A;a 2\n/B;b 1\n')
@@ -0,0 +1,540 @@
+#!/usr/bin/env python2
+
+"""benchmark.py
+
+Purpose: Measure the performance of the WebKit request pipeline in a
+reproducible way, so that the results of different commits can be compared.
+
+Unlike the stress test, the benchmark does not need a running application
+server. It creates the application server in-process (like the OneShot
+adapter does) and drives it in one of these modes:
+
+  inprocess - call Application.dispatchRawRequest() directly
+  adapter   - AdapterHandler with marshalled request dicts over a socket
+  scgi      - SCGIHandler with SCGI netstrings over a socket
+  http      - HTTPAppServerHandler with plain HTTP over a socket
+
+The handler modes use loopback TCP connections, one per request, and
+include the work of the handlers, but not that of a web server or adapter.
+
+The requests are taken from the '.rr' files containing raw request
+dictionaries in the stress test directory (or another directory).
+They are run by a number of threads in parallel after some warm-up
+requests. For every request, the time spent in these stages is measured:
+
+  parse        - creating the HTTPRequest from the request dictionary
+  resolve      - finding the servlet for the URL
+  awake        - awake() of the session and the servlet
+  respond      - respond() of the session and the servlet
+  sleep        - sleep() of the servlet and the session
+  sessionLoad  - getting or creating the session (part of other stages)
+  sessionStore - storing the session (part of sleep)
+  commit       - delivering the response
+  total        - handling the request as a whole
+
+The benchmark reports the throughput and the mean, p50, p95 and p99
+latencies and a histogram for every stage, and writes the results as
+JSON to a file, which can be compared with the results of another run.
+
+To run:
+  > python benchmark.py -h
+
+Examples:
+  > python benchmark.py -n 2000 -c 4 -o new.json
+  > python benchmark.py -n 2000 -c 4 -m inprocess,http --compare old.json
+"""
+
+
+import os
+import sys
+import json
+import socket
+import threading
+from getopt import getopt, GetoptError
+from glob import glob
+from marshal import dumps
+from time import time, asctime, localtime
+from itertools import count
+from cStringIO import StringIO
+from subprocess import Popen, PIPE
+
+benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+webwareDir = os.path.dirname(os.path.dirname(os.path.dirname(benchmarkDir)))
+if webwareDir not in sys.path:
+    sys.path.insert(0, webwareDir)
+
+from WebKit.OneShotAppServer import OneShotAppServer
+from WebKit.ASStreamOut import ASStreamOut
+from WebKit.HTTPRequest import HTTPRequest
+from WebKit.HTTPResponse import HTTPResponse
+from WebKit.Transaction import Transaction
+from WebKit.ThreadedAppServer import (AdapterHandler, SCGIHandler,
+    defaultConfig as threadedConfig)
+from WebKit.HTTPServer import HTTPAppServerHandler
+
+
+modes = ('inprocess', 'adapter', 'scgi', 'http')
+
+stages = ('parse', 'resolve', 'awake', 'respond', 'sleep',
+    'sessionLoad', 'sessionStore', 'commit', 'total')
+
+# upper bounds of the histogram buckets in milliseconds
+histogramBounds = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class BenchmarkAppServer(OneShotAppServer):
+    """In-process application server for the benchmark.
+
+    Besides dispatchRawRequest(), it provides what the handlers
+    of the ThreadedAppServer need.
+    """
+
+    def __init__(self, path=None):
+        OneShotAppServer.__init__(self, path)
+        self._verbose = False  # do not print every request
+        self._requestBufferSize = self.setting('RequestBufferSize',
+            threadedConfig['RequestBufferSize'])
+        self._responseBufferSize = self.setting('ResponseBufferSize',
+            threadedConfig['ResponseBufferSize'])
+        self._handlerCache = {}
+        self._requestIDs = count(1)
+
+    def nextRequestID(self):
+        return self._requestIDs.next()
+
+    def dispatchRawRequest(self, requestDict, strmOut):
+        requestDict['requestID'] = self.nextRequestID()
+        return self._app.dispatchRawRequest(requestDict, strmOut)
+
+
+class StageTimer(object):
+    """Measure the time spent in the stages of the requests.
+
+    The timer wraps the methods implementing the stages while it is
+    installed and adds up their durations per thread.
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._local = threading.local()
+        self._patched = []
+
+    def install(self):
+        app = self._server._app
+        self.wrap(HTTPRequest, '__init__', 'parse')
+        self.wrap(app.rootURLParser(), 'findServletForTransaction', 'resolve')
+        self.wrap(Transaction, 'awake', 'awake')
+        self.wrap(Transaction, 'respond', 'respond')
+        self.wrap(Transaction, 'sleep', 'sleep')
+        self.wrap(app, 'createSessionForTransaction', 'sessionLoad')
+        self.wrap(app.sessions(), 'storeSession', 'sessionStore')
+        self.wrap(HTTPResponse, 'deliver', 'commit')
+
+    def uninstall(self):
+        while self._patched:
+            obj, name, original = self._patched.pop()
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+
+    def wrap(self, obj, name, stage):
+        original = obj.__dict__.get(name)
+        method = getattr(obj, name)
+        add = self.add
+
+        def timed(*args, **kwargs):
+            start = time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                add(stage, time() - start)
+        self._patched.append((obj, name, original))
+        setattr(obj, name, timed)
+
+    def add(self, stage, seconds):
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def start(self):
+        self._local.timings = {}
+
+    def stop(self):
+        timings, self._local.timings = self._local.timings, None
+        return timings
+
+
+class Client(object):
+    """Send requests to the application server in one of the modes."""
+
+    def __init__(self, server, mode):
+        self._server = server
+        self._mode = mode
+        self._run = getattr(self, 'run' + mode.capitalize())
+        if mode != 'inprocess':
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.bind(('127.0.0.1', 0))
+            self._listener.listen(64)
+            self._address = self._listener.getsockname()
+            self._listenerLock = threading.Lock()
+            handlerClass = dict(adapter=AdapterHandler, scgi=SCGIHandler,
+                http=HTTPAppServerHandler)[mode]
+            self._handlerClass = handlerClass
+            server._handlerCache[self._address] = []
+
+    def close(self):
+        if self._mode != 'inprocess':
+            self._listener.close()
+
+    def run(self, requestDict):
+        """Run the request and return the response."""
+        return self._run(requestDict)
+
+    def runInprocess(self, requestDict):
+        requestDict['input'] = StringIO()
+        strmOut = ASStreamOut()
+        trans = self._server.dispatchRawRequest(requestDict, strmOut)
+        strmOut.close()
+        trans._application = None
+        trans.die()
+        return strmOut._buffer
+
+    def runAdapter(self, requestDict):
+        data = dumps(requestDict)
+        return self.runHandler(dumps(len(data)) + data)
+
+    def runScgi(self, requestDict):
+        environ = requestDict['environ']
+        headers = ['CONTENT_LENGTH', '0', 'SCGI', '1']
+        for name, value in sorted(environ.items()):
+            if name not in ('CONTENT_LENGTH', 'SCGI'):
+                headers.extend((name, str(value)))
+        headers = '\0'.join(headers) + '\0'
+        return self.runHandler('%d:%s,' % (len(headers), headers))
+
+    def runHttp(self, requestDict):
+        environ = requestDict['environ']
+        path = environ.get('PATH_INFO') or '/'
+        if environ.get('QUERY_STRING'):
+            path += '?' + environ['QUERY_STRING']
+        lines = ['%s %s HTTP/1.0' % (environ.get('REQUEST_METHOD', 'GET'),
+            path)]
+        for name, value in sorted(environ.items()):
+            if name.startswith('HTTP_'):
+                lines.append('%s: %s' % (
+                    name[5:].replace('_', '-').title(), value))
+        return self.runHandler('\r\n'.join(lines) + '\r\n\r\n')
+
+    def runHandler(self, data):
+        """Send the data over a new connection to a handler.
+
+        The handler runs in the current thread, while the response
+        is read by another thread.
+        """
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        with self._listenerLock:
+            client.connect(self._address)
+            sock = self._listener.accept()[0]
+        client.sendall(data)
+        client.shutdown(1)
+        response = []
+        reader = threading.Thread(target=self.readResponse,
+            args=(client, response))
+        reader.start()
+        handler = self._handlerClass(self._server, self._address)
+        handler.activate(sock, self._server.nextRequestID())
+        try:
+            handler.handleRequest()
+        finally:
+            try:
+                sock.close()
+            except Exception:
+                pass
+            reader.join()
+            client.close()
+        return ''.join(response)
+
+    @staticmethod
+    def readResponse(sock, response):
+        while 1:
+            data = sock.recv(65536)
+            if not data:
+                break
+            response.append(data)
+
+
+class Benchmark(object):
+    """Run the requests in one mode and collect the timings."""
+
+    def __init__(self, server, requestDicts, mode='inprocess',
+            numRequests=1000, concurrency=1, warmup=None):
+        self._server = server
+        self._requestDicts = requestDicts
+        self._mode = mode
+        self._numRequests = numRequests
+        self._concurrency = max(1, concurrency)
+        if warmup is None:
+            warmup = min(100, numRequests // 10)
+        self._warmup = warmup
+        self._timer = StageTimer(server)
+
+    def run(self):
+        """Run the benchmark and return the results as a dictionary."""
+        client = Client(self._server, self._mode)
+        try:
+            for i in range(self._warmup):
+                self.request(client, i)
+            samples = []
+            errors = []
+            numbers = iter(xrange(self._numRequests))
+            lock = threading.Lock()
+            self._timer.install()
+            try:
+                threads = [threading.Thread(target=self.work,
+                    args=(client, numbers, lock, samples, errors))
+                    for i in range(self._concurrency)]
+                start = time()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                duration = time() - start
+            finally:
+                self._timer.uninstall()
+        finally:
+            client.close()
+        return self.results(samples, errors, duration)
+
+    def work(self, client, numbers, lock, samples, errors):
+        timer = self._timer
+        mySamples = []
+        myErrors = []
+        while 1:
+            with lock:
+                i = next(numbers, None)
+            if i is None:
+                break
+            timer.start()
+            start = time()
+            try:
+                self.request(client, i)
+            except Exception as e:
+                myErrors.append('%s: %s' % (e.__class__.__name__, e))
+            total = time() - start
+            timings = timer.stop()
+            timings['total'] = total
+            mySamples.append(timings)
+        with lock:
+            samples.extend(mySamples)
+            errors.extend(myErrors)
+
+    def request(self, client, i):
+        requestDicts = self._requestDicts
+        requestDict = dict(requestDicts[i % len(requestDicts)])
+        requestDict['environ'] = dict(requestDict['environ'])
+        requestDict['time'] = time()
+        response = client.run(requestDict)
+        status = response.split('\n', 1)[0]
+        if self._mode == 'http':
+            ok = status.split(None, 2)[1:2] == ['200']
+        else:
+            ok = status.startswith('Status: 200')
+        if not ok:
+            raise ValueError('%s %s' % (
+                requestDict['environ'].get('PATH_INFO'), status.strip()))
+
+    def results(self, samples, errors, duration):
+        stageResults = {}
+        for stage in stages:
+            values = [sample[stage] for sample in samples if stage in sample]
+            if values:
+                stageResults[stage] = stageStats(values)
+        return dict(mode=self._mode, requests=len(samples),
+            concurrency=self._concurrency, warmup=self._warmup,
+            errors=len(errors), errorSamples=errors[:10],
+            seconds=duration,
+            throughput=len(samples) / duration if duration else 0.0,
+            stages=stageResults)
+
+
+def percentile(values, p):
+    """Return the p-th percentile of the sorted values (nearest rank)."""
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * len(values) + 0.5)) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def stageStats(values):
+    """Return statistics in milliseconds for the durations in seconds."""
+    values = sorted(value * 1000 for value in values)
+    histogram = [0] * (len(histogramBounds) + 1)
+    for value in values:
+        for i, bound in enumerate(histogramBounds):
+            if value <= bound:
+                break
+        else:
+            i = len(histogramBounds)
+        histogram[i] += 1
+    # the histogram is a list of (upper bound, count) pairs,
+    # where the upper bound None stands for infinity
+    return dict(count=len(values), mean=sum(values) / len(values),
+        min=values[0], max=values[-1], p50=percentile(values, 50),
+        p95=percentile(values, 95), p99=percentile(values, 99),
+        histogram=[(bound, n) for bound, n in zip(
+            histogramBounds + (None,), histogram) if n])
+
+
+def readRequestDicts(directory):
+    """Read the raw request dictionaries from the '.rr' files."""
+    filenames = sorted(glob(os.path.join(directory, '*.rr')))
+    requestDicts = []
+    for filename in filenames:
+        requestDict = eval(open(filename).read())
+        environ = requestDict['environ']
+        # the cookies typically have an invalid session id
+        environ.pop('HTTP_COOKIE', None)
+        requestDicts.append(requestDict)
+    return requestDicts
+
+
+def gitRevision():
+    """Return the current git revision of Webware if available."""
+    try:
+        return Popen(['git', 'rev-parse', '--short', 'HEAD'], cwd=webwareDir,
+            stdout=PIPE, stderr=PIPE).communicate()[0].strip() or None
+    except OSError:
+        return None
+
+
+def runBenchmarks(modes=('inprocess',), numRequests=1000, concurrency=1,
+        warmup=None, requestDir=None, workDir=None):
+    """Run the benchmark in the given modes and return the results."""
+    if requestDir is None:
+        requestDir = os.path.join(os.path.dirname(benchmarkDir), 'stress')
+    requestDicts = readRequestDicts(requestDir)
+    if not requestDicts:
+        raise ValueError('No request files found in %s.' % requestDir)
+    server = BenchmarkAppServer(workDir)
+    try:
+        results = [Benchmark(server, requestDicts, mode, numRequests,
+            concurrency, warmup).run() for mode in modes]
+    finally:
+        server.shutDown()
+    return dict(time=asctime(localtime()), revision=gitRevision(),
+        python=sys.version.split(None, 1)[0], platform=sys.platform,
+        requestFiles=[os.path.basename(filename) for filename in
+            sorted(glob(os.path.join(requestDir, '*.rr')))],
+        results=results)
+
+
+def printResults(results, baseline=None, out=None):
+    """Print the results, compared with the baseline results if given."""
+    if out is None:
+        out = sys.stdout
+    wr = out.write
+    base = {}
+    if baseline:
+        base = dict((r['mode'], r) for r in baseline['results'])
+        wr('Compared with revision %s from %s\n\n'
+            % (baseline.get('revision'), baseline.get('time')))
+
+    def change(value, old):
+        if not old:
+            return ''
+        return ' (%+.0f%%)' % ((value - old) * 100.0 / old)
+    for result in results['results']:
+        mode = result['mode']
+        old = base.get(mode, {})
+        wr('%s: %d requests, concurrency %d, %d errors, %.1f req/sec%s\n'
+            % (mode, result['requests'], result['concurrency'],
+                result['errors'], result['throughput'],
+                change(result['throughput'], old.get('throughput'))))
+        for error in result['errorSamples']:
+            wr('  error: %s\n' % error)
+        wr('  %-13s %9s %9s %9s %9s\n' % ('stage (ms)', 'mean', 'p50',
+            'p95', 'p99'))
+        for stage in stages:
+            stats = result['stages'].get(stage)
+            if not stats:
+                continue
+            oldStats = old.get('stages', {}).get(stage, {})
+            wr('  %-13s %9.3f %9.3f %9.3f %9.3f%s\n' % (stage, stats['mean'],
+                stats['p50'], stats['p95'], stats['p99'],
+                change(stats['p50'], oldStats.get('p50'))))
+        wr('\n')
+
+
+def usage(errorMsg=None):
+    """Print usage information and exit."""
+    progName = os.path.basename(sys.argv[0])
+    if errorMsg:
+        print '%s: error: %s' % (progName, errorMsg)
+    print 'Usage: %s [OPTIONS]' % progName
+    print
+    print 'Options:'
+    print '  -n, --requests N      number of requests per mode (default 1000)'
+    print '  -c, --concurrency N   number of parallel threads (default 1)'
+    print '  -w, --warmup N        number of warm-up requests per mode'
+    print '  -m, --modes MODES     comma separated modes (default inprocess)'
+    print '                        from: %s, or all' % ', '.join(modes)
+    print '  -r, --requests-dir D  directory with .rr files (default ../stress)'
+    print '  -d, --work-dir D      application server working directory'
+    print '  -o, --output FILE     write the results as JSON to FILE'
+    print '  --compare FILE        compare with the JSON results in FILE'
+    print '  -h, --help            print this help'
+    print
+    sys.exit(2 if errorMsg else 0)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    try:
+        opts, args = getopt(args, 'n:c:w:m:r:d:o:h', ['requests=',
+            'concurrency=', 'warmup=', 'modes=', 'requests-dir=',
+            'work-dir=', 'output=', 'compare=', 'help'])
+    except GetoptError as error:
+        usage(str(error))
+    if args:
+        usage('Unexpected arguments: %s' % ' '.join(args))
+    options = dict(modes=('inprocess',))
+    output = baseline = None
+    try:
+        for opt, value in opts:
+            if opt in ('-h', '--help'):
+                usage()
+            elif opt in ('-n', '--requests'):
+                options['numRequests'] = int(value)
+            elif opt in ('-c', '--concurrency'):
+                options['concurrency'] = int(value)
+            elif opt in ('-w', '--warmup'):
+                options['warmup'] = int(value)
+            elif opt in ('-m', '--modes'):
+                selected = modes if value == 'all' else tuple(
+                    mode.strip() for mode in value.split(','))
+                for mode in selected:
+                    if mode not in modes:
+                        usage('Unknown mode: %s' % mode)
+                options['modes'] = selected
+            elif opt in ('-r', '--requests-dir'):
+                options['requestDir'] = value
+            elif opt in ('-d', '--work-dir'):
+                options['workDir'] = value
+            elif opt in ('-o', '--output'):
+                output = value
+            elif opt == '--compare':
+                baseline = json.load(open(value))
+    except ValueError as error:
+        usage(str(error))
+    results = runBenchmarks(**options)
+    printResults(results, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
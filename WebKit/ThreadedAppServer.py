@@ -47,7 +47,7 @@ else:
     except AttributeError:  # not always defined
         FD_CLOEXEC = 1
 
-from MiscUtils.Funcs import asclocaltime
+from MiscUtils.Funcs import asclocaltime, monotonic
 from WebUtils.Funcs import requestURI
 
 import AppServer as AppServerModule
@@ -55,6 +55,7 @@ from PidFile import ProcessRunning
 from AutoReloadingAppServer import AutoReloadingAppServer as AppServer
 from ASStreamOut import ASStreamOut, ConnectionAbortedError
 from HTTPExceptions import HTTPServiceUnavailable
+from RequestMetrics import requestMetrics
 
 debug = False
 
@@ -651,6 +652,7 @@ class ThreadedAppServer(AppServer):
                 try:
                     t._processing = True
                     self._threadHandler[t] = handler
+                    requestMetrics.record('queue', handler._queueTime)
                     try:
                         handler.handleRequest()
                     except ThreadAbortedError:
@@ -851,6 +853,7 @@ class Handler(object):
         """
         self._requestID = requestID
         self._sock = sock
+        self._queueTime = monotonic()
 
     def close(self):
         """Close the socket.
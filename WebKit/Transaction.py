@@ -3,6 +3,8 @@
 import sys
 import traceback
 
+from RequestMetrics import requestMetrics, monotonic
+
 
 class Transaction(object):
     """The Transaction container.
@@ -130,16 +132,22 @@ class Transaction(object):
         awake()-respond()-sleep() cycle. This could definitely be added
         in the future if any use was demonstrated for it.
         """
+        start = monotonic()
         if not self._nested and self._session:
             self._session.awake(self)
         self._servlet.awake(self)
         self._nested += 1
+        if self._nested == 1:
+            requestMetrics.record('awake', start)
 
     def respond(self):
         """Respond to the request."""
+        start = monotonic()
         if self._session:
             self._session.respond(self)
         self._servlet.respond(self)
+        if self._nested == 1:
+            requestMetrics.record('respond', start)
 
     def sleep(self):
         """Send sleep() to the session and the servlet.
@@ -147,11 +155,17 @@ class Transaction(object):
         Note that sleep() is sent in reverse order as awake()
         (which is typical for shutdown/cleanup methods).
         """
+        start = monotonic()
         self._nested -= 1
         self._servlet.sleep(self)
-        if not self._nested and self._session:
-            self._session.sleep(self)
-            self._application.sessions().storeSession(self._session)
+        if not self._nested:
+            if self._session:
+                self._session.sleep(self)
+                start = requestMetrics.record('sleep', start)
+                self._application.sessions().storeSession(self._session)
+                requestMetrics.record('sessionStore', start)
+            else:
+                requestMetrics.record('sleep', start)
 
 
     ## Debugging ##
@@ -20,6 +20,7 @@ from warnings import warn
 from HTTPExceptions import HTTPNotFound, HTTPMovedPermanently
 from MiscUtils.ParamFactory import ParamFactory
 from WebUtils.Funcs import urlDecode
+from RequestMetrics import requestMetrics, monotonic
 
 debug = False
 
@@ -804,6 +805,10 @@ class ServletFactoryManagerClass(object):
                     self._factoryExtensions[ext].__name__))
             self._factoryExtensions[ext] = factory
 
+    def factories(self):
+        """Get the list of all installed servlet factories."""
+        return self._factories
+
     def factoryForFile(self, path):
         """Get a factory for a filename."""
         ext = os.path.splitext(path)[1]
@@ -819,8 +824,11 @@ class ServletFactoryManagerClass(object):
         Uses `factoryForFile` to find the factory, which
         creates the servlet.
         """
+        start = monotonic()
         factory = self.factoryForFile(path)
-        return factory.servletForTransaction(trans)
+        servlet = factory.servletForTransaction(trans)
+        requestMetrics.record('factory', start)
+        return servlet
 
 ServletFactoryManager = ServletFactoryManagerClass()
 
@@ -1,6 +1,7 @@
 """Servlet factory for unknown file types."""
 
 import os
+import zlib
 
 from mimetypes import guess_type
 
@@ -8,6 +9,7 @@ import HTTPExceptions
 from HTTPServlet import HTTPServlet
 from MiscUtils.Configurable import Configurable
 from ServletFactory import ServletFactory
+from ASStreamOut import compressionWindowBits
 
 debug = 0
 
@@ -42,7 +44,8 @@ class UnknownFileTypeServletFactory(ServletFactory):
 fileCache = {}
     # A cache of the files served up by UnknownFileTypeServlet cached by
     # absolute, server side path. Each content is another dictionary with keys:
-    # content, mimeType, mimeEncoding.
+    # content, mimeType, mimeEncoding, mtime, size, filename and compressed,
+    # a dictionary of the content compressed with the content encodings.
     # Previously, this content was stored directly in the attributes of the
     # UnknownFileTypeServlets, but with that approach subclasses cannot
     # dynamically serve content from different locations.
@@ -96,6 +99,22 @@ class UnknownFileTypeServlet(HTTPServlet, Configurable):
         """
         return self.setting('CacheContent')
 
+    @staticmethod
+    def compressedContent(fileDict, encoding):
+        """Get the cached content of a file compressed with the encoding.
+
+        The content is compressed only once, with the best compression.
+        """
+        compressed = fileDict.setdefault('compressed', {})
+        content = compressed.get(encoding)
+        if content is None:
+            compressor = zlib.compressobj(9, zlib.DEFLATED,
+                compressionWindowBits[encoding])
+            content = compressor.compress(fileDict['content'])
+            content += compressor.flush()
+            compressed[encoding] = content
+        return content
+
 
     ## Init et al ##
 
@@ -182,6 +201,13 @@ class UnknownFileTypeServlet(HTTPServlet, Configurable):
         except OSError:
             return None
 
+    def etag(self, trans):
+        try:
+            stat = os.stat(self.filename(trans))
+        except OSError:
+            return None
+        return 'W/"%x-%x"' % (stat.st_size, int(stat.st_mtime))
+
     def serveContent(self, trans):
         response = trans.response()
 
@@ -239,7 +265,14 @@ class UnknownFileTypeServlet(HTTPServlet, Configurable):
         if fileDict is not None:
             if debug:
                 print '>> sending content from cache'
-            response.write(fileDict['content'])
+            content = fileDict['content']
+            if not mimeEncoding:
+                encoding = response.negotiateCompression(mimeType, fileSize)
+                if encoding:
+                    content = self.compressedContent(fileDict, encoding)
+                    response.setHeader('Content-Encoding', encoding)
+                    response.setHeader('Content-Length', str(len(content)))
+            response.write(content)
         else:  # too big or not supposed to cache
             if debug:
                 print '>> sending directly'